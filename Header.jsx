@@ -1,4 +1,4 @@
-import { useState } from 'react'
+import { useState, useEffect } from 'react'
 import { Search, Menu, X } from 'lucide-react'
 import { Button } from '@/components/ui/button'
 import { Input } from '@/components/ui/input'
@@ -6,6 +6,7 @@ import { Input } from '@/components/ui/input'
 const Header = () => {
   const [isMenuOpen, setIsMenuOpen] = useState(false)
   const [searchQuery, setSearchQuery] = useState('')
+  const [suggestions, setSuggestions] = useState([])
 
   const categories = [
     { name: 'Books', path: '/books' },
@@ -17,6 +18,31 @@ const Header = () => {
     { name: 'Cars', path: '/cars' }
   ]
 
+  useEffect(() => {
+    const query = searchQuery.trim()
+    if (!query) {
+      setSuggestions([])
+      return
+    }
+    // Debounce keystrokes; /api/suggest is served from an in-memory index
+    const controller = new AbortController()
+    const timer = setTimeout(async () => {
+      try {
+        const response = await fetch(`/api/suggest?q=${encodeURIComponent(query)}&limit=8`, { signal: controller.signal })
+        const data = await response.json()
+        setSuggestions(data.suggestions || [])
+      } catch (error) {
+        if (error.name !== 'AbortError') {
+          console.error('Error fetching suggestions:', error)
+        }
+      }
+    }, 120)
+    return () => {
+      clearTimeout(timer)
+      controller.abort()
+    }
+  }, [searchQuery])
+
   const handleSearch = (e) => {
     e.preventDefault()
     if (searchQuery.trim()) {
@@ -63,6 +89,21 @@ const Header = () => {
                   onChange={(e) => setSearchQuery(e.target.value)}
                   className="pl-10 pr-4 py-2 w-full"
                 />
+                {suggestions.length > 0 && (
+                  <ul className="absolute left-0 right-0 mt-1 bg-white border rounded-md shadow-lg z-50">
+                    {suggestions.map((suggestion) => (
+                      <li key={`${suggestion.type}-${suggestion.id}`}>
+                        <a
+                          href={`/search?q=${encodeURIComponent(suggestion.label)}`}
+                          className="flex justify-between px-4 py-2 text-sm text-slate-700 hover:bg-slate-50"
+                        >
+                          <span>{suggestion.label}</span>
+                          <span className="text-slate-400 capitalize">{suggestion.category}</span>
+                        </a>
+                      </li>
+                    ))}
+                  </ul>
+                )}
               </div>
             </form>
           </div>
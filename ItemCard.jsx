@@ -37,8 +37,9 @@ const ItemCard = ({ item, position, showPosition = true }) => {
           <div className="relative w-24 h-36 bg-gradient-to-br from-slate-100 to-slate-200 flex-shrink-0">
             {item.image_url ? (
               <img
-                src={item.image_url}
+                src={`/img/${item.id}/thumb`}
                 alt={item.title}
+                loading="lazy"
                 className="w-full h-full object-cover group-hover:scale-105 transition-transform duration-300"
               />
             ) : (
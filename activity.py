@@ -0,0 +1,21 @@
+from src.models.user import db
+
+class FranchiseActivity(db.Model):
+    """Daily page view and affiliate click counts per franchise (popularity signals)."""
+    __tablename__ = 'franchise_activity'
+
+    franchise_id = db.Column(db.String(36), primary_key=True)
+    day = db.Column(db.Date, primary_key=True)
+    page_views = db.Column(db.Integer, nullable=False, default=0)
+    affiliate_clicks = db.Column(db.Integer, nullable=False, default=0)
+
+    def __repr__(self):
+        return f'<FranchiseActivity {self.franchise_id} {self.day}>'
+
+    def to_dict(self):
+        return {
+            'franchise_id': self.franchise_id,
+            'day': self.day.isoformat() if self.day else None,
+            'page_views': self.page_views,
+            'affiliate_clicks': self.affiliate_clicks
+        }
@@ -1,5 +1,7 @@
 from flask import Blueprint, request, jsonify
 from src.models.franchise import db, AffiliateLink, Item
+from src.services.popularity import record_click
+from src.services.affiliate_import import BulkImportError, iter_request_rows, import_links_sqlalchemy
 import uuid
 
 affiliate_bp = Blueprint('affiliate', __name__)
@@ -81,16 +83,17 @@ def delete_affiliate_link():
         return jsonify({'error': str(e)}), 500
 
 @affiliate_bp.route('/affiliate-links/<link_id>/click', methods=['POST'])
-def track_affiliate_click():
+def track_affiliate_click(link_id):
     """Track affiliate link clicks for analytics"""
     try:
-        link_id = request.view_args['link_id']
-        data = request.get_json() or {}
+        data = request.get_json(silent=True) or {}
         
-        affiliate_link = AffiliateLink.query.get_or_404(link_id)
+        affiliate_link = db.session.get(AffiliateLink, link_id)
+        if not affiliate_link:
+            return jsonify({'error': 'Affiliate link not found'}), 404
         
-        # Here you would typically log the click to an analytics service
-        # For now, we'll just return the link URL
+        # Counted in memory and rolled up into franchise_activity for popularity scoring
+        record_click(affiliate_link.item_id)
         
         click_data = {
             'link_id': link_id,
@@ -114,43 +117,17 @@ def track_affiliate_click():
 
 @affiliate_bp.route('/admin/affiliate-links/bulk-create', methods=['POST'])
 def bulk_create_affiliate_links():
-    """Bulk create affiliate links for multiple items"""
+    """Bulk create affiliate links from a JSON body or a streamed NDJSON feed"""
     try:
-        data = request.get_json()
-        
-        if not data or not data.get('links'):
-            return jsonify({'error': 'Links array is required'}), 400
-        
-        created_links = []
-        
-        for link_data in data['links']:
-            if not link_data.get('item_id') or not link_data.get('platform') or not link_data.get('url'):
-                continue
-            
-            # Check if item exists
-            item = Item.query.get(link_data['item_id'])
-            if not item:
-                continue
-            
-            affiliate_link = AffiliateLink(
-                item_id=link_data['item_id'],
-                platform=link_data['platform'],
-                url=link_data['url'],
-                price=link_data.get('price'),
-                currency=link_data.get('currency'),
-                is_active=link_data.get('is_active', True)
-            )
-            
-            db.session.add(affiliate_link)
-            created_links.append(affiliate_link)
-        
-        db.session.commit()
+        report = import_links_sqlalchemy(db.session, iter_request_rows(request))
         
         return jsonify({
-            'message': f'Created {len(created_links)} affiliate links',
-            'links': [link.to_dict() for link in created_links]
+            'message': f"Created {report['created']} affiliate links",
+            **report
         }), 201
         
+    except BulkImportError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         db.session.rollback()
         return jsonify({'error': str(e)}), 500
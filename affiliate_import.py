@@ -0,0 +1,179 @@
+"""Bulk affiliate link import for the partner feeds.
+
+Rows come either from a JSON body ({"links": [...]}) or, for large feeds, a
+streamed NDJSON body (Content-Type: application/x-ndjson, one link object
+per line) that is parsed line by line, so only one chunk is ever in memory.
+
+Rows are handled CHUNK_SIZE at a time: field checks, one IN query to find
+which item_ids exist, one bulk insert and one commit per chunk. If a chunk
+insert is rejected by the database (e.g. a unique constraint) the chunk is
+retried row by row so only the offending rows fail. Every rejected row is
+reported with its 1-based row number:
+
+    {"created": 49990, "failed": 10, "chunks": 50,
+     "errors": [{"row": 17, "item_id": "...", "error": "Unknown item_id"}, ...]}
+"""
+
+import json
+import logging
+import uuid
+from decimal import Decimal, InvalidOperation
+
+from src.services.batching import chunks
+from src.services.catalog_events import publish_rows
+
+logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = 1000
+NDJSON_TYPES = ('application/x-ndjson', 'application/ndjson', 'application/jsonl')
+REQUIRED_FIELDS = ('item_id', 'platform', 'url')
+
+
+class BulkImportError(ValueError):
+    """The request body as a whole is unusable (as opposed to individual rows)."""
+
+
+def is_ndjson(request):
+    return request.mimetype in NDJSON_TYPES
+
+
+def iter_request_rows(request):
+    """Yield (row number, parsed row or None, parse error or None) from a JSON or NDJSON body."""
+    if is_ndjson(request):
+        number = 0
+        for line in request.stream:
+            line = line.strip()
+            if not line:
+                continue
+            number += 1
+            try:
+                yield number, json.loads(line), None
+            except ValueError as e:
+                yield number, None, f'Invalid JSON: {e}'
+        return
+    
+    data = request.get_json(silent=True)
+    if not data or not isinstance(data.get('links'), list) or not data['links']:
+        raise BulkImportError('Links array is required')
+    for number, row in enumerate(data['links'], 1):
+        yield number, row, None
+
+
+def validate_row(row, columns, required=REQUIRED_FIELDS):
+    """(link mapping restricted to columns, None) or (None, error message)."""
+    if not isinstance(row, dict):
+        return None, 'Row must be a JSON object'
+    missing = [field for field in required if not row.get(field)]
+    if missing:
+        return None, f"Missing {', '.join(missing)}"
+    if not str(row['url']).startswith(('http://', 'https://')):
+        return None, 'url must be http(s)'
+    if row.get('price') is not None:
+        try:
+            price = Decimal(str(row['price']))
+        except InvalidOperation:
+            return None, 'price must be a number'
+        if price < 0:
+            return None, 'price must not be negative'
+    if row.get('currency') is not None and len(str(row['currency'])) != 3:
+        return None, 'currency must be a 3-letter code'
+    link = {column: row[column] for column in columns if column in row}
+    link['id'] = str(uuid.uuid4())
+    link['item_id'] = str(row['item_id'])
+    return link, None
+
+
+def run_import(rows, columns, existing_items, insert_chunk, insert_one, chunk_size=CHUNK_SIZE,
+               required=REQUIRED_FIELDS):
+    """Validate and insert (number, row, parse error) tuples chunk by chunk.
+    
+    existing_items(ids) -> set of the ids that exist; insert_chunk(links)
+    inserts and commits a chunk (raising leaves nothing behind);
+    insert_one(link) does the same for the row-by-row retry.
+    """
+    report = {'created': 0, 'failed': 0, 'chunks': 0, 'errors': []}
+    
+    def fail(number, row, error):
+        report['failed'] += 1
+        item_id = row.get('item_id') if isinstance(row, dict) else None
+        report['errors'].append({'row': number, 'item_id': item_id, 'error': error})
+    
+    for chunk in chunks(rows, chunk_size):
+        report['chunks'] += 1
+        candidates = []
+        for number, row, error in chunk:
+            link = None
+            if error is None:
+                link, error = validate_row(row, columns, required)
+            if error is not None:
+                fail(number, row, error)
+            else:
+                candidates.append((number, link))
+        if not candidates:
+            continue
+        
+        known = existing_items(list({link['item_id'] for _, link in candidates}))
+        links = []
+        for number, link in candidates:
+            if link['item_id'] in known:
+                links.append((number, link))
+            else:
+                fail(number, link, 'Unknown item_id')
+        if not links:
+            continue
+        
+        try:
+            insert_chunk([link for _, link in links])
+            report['created'] += len(links)
+            publish_rows('affiliate_links', [link for _, link in links])
+        except Exception as e:
+            logger.warning(f"Bulk link chunk {report['chunks']} rejected, retrying row by row: {e}")
+            for number, link in links:
+                try:
+                    insert_one(link)
+                    report['created'] += 1
+                    publish_rows('affiliate_links', [link])
+                except Exception as row_error:
+                    fail(number, link, str(getattr(row_error, 'orig', row_error)))
+    
+    report['errors'].sort(key=lambda error: error['row'])
+    return report
+
+
+def import_links_sqlalchemy(session, rows, chunk_size=CHUNK_SIZE):
+    """Bulk import into the legacy SQLite AffiliateLink table."""
+    from src.models.franchise import AffiliateLink, Item
+    
+    columns = ('item_id', 'platform', 'url', 'price', 'currency', 'is_active')
+    
+    def existing_items(ids):
+        return {str(item_id) for item_id, in session.query(Item.id).filter(Item.id.in_(ids))}
+    
+    def insert_chunk(links):
+        try:
+            session.bulk_insert_mappings(AffiliateLink, [dict({'is_active': True}, **link) for link in links])
+            session.commit()
+        except Exception:
+            session.rollback()
+            raise
+    
+    return run_import(rows, columns, existing_items, insert_chunk, lambda link: insert_chunk([link]), chunk_size)
+
+
+def import_links_supabase(client, rows, chunk_size=CHUNK_SIZE):
+    """Bulk import into the Supabase affiliate_links table."""
+    columns = ('item_id', 'platform', 'region', 'url', 'price', 'currency', 'affiliate_tag')
+    
+    def existing_items(ids):
+        known = set()
+        # Keep the IN list well under PostgREST's URL length limit
+        for start in range(0, len(ids), 200):
+            result = client.table('items').select('id').in_('id', ids[start:start + 200]).execute()
+            known.update(str(row['id']) for row in result.data)
+        return known
+    
+    def insert_chunk(links):
+        client.table('affiliate_links').insert(links).execute()
+    
+    return run_import(rows, columns, existing_items, insert_chunk, lambda link: insert_chunk([link]), chunk_size,
+                      required=REQUIRED_FIELDS + ('region',))
@@ -0,0 +1,553 @@
+#!/usr/bin/env python3
+"""Local TMDb / RAWG stub server with record/replay and fault injection.
+
+Serves both APIs from one port under /tmdb/3/... and /rawg/api/...:
+
+    TMDB_BASE_URL=http://127.0.0.1:8765/tmdb/3
+    RAWG_BASE_URL=http://127.0.0.1:8765/rawg/api
+
+Modes:
+    replay      answer from recorded cassettes, synthesize on a miss (default)
+    strict      answer from recorded cassettes only, 404 on a miss
+    record      forward misses to the real APIs and save the responses
+    synthetic   ignore cassettes, always synthesize deterministic responses
+
+Synthesized responses cover search/movie, search/tv, movie/{id}, tv/{id},
+tv/{id}/season/{n}, collection/{id}, games, games/{id} and
+games/{id}/game-series, with stable ids derived from the request.
+
+/images/<any path> serves a deterministic JPEG (needs Pillow) for testing
+the image proxy: a w<N> path segment such as /images/t/p/w500/x.jpg gives a
+poster N pixels wide, anything else a 1280x720 backdrop.
+
+/links/... stands in for retailer pages when checking affiliate links
+(GET and HEAD): ok, status/<code>, redirect/<n> (n hops, then ok) and
+no-head (405 to HEAD, 200 to GET). Peak concurrent requests per Host header
+are reported under links_peak in /__stats.
+
+Fault injection: --latency/--jitter (ms) delay every response, --error-rate
+returns 500s and --rate-limit-rate returns 429 with a Retry-After header.
+GET /__stats returns request counters, POST /__reset clears them.
+
+    python api_stub_server.py --port 8765 --latency 40 --jitter 20 --rate-limit-rate 0.02
+"""
+
+import argparse
+import hashlib
+import io
+import json
+import os
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit, parse_qsl, urlencode
+
+import requests
+
+UPSTREAMS = {
+    'tmdb': 'https://api.themoviedb.org/3',
+    'rawg': 'https://api.rawg.io/api',
+}
+PREFIXES = {
+    '/tmdb/3/': 'tmdb',
+    '/rawg/api/': 'rawg',
+    '/images/': 'images',
+    '/links/': 'links',
+}
+# Credentials are never part of a cassette key or stored response
+SECRET_PARAMS = {'api_key', 'key'}
+
+DEFAULT_CASSETTE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'api_cassettes')
+
+
+def _stable_int(*parts, modulo=1_000_000):
+    digest = hashlib.sha1('|'.join(str(part) for part in parts).encode()).hexdigest()
+    return int(digest[:12], 16) % modulo
+
+
+class Synthesizer:
+    """Deterministic fake responses shaped like the real APIs."""
+    
+    RAWG_PAGE_SIZE = 20
+    
+    def tmdb(self, path, params):
+        parts = path.strip('/').split('/')
+        if parts[:2] == ['search', 'movie']:
+            return self._tmdb_search(params.get('query', ''), 'movie')
+        if parts[:2] == ['search', 'tv']:
+            return self._tmdb_search(params.get('query', ''), 'tv')
+        if parts[0] == 'movie' and len(parts) == 2:
+            return self._tmdb_movie(int(parts[1]))
+        if parts[0] == 'collection' and len(parts) == 2:
+            return self._tmdb_collection(int(parts[1]))
+        if parts[0] == 'tv' and len(parts) == 2:
+            return self._tmdb_tv(int(parts[1]))
+        if parts[0] == 'tv' and len(parts) == 4 and parts[2] == 'season':
+            return self._tmdb_season(int(parts[1]), int(parts[3]))
+        return None
+    
+    def _tmdb_search(self, query, kind):
+        base = _stable_int('tmdb', kind, query.lower()) * 100
+        results = []
+        for n in range(8):
+            title = query if n == 0 else f'{query} {n + 1}'
+            entry = {
+                'id': base + n,
+                'overview': f'Synthetic {kind} entry for {query}.',
+                'poster_path': f'/poster-{base + n}.jpg',
+                'popularity': round(100 / (n + 1), 2),
+                'vote_average': round(5 + (base + n) % 45 / 10, 1),
+                'vote_count': (base + n) % 20000,
+                'genre_ids': [28, 12],
+                'original_language': 'en',
+            }
+            if kind == 'movie':
+                entry.update(title=title, release_date=f'{1980 + n * 3}-05-{10 + n:02d}')
+            else:
+                entry.update(name=title, first_air_date=f'{1995 + n * 2}-09-{10 + n:02d}')
+            results.append(entry)
+        return {'page': 1, 'results': results, 'total_pages': 1, 'total_results': len(results)}
+    
+    def _tmdb_movie(self, movie_id):
+        return {
+            'id': movie_id,
+            'title': f'Movie {movie_id}',
+            'release_date': f'{1980 + movie_id % 40}-06-01',
+            'overview': f'Synthetic movie {movie_id}.',
+            'belongs_to_collection': {'id': movie_id // 100, 'name': f'Collection {movie_id // 100}'},
+        }
+    
+    def _tmdb_collection(self, collection_id):
+        count = 3 + collection_id % 10
+        return {
+            'id': collection_id,
+            'name': f'Collection {collection_id}',
+            'parts': [{
+                'id': collection_id * 100 + n,
+                'title': f'Collection {collection_id} Part {n + 1}',
+                'overview': 'Synthetic collection entry.',
+                'release_date': f'{1977 + n * 3}-05-25',
+                'poster_path': f'/part-{collection_id}-{n}.jpg',
+                'popularity': round(50 / (n + 1), 2),
+                'vote_average': 7.5,
+                'vote_count': 1000 + n,
+                'genre_ids': [878],
+                'original_language': 'en',
+            } for n in range(count)],
+        }
+    
+    def _tmdb_tv(self, tv_id):
+        seasons = 1 + tv_id % 12
+        episodes_per_season = 6 + tv_id % 18
+        return {
+            'id': tv_id,
+            'name': f'Show {tv_id}',
+            'overview': f'Synthetic show {tv_id}.',
+            'first_air_date': '2005-03-24',
+            'poster_path': f'/show-{tv_id}.jpg',
+            'vote_average': 8.1,
+            'vote_count': 5000,
+            'genre_ids': [35],
+            'original_language': 'en',
+            'number_of_seasons': seasons,
+            'number_of_episodes': seasons * episodes_per_season,
+            'status': 'Ended',
+            'seasons': [{
+                'id': tv_id * 100 + n,
+                'season_number': n,
+                'name': f'Season {n}',
+                'episode_count': episodes_per_season,
+                'air_date': f'{2004 + n}-09-01',
+                'poster_path': f'/season-{tv_id}-{n}.jpg',
+                'overview': '',
+            } for n in range(1, seasons + 1)],
+        }
+    
+    def _tmdb_season(self, tv_id, season_number):
+        episodes_per_season = 6 + tv_id % 18
+        return {
+            'id': tv_id * 100 + season_number,
+            'season_number': season_number,
+            'name': f'Season {season_number}',
+            'air_date': f'{2004 + season_number}-09-01',
+            'poster_path': f'/season-{tv_id}-{season_number}.jpg',
+            'overview': '',
+            'episodes': [{
+                'id': (tv_id * 100 + season_number) * 100 + n,
+                'episode_number': n,
+                'season_number': season_number,
+                'name': f'Episode {n}',
+                'air_date': f'{2004 + season_number}-{1 + (n - 1) % 12:02d}-15',
+                'overview': '',
+                'still_path': f'/still-{tv_id}-{season_number}-{n}.jpg',
+                'vote_average': 8.0,
+                'vote_count': 100,
+                'runtime': 42,
+            } for n in range(1, episodes_per_season + 1)],
+        }
+    
+    def rawg(self, path, params, base_url):
+        parts = path.strip('/').split('/')
+        if parts == ['games']:
+            return self._rawg_games(params, base_url, path)
+        if parts[0] == 'games' and len(parts) == 2:
+            return self._rawg_game(int(parts[1]))
+        if parts[0] == 'games' and len(parts) == 3 and parts[2] == 'game-series':
+            return self._rawg_series(int(parts[1]), params, base_url, path)
+        return None
+    
+    def _rawg_game_entry(self, game_id, name):
+        return {
+            'id': game_id,
+            'slug': name.lower().replace(' ', '-'),
+            'name': name,
+            'released': f'{1986 + game_id % 38}-{1 + game_id % 12:02d}-15',
+            'background_image': f'https://media.example.test/games/{game_id}.jpg',
+            'rating': round(3 + game_id % 20 / 10, 2),
+            'rating_top': 5,
+            'ratings_count': game_id % 5000,
+            'metacritic': 60 + game_id % 40,
+            'platforms': [{'platform': {'id': 4, 'name': 'PC'}}],
+            'genres': [{'id': 4, 'name': 'Action'}],
+        }
+    
+    def _page(self, results, params, base_url, path):
+        page = int(params.get('page', 1))
+        page_size = int(params.get('page_size', self.RAWG_PAGE_SIZE))
+        start = (page - 1) * page_size
+        next_url = None
+        if start + page_size < len(results):
+            next_params = {k: v for k, v in params.items() if k not in SECRET_PARAMS}
+            next_params.update(page=page + 1, page_size=page_size)
+            next_url = f"{base_url}/{path.strip('/')}?{urlencode(next_params)}"
+        return {'count': len(results), 'next': next_url, 'previous': None,
+                'results': results[start:start + page_size]}
+    
+    def _rawg_games(self, params, base_url, path):
+        query = params.get('search', '')
+        base = _stable_int('rawg', query.lower()) * 100
+        total = 25 + base % 60 if query else 200
+        results = [self._rawg_game_entry(base + n, f'{query} {n + 1}'.strip() if n else (query or 'Game'))
+                   for n in range(total)]
+        return self._page(results, params, base_url, path)
+    
+    def _rawg_game(self, game_id):
+        game = self._rawg_game_entry(game_id, f'Game {game_id}')
+        game.update(description_raw=f'Synthetic game {game_id}.', developers=[{'name': 'Studio'}],
+                    publishers=[{'name': 'Publisher'}], esrb_rating={'name': 'Teen'})
+        return game
+    
+    def _rawg_series(self, game_id, params, base_url, path):
+        # Games sharing a hundred-block form one series
+        series_base = game_id - game_id % 100
+        members = [self._rawg_game_entry(series_base + n, f'Series {series_base} Part {n + 1}')
+                   for n in range(12) if series_base + n != game_id]
+        return self._page(members, params, base_url, path)
+
+
+def synthesize_image(path):
+    """Deterministic JPEG bytes for an image path."""
+    from PIL import Image, ImageDraw
+    
+    width, height = 1280, 720
+    for part in path.split('/'):
+        if part[:1] == 'w' and part[1:].isdigit():
+            width = int(part[1:])
+            height = width * 3 // 2
+    seed = _stable_int('image', path, modulo=256 ** 3)
+    color = (seed >> 16, (seed >> 8) & 255, seed & 255)
+    image = Image.new('RGB', (width, height), color)
+    draw = ImageDraw.Draw(image)
+    for n in range(0, height, max(1, height // 12)):
+        draw.rectangle([0, n, width, n + height // 24], fill=tuple(255 - c for c in color))
+    output = io.BytesIO()
+    image.save(output, 'JPEG', quality=90)
+    return output.getvalue()
+
+
+def link_response(method, path):
+    """(status, headers) for a /links/ path."""
+    parts = path.strip('/').split('/')
+    if parts == ['ok']:
+        return 200, {}
+    if parts == ['no-head']:
+        return (405, {'Allow': 'GET'}) if method == 'HEAD' else (200, {})
+    if len(parts) == 2 and parts[0] == 'status' and parts[1].isdigit():
+        return int(parts[1]), {}
+    if len(parts) == 2 and parts[0] == 'redirect' and parts[1].isdigit():
+        hops = int(parts[1])
+        return 302, {'Location': f'/links/redirect/{hops - 1}' if hops > 1 else '/links/ok'}
+    return 404, {}
+
+
+class StubState:
+    def __init__(self, mode='replay', cassette_dir=DEFAULT_CASSETTE_DIR, latency=0.0, jitter=0.0,
+                 error_rate=0.0, rate_limit_rate=0.0, retry_after=1, seed=None):
+        self.mode = mode
+        self.cassette_dir = cassette_dir
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.retry_after = retry_after
+        self.random = random.Random(seed)
+        self.synthesizer = Synthesizer()
+        self.lock = threading.Lock()
+        self.reset()
+    
+    def reset(self):
+        with self.lock:
+            self.stats = {'requests': 0, 'by_provider': {}, 'by_endpoint': {}, 'status': {},
+                          'cassette_hits': 0, 'synthesized': 0, 'recorded': 0, 'links_peak': {}}
+            self.in_flight = {}
+    
+    def enter(self, host):
+        with self.lock:
+            self.in_flight[host] = self.in_flight.get(host, 0) + 1
+            peaks = self.stats['links_peak']
+            peaks[host] = max(peaks.get(host, 0), self.in_flight[host])
+    
+    def leave(self, host):
+        with self.lock:
+            self.in_flight[host] = self.in_flight.get(host, 1) - 1
+    
+    def count(self, provider, endpoint, status):
+        with self.lock:
+            self.stats['requests'] += 1
+            self.stats['by_provider'][provider] = self.stats['by_provider'].get(provider, 0) + 1
+            self.stats['by_endpoint'][endpoint] = self.stats['by_endpoint'].get(endpoint, 0) + 1
+            self.stats['status'][str(status)] = self.stats['status'].get(str(status), 0) + 1
+    
+    def bump(self, key):
+        with self.lock:
+            self.stats[key] += 1
+    
+    def roll(self):
+        with self.lock:
+            return self.random.random(), self.random.uniform(-1, 1)
+    
+    def cassette_path(self, provider, path, params):
+        key_params = sorted((k, v) for k, v in params.items() if k not in SECRET_PARAMS)
+        key = f"{path}?{urlencode(key_params)}"
+        digest = hashlib.sha1(key.encode()).hexdigest()
+        return os.path.join(self.cassette_dir, provider, f'{digest}.json'), key
+
+
+def _endpoint_name(provider, path):
+    """Collapse ids so stats group by endpoint, e.g. tmdb:movie/{id}."""
+    if provider == 'images':
+        return 'images'
+    parts = ['{id}' if part.isdigit() else part for part in path.strip('/').split('/')]
+    return f"{provider}:{'/'.join(parts)}"
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    server_version = 'OrderOfAPIStub/1.0'
+    
+    def log_message(self, format, *args):
+        pass
+    
+    def _send_json(self, status, body, headers=None):
+        payload = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        if self.command != 'HEAD':
+            self.wfile.write(payload)
+    
+    def _send_bytes(self, status, payload, content_type):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        if self.command != 'HEAD':
+            self.wfile.write(payload)
+    
+    def do_HEAD(self):
+        self.do_GET()
+    
+    def do_POST(self):
+        if self.path == '/__reset':
+            self.server.state.reset()
+            return self._send_json(200, {'reset': True})
+        self._send_json(405, {'error': 'method not allowed'})
+    
+    def do_GET(self):
+        state = self.server.state
+        url = urlsplit(self.path)
+        if url.path == '/__stats':
+            with state.lock:
+                return self._send_json(200, json.loads(json.dumps(state.stats)))
+        
+        provider = None
+        for prefix, name in PREFIXES.items():
+            if url.path.startswith(prefix):
+                provider, path = name, url.path[len(prefix):]
+                break
+        if provider is None:
+            return self._send_json(404, {'error': 'unknown API prefix'})
+        
+        params = dict(parse_qsl(url.query))
+        endpoint = _endpoint_name(provider, path)
+        
+        if provider == 'links':
+            host = self.headers.get('Host')
+            state.enter(host)
+            try:
+                return self._respond(state, provider, endpoint, path, params)
+            finally:
+                state.leave(host)
+        return self._respond(state, provider, endpoint, path, params)
+    
+    def _respond(self, state, provider, endpoint, path, params):
+        chance, spread = state.roll()
+        delay = max(0.0, state.latency + spread * state.jitter) / 1000
+        if delay:
+            time.sleep(delay)
+        
+        if chance < state.rate_limit_rate:
+            state.count(provider, endpoint, 429)
+            return self._send_json(429, {'status_message': 'Too Many Requests'},
+                                   {'Retry-After': str(state.retry_after)})
+        if chance < state.rate_limit_rate + state.error_rate:
+            state.count(provider, endpoint, 500)
+            return self._send_json(500, {'status_message': 'Injected failure'})
+        
+        if provider == 'images':
+            state.count(provider, endpoint, 200)
+            return self._send_bytes(200, synthesize_image(path), 'image/jpeg')
+        if provider == 'links':
+            status, headers = link_response(self.command, path)
+            state.count(provider, endpoint, status)
+            return self._send_json(status, {'path': path}, headers)
+        
+        status, body = self._resolve(state, provider, path, params)
+        state.count(provider, endpoint, status)
+        self._send_json(status, body)
+    
+    def _resolve(self, state, provider, path, params):
+        cassette, key = state.cassette_path(provider, path, params)
+        
+        if state.mode != 'synthetic' and os.path.exists(cassette):
+            with open(cassette) as f:
+                recorded = json.load(f)
+            state.bump('cassette_hits')
+            return recorded['status'], recorded['body']
+        
+        if state.mode == 'record':
+            status, body = self._record(provider, path, params, cassette, key)
+            state.bump('recorded')
+            return status, body
+        
+        if state.mode == 'strict':
+            return 404, {'status_message': f'No recording for {provider} {key}'}
+        
+        base_url = f"http://{self.headers.get('Host')}/{provider}/{'3' if provider == 'tmdb' else 'api'}"
+        if provider == 'tmdb':
+            body = state.synthesizer.tmdb(path, params)
+        else:
+            body = state.synthesizer.rawg(path, params, base_url)
+        if body is None:
+            return 404, {'status_message': f'No synthetic response for {path}'}
+        state.bump('synthesized')
+        return 200, body
+    
+    def _record(self, provider, path, params, cassette, key):
+        upstream_params = dict(params)
+        if provider == 'tmdb':
+            upstream_params['api_key'] = os.environ['TMDB_API_KEY']
+        else:
+            upstream_params['key'] = os.environ['RAWG_API_KEY']
+        response = requests.get(f"{UPSTREAMS[provider]}/{path}", params=upstream_params, timeout=30)
+        body = response.json()
+        if provider == 'rawg':
+            # Point pagination links back at the stub and drop the key
+            for link in ('next', 'previous'):
+                if body.get(link):
+                    link_url = urlsplit(body[link])
+                    link_params = [(k, v) for k, v in parse_qsl(link_url.query) if k not in SECRET_PARAMS]
+                    body[link] = (f"http://{self.headers.get('Host')}/rawg/api/{path}?"
+                                  f"{urlencode(link_params)}")
+        os.makedirs(os.path.dirname(cassette), exist_ok=True)
+        with open(cassette, 'w') as f:
+            json.dump({'request': key, 'status': response.status_code, 'body': body}, f)
+        return response.status_code, body
+
+
+class StubServer:
+    """Run the stub in a background thread, e.g. from a benchmark or test."""
+    
+    def __init__(self, host='127.0.0.1', port=0, **state_options):
+        self.state = StubState(**state_options)
+        self.httpd = ThreadingHTTPServer((host, port), StubHandler)
+        self.httpd.daemon_threads = True
+        self.httpd.state = self.state
+        self.thread = None
+    
+    @property
+    def base_url(self):
+        host, port = self.httpd.server_address[:2]
+        return f'http://{host}:{port}'
+    
+    @property
+    def tmdb_base_url(self):
+        return f'{self.base_url}/tmdb/3'
+    
+    @property
+    def rawg_base_url(self):
+        return f'{self.base_url}/rawg/api'
+    
+    @property
+    def image_base_url(self):
+        return f'{self.base_url}/images'
+    
+    @property
+    def link_base_url(self):
+        return f'{self.base_url}/links'
+    
+    def start(self):
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+    
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+    
+    def stats(self):
+        with self.state.lock:
+            return json.loads(json.dumps(self.state.stats))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--mode', choices=['replay', 'strict', 'record', 'synthetic'], default='replay')
+    parser.add_argument('--cassettes', default=DEFAULT_CASSETTE_DIR)
+    parser.add_argument('--latency', type=float, default=0.0, help='base latency in ms')
+    parser.add_argument('--jitter', type=float, default=0.0, help='+/- jitter in ms')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='fraction of 500 responses')
+    parser.add_argument('--rate-limit-rate', type=float, default=0.0, help='fraction of 429 responses')
+    parser.add_argument('--retry-after', type=int, default=1, help='Retry-After seconds on 429')
+    parser.add_argument('--seed', type=int, default=None)
+    args = parser.parse_args()
+    
+    server = StubServer(args.host, args.port, mode=args.mode, cassette_dir=args.cassettes,
+                        latency=args.latency, jitter=args.jitter, error_rate=args.error_rate,
+                        rate_limit_rate=args.rate_limit_rate, retry_after=args.retry_after, seed=args.seed)
+    print(f"API stub ({args.mode}) listening on {server.base_url}")
+    print(f"  TMDB_BASE_URL={server.tmdb_base_url}")
+    print(f"  RAWG_BASE_URL={server.rawg_base_url}")
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        server.stop()
+
+
+if __name__ == '__main__':
+    main()
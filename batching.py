@@ -0,0 +1,18 @@
+"""Chunking and size limits shared by the bulk catalog writers and loaders."""
+
+from itertools import islice
+
+# Keep IN lists under SQLite's variable limit and PostgREST's URL length limit
+IN_CHUNK_SIZE = 200
+# Stored error messages are cut to fit the String(255) error columns
+MAX_ERROR_LENGTH = 255
+
+
+def chunks(rows, size):
+    """Lists of up to size rows from any iterable, read lazily."""
+    iterator = iter(rows)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
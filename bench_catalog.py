@@ -0,0 +1,255 @@
+"""Seeded synthetic catalog generator for benchmarks.
+
+generate_catalog(scale, seed) streams rows for franchises, items, orders,
+order_items and affiliate_links. The same (scale, seed) always produces the
+same catalog, ids included, so runs can be compared with each other. Rows are
+produced table by table as generators and never held all at once.
+
+    catalog = generate_catalog('10k', seed=42)
+    load_sqlite(db, catalog)            # legacy backend
+    load_supabase(standin, catalog)     # SupabaseStandIn
+"""
+
+import random
+import uuid
+from datetime import date, timedelta
+
+SCALES = {
+    '1k': 1_000,
+    '10k': 10_000,
+    '100k': 100_000,
+}
+
+CATEGORIES = ['movies', 'series', 'games', 'books', 'anime']
+CATEGORY_WEIGHTS = [30, 25, 25, 10, 10]
+
+ADJECTIVES = [
+    'Crimson', 'Silent', 'Eternal', 'Broken', 'Golden', 'Hidden', 'Savage', 'Frozen',
+    'Lost', 'Iron', 'Shadow', 'Last', 'Burning', 'Stellar', 'Wild', 'Hollow', 'Neon',
+    'Ancient', 'Midnight', 'Scarlet', 'Galactic', 'Forgotten', 'Mystic', 'Dark',
+]
+NOUNS = [
+    'Empire', 'Legend', 'Kingdom', 'Odyssey', 'Chronicles', 'Saga', 'Frontier', 'Knight',
+    'Dragon', 'Horizon', 'Protocol', 'Dynasty', 'Requiem', 'Crusade', 'Voyage', 'Paradox',
+    'Citadel', 'Titan', 'Covenant', 'Rebellion', 'Guardian', 'Storm', 'Oracle', 'Wars',
+]
+SUBTITLES = [
+    'Rising', 'Reborn', 'Origins', 'Revelations', 'Endgame', 'Awakening', 'Legacy',
+    'Reckoning', 'Resurrection', 'Uprising', 'Homecoming', 'Dawn', 'Exile', 'Ascension',
+]
+ROMAN = ['', ' II', ' III', ' IV', ' V', ' VI', ' VII', ' VIII', ' IX', ' X']
+
+ITEMS_PER_FRANCHISE = (3, 15)
+ORDER_TYPES = ['release', 'chronological']
+LINK_PLATFORMS = [('amazon', 'uk', 'GBP'), ('amazon', 'us', 'USD')]
+
+
+class Catalog:
+    """Lazily generated catalog; every table can be iterated independently."""
+
+    def __init__(self, franchise_count, seed):
+        self.franchise_count = franchise_count
+        self.seed = seed
+
+    def _rng(self, table):
+        return random.Random(f'{self.seed}:{table}')
+
+    @staticmethod
+    def _uuid(rng):
+        return str(uuid.UUID(int=rng.getrandbits(128), version=4))
+
+    def _franchise_plan(self):
+        """Yield (index, franchise_id, category, item_count) deterministically."""
+        rng = self._rng('plan')
+        for index in range(self.franchise_count):
+            yield (
+                index,
+                self._uuid(rng),
+                rng.choices(CATEGORIES, CATEGORY_WEIGHTS)[0],
+                rng.randint(*ITEMS_PER_FRANCHISE),
+            )
+
+    def _franchise_name(self, index):
+        adjective = ADJECTIVES[index % len(ADJECTIVES)]
+        noun = NOUNS[(index // len(ADJECTIVES)) % len(NOUNS)]
+        series = index // (len(ADJECTIVES) * len(NOUNS))
+        return f'The {adjective} {noun}' + (f' {series + 1}' if series else '')
+
+    def franchises(self):
+        rng = self._rng('franchises')
+        for index, franchise_id, category, _ in self._franchise_plan():
+            name = self._franchise_name(index)
+            yield {
+                'id': franchise_id,
+                'name': name,
+                'slug': f"{name.lower().replace(' ', '-')}-{index}",
+                'category': category,
+                'description': f'{name} is a {category} franchise spanning several entries.',
+                'image_url': f'https://example.test/franchises/{index}.jpg',
+                'popularity_score': int(rng.paretovariate(1.5) * 10) % 1000,
+            }
+
+    def _items_of(self, rng, index, franchise_id, item_count):
+        name = self._franchise_name(index)
+        start = date(1970, 1, 1) + timedelta(days=rng.randint(0, 365 * 45))
+        for number in range(item_count):
+            subtitle = rng.choice(SUBTITLES)
+            yield {
+                'id': self._uuid(rng),
+                'franchise_id': franchise_id,
+                'title': f'{name}{ROMAN[number % len(ROMAN)]}: {subtitle}',
+                'slug': f"{name.lower().replace(' ', '-')}-{index}-{number + 1}",
+                'description': f'Entry {number + 1} of {name}.',
+                'release_date': start + timedelta(days=number * rng.randint(200, 900)),
+                'image_url': f'https://example.test/items/{index}/{number}.jpg',
+                'external_id': str(index * 100 + number),
+                'api_metadata': {
+                    'popularity': round(rng.lognormvariate(2, 1), 3),
+                    'vote_count': rng.randint(0, 20000),
+                    'vote_average': round(rng.uniform(3, 9.5), 1),
+                },
+                'rating': round(rng.uniform(3, 9.5), 1),
+            }
+
+    def items(self):
+        rng = self._rng('items')
+        for index, franchise_id, _, item_count in self._franchise_plan():
+            yield from self._items_of(rng, index, franchise_id, item_count)
+
+    def items_by_franchise(self):
+        """Yield (franchise_id, [item rows]) one franchise at a time."""
+        rng = self._rng('items')
+        for index, franchise_id, _, item_count in self._franchise_plan():
+            yield franchise_id, list(self._items_of(rng, index, franchise_id, item_count))
+
+    def orders(self):
+        rng = self._rng('orders')
+        for _, franchise_id, _, _ in self._franchise_plan():
+            for order_type in ORDER_TYPES:
+                yield {
+                    'id': self._uuid(rng),
+                    'franchise_id': franchise_id,
+                    'order_type': order_type,
+                    'name': f'{order_type.title()} Order',
+                    'description': f'Entries in {order_type} order',
+                    'is_official': True,
+                }
+
+    def order_items(self):
+        orders = self.orders()
+        shuffle_rng = self._rng('order_items')
+        for _, items in self.items_by_franchise():
+            for order_type in ORDER_TYPES:
+                order = next(orders)
+                entries = sorted(items, key=lambda item: item['release_date'])
+                if order_type == 'chronological':
+                    shuffle_rng.shuffle(entries)
+                for position, item in enumerate(entries, 1):
+                    yield {
+                        'order_id': order['id'],
+                        'item_id': item['id'],
+                        'position': position,
+                        'notes': None,
+                        'is_optional': False,
+                    }
+
+    def affiliate_links(self):
+        rng = self._rng('affiliate_links')
+        for item in self.items():
+            for platform, region, currency in LINK_PLATFORMS:
+                domain = 'amazon.co.uk' if region == 'uk' else 'amazon.com'
+                yield {
+                    'id': self._uuid(rng),
+                    'item_id': item['id'],
+                    'platform': platform,
+                    'region': region,
+                    'url': f"https://www.{domain}/s?k={item['slug']}",
+                    'price': round(rng.uniform(4.99, 59.99), 2),
+                    'currency': currency,
+                    'is_active': True,
+                }
+
+    def tables(self):
+        """Tables in dependency order."""
+        return [
+            ('franchises', self.franchises),
+            ('items', self.items),
+            ('orders', self.orders),
+            ('order_items', self.order_items),
+            ('affiliate_links', self.affiliate_links),
+        ]
+
+
+def generate_catalog(scale, seed=42):
+    """Build a catalog description for a named scale ('1k', '10k', '100k') or a count."""
+    franchise_count = SCALES[scale] if scale in SCALES else int(scale)
+    return Catalog(franchise_count, seed)
+
+
+def chunked(rows, size):
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+# Columns understood by each backend; everything else is dropped on load
+SQLITE_COLUMNS = {
+    'franchises': ('id', 'name', 'slug', 'category', 'description', 'image_url', 'popularity_score'),
+    'items': ('id', 'franchise_id', 'title', 'slug', 'description', 'release_date', 'image_url',
+              'external_id', 'api_metadata'),
+    'orders': ('id', 'franchise_id', 'order_type', 'name', 'description', 'is_official'),
+    'order_items': ('order_id', 'item_id', 'position', 'notes', 'is_optional'),
+    'affiliate_links': ('id', 'item_id', 'platform', 'url', 'price', 'currency', 'is_active'),
+}
+SUPABASE_COLUMNS = {
+    'franchises': ('id', 'name', 'slug', 'category', 'description', 'image_url', 'popularity_score'),
+    'items': ('id', 'franchise_id', 'title', 'description', 'release_date', 'image_url',
+              'external_id', 'api_metadata', 'rating'),
+    'orders': ('id', 'franchise_id', 'order_type', 'name', 'description'),
+    'order_items': ('order_id', 'item_id', 'position', 'notes'),
+    'affiliate_links': ('id', 'item_id', 'platform', 'region', 'url', 'price', 'currency'),
+}
+
+
+def load_sqlite(db, catalog, chunk_size=5000):
+    """Bulk insert a catalog through the SQLAlchemy models (needs an app context)."""
+    from src.models.franchise import Franchise, Item, Order, OrderItem, AffiliateLink
+    models = {
+        'franchises': Franchise,
+        'items': Item,
+        'orders': Order,
+        'order_items': OrderItem,
+        'affiliate_links': AffiliateLink,
+    }
+    counts = {}
+    for table, rows in catalog.tables():
+        columns = SQLITE_COLUMNS[table]
+        counts[table] = 0
+        for chunk in chunked(rows(), chunk_size):
+            db.session.bulk_insert_mappings(models[table], [
+                {column: row[column] for column in columns} for row in chunk
+            ])
+            db.session.commit()
+            counts[table] += len(chunk)
+    return counts
+
+
+def load_supabase(standin, catalog):
+    """Load a catalog into a SupabaseStandIn."""
+    counts = {}
+    for table, rows in catalog.tables():
+        columns = SUPABASE_COLUMNS[table]
+        loaded = []
+        for row in rows():
+            row = {column: row[column] for column in columns}
+            if isinstance(row.get('release_date'), date):
+                row['release_date'] = row['release_date'].isoformat()
+            loaded.append(row)
+        standin.bulk_load(table, loaded)
+        counts[table] = len(loaded)
+    return counts
@@ -0,0 +1,72 @@
+"""Shared helpers for the benchmark scripts: percentiles, reports, baselines."""
+
+import json
+import platform
+import time
+
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(pct / 100 * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def summarize(latencies, elapsed, errors=0):
+    """Summarize request latencies (seconds) into throughput and percentiles (ms)."""
+    latencies = sorted(latencies)
+    return {
+        'requests': len(latencies),
+        'errors': errors,
+        'throughput': len(latencies) / elapsed if elapsed else 0.0,
+        'p50': percentile(latencies, 50) * 1000,
+        'p95': percentile(latencies, 95) * 1000,
+        'p99': percentile(latencies, 99) * 1000,
+        'max': (latencies[-1] if latencies else 0.0) * 1000,
+    }
+
+
+def print_table(results, first_column='scenario'):
+    print(f"{first_column:<12}{'reqs':>8}{'errors':>8}{'req/s':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'max ms':>10}")
+    for name, r in results.items():
+        print(f"{name:<12}{r['requests']:>8}{r['errors']:>8}{r['throughput']:>10.1f}"
+              f"{r['p50']:>10.2f}{r['p95']:>10.2f}{r['p99']:>10.2f}{r['max']:>10.2f}")
+
+
+def write_report(path, config, results):
+    report = {
+        'created_at': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'machine': platform.machine(),
+        'config': config,
+        'results': results,
+    }
+    with open(path, 'w') as f:
+        json.dump(report, f, indent=2, sort_keys=True)
+    return report
+
+
+def load_report(path):
+    with open(path) as f:
+        return json.load(f)
+
+
+def compare_reports(baseline, results, threshold):
+    """List regressions against a baseline report.
+
+    A scenario regresses when its p99 latency grows, or its throughput
+    drops, by more than `threshold` (a fraction, e.g. 0.15 for 15%).
+    """
+    regressions = []
+    for name, current in results.items():
+        previous = baseline.get('results', {}).get(name)
+        if not previous:
+            continue
+        if previous['p99'] and current['p99'] > previous['p99'] * (1 + threshold):
+            regressions.append(f"{name}: p99 {previous['p99']:.2f}ms -> {current['p99']:.2f}ms")
+        if previous['throughput'] and current['throughput'] < previous['throughput'] * (1 - threshold):
+            regressions.append(f"{name}: throughput {previous['throughput']:.1f} -> {current['throughput']:.1f} req/s")
+        if current['errors'] > previous.get('errors', 0):
+            regressions.append(f"{name}: errors {previous.get('errors', 0)} -> {current['errors']}")
+    return regressions
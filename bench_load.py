@@ -0,0 +1,202 @@
+#!/usr/bin/env python3
+"""Reproducible load benchmark for the listing, detail, orders, search and
+click endpoints.
+
+A seeded synthetic catalog is loaded into either the legacy SQLite backend
+or a local Supabase stand-in, then each scenario is driven by concurrent
+clients for a fixed duration. Results (throughput, p50/p95/p99) are written
+as JSON and can be compared with a previous run; the script exits non-zero
+when a scenario regresses past the threshold, or when any request fails
+(no report is written then, so a baseline never records an error path).
+
+    python bench_load.py --backend sqlite --scale 10k --output bench-10k.json
+    python bench_load.py --backend sqlite --scale 10k --baseline bench-10k.json --threshold 0.15
+"""
+
+import argparse
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+
+from flask import Flask
+from src.bench_catalog import generate_catalog, load_sqlite, load_supabase, SCALES, CATEGORIES
+from src.bench_common import summarize, print_table, write_report, load_report, compare_reports
+
+SEARCH_TERMS = ['crimson', 'empire', 'legend', 'dragon wars', 'silent', 'origins', 'the last', 'neon titan']
+
+
+def build_sqlite_app(catalog):
+    from src.models.user import db
+    from src.config.database import configure_database
+    from src.routes.franchise import franchise_bp
+    from src.routes.affiliate import affiliate_bp
+    from src.services.search_index import init_search_index
+    from src.services.leaderboard import init_leaderboard
+
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    app.register_blueprint(franchise_bp, url_prefix='/api')
+    app.register_blueprint(affiliate_bp, url_prefix='/api')
+    configure_database(app, db, os.path.join(tempfile.mkdtemp(prefix='orderof-load-'), 'app.db'))
+    with app.app_context():
+        db.create_all()
+        counts = load_sqlite(db, catalog)
+        init_search_index(app)
+        init_leaderboard(app)
+    return app, counts
+
+
+def build_supabase_app(catalog):
+    from src.services.supabase_standin import SupabaseStandIn, AsyncSupabaseStandIn, register_search_rpcs
+    from src.services.leaderboard import init_leaderboard
+    from src.config.supabase import use_supabase_client
+
+    standin = SupabaseStandIn()
+    counts = load_supabase(standin, catalog)
+    register_search_rpcs(standin)
+    # Must happen before the route modules create their shared services
+    use_supabase_client(standin, AsyncSupabaseStandIn(standin))
+
+    from src.routes.supabase_franchise import supabase_franchise_bp
+    from src.routes.supabase_affiliate import supabase_affiliate_bp
+
+    app = Flask(__name__)
+    app.register_blueprint(supabase_franchise_bp, url_prefix='/api')
+    app.register_blueprint(supabase_affiliate_bp, url_prefix='/api')
+    init_leaderboard(app, supabase_client=standin)
+    return app, counts
+
+
+def sample_ids(catalog, rng, count=2000):
+    """Reservoir-sample franchise and affiliate link ids from the catalog."""
+    def reservoir(rows, key):
+        sample = []
+        for index, row in enumerate(rows):
+            if len(sample) < count:
+                sample.append(row[key])
+            else:
+                slot = rng.randint(0, index)
+                if slot < count:
+                    sample[slot] = row[key]
+        return sample
+    return reservoir(catalog.franchises(), 'id'), reservoir(catalog.affiliate_links(), 'id')
+
+
+def scenarios(backend, franchise_ids, link_ids, total_franchises):
+    """Map scenario name -> (method, path factory)."""
+    max_offset = max(0, min(total_franchises, 1000) - 20)
+    result = {
+        'listing': ('GET', lambda rng: f'/api/franchises?limit=20&offset={rng.randint(0, max_offset)}'),
+        'detail': ('GET', lambda rng: f'/api/franchises/{rng.choice(franchise_ids)}'),
+        'orders': ('GET', lambda rng: f'/api/franchises/{rng.choice(franchise_ids)}/orders'),
+        'search': ('GET', lambda rng: f'/api/search?q={rng.choice(SEARCH_TERMS)}&limit=20'),
+    }
+    # Homepage rows: top franchises per category
+    if backend == 'sqlite':
+        result['popular'] = ('GET', lambda rng: f'/api/popular?category={rng.choice(CATEGORIES)}&limit=8')
+    else:
+        result['popular'] = ('GET', lambda rng: f'/api/franchises?category={rng.choice(CATEGORIES)}&limit=8')
+    result['click'] = ('POST', lambda rng: f'/api/affiliate-links/{rng.choice(link_ids)}/click')
+    return result
+
+
+def run_scenario(app, method, path_factory, concurrency, duration, seed):
+    latencies = []
+    errors = [0]
+    first_error = []
+    lock = threading.Lock()
+    deadline = time.perf_counter() + duration
+
+    def worker(worker_seed):
+        rng = random.Random(worker_seed)
+        client = app.test_client()
+        local = []
+        local_errors = 0
+        while time.perf_counter() < deadline:
+            path = path_factory(rng)
+            start = time.perf_counter()
+            response = client.open(path, method=method, json={} if method == 'POST' else None)
+            local.append(time.perf_counter() - start)
+            if response.status_code >= 400:
+                local_errors += 1
+                if not first_error:
+                    first_error.append(f'{method} {path} -> {response.status_code} {response.get_data(as_text=True)[:200]}')
+        with lock:
+            latencies.extend(local)
+            errors[0] += local_errors
+
+    threads = [threading.Thread(target=worker, args=(f'{seed}:{n}',)) for n in range(concurrency)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    result = summarize(latencies, time.perf_counter() - started, errors[0])
+    if first_error:
+        result['first_error'] = first_error[0]
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--backend', choices=['sqlite', 'supabase'], default='sqlite')
+    parser.add_argument('--scale', default='1k', help=f"one of {', '.join(SCALES)} or a franchise count")
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--duration', type=float, default=10.0, help='seconds per scenario')
+    parser.add_argument('--scenario', action='append', help='run only these scenarios')
+    parser.add_argument('--output', help='write the JSON report here')
+    parser.add_argument('--baseline', help='compare against this JSON report')
+    parser.add_argument('--threshold', type=float, default=0.15, help='allowed regression fraction')
+    args = parser.parse_args()
+
+    catalog = generate_catalog(args.scale, args.seed)
+    started = time.perf_counter()
+    if args.backend == 'sqlite':
+        app, counts = build_sqlite_app(catalog)
+    else:
+        app, counts = build_supabase_app(catalog)
+    print(f"Loaded {counts} into {args.backend} in {time.perf_counter() - started:.1f}s")
+
+    rng = random.Random(args.seed)
+    franchise_ids, link_ids = sample_ids(catalog, rng)
+    selected = scenarios(args.backend, franchise_ids, link_ids, catalog.franchise_count)
+    if args.scenario:
+        selected = {name: selected[name] for name in args.scenario if name in selected}
+
+    results = {}
+    for name, (method, path_factory) in selected.items():
+        results[name] = run_scenario(app, method, path_factory, args.concurrency, args.duration, args.seed)
+    print_table(results)
+
+    failed = {name: result for name, result in results.items() if result['errors']}
+    if failed:
+        print("Failed requests (latencies above include them, so no report was written):")
+        for name, result in failed.items():
+            print(f"  {name}: {result['errors']} errors, e.g. {result['first_error']}")
+        sys.exit(1)
+
+    config = {key: getattr(args, key) for key in ('backend', 'scale', 'seed', 'concurrency', 'duration')}
+    if args.output:
+        write_report(args.output, config, results)
+
+    if args.baseline:
+        baseline = load_report(args.baseline)
+        if baseline.get('config', {}).get('scale') != args.scale or baseline.get('config', {}).get('backend') != args.backend:
+            print("Warning: baseline was recorded with a different backend or scale")
+        regressions = compare_reports(baseline, results, args.threshold)
+        if regressions:
+            print("Regressions:")
+            for regression in regressions:
+                print(f"  {regression}")
+            sys.exit(1)
+        print(f"No regressions beyond {args.threshold:.0%}")
+
+
+if __name__ == '__main__':
+    main()
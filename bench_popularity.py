@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""Popularity recompute benchmark.
+
+Loads a seeded catalog into the legacy SQLite backend or the Supabase
+stand-in, adds seeded page view / click rollups for the last
+ACTIVITY_WINDOW_DAYS and runs the popularity job, reporting the load, score
+and write phases. --runs repeats the job so later runs show the cost when
+only some scores change.
+
+    python bench_popularity.py --scale 100k
+    python bench_popularity.py --backend supabase --scale 10k --output popularity.json
+"""
+
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+
+from flask import Flask
+from src.bench_catalog import generate_catalog, load_sqlite, load_supabase, SCALES
+from src.bench_common import write_report
+from src.services.popularity import ACTIVITY_WINDOW_DAYS
+
+
+def activity_rows(catalog, seed, share=0.3):
+    """Seeded daily rollups for a share of the franchises."""
+    rng = random.Random(seed)
+    today = date.today()
+    for franchise in catalog.franchises():
+        if rng.random() >= share:
+            continue
+        for days_ago in rng.sample(range(ACTIVITY_WINDOW_DAYS), rng.randint(1, 10)):
+            yield {
+                'franchise_id': franchise['id'],
+                'day': today - timedelta(days=days_ago),
+                'page_views': int(rng.paretovariate(1.2) * 5),
+                'affiliate_clicks': rng.randint(0, 5),
+            }
+
+
+def run_sqlite(catalog, seed, runs):
+    from src.models.franchise import db
+    from src.models.activity import FranchiseActivity
+    from src.config.database import configure_database
+    from src.services.popularity import recompute_popularity
+    
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    configure_database(app, db, os.path.join(tempfile.mkdtemp(prefix='orderof-popularity-'), 'app.db'))
+    with app.app_context():
+        db.create_all()
+        started = time.perf_counter()
+        counts = load_sqlite(db, catalog)
+        db.session.bulk_insert_mappings(FranchiseActivity, list(activity_rows(catalog, seed)))
+        db.session.commit()
+        print(f"Loaded {counts} in {time.perf_counter() - started:.1f}s")
+        return [recompute_popularity(db.session) for _ in range(runs)]
+
+
+def run_supabase(catalog, seed, runs):
+    from src.services.supabase_standin import SupabaseStandIn, register_popularity_rpcs
+    from src.services.popularity import recompute_popularity_supabase
+    
+    standin = register_popularity_rpcs(SupabaseStandIn())
+    started = time.perf_counter()
+    counts = load_supabase(standin, catalog)
+    standin.bulk_load('franchise_activity', [
+        dict(row, id=f"{row['franchise_id']}:{row['day']}", day=row['day'].isoformat())
+        for row in activity_rows(catalog, seed)
+    ])
+    print(f"Loaded {counts} in {time.perf_counter() - started:.1f}s")
+    return [recompute_popularity_supabase(standin) for _ in range(runs)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--backend', choices=['sqlite', 'supabase'], default='sqlite')
+    parser.add_argument('--scale', default='10k', help=f"one of {', '.join(SCALES)} or a franchise count")
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--runs', type=int, default=2)
+    parser.add_argument('--output', help='write the JSON report here')
+    args = parser.parse_args()
+    
+    catalog = generate_catalog(args.scale, args.seed)
+    run = run_sqlite if args.backend == 'sqlite' else run_supabase
+    reports = run(catalog, args.seed, args.runs)
+    
+    print(f"{'run':<6}{'franchises':>12}{'items':>10}{'changed':>10}{'load s':>10}{'score s':>10}{'write s':>10}")
+    for number, report in enumerate(reports, 1):
+        seconds = report['seconds']
+        print(f"{number:<6}{report['franchises']:>12}{report['items']:>10}{report['changed']:>10}"
+              f"{seconds['load']:>10.3f}{seconds['score']:>10.3f}{seconds['write']:>10.3f}")
+    
+    if args.output:
+        config = {key: getattr(args, key) for key in ('backend', 'scale', 'seed', 'runs')}
+        write_report(args.output, config, {f'run{number}': report for number, report in enumerate(reports, 1)})
+
+
+if __name__ == '__main__':
+    main()
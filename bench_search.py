@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+"""Search benchmark: trigram index vs the ilike path.
+
+Loads a seeded catalog into the legacy SQLite backend, builds the trigram
+search index and runs the same query set through GET /api/search in both
+SEARCH_MODEs. Queries are sampled item titles, half of them with typos
+(dropped, swapped or replaced letters). Besides latency it reports the
+hit rate: the share of queries whose source item comes back in the results.
+The raw index lookup is timed separately to show the in-process cost.
+
+    python bench_search.py --scale 10k --queries 500
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+
+from src.bench_catalog import generate_catalog, SCALES
+from src.bench_common import summarize, print_table, write_report
+from src.bench_load import build_sqlite_app
+
+
+def add_typo(rng, text):
+    """Drop, swap or replace one letter in a random word."""
+    words = text.split()
+    candidates = [i for i, word in enumerate(words) if len(word) > 3]
+    if not candidates:
+        return text
+    i = rng.choice(candidates)
+    word = words[i]
+    at = rng.randint(1, len(word) - 2)
+    kind = rng.choice(['drop', 'swap', 'replace'])
+    if kind == 'drop':
+        word = word[:at] + word[at + 1:]
+    elif kind == 'swap':
+        word = word[:at] + word[at + 1] + word[at] + word[at + 2:]
+    else:
+        word = word[:at] + rng.choice('aeiouxyz') + word[at + 1:]
+    words[i] = word
+    return ' '.join(words)
+
+
+def build_queries(catalog, count, seed):
+    """[(query, expected item id)]: a title fragment of a sampled item, typo'd half the time."""
+    rng = random.Random(seed)
+    sample = []
+    for index, item in enumerate(catalog.items()):
+        if len(sample) < count:
+            sample.append(item)
+        else:
+            slot = rng.randint(0, index)
+            if slot < count:
+                sample[slot] = item
+    queries = []
+    for n, item in enumerate(sample):
+        # Drop the leading "The" and keep two or three words
+        words = item['title'].replace(':', '').split()[1:]
+        start = rng.randint(0, max(0, len(words) - 3))
+        query = ' '.join(words[start:start + rng.randint(2, 3)])
+        if n % 2:
+            query = add_typo(rng, query)
+        queries.append((query, item['id']))
+    return queries
+
+
+def run_mode(app, mode, queries, limit):
+    app.config['SEARCH_MODE'] = mode
+    client = app.test_client()
+    latencies = []
+    errors = 0
+    hits = 0
+    started = time.perf_counter()
+    for query, expected in queries:
+        start = time.perf_counter()
+        response = client.get('/api/search', query_string={'q': query, 'limit': limit})
+        latencies.append(time.perf_counter() - start)
+        if response.status_code != 200:
+            errors += 1
+            continue
+        payload = response.get_json()
+        # Trigram mode returns one ranked 'results' stream, ilike mode separate lists
+        items = payload['items'] if 'items' in payload else [r for r in payload['results'] if r['type'] == 'item']
+        if any(item['id'] == expected for item in items):
+            hits += 1
+    result = summarize(latencies, time.perf_counter() - started, errors)
+    result['hit_rate'] = hits / len(queries) if queries else 0.0
+    return result
+
+
+def run_index(index, queries, limit):
+    latencies = []
+    hits = 0
+    started = time.perf_counter()
+    for query, expected in queries:
+        start = time.perf_counter()
+        results = index.search_items(query, limit)
+        latencies.append(time.perf_counter() - start)
+        if any(doc_id == expected for doc_id, _ in results):
+            hits += 1
+    result = summarize(latencies, time.perf_counter() - started)
+    result['hit_rate'] = hits / len(queries) if queries else 0.0
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--scale', default='10k', help=f"one of {', '.join(SCALES)} or a franchise count")
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--queries', type=int, default=500)
+    parser.add_argument('--limit', type=int, default=20)
+    parser.add_argument('--output', help='write the JSON report here')
+    args = parser.parse_args()
+    
+    from src.services.search_index import get_search_index
+    
+    catalog = generate_catalog(args.scale, args.seed)
+    started = time.perf_counter()
+    app, counts = build_sqlite_app(catalog)
+    index = get_search_index(app)
+    print(f"Loaded {counts} and indexed in {time.perf_counter() - started:.1f}s")
+    print(f"Index: franchises {index.franchises.stats()}, items {index.items.stats()}")
+    
+    queries = build_queries(catalog, args.queries, args.seed)
+    results = {
+        'index': run_index(index, queries, args.limit),
+        'trigram': run_mode(app, 'trigram', queries, args.limit),
+        'ilike': run_mode(app, 'ilike', queries, args.limit),
+    }
+    print_table(results, first_column='search')
+    for name, result in results.items():
+        print(f"{name:<12}hit rate {result['hit_rate']:.1%}")
+    
+    if args.output:
+        config = {key: getattr(args, key) for key in ('scale', 'seed', 'queries', 'limit')}
+        write_report(args.output, config, results)
+
+
+if __name__ == '__main__':
+    main()
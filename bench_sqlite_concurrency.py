@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+"""Concurrency benchmark for the legacy SQLite backend.
+
+Readers hammer GET /api/franchises while a writer repeatedly runs
+POST /api/admin/sync/popular. The run is done twice, once with SQLite
+defaults and once with the tuned engine (WAL, pragmas, read-only pool),
+and the reader latency percentiles are printed side by side.
+
+TMDb and RAWG calls are answered from canned payloads (with a small
+simulated network delay) so the benchmark never touches the live APIs.
+
+    python bench_sqlite_concurrency.py --readers 8 --rounds 3
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+
+from flask import Flask
+from src.models.user import db
+from src.models.franchise import Franchise
+from src.config.database import configure_database
+from src.routes.franchise import franchise_bp
+from src.routes.sync import sync_bp
+from src.services.tmdb_service import TMDbService
+from src.services.rawg_service import RAWGService
+from src.bench_common import summarize, print_table
+
+SEED_FRANCHISES = 2000
+API_DELAY = 0.002  # simulated upstream latency per call, seconds
+
+
+def fake_tmdb_request(self, endpoint, params=None):
+    """Canned TMDb responses shaped like the real endpoints"""
+    time.sleep(API_DELAY)
+    if endpoint.startswith('search/'):
+        return {'results': [{'id': 1000 + i, 'title': f'Movie {i}', 'name': f'Show {i}',
+                             'release_date': f'20{i:02d}-01-01'} for i in range(5)]}
+    if endpoint.startswith('movie/'):
+        return {'id': 1000, 'belongs_to_collection': {'id': 77}}
+    if endpoint.startswith('collection/'):
+        return {'id': 77, 'parts': [{'id': 5000 + i, 'title': f'Part {i}', 'overview': 'x' * 200,
+                                     'release_date': f'19{70 + i}-05-25'} for i in range(20)]}
+    if endpoint.startswith('tv/'):
+        return {'id': 9000, 'name': 'Show', 'first_air_date': '2011-04-17', 'number_of_seasons': 8}
+    return None
+
+
+def fake_rawg_request(self, endpoint, params=None):
+    """Canned RAWG responses shaped like the real endpoints"""
+    time.sleep(API_DELAY)
+    search = (params or {}).get('search', '')
+    return {'results': [{'id': 20000 + i, 'name': f'{search} {i}', 'slug': f'game-{i}',
+                         'released': f'20{i:02d}-03-01'} for i in range(15)]}
+
+
+def create_app(db_path, tuned):
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    app.config['SQLITE_TUNING'] = tuned
+    app.register_blueprint(franchise_bp, url_prefix='/api')
+    app.register_blueprint(sync_bp, url_prefix='/api')
+    configure_database(app, db, db_path)
+    with app.app_context():
+        db.create_all()
+        db.session.bulk_save_objects([
+            Franchise(name=f'Seed {i}', slug=f'seed-{i}', category=('movies', 'games', 'series')[i % 3],
+                      description='Seed franchise ' * 10, popularity_score=i % 100)
+            for i in range(SEED_FRANCHISES)
+        ])
+        db.session.commit()
+    return app
+
+
+def run_scenario(tuned, readers, rounds):
+    workdir = tempfile.mkdtemp(prefix='orderof-bench-')
+    app = create_app(os.path.join(workdir, 'app.db'), tuned)
+
+    latencies = []
+    errors = [0]
+    lock = threading.Lock()
+    stop = threading.Event()
+
+    def reader():
+        client = app.test_client()
+        local = []
+        while not stop.is_set():
+            start = time.perf_counter()
+            response = client.get('/api/franchises?limit=20&offset=40')
+            local.append(time.perf_counter() - start)
+            if response.status_code != 200:
+                with lock:
+                    errors[0] += 1
+        with lock:
+            latencies.extend(local)
+
+    def writer():
+        client = app.test_client()
+        for _ in range(rounds):
+            client.post('/api/admin/sync/popular')
+            # Drop the synced franchises so the next round writes again
+            with app.app_context():
+                Franchise.query.filter(~Franchise.slug.like('seed-%')).delete(synchronize_session=False)
+                db.session.commit()
+        stop.set()
+
+    threads = [threading.Thread(target=reader) for _ in range(readers)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    writer()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    return summarize(latencies, elapsed, errors[0])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--readers', type=int, default=8)
+    parser.add_argument('--rounds', type=int, default=3)
+    args = parser.parse_args()
+
+    TMDbService._make_request = fake_tmdb_request
+    RAWGService._make_request = fake_rawg_request
+
+    results = {
+        'default': run_scenario(False, args.readers, args.rounds),
+        'tuned': run_scenario(True, args.readers, args.rounds),
+    }
+
+    print_table(results, first_column='engine')
+
+
+if __name__ == '__main__':
+    main()
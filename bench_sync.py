@@ -0,0 +1,168 @@
+#!/usr/bin/env python3
+"""Offline sync benchmark against the local TMDb / RAWG stub server.
+
+Starts api_stub_server in-process, points TMDB_BASE_URL / RAWG_BASE_URL at
+it and syncs a batch of franchises through either the legacy SQLite sync
+routes or the Supabase sync service (backed by the local stand-in). Reports
+franchises synced per minute and upstream requests per franchise, so sync
+changes can be measured with realistic latency, jitter, errors and 429s but
+without touching the live APIs.
+
+    python bench_sync.py --backend sqlite --franchises 60 --latency 40 --jitter 20
+    python bench_sync.py --backend supabase --rate-limit-rate 0.05 --output sync.json
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+
+from flask import Flask
+from src.api_stub_server import StubServer
+from src.bench_catalog import generate_catalog
+from src.bench_common import summarize, write_report
+
+# Category -> legacy sync route
+SQLITE_ROUTES = {
+    'movies': '/api/admin/sync/tmdb/movies',
+    'series': '/api/admin/sync/tmdb/tv',
+    'games': '/api/admin/sync/rawg/games',
+}
+
+
+def pick_franchises(count, seed):
+    """Franchise names and categories from the seeded catalog, syncable categories only."""
+    picked = []
+    for row in generate_catalog(count * 4, seed).franchises():
+        if row['category'] in SQLITE_ROUTES:
+            picked.append((row['name'], row['category']))
+            if len(picked) >= count:
+                break
+    return picked
+
+
+def build_sqlite_sync():
+    from src.models.user import db
+    from src.config.database import configure_database
+    from src.routes.sync import sync_bp
+    
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    app.register_blueprint(sync_bp, url_prefix='/api')
+    configure_database(app, db, os.path.join(tempfile.mkdtemp(prefix='orderof-sync-'), 'app.db'))
+    with app.app_context():
+        db.create_all()
+    
+    def sync_one(name, category):
+        response = app.test_client().post(SQLITE_ROUTES[category], json={'franchise_name': name})
+        return response.status_code < 400
+    
+    return sync_one
+
+
+def build_supabase_sync():
+    from src.services.supabase_standin import SupabaseStandIn, AsyncSupabaseStandIn
+    from src.config.supabase import use_supabase_client
+    
+    standin = SupabaseStandIn()
+    use_supabase_client(standin, AsyncSupabaseStandIn(standin))
+    
+    from src.services.supabase_sync_service import SupabaseSyncService
+    sync_service = SupabaseSyncService()
+    
+    def sync_one(name, category):
+        franchise = sync_service.supabase_service.create_franchise({
+            'name': name,
+            'category': category,
+            'description': f'{category.title()} franchise: {name}',
+        })
+        if not franchise:
+            return False
+        if category == 'games':
+            result = sync_service.sync_rawg_games_for_franchise(franchise['id'], name)
+        else:
+            # The Supabase sync service has no TV path; series go through the movie search
+            result = sync_service.sync_tmdb_movies_for_franchise(franchise['id'], name)
+        return 'error' not in result
+    
+    return sync_one
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--backend', choices=['sqlite', 'supabase'], default='sqlite')
+    parser.add_argument('--franchises', type=int, default=60)
+    parser.add_argument('--concurrency', type=int, default=4)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--mode', choices=['replay', 'strict', 'synthetic'], default='replay',
+                        help='stub mode; replay falls back to synthetic responses')
+    parser.add_argument('--cassettes', help='cassette directory recorded with api_stub_server.py --mode record')
+    parser.add_argument('--latency', type=float, default=30.0, help='stub base latency in ms')
+    parser.add_argument('--jitter', type=float, default=10.0, help='stub +/- jitter in ms')
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    parser.add_argument('--rate-limit-rate', type=float, default=0.0)
+    parser.add_argument('--output', help='write the JSON report here')
+    args = parser.parse_args()
+    
+    stub_options = dict(mode=args.mode, latency=args.latency, jitter=args.jitter, error_rate=args.error_rate,
+                        rate_limit_rate=args.rate_limit_rate, retry_after=1, seed=args.seed)
+    if args.cassettes:
+        stub_options['cassette_dir'] = args.cassettes
+    stub = StubServer(**stub_options).start()
+    # Services read these when constructed, so set them before building the backend
+    os.environ['TMDB_BASE_URL'] = stub.tmdb_base_url
+    os.environ['RAWG_BASE_URL'] = stub.rawg_base_url
+    
+    sync_one = build_sqlite_sync() if args.backend == 'sqlite' else build_supabase_sync()
+    franchises = pick_franchises(args.franchises, args.seed)
+    
+    latencies = []
+    failed = []
+    lock = threading.Lock()
+    
+    def run(entry):
+        name, category = entry
+        start = time.perf_counter()
+        ok = sync_one(name, category)
+        with lock:
+            latencies.append(time.perf_counter() - start)
+            if not ok:
+                failed.append(name)
+    
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        list(pool.map(run, franchises))
+    elapsed = time.perf_counter() - started
+    stats = stub.stats()
+    stub.stop()
+    
+    summary = summarize(latencies, elapsed, len(failed))
+    synced = len(franchises)
+    summary.update({
+        'franchises': synced,
+        'franchises_per_minute': synced / elapsed * 60 if elapsed else 0.0,
+        'requests_per_franchise': stats['requests'] / synced if synced else 0.0,
+        'upstream': stats,
+    })
+    
+    print(f"Synced {synced} franchises ({args.backend}) in {elapsed:.1f}s, {len(failed)} failed")
+    print(f"  franchises/minute      {summary['franchises_per_minute']:.1f}")
+    print(f"  requests/franchise     {summary['requests_per_franchise']:.1f}")
+    print(f"  per-franchise p50/p95  {summary['p50']:.0f}ms / {summary['p95']:.0f}ms")
+    print(f"  upstream status        {stats['status']}")
+    for endpoint, count in sorted(stats['by_endpoint'].items(), key=lambda pair: -pair[1]):
+        print(f"    {endpoint:<32}{count:>8}")
+    
+    if args.output:
+        config = {key: getattr(args, key) for key in ('backend', 'franchises', 'concurrency', 'seed', 'mode',
+                                                      'latency', 'jitter', 'error_rate', 'rate_limit_rate')}
+        write_report(args.output, config, {'sync': summary})
+
+
+if __name__ == '__main__':
+    main()
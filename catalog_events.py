@@ -0,0 +1,118 @@
+"""Post-commit change feed for catalog writes.
+
+In-memory structures (search index, typeahead, leaderboards, ...) subscribe
+here instead of hooking the admin and sync code individually. SQLAlchemy
+writes are captured on flush and published only after the transaction
+commits; rolled back changes are dropped. Writers that bypass the ORM
+session (bulk inserts, the Supabase services) call publish() themselves.
+
+Each change is a Change(table, action, row) where table is one of the
+Supabase table names, action is 'upsert' or 'delete' and row is a plain
+dict of column values. Bulk score updates publish partial franchise rows
+carrying only id and popularity_score.
+"""
+
+import logging
+import threading
+from collections import namedtuple
+
+logger = logging.getLogger(__name__)
+
+Change = namedtuple('Change', 'table action row')
+
+# Model class name -> table name used in change events
+CATALOG_TABLES = {
+    'Franchise': 'franchises',
+    'Item': 'items',
+    'Order': 'orders',
+    'OrderItem': 'order_items',
+    'AffiliateLink': 'affiliate_links',
+}
+
+_PENDING_KEY = 'catalog_changes'
+
+_subscribers = []
+_lock = threading.Lock()
+_installed = False
+
+
+def subscribe(callback, tables=None):
+    """Call callback(changes) after each commit touching the given tables (all if None)."""
+    with _lock:
+        _subscribers.append((callback, frozenset(tables) if tables else None))
+    return callback
+
+
+def unsubscribe(callback):
+    with _lock:
+        _subscribers[:] = [entry for entry in _subscribers if entry[0] is not callback]
+
+
+def publish(changes):
+    """Deliver committed changes to subscribers. A failing subscriber is logged, not raised."""
+    changes = list(changes)
+    if not changes:
+        return
+    with _lock:
+        subscribers = list(_subscribers)
+    for callback, tables in subscribers:
+        relevant = changes if tables is None else [c for c in changes if c.table in tables]
+        if not relevant:
+            continue
+        try:
+            callback(relevant)
+        except Exception as e:
+            logger.error(f"Catalog change subscriber {callback!r} failed: {e}")
+
+
+def publish_rows(table, rows, action='upsert'):
+    """Publish one change per row, for writers that bypass the ORM session.
+    
+    Bulk inserts and updates (and the Supabase services) never reach the
+    flush hooks, so subscribers hear of their rows only through this call.
+    """
+    publish(Change(table, action, dict(row)) for row in rows)
+
+
+def _row_of(obj):
+    from sqlalchemy import inspect
+    return {attr.key: getattr(obj, attr.key) for attr in inspect(obj).mapper.column_attrs}
+
+
+def _after_flush(session, flush_context):
+    pending = None
+    for action, objects in (('upsert', session.new), ('upsert', session.dirty), ('delete', session.deleted)):
+        for obj in objects:
+            table = CATALOG_TABLES.get(type(obj).__name__)
+            if table is None:
+                continue
+            if action == 'upsert' and obj in session.dirty and not session.is_modified(obj):
+                continue
+            if pending is None:
+                pending = session.info.setdefault(_PENDING_KEY, [])
+            pending.append(Change(table, action, _row_of(obj)))
+
+
+def _after_commit(session):
+    changes = session.info.pop(_PENDING_KEY, None)
+    if changes:
+        publish(changes)
+
+
+def _after_soft_rollback(session, previous_transaction):
+    session.info.pop(_PENDING_KEY, None)
+
+
+def install_session_hooks():
+    """Capture ORM writes from every SQLAlchemy session (idempotent)."""
+    global _installed
+    from sqlalchemy import event
+    from sqlalchemy.orm import Session
+    
+    with _lock:
+        if _installed:
+            return
+        event.listen(Session, 'after_flush', _after_flush)
+        event.listen(Session, 'after_commit', _after_commit)
+        event.listen(Session, 'after_soft_rollback', _after_soft_rollback)
+        _installed = True
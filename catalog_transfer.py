@@ -0,0 +1,473 @@
+"""Streaming NDJSON snapshots of the catalog.
+
+export_lines() streams franchises, items, orders, order_items and
+affiliate_links (in that order, so parents always come first) as one JSON
+object per line:
+
+    {"format": "orderof-catalog", "version": 1, "tables": [...]}
+    {"table": "franchises", "row": {"slug": "star-wars", "name": "Star Wars", ...}}
+    {"table": "items", "row": {"franchise": "star-wars", "external_id": "11", "title": ...}}
+    {"table": "order_items", "row": {"order": {"franchise": ..., "name": ...},
+                                     "item": {"franchise": ..., "external_id": ..., "title": ...},
+                                     "position": 1, ...}}
+
+Database ids are not exported. Rows refer to each other by natural key
+(franchise slug; item external_id, or title when there is none; order name
+within its franchise) so a snapshot can be restored into another
+environment, and re-importing the same snapshot updates rows instead of
+duplicating them. Columns the target backend does not have are dropped.
+
+Reads go through a server-side cursor (SQLite) or keyset pages (Supabase)
+and references are resolved with one IN query per page; import_lines()
+resolves natural keys and upserts CHUNK_SIZE rows at a time with one commit
+per chunk, so memory stays flat whatever the catalog size.
+"""
+
+import json
+import logging
+import time
+import uuid
+from datetime import date, datetime
+from decimal import Decimal
+
+from src.services.batching import IN_CHUNK_SIZE, chunks
+from src.services.catalog_events import publish_rows
+
+logger = logging.getLogger(__name__)
+
+FORMAT = 'orderof-catalog'
+VERSION = 1
+TABLES = ('franchises', 'items', 'orders', 'order_items', 'affiliate_links')
+CHUNK_SIZE = 1000
+MAX_ERRORS = 1000
+
+# Foreign key column -> reference field in exported rows
+REFERENCES = {
+    'items': {'franchise_id': 'franchise'},
+    'orders': {'franchise_id': 'franchise'},
+    'order_items': {'order_id': 'order', 'item_id': 'item'},
+    'affiliate_links': {'item_id': 'item'},
+}
+
+# Columns per Supabase table, from setup_supabase_tables.sql
+SUPABASE_COLUMNS = {
+    'franchises': ('id', 'name', 'slug', 'description', 'category', 'image_url', 'external_id',
+                   'api_metadata', 'popularity_score', 'created_at', 'updated_at'),
+    'items': ('id', 'franchise_id', 'title', 'description', 'release_date', 'image_url', 'external_id',
+              'api_metadata', 'rating', 'created_at', 'updated_at'),
+    'orders': ('id', 'franchise_id', 'name', 'order_type', 'description', 'created_at', 'updated_at'),
+    'order_items': ('id', 'order_id', 'item_id', 'position', 'notes', 'created_at'),
+    'affiliate_links': ('id', 'item_id', 'platform', 'region', 'url', 'price', 'currency', 'affiliate_tag',
+                        'created_at', 'updated_at'),
+}
+
+
+class CatalogImportError(ValueError):
+    """The snapshot as a whole is unusable (as opposed to individual lines)."""
+
+
+def _json_default(value):
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, uuid.UUID):
+        return str(value)
+    raise TypeError(f'{type(value).__name__} is not JSON serializable')
+
+
+def item_key(franchise_slug, external_id, title):
+    """Natural key of an item: its external id within the franchise, else its title."""
+    if external_id not in (None, ''):
+        return (franchise_slug, 'external_id', str(external_id))
+    return (franchise_slug, 'title', title)
+
+
+class SqlAlchemyCatalog:
+    """Snapshot access to the legacy SQLite models (needs an app context)."""
+    
+    def __init__(self, session):
+        from src.models.franchise import Franchise, Item, Order, OrderItem, AffiliateLink
+        
+        self.session = session
+        self.models = {
+            'franchises': Franchise,
+            'items': Item,
+            'orders': Order,
+            'order_items': OrderItem,
+            'affiliate_links': AffiliateLink,
+        }
+    
+    def columns(self, table):
+        return tuple(column.key for column in self.models[table].__table__.columns)
+    
+    def scan(self, table, page_size=CHUNK_SIZE):
+        from sqlalchemy import select
+        
+        model_table = self.models[table].__table__
+        # yield_per streams from a server-side cursor instead of loading the table
+        result = self.session.execute(select(model_table).order_by(model_table.c.id),
+                                      execution_options={'yield_per': page_size})
+        for row in result.mappings():
+            yield dict(row)
+    
+    def fetch(self, table, columns, column, values):
+        model_table = self.models[table].__table__
+        selected = [model_table.c[name] for name in columns]
+        rows = []
+        for chunk in chunks(values, IN_CHUNK_SIZE):
+            query = model_table.select().with_only_columns(*selected).where(model_table.c[column].in_(chunk))
+            rows.extend(dict(row) for row in self.session.execute(query).mappings())
+        return rows
+    
+    def new_id(self, table):
+        from sqlalchemy import Integer
+        
+        # Integer keys (e.g. order_items) are left to autoincrement
+        return None if isinstance(self.models[table].__table__.c.id.type, Integer) else str(uuid.uuid4())
+    
+    def coerce(self, table, row):
+        """Parse ISO date strings for Date/DateTime columns."""
+        from sqlalchemy import Date, DateTime
+        
+        model_columns = self.models[table].__table__.c
+        for name, value in row.items():
+            if not isinstance(value, str) or name not in model_columns:
+                continue
+            if isinstance(model_columns[name].type, DateTime):
+                row[name] = datetime.fromisoformat(value)
+            elif isinstance(model_columns[name].type, Date):
+                row[name] = date.fromisoformat(value[:10])
+        return row
+    
+    def write(self, table, inserts, updates):
+        model = self.models[table]
+        try:
+            if inserts:
+                self.session.bulk_insert_mappings(model, inserts)
+            if updates:
+                self.session.bulk_update_mappings(model, updates)
+            self.session.commit()
+        except Exception:
+            self.session.rollback()
+            raise
+    
+    def delete(self, table, ids):
+        model_table = self.models[table].__table__
+        try:
+            for chunk in chunks(ids, IN_CHUNK_SIZE):
+                self.session.execute(model_table.delete().where(model_table.c.id.in_(chunk)))
+            self.session.commit()
+        except Exception:
+            self.session.rollback()
+            raise
+
+
+class SupabaseCatalog:
+    """Snapshot access to the Supabase tables."""
+    
+    def __init__(self, client):
+        self.client = client
+    
+    def columns(self, table):
+        return SUPABASE_COLUMNS[table]
+    
+    def scan(self, table, page_size=CHUNK_SIZE):
+        # Keyset pagination on id: every page is an indexed range scan
+        last_id = None
+        while True:
+            query = self.client.table(table).select('*').order('id')
+            if last_id is not None:
+                query = query.gt('id', last_id)
+            rows = query.limit(page_size).execute().data
+            yield from rows
+            if len(rows) < page_size:
+                return
+            last_id = rows[-1]['id']
+    
+    def fetch(self, table, columns, column, values):
+        rows = []
+        for chunk in chunks(values, IN_CHUNK_SIZE):
+            rows.extend(self.client.table(table).select(','.join(columns)).in_(column, chunk).execute().data)
+        return rows
+    
+    def new_id(self, table):
+        return str(uuid.uuid4())
+    
+    def coerce(self, table, row):
+        return row
+    
+    def write(self, table, inserts, updates):
+        # Ids are resolved up front, so one upsert on the primary key covers both
+        rows = inserts + updates
+        if rows:
+            self.client.table(table).upsert(rows).execute()
+    
+    def delete(self, table, ids):
+        for chunk in chunks(ids, IN_CHUNK_SIZE):
+            self.client.table(table).delete().in_('id', chunk).execute()
+
+
+# Export
+
+def _franchise_slugs(catalog, ids):
+    return {row['id']: row['slug'] for row in catalog.fetch('franchises', ('id', 'slug'), 'id', ids)}
+
+
+def _item_refs(catalog, ids):
+    items = catalog.fetch('items', ('id', 'franchise_id', 'external_id', 'title'), 'id', ids)
+    slugs = _franchise_slugs(catalog, {item['franchise_id'] for item in items})
+    return {
+        item['id']: {
+            'franchise': slugs.get(item['franchise_id']),
+            'external_id': item['external_id'],
+            'title': item['title'],
+        }
+        for item in items
+    }
+
+
+def _order_refs(catalog, ids):
+    orders = catalog.fetch('orders', ('id', 'franchise_id', 'name'), 'id', ids)
+    slugs = _franchise_slugs(catalog, {order['franchise_id'] for order in orders})
+    return {order['id']: {'franchise': slugs.get(order['franchise_id']), 'name': order['name']} for order in orders}
+
+
+_REF_RESOLVERS = {'franchise': _franchise_slugs, 'item': _item_refs, 'order': _order_refs}
+
+
+def export_rows(catalog, table, page_size=CHUNK_SIZE):
+    """Yield portable rows of one table: no ids, foreign keys replaced by natural keys."""
+    references = REFERENCES.get(table, {})
+    for page in chunks(catalog.scan(table, page_size), page_size):
+        resolved = {
+            column: _REF_RESOLVERS[field](catalog, {row[column] for row in page if row.get(column) is not None})
+            for column, field in references.items()
+        }
+        for row in page:
+            row = dict(row)
+            row.pop('id', None)
+            for column, field in references.items():
+                row[field] = resolved[column].get(row.pop(column, None))
+            yield row
+
+
+def export_lines(catalog, tables=TABLES, page_size=CHUNK_SIZE):
+    """Yield the snapshot as NDJSON lines (str, newline terminated)."""
+    unknown = [table for table in tables if table not in TABLES]
+    if unknown:
+        raise ValueError(f"Unknown tables: {', '.join(unknown)}")
+    tables = [table for table in TABLES if table in tables]
+    yield json.dumps({'format': FORMAT, 'version': VERSION, 'tables': tables}) + '\n'
+    for table in tables:
+        started = time.perf_counter()
+        count = 0
+        for row in export_rows(catalog, table, page_size):
+            count += 1
+            yield json.dumps({'table': table, 'row': row}, default=_json_default) + '\n'
+        logger.info(f"Exported {count} {table} in {time.perf_counter() - started:.1f}s")
+
+
+# Import
+
+def _franchise_ids(catalog, slugs):
+    return {row['slug']: row['id'] for row in catalog.fetch('franchises', ('id', 'slug'), 'slug', slugs)}
+
+
+def _item_ids(catalog, franchise_ids, keys):
+    """item_key -> id for the given keys, looked up by external_id and by title."""
+    slugs = {franchise_id: slug for slug, franchise_id in franchise_ids.items()}
+    found = {}
+    for field in ('external_id', 'title'):
+        values = {key[2] for key in keys if key[1] == field}
+        if not values:
+            continue
+        for item in catalog.fetch('items', ('id', 'franchise_id', 'external_id', 'title'), field, values):
+            slug = slugs.get(item['franchise_id'])
+            if slug is not None:
+                found[item_key(slug, item['external_id'], item['title'])] = item['id']
+    return found
+
+
+def _order_ids(catalog, franchise_ids):
+    slugs = {franchise_id: slug for slug, franchise_id in franchise_ids.items()}
+    orders = catalog.fetch('orders', ('id', 'franchise_id', 'name'), 'franchise_id', list(slugs))
+    return {(slugs[order['franchise_id']], order['name']): order['id'] for order in orders}
+
+
+def _ref_slugs(row):
+    """Franchise slugs a portable row refers to, directly or through its item/order."""
+    slugs = set()
+    for field in ('franchise', 'item', 'order'):
+        value = row.get(field)
+        if isinstance(value, dict):
+            value = value.get('franchise')
+        if value:
+            slugs.add(value)
+    return slugs
+
+
+def _ref_item_key(ref):
+    return item_key(ref.get('franchise'), ref.get('external_id'), ref.get('title')) if isinstance(ref, dict) else None
+
+
+def _ref_order_key(ref):
+    return (ref.get('franchise'), ref.get('name')) if isinstance(ref, dict) else None
+
+
+class _ChunkResolver:
+    """Natural key lookups for one chunk, backed by one IN query per table."""
+    
+    def __init__(self, catalog, table, rows):
+        self.catalog = catalog
+        slugs = set()
+        for _, row in rows:
+            slugs |= _ref_slugs(row)
+            if table == 'franchises' and row.get('slug'):
+                slugs.add(row['slug'])
+        self.franchises = _franchise_ids(catalog, slugs) if slugs else {}
+        if table == 'items':
+            item_keys = {item_key(row.get('franchise'), row.get('external_id'), row.get('title')) for _, row in rows}
+        else:
+            item_keys = {_ref_item_key(row.get('item')) for _, row in rows} - {None}
+        self.items = _item_ids(catalog, self.franchises, item_keys) if item_keys and self.franchises else {}
+        needs_orders = table in ('orders', 'order_items')
+        self.orders = _order_ids(catalog, self.franchises) if needs_orders and self.franchises else {}
+    
+    def children(self, table, column, parent_ids, key_columns):
+        """(key columns...) -> id for existing rows whose column is in parent_ids."""
+        if not parent_ids:
+            return {}
+        rows = self.catalog.fetch(table, ('id',) + key_columns, column, parent_ids)
+        return {tuple(str(row.get(name)) for name in key_columns): row['id'] for row in rows}
+
+
+def _link_key_columns(columns):
+    # Supabase links are unique per region; the legacy table has no unique key
+    return ('item_id', 'platform', 'region') if 'region' in columns else ('item_id', 'platform', 'url')
+
+
+def _prepare_chunk(catalog, table, rows, fail):
+    """Resolve references and existing ids for a chunk; returns (inserts, updates)."""
+    columns = catalog.columns(table)
+    resolver = _ChunkResolver(catalog, table, rows)
+    prepared = []
+    for number, row in rows:
+        mapping = {name: value for name, value in row.items() if name in columns and name != 'id'}
+        if table in ('items', 'orders'):
+            mapping['franchise_id'] = resolver.franchises.get(row.get('franchise'))
+            if mapping['franchise_id'] is None:
+                fail(number, table, f"Unknown franchise {row.get('franchise')!r}")
+                continue
+        if table in ('order_items', 'affiliate_links'):
+            mapping['item_id'] = resolver.items.get(_ref_item_key(row.get('item')))
+            if mapping['item_id'] is None:
+                fail(number, table, f"Unknown item {row.get('item')!r}")
+                continue
+        if table == 'order_items':
+            mapping['order_id'] = resolver.orders.get(_ref_order_key(row.get('order')))
+            if mapping['order_id'] is None:
+                fail(number, table, f"Unknown order {row.get('order')!r}")
+                continue
+        if table == 'franchises' and not row.get('slug'):
+            fail(number, table, 'Missing slug')
+            continue
+        prepared.append((row, mapping))
+    
+    if table == 'franchises':
+        existing = resolver.franchises
+        keys = [row['slug'] for row, _ in prepared]
+    elif table == 'items':
+        existing = resolver.items
+        keys = [item_key(row.get('franchise'), row.get('external_id'), row.get('title')) for row, _ in prepared]
+    elif table == 'orders':
+        existing = resolver.orders
+        keys = [(row.get('franchise'), row.get('name')) for row, _ in prepared]
+    else:
+        # Child rows are keyed on their resolved parent ids
+        parent, key_columns = (('order_id', ('order_id', 'position')) if table == 'order_items'
+                               else ('item_id', _link_key_columns(columns)))
+        existing = resolver.children(table, parent, {mapping[parent] for _, mapping in prepared}, key_columns)
+        keys = [tuple(str(mapping.get(name)) for name in key_columns) for _, mapping in prepared]
+    
+    inserts, updates = {}, {}
+    for key, (_, mapping) in zip(keys, prepared):
+        mapping = catalog.coerce(table, mapping)
+        if key in existing:
+            mapping['id'] = existing[key]
+            updates[key] = mapping
+        else:
+            # A key repeated within the chunk keeps its first id; the later line wins
+            new_id = inserts[key].get('id') if key in inserts else catalog.new_id(table)
+            if new_id is not None:
+                mapping['id'] = new_id
+            inserts[key] = mapping
+    return list(inserts.values()), list(updates.values())
+
+
+def iter_lines(stream):
+    """Yield (line number, parsed object or None, error or None) from an NDJSON byte or text stream."""
+    for number, line in enumerate(stream, 1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            yield number, json.loads(line), None
+        except ValueError as e:
+            yield number, None, f'Invalid JSON: {e}'
+
+
+def import_lines(catalog, lines, chunk_size=CHUNK_SIZE):
+    """Upsert a snapshot from iter_lines() output chunk by chunk and report per table."""
+    started = time.perf_counter()
+    report = {
+        'tables': {table: {'created': 0, 'updated': 0, 'failed': 0} for table in TABLES},
+        'failed': 0,
+        'errors': [],
+    }
+    
+    def fail(number, table, error):
+        report['failed'] += 1
+        if table is not None:
+            report['tables'][table]['failed'] += 1
+        if len(report['errors']) < MAX_ERRORS:
+            report['errors'].append({'line': number, 'table': table, 'error': error})
+    
+    def flush(table, rows):
+        inserts, updates = _prepare_chunk(catalog, table, rows, fail)
+        try:
+            catalog.write(table, inserts, updates)
+        except Exception as e:
+            logger.warning(f"Catalog import chunk of {table} failed: {e}")
+            for number, _ in rows:
+                fail(number, table, str(getattr(e, 'orig', e)))
+            return
+        counts = report['tables'][table]
+        counts['created'] += len(inserts)
+        counts['updated'] += len(updates)
+        publish_rows(table, inserts + updates)
+    
+    table, rows = None, []
+    for number, line, error in lines:
+        if error is None and isinstance(line, dict) and 'format' in line:
+            if line['format'] != FORMAT or line.get('version') != VERSION:
+                raise CatalogImportError(f"Unsupported snapshot format {line.get('format')!r} v{line.get('version')}")
+            continue
+        if error is None and (not isinstance(line, dict) or line.get('table') not in TABLES
+                              or not isinstance(line.get('row'), dict)):
+            error = 'Expected {"table": <catalog table>, "row": {...}}'
+        if error is not None:
+            fail(number, None, error)
+            continue
+        if rows and (line['table'] != table or len(rows) >= chunk_size):
+            flush(table, rows)
+            rows = []
+        table = line['table']
+        rows.append((number, line['row']))
+    if rows:
+        flush(table, rows)
+    
+    # Line errors are reported as read, reference errors when their chunk is written
+    report['errors'].sort(key=lambda error: error['line'])
+    report['seconds'] = round(time.perf_counter() - started, 3)
+    return report
@@ -0,0 +1,36 @@
+"""Shared test fixtures: a Flask app on a temporary SQLite database, and the API stub server."""
+
+import os
+import sys
+import tempfile
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+
+from flask import Flask
+from src.models.user import db
+from src.config.database import configure_database
+from src.api_stub_server import StubServer
+
+
+@pytest.fixture
+def sqlite_app():
+    """Flask app on a fresh SQLite file with every registered model's table created."""
+    app = Flask(__name__)
+    app.config['TESTING'] = True
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    configure_database(app, db, os.path.join(tempfile.mkdtemp(), 'app.db'))
+    with app.app_context():
+        db.create_all()
+    return app
+
+
+@pytest.fixture
+def stub(monkeypatch):
+    """API stub server, with TMDbService and RAWGService pointed at it."""
+    server = StubServer().start()
+    # Worker processes inherit the environment, so they call the stub too
+    monkeypatch.setenv('TMDB_BASE_URL', server.tmdb_base_url)
+    monkeypatch.setenv('RAWG_BASE_URL', server.rawg_base_url)
+    yield server
+    server.stop()
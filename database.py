@@ -0,0 +1,113 @@
+import os
+from contextlib import contextmanager
+from flask import current_app
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import QueuePool
+
+# Applied to every connection (writer and readers). journal_mode is set once
+# on the writer because WAL is persistent in the database file.
+DEFAULT_PRAGMAS = {
+    'synchronous': 'NORMAL',   # safe with WAL, avoids an fsync per commit
+    'cache_size': -64000,      # negative means KiB, i.e. ~64 MB page cache
+    'mmap_size': 268435456,    # 256 MB memory-mapped I/O
+    'busy_timeout': 5000,      # ms to wait on a lock before SQLITE_BUSY
+    'temp_store': 'MEMORY',
+}
+
+DEFAULT_READ_POOL_SIZE = 8
+
+
+def _pragma_listener(pragmas, read_only=False):
+    """Build a connect listener that applies the given PRAGMAs"""
+    def on_connect(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            for name, value in pragmas.items():
+                cursor.execute(f"PRAGMA {name}={value}")
+            if read_only:
+                cursor.execute("PRAGMA query_only=ON")
+        finally:
+            cursor.close()
+    return on_connect
+
+
+def _create_read_engine(db_path, pragmas, pool_size):
+    """Create a pooled engine that opens the database file read-only"""
+    engine = create_engine(
+        f"sqlite:///file:{db_path}?mode=ro&uri=true",
+        poolclass=QueuePool,
+        pool_size=pool_size,
+        max_overflow=pool_size,
+        pool_pre_ping=False,
+        connect_args={
+            'check_same_thread': False,
+            'timeout': pragmas.get('busy_timeout', 5000) / 1000,
+        },
+    )
+    event.listen(engine, 'connect', _pragma_listener(pragmas, read_only=True))
+    return engine
+
+
+def configure_database(app, db, db_path):
+    """Configure the SQLite writer engine and the pooled read-only path.
+
+    Settings (all optional, read from app.config):
+        SQLITE_TUNING          -- False keeps SQLite defaults and routes reads
+                                  through db.session (used for benchmarking)
+        SQLITE_PRAGMAS         -- overrides merged into DEFAULT_PRAGMAS
+        SQLITE_READ_POOL_SIZE  -- number of pooled reader connections
+    """
+    os.makedirs(os.path.dirname(db_path), exist_ok=True)
+
+    tuning = app.config.setdefault('SQLITE_TUNING', True)
+    pragmas = dict(DEFAULT_PRAGMAS)
+    pragmas.update(app.config.get('SQLITE_PRAGMAS') or {})
+    pool_size = app.config.setdefault('SQLITE_READ_POOL_SIZE', DEFAULT_READ_POOL_SIZE)
+
+    app.config['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{db_path}"
+    if tuning:
+        engine_options = app.config.setdefault('SQLALCHEMY_ENGINE_OPTIONS', {})
+        connect_args = engine_options.setdefault('connect_args', {})
+        connect_args.setdefault('check_same_thread', False)
+        connect_args.setdefault('timeout', pragmas['busy_timeout'] / 1000)
+
+    db.init_app(app)
+
+    read_sessionmaker = None
+    if tuning:
+        with app.app_context():
+            engine = db.engine
+            event.listen(engine, 'connect', _pragma_listener(pragmas))
+            # WAL lets readers run alongside the single writer instead of
+            # blocking on the database lock. It only needs setting once.
+            with engine.connect() as connection:
+                connection.exec_driver_sql("PRAGMA journal_mode=WAL")
+
+        read_engine = _create_read_engine(db_path, pragmas, pool_size)
+        read_sessionmaker = sessionmaker(bind=read_engine, autoflush=False)
+
+    app.extensions['orderof_database'] = {
+        'db': db,
+        'read_sessionmaker': read_sessionmaker,
+    }
+
+
+@contextmanager
+def read_session():
+    """Yield a session for read-only queries.
+
+    With tuning enabled this is a short-lived session on the read-only
+    connection pool, closed on exit, so serialize results inside the block.
+    Otherwise it falls back to the regular db.session.
+    """
+    state = current_app.extensions['orderof_database']
+    if state['read_sessionmaker'] is None:
+        yield state['db'].session
+        return
+
+    session = state['read_sessionmaker']()
+    try:
+        yield session
+    finally:
+        session.close()
@@ -0,0 +1,292 @@
+"""Cross-provider entity resolution for catalog items.
+
+The same work can reach a franchise more than once: from TMDb and from
+RAWG, or from two syncs that saw slightly different titles. Every item has
+a few blocking keys, all scoped to its franchise:
+
+    ('id', 'tmdb:movie:603')          provider ids, incl. ones merged in earlier
+    ('title', 'matrix', 1999)         normalized title and release year
+
+Two items sharing any key are the same work. Syncs load an EntityIndex of
+the franchise once and resolve each incoming item with a few dict lookups;
+a match is merged into the existing (canonical) item instead of inserted.
+
+dedupe_catalog() cleans up what is already stored. One pass over the items
+feeds every key into a union-find, so groups come out without comparing
+items pairwise. Each group is merged into its most complete item: empty
+fields are filled from the duplicates, order entries and affiliate links
+are moved over (dropping ones the canonical item already has), and the
+duplicates are deleted. Franchises already resolve by slug in the sync
+routes, so only items are grouped.
+"""
+
+import logging
+import re
+import time
+import unicodedata
+from datetime import date, datetime
+
+from src.services.batching import IN_CHUNK_SIZE
+from src.services.catalog_events import publish_rows
+
+logger = logging.getLogger(__name__)
+
+SAMPLE_GROUPS = 20
+
+# Columns filled from a duplicate when the canonical item has none
+MERGE_FIELDS = ('description', 'image_url', 'release_date')
+
+ARTICLES = ('the ', 'a ', 'an ')
+# Sequel numbers are written both ways across providers (Final Fantasy VII / 7).
+# Single-letter numerals are left alone: they are usually words (V for Vendetta).
+ROMAN_NUMERALS = {
+    'ii': '2', 'iii': '3', 'iv': '4', 'vi': '6', 'vii': '7', 'viii': '8', 'ix': '9',
+    'xi': '11', 'xii': '12', 'xiii': '13', 'xiv': '14', 'xv': '15', 'xvi': '16',
+}
+
+
+def normalize_title(title):
+    """Title reduced to what providers agree on: ascii, lowercase, no punctuation or leading article."""
+    text = unicodedata.normalize('NFKD', title or '').encode('ascii', 'ignore').decode().lower()
+    text = re.sub(r'[^a-z0-9]+', ' ', text.replace('&', ' and ')).strip()
+    for article in ARTICLES:
+        if text.startswith(article):
+            text = text[len(article):]
+            break
+    return ' '.join(ROMAN_NUMERALS.get(word, word) for word in text.split())
+
+
+def release_year(value):
+    if isinstance(value, (date, datetime)):
+        return value.year
+    if isinstance(value, str) and value[:4].isdigit():
+        return int(value[:4])
+    return None
+
+
+def provider_ids(item):
+    """Provider ids of an item, e.g. {'rawg:3498', 'tmdb:movie:603'}."""
+    metadata = item.get('api_metadata') or {}
+    ids = set(metadata.get('provider_ids') or ())
+    if metadata.get('rawg_id') is not None:
+        ids.add(f"rawg:{metadata['rawg_id']}")
+    if metadata.get('tmdb_id') is not None:
+        # Movie, show, season and episode ids are separate TMDb namespaces
+        if 'episode_number' in metadata:
+            kind = 'episode'
+        elif 'season_number' in metadata:
+            kind = 'season'
+        elif 'number_of_seasons' in metadata:
+            kind = 'tv'
+        else:
+            kind = 'movie'
+        ids.add(f"tmdb:{kind}:{metadata['tmdb_id']}")
+    return ids
+
+
+def blocking_keys(item):
+    """Keys under which an item can match another in its franchise."""
+    scope = str(item.get('franchise_id'))
+    keys = [(scope, 'id', provider_id) for provider_id in sorted(provider_ids(item))]
+    if 'season_number' in (item.get('api_metadata') or {}):
+        # Season and episode titles ("Season 1", "Pilot") say nothing across shows
+        return keys
+    title = normalize_title(item.get('title'))
+    year = release_year(item.get('release_date'))
+    if title and year:
+        # Undated titles are too ambiguous to match on (remakes, reboots)
+        keys.append((scope, 'title', title, year))
+    return keys
+
+
+def merged_fields(canonical, other):
+    """Column updates that fold other into canonical: empty fields filled, provider ids unioned."""
+    updates = {field: other[field] for field in MERGE_FIELDS if not canonical.get(field) and other.get(field)}
+    current = canonical.get('api_metadata') or {}
+    # The canonical item's own metadata wins on clashes
+    metadata = dict(other.get('api_metadata') or {}, **current)
+    ids = provider_ids(canonical) | provider_ids(other)
+    if ids != provider_ids(canonical):
+        metadata['provider_ids'] = sorted(ids)
+    if metadata != current:
+        updates['api_metadata'] = metadata
+    return updates
+
+
+def merge_into(item, row):
+    """Fold an incoming item row into an existing Item model."""
+    current = {field: getattr(item, field) for field in MERGE_FIELDS + ('api_metadata',)}
+    for field, value in merged_fields(current, row).items():
+        setattr(item, field, value)
+
+
+class EntityIndex:
+    """Blocking key -> item id, for resolving incoming items during a sync."""
+    
+    def __init__(self):
+        self._owners = {}
+    
+    @classmethod
+    def from_rows(cls, rows):
+        index = cls()
+        for row in rows:
+            index.add(row['id'], row)
+        return index
+    
+    def add(self, item_id, row):
+        for key in blocking_keys(row):
+            self._owners.setdefault(key, item_id)
+    
+    def resolve(self, row):
+        """Id of the item row duplicates, or None for a new work."""
+        for key in blocking_keys(row):
+            owner = self._owners.get(key)
+            if owner is not None:
+                return owner
+        return None
+    
+    def __len__(self):
+        return len(self._owners)
+
+
+def load_franchise_index(session, franchise_id):
+    """EntityIndex of a franchise's stored items (legacy models)."""
+    from src.models.franchise import Item
+    
+    rows = session.query(Item.id, Item.franchise_id, Item.title, Item.release_date, Item.api_metadata).filter(
+        Item.franchise_id == franchise_id)
+    return EntityIndex.from_rows(row._asdict() for row in rows)
+
+
+def _completeness(item):
+    return len(provider_ids(item)), sum(1 for field in MERGE_FIELDS if item.get(field))
+
+
+def find_duplicates(items):
+    """Groups of item ids sharing a blocking key, canonical (most complete) first.
+    
+    Each key remembers the first item that had it; a later item with the same
+    key is unioned with it, so the work is linear in the number of keys.
+    """
+    parent, ranks, owners = {}, {}, {}
+    
+    def find(item_id):
+        while parent[item_id] != item_id:
+            parent[item_id] = parent[parent[item_id]]
+            item_id = parent[item_id]
+        return item_id
+    
+    for item in items:
+        item_id = item['id']
+        parent[item_id] = item_id
+        ranks[item_id] = _completeness(item)
+        for key in blocking_keys(item):
+            owner = owners.setdefault(key, item_id)
+            if owner != item_id:
+                root, other = find(owner), find(item_id)
+                if root != other:
+                    parent[other] = root
+    
+    groups = {}
+    for item_id in parent:
+        groups.setdefault(find(item_id), []).append(item_id)
+    return [sorted(group, key=lambda item_id: (tuple(-n for n in ranks[item_id]), str(item_id)))
+            for group in groups.values() if len(group) > 1]
+
+
+def _repoint(rows, targets, key_columns):
+    """Move rows to their canonical item; returns (updates, deletes) with rows the target already has dropped."""
+    taken = {tuple(row.get(column) for column in key_columns) + (row['item_id'],)
+             for row in rows if row['item_id'] not in targets}
+    updates, deletes = [], []
+    for row in rows:
+        target = targets.get(row['item_id'])
+        if target is None:
+            continue
+        key = tuple(row.get(column) for column in key_columns) + (target,)
+        if key in taken:
+            deletes.append(row)
+        else:
+            taken.add(key)
+            updates.append(dict(row, item_id=target))
+    return updates, deletes
+
+
+def _merge_groups(catalog, groups, report):
+    """Merge one chunk of duplicate groups into their canonical items."""
+    targets = {duplicate: group[0] for group in groups for duplicate in group[1:]}
+    ids = [item_id for group in groups for item_id in group]
+    items = {row['id']: row for row in catalog.fetch('items', catalog.columns('items'), 'id', ids)}
+    
+    item_updates = []
+    for group in groups:
+        canonical = dict(items[group[0]])
+        changed = {}
+        for duplicate in group[1:]:
+            updates = merged_fields(canonical, items[duplicate])
+            canonical.update(updates)
+            changed.update(updates)
+        if changed:
+            item_updates.append(canonical)
+    
+    entries = catalog.fetch('order_items', catalog.columns('order_items'), 'item_id', ids)
+    entry_updates, entry_deletes = _repoint(entries, targets, ('order_id',))
+    links = catalog.fetch('affiliate_links', catalog.columns('affiliate_links'), 'item_id', ids)
+    link_updates, link_deletes = _repoint(links, targets, ('platform', 'region'))
+    
+    # Children first, so nothing ever points at a deleted item
+    catalog.delete('order_items', [row['id'] for row in entry_deletes])
+    catalog.write('order_items', [], entry_updates)
+    catalog.delete('affiliate_links', [row['id'] for row in link_deletes])
+    catalog.write('affiliate_links', [], link_updates)
+    catalog.write('items', [], item_updates)
+    catalog.delete('items', list(targets))
+    
+    publish_rows('order_items', entry_deletes, 'delete')
+    publish_rows('order_items', entry_updates)
+    publish_rows('affiliate_links', link_deletes, 'delete')
+    publish_rows('affiliate_links', link_updates)
+    publish_rows('items', item_updates)
+    publish_rows('items', [items[item_id] for item_id in targets], 'delete')
+    
+    report['merged'] += len(targets)
+    report['order_items_moved'] += len(entry_updates)
+    report['order_items_dropped'] += len(entry_deletes)
+    report['links_moved'] += len(link_updates)
+    report['links_dropped'] += len(link_deletes)
+
+
+def dedupe_catalog(catalog, dry_run=False):
+    """Merge every group of duplicate items; catalog is a SqlAlchemyCatalog or SupabaseCatalog."""
+    started = time.perf_counter()
+    report = {'items': 0, 'groups': 0, 'duplicates': 0, 'merged': 0, 'order_items_moved': 0,
+              'order_items_dropped': 0, 'links_moved': 0, 'links_dropped': 0, 'sample': []}
+    
+    def scanned():
+        for row in catalog.scan('items'):
+            report['items'] += 1
+            light = {column: row.get(column) for column in ('id', 'franchise_id', 'title', 'release_date',
+                                                            'api_metadata')}
+            # Only presence matters for picking the canonical item, so long descriptions aren't kept
+            light.update((field, bool(row.get(field))) for field in ('description', 'image_url'))
+            yield light
+    
+    groups = find_duplicates(scanned())
+    report['groups'] = len(groups)
+    report['duplicates'] = sum(len(group) - 1 for group in groups)
+    report['sample'] = [{'canonical': group[0], 'duplicates': group[1:]} for group in groups[:SAMPLE_GROUPS]]
+    
+    if not dry_run:
+        chunk, size = [], 0
+        for group in groups:
+            chunk.append(group)
+            size += len(group)
+            if size >= IN_CHUNK_SIZE:
+                _merge_groups(catalog, chunk, report)
+                chunk, size = [], 0
+        if chunk:
+            _merge_groups(catalog, chunk, report)
+    
+    report['seconds'] = round(time.perf_counter() - started, 3)
+    logger.info(f"Catalog dedupe: { {key: value for key, value in report.items() if key != 'sample'} }")
+    return report
@@ -1,17 +1,88 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request, jsonify, current_app
 from src.models.franchise import db, Franchise, Item, Order, OrderItem, AffiliateLink
 from src.models.user import User
+from src.config.database import read_session
+from src.services.query_budget import query_budget
+from src.services.search_index import get_search_index, DEFAULT_THRESHOLD
+from src.services.popularity import record_view
+from src.services.leaderboard import get_leaderboard
+from src.services.order_compare import compare_orders, get_comparison_cache, matches
+from src.services.link_regions import UnknownRegion, get_link_index, link_region, resolve_region
+from src.services.order_ranks import (
+    OrderNotFound, ReorderError, SqlAlchemyOrderStore, apply_sequence, changes_from, delete_entry, insert_entry,
+    move_entry, target_from
+)
 from sqlalchemy import or_, and_
-import re
+from src.services.slugs import slugify
 
 franchise_bp = Blueprint('franchise', __name__)
 
-def slugify(text):
-    """Convert text to URL-friendly slug"""
-    text = re.sub(r'[^\w\s-]', '', text.lower())
-    return re.sub(r'[-\s]+', '-', text).strip('-')
+def serialize_orders(session, orders, region=None):
+    """Serialize orders with their items and active affiliate links.
+    
+    Uses one query for the order items of all orders and one for the
+    affiliate links of all their items, regardless of order size. With a
+    region, only that region's links are included, taken from the link
+    index when it is loaded (no links query at all).
+    """
+    orders_data = {order.id: dict(order.to_dict(), items=[]) for order in orders}
+    if not orders_data:
+        return []
+    
+    order_items = session.query(OrderItem, Item).join(Item).filter(
+        OrderItem.order_id.in_(list(orders_data))
+    ).order_by(OrderItem.order_id, OrderItem.position).all()
+    
+    links_by_item = {}
+    item_ids = {item.id for _, item in order_items}
+    index = get_link_index() if region else None
+    if item_ids and index is not None:
+        links_by_item = index.links(item_ids, region)
+    elif item_ids:
+        affiliate_links = session.query(AffiliateLink).filter(
+            AffiliateLink.item_id.in_(list(item_ids)),
+            AffiliateLink.is_active == True
+        ).all()
+        for link in affiliate_links:
+            link_dict = link.to_dict()
+            if region is None or link_region(link_dict) in (region, None):
+                links_by_item.setdefault(str(link.item_id), []).append(link_dict)
+    
+    for order_item, item in order_items:
+        item_dict = item.to_dict()
+        entries = orders_data[order_item.order_id]['items']
+        # position is the 1-based place in the order; rank is the stored sparse value
+        item_dict['position'] = len(entries) + 1
+        item_dict['rank'] = order_item.position
+        item_dict['entry_id'] = order_item.id
+        item_dict['notes'] = order_item.notes
+        item_dict['is_optional'] = order_item.is_optional
+        item_dict['affiliate_links'] = links_by_item.get(str(item.id), [])
+        entries.append(item_dict)
+    
+    return [orders_data[order.id] for order in orders]
+
+def load_ranked(session, results):
+    """Load ranked (type, id, score, similarity) search results with one IN query per type, keeping their order"""
+    ids = {'franchise': [], 'item': []}
+    for kind, doc_id, _, _ in results:
+        ids[kind].append(doc_id)
+    
+    rows = {}
+    for kind, model in (('franchise', Franchise), ('item', Item)):
+        if ids[kind]:
+            for row in session.query(model).filter(model.id.in_(ids[kind])):
+                rows[(kind, row.id)] = row
+    
+    loaded = []
+    for kind, doc_id, score, similarity in results:
+        row = rows.get((kind, doc_id))
+        if row is not None:
+            loaded.append(dict(row.to_dict(), type=kind, score=score, similarity=similarity))
+    return loaded
 
 @franchise_bp.route('/franchises', methods=['GET'])
+@query_budget(2)
 def get_franchises():
     """Get all franchises with optional filtering"""
     try:
@@ -20,231 +91,314 @@ def get_franchises():
         limit = request.args.get('limit', 20, type=int)
         offset = request.args.get('offset', 0, type=int)
         
-        query = Franchise.query
-        
-        if category:
-            query = query.filter(Franchise.category == category)
-        
-        if search:
-            query = query.filter(
-                or_(
-                    Franchise.name.ilike(f'%{search}%'),
-                    Franchise.description.ilike(f'%{search}%')
+        board = get_leaderboard() if not search else None
+        if board is not None:
+            franchises = board.top(category, limit, offset)
+            if franchises is not None:
+                return jsonify({
+                    'franchises': franchises,
+                    'total': board.total(category),
+                    'limit': limit,
+                    'offset': offset
+                })
+        
+        with read_session() as session:
+            query = session.query(Franchise)
+            
+            if category:
+                query = query.filter(Franchise.category == category)
+            
+            if search:
+                query = query.filter(
+                    or_(
+                        Franchise.name.ilike(f'%{search}%'),
+                        Franchise.description.ilike(f'%{search}%')
+                    )
                 )
-            )
-        
-        # Order by popularity score descending
-        query = query.order_by(Franchise.popularity_score.desc())
-        
-        total = query.count()
-        franchises = query.offset(offset).limit(limit).all()
-        
-        return jsonify({
-            'franchises': [franchise.to_dict() for franchise in franchises],
-            'total': total,
-            'limit': limit,
-            'offset': offset
-        })
+            
+            # Order by popularity score descending
+            query = query.order_by(Franchise.popularity_score.desc())
+            
+            total = query.count()
+            franchises = [franchise.to_dict() for franchise in query.offset(offset).limit(limit).all()]
+            if board is not None:
+                board.remember(franchises)
+            
+            return jsonify({
+                'franchises': franchises,
+                'total': total,
+                'limit': limit,
+                'offset': offset
+            })
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 @franchise_bp.route('/franchises/<franchise_id>', methods=['GET'])
+@query_budget(1)
 def get_franchise(franchise_id):
     """Get a specific franchise by ID"""
     try:
-        franchise = Franchise.query.get_or_404(franchise_id)
-        return jsonify(franchise.to_dict())
+        with read_session() as session:
+            franchise = session.get(Franchise, franchise_id)
+            if not franchise:
+                return jsonify({'error': 'Franchise not found'}), 404
+            record_view(franchise.id)
+            return jsonify(franchise.to_dict())
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 @franchise_bp.route('/franchises/<franchise_id>/items', methods=['GET'])
+@query_budget(2)
 def get_franchise_items(franchise_id):
     """Get all items for a specific franchise"""
     try:
-        franchise = Franchise.query.get_or_404(franchise_id)
-        items = Item.query.filter_by(franchise_id=franchise_id).order_by(Item.release_date).all()
-        
-        return jsonify({
-            'franchise': franchise.to_dict(),
-            'items': [item.to_dict() for item in items]
-        })
+        with read_session() as session:
+            franchise = session.get(Franchise, franchise_id)
+            if not franchise:
+                return jsonify({'error': 'Franchise not found'}), 404
+            items = session.query(Item).filter_by(franchise_id=franchise_id).order_by(Item.release_date).all()
+            
+            return jsonify({
+                'franchise': franchise.to_dict(),
+                'items': [item.to_dict() for item in items]
+            })
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 @franchise_bp.route('/franchises/<franchise_id>/orders', methods=['GET'])
+@query_budget(4)
 def get_franchise_orders(franchise_id):
-    """Get all orders for a specific franchise"""
+    """Get all orders for a specific franchise (affiliate links for the request's region)"""
     try:
-        franchise = Franchise.query.get_or_404(franchise_id)
-        orders = Order.query.filter_by(franchise_id=franchise_id).all()
-        
-        orders_data = []
-        for order in orders:
-            order_dict = order.to_dict()
-            # Get order items with item details
-            order_items = db.session.query(OrderItem, Item).join(Item).filter(
-                OrderItem.order_id == order.id
-            ).order_by(OrderItem.position).all()
+        region = resolve_region()
+        with read_session() as session:
+            franchise = session.get(Franchise, franchise_id)
+            if not franchise:
+                return jsonify({'error': 'Franchise not found'}), 404
+            orders = session.query(Order).filter_by(franchise_id=franchise_id).all()
+            orders_data = serialize_orders(session, orders, region)
             
-            order_dict['items'] = []
-            for order_item, item in order_items:
-                item_dict = item.to_dict()
-                item_dict['position'] = order_item.position
-                item_dict['notes'] = order_item.notes
-                item_dict['is_optional'] = order_item.is_optional
-                
-                # Get affiliate links for this item
-                affiliate_links = AffiliateLink.query.filter_by(
-                    item_id=item.id, is_active=True
-                ).all()
-                item_dict['affiliate_links'] = [link.to_dict() for link in affiliate_links]
-                
-                order_dict['items'].append(item_dict)
-            
-            orders_data.append(order_dict)
-        
-        return jsonify({
-            'franchise': franchise.to_dict(),
-            'orders': orders_data
-        })
+            return jsonify({
+                'franchise': franchise.to_dict(),
+                'orders': orders_data,
+                'region': region
+            }), 200, {'Vary': 'Accept-Language'}
+    except UnknownRegion as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@franchise_bp.route('/franchises/<franchise_id>/orders/compare', methods=['GET'])
+@query_budget(4)
+def compare_franchise_orders(franchise_id):
+    """Compare two orders of a franchise (?a=<order type or id>&b=<order type or id>)"""
+    wanted_a, wanted_b = request.args.get('a'), request.args.get('b')
+    if not wanted_a or not wanted_b:
+        return jsonify({'error': 'Both a and b order types are required'}), 400
+    try:
+        cache = get_comparison_cache()
+        key = ('sqlite', franchise_id, wanted_a, wanted_b)
+        if cache is not None:
+            cached = cache.get(key)
+            if cached is not None:
+                return jsonify(cached)
+            token = cache.token()
+        
+        with read_session() as session:
+            franchise = session.get(Franchise, franchise_id)
+            if not franchise:
+                return jsonify({'error': 'Franchise not found'}), 404
+            orders = session.query(Order).filter_by(franchise_id=franchise_id).all()
+            picked = []
+            for wanted in (wanted_a, wanted_b):
+                order = next((order for order in orders if matches(order.id, order.order_type, wanted)), None)
+                if not order:
+                    return jsonify({'error': f'Order not found: {wanted}'}), 404
+                picked.append(order)
+            order_a, order_b = serialize_orders(session, picked)
+        
+        result = dict(compare_orders(order_a, order_b), franchise_id=franchise.id)
+        if cache is not None:
+            cache.put(key, result, franchise_id, [order.id for order in picked], token)
+        return jsonify(result)
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 @franchise_bp.route('/franchises/<franchise_id>/orders/<order_type>', methods=['GET'])
+@query_budget(4)
 def get_franchise_order_by_type(franchise_id, order_type):
-    """Get a specific order type for a franchise"""
+    """Get a specific order type for a franchise (affiliate links for the request's region)"""
     try:
-        franchise = Franchise.query.get_or_404(franchise_id)
-        order = Order.query.filter_by(
-            franchise_id=franchise_id, 
-            order_type=order_type
-        ).first()
-        
-        if not order:
-            return jsonify({'error': 'Order type not found'}), 404
-        
-        order_dict = order.to_dict()
-        
-        # Get order items with item details
-        order_items = db.session.query(OrderItem, Item).join(Item).filter(
-            OrderItem.order_id == order.id
-        ).order_by(OrderItem.position).all()
-        
-        order_dict['items'] = []
-        for order_item, item in order_items:
-            item_dict = item.to_dict()
-            item_dict['position'] = order_item.position
-            item_dict['notes'] = order_item.notes
-            item_dict['is_optional'] = order_item.is_optional
+        region = resolve_region()
+        with read_session() as session:
+            franchise = session.get(Franchise, franchise_id)
+            if not franchise:
+                return jsonify({'error': 'Franchise not found'}), 404
+            order = session.query(Order).filter_by(
+                franchise_id=franchise_id, 
+                order_type=order_type
+            ).first()
             
-            # Get affiliate links for this item
-            affiliate_links = AffiliateLink.query.filter_by(
-                item_id=item.id, is_active=True
-            ).all()
-            item_dict['affiliate_links'] = [link.to_dict() for link in affiliate_links]
+            if not order:
+                return jsonify({'error': 'Order type not found'}), 404
             
-            order_dict['items'].append(item_dict)
-        
-        return jsonify({
-            'franchise': franchise.to_dict(),
-            'order': order_dict
-        })
+            order_dict = serialize_orders(session, [order], region)[0]
+            
+            return jsonify({
+                'franchise': franchise.to_dict(),
+                'order': order_dict,
+                'region': region
+            }), 200, {'Vary': 'Accept-Language'}
+    except UnknownRegion as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 @franchise_bp.route('/categories/<category>/franchises', methods=['GET'])
+@query_budget(2)
 def get_category_franchises(category):
     """Get franchises by category"""
     try:
         limit = request.args.get('limit', 20, type=int)
         offset = request.args.get('offset', 0, type=int)
         
-        query = Franchise.query.filter_by(category=category)
-        query = query.order_by(Franchise.popularity_score.desc())
-        
-        total = query.count()
-        franchises = query.offset(offset).limit(limit).all()
-        
-        return jsonify({
-            'category': category,
-            'franchises': [franchise.to_dict() for franchise in franchises],
-            'total': total,
-            'limit': limit,
-            'offset': offset
-        })
+        board = get_leaderboard()
+        if board is not None:
+            franchises = board.top(category, limit, offset)
+            if franchises is not None:
+                return jsonify({
+                    'category': category,
+                    'franchises': franchises,
+                    'total': board.total(category),
+                    'limit': limit,
+                    'offset': offset
+                })
+        
+        with read_session() as session:
+            query = session.query(Franchise).filter_by(category=category)
+            query = query.order_by(Franchise.popularity_score.desc())
+            
+            total = query.count()
+            franchises = [franchise.to_dict() for franchise in query.offset(offset).limit(limit).all()]
+            if board is not None:
+                board.remember(franchises)
+            
+            return jsonify({
+                'category': category,
+                'franchises': franchises,
+                'total': total,
+                'limit': limit,
+                'offset': offset
+            })
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 @franchise_bp.route('/search', methods=['GET'])
+@query_budget(2)
 def search():
-    """Search across all franchises and items"""
+    """Search across all franchises and items
+    
+    Returns one ranked stream mixing franchises and items (trigram similarity
+    plus popularity), category facet counts and a cursor for the next page.
+    """
     try:
         query = request.args.get('q', '')
         category = request.args.get('category')
         limit = request.args.get('limit', 20, type=int)
         offset = request.args.get('offset', 0, type=int)
+        cursor = request.args.get('cursor')
         
         if not query:
             return jsonify({'error': 'Search query is required'}), 400
         
-        # Search franchises
-        franchise_query = Franchise.query.filter(
-            or_(
-                Franchise.name.ilike(f'%{query}%'),
-                Franchise.description.ilike(f'%{query}%')
+        with read_session() as session:
+            index = get_search_index()
+            if index is not None and current_app.config.get('SEARCH_MODE', 'trigram') == 'trigram':
+                threshold = current_app.config.get('SEARCH_SIMILARITY_THRESHOLD', DEFAULT_THRESHOLD)
+                try:
+                    page = index.search_all(query, limit, cursor, category, threshold)
+                except ValueError as e:
+                    return jsonify({'error': str(e)}), 400
+                return jsonify({
+                    'query': query,
+                    'category': category,
+                    'results': load_ranked(session, page['results']),
+                    'facets': page['facets'],
+                    'total': page['total'],
+                    'next_cursor': page['next_cursor']
+                })
+            
+            # Search franchises
+            franchise_query = session.query(Franchise).filter(
+                or_(
+                    Franchise.name.ilike(f'%{query}%'),
+                    Franchise.description.ilike(f'%{query}%')
+                )
             )
-        )
-        
-        if category:
-            franchise_query = franchise_query.filter(Franchise.category == category)
-        
-        franchises = franchise_query.order_by(Franchise.popularity_score.desc()).limit(limit).all()
-        
-        # Search items
-        item_query = Item.query.filter(
-            or_(
-                Item.title.ilike(f'%{query}%'),
-                Item.description.ilike(f'%{query}%')
+            
+            if category:
+                franchise_query = franchise_query.filter(Franchise.category == category)
+            
+            franchises = franchise_query.order_by(Franchise.popularity_score.desc()).limit(limit).all()
+            
+            # Search items
+            item_query = session.query(Item).filter(
+                or_(
+                    Item.title.ilike(f'%{query}%'),
+                    Item.description.ilike(f'%{query}%')
+                )
             )
-        )
-        
-        if category:
-            item_query = item_query.join(Franchise).filter(Franchise.category == category)
-        
-        items = item_query.limit(limit).all()
-        
-        return jsonify({
-            'query': query,
-            'category': category,
-            'franchises': [franchise.to_dict() for franchise in franchises],
-            'items': [item.to_dict() for item in items]
-        })
+            
+            if category:
+                item_query = item_query.join(Franchise).filter(Franchise.category == category)
+            
+            items = item_query.limit(limit).all()
+            
+            return jsonify({
+                'query': query,
+                'category': category,
+                'franchises': [franchise.to_dict() for franchise in franchises],
+                'items': [item.to_dict() for item in items]
+            })
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 @franchise_bp.route('/popular', methods=['GET'])
+@query_budget(1)
 def get_popular():
     """Get popular franchises"""
     try:
         category = request.args.get('category')
         limit = request.args.get('limit', 10, type=int)
         
-        query = Franchise.query
-        
-        if category:
-            query = query.filter(Franchise.category == category)
+        # Served from the in-memory leaderboard; the query below is the fallback
+        board = get_leaderboard()
+        if board is not None:
+            franchises = board.top(category, limit)
+            if franchises is not None:
+                return jsonify({'category': category, 'franchises': franchises})
         
-        franchises = query.order_by(Franchise.popularity_score.desc()).limit(limit).all()
-        
-        return jsonify({
-            'category': category,
-            'franchises': [franchise.to_dict() for franchise in franchises]
-        })
+        with read_session() as session:
+            query = session.query(Franchise)
+            
+            if category:
+                query = query.filter(Franchise.category == category)
+            
+            franchises = query.order_by(Franchise.popularity_score.desc()).limit(limit).all()
+            franchises = [franchise.to_dict() for franchise in franchises]
+            if board is not None:
+                board.remember(franchises)
+            
+            return jsonify({
+                'category': category,
+                'franchises': franchises
+            })
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 # Admin endpoints for creating/updating data
 @franchise_bp.route('/admin/franchises', methods=['POST'])
+@query_budget(3)
 def create_franchise():
     """Create a new franchise"""
     try:
@@ -279,6 +433,7 @@ def create_franchise():
         return jsonify({'error': str(e)}), 500
 
 @franchise_bp.route('/admin/franchises/<franchise_id>/items', methods=['POST'])
+@query_budget(3)
 def create_item():
     """Create a new item for a franchise"""
     try:
@@ -314,6 +469,7 @@ def create_item():
         return jsonify({'error': str(e)}), 500
 
 @franchise_bp.route('/admin/franchises/<franchise_id>/orders', methods=['POST'])
+@query_budget(3)
 def create_order():
     """Create a new order for a franchise"""
     try:
@@ -342,3 +498,70 @@ def create_order():
         db.session.rollback()
         return jsonify({'error': str(e)}), 500
 
+@franchise_bp.route('/admin/orders/<order_id>/entries', methods=['POST'])
+@query_budget(5)
+def insert_order_entry(order_id):
+    """Insert an item into an order at a position (or after/before an entry) with a single row write"""
+    try:
+        data = request.get_json()
+        if not data or not data.get('item_id'):
+            return jsonify({'error': 'item_id is required'}), 400
+        
+        store = SqlAlchemyOrderStore(db.session)
+        row = dict(changes_from(data, store.fields), item_id=data['item_id'])
+        return jsonify(insert_entry(store, order_id, row, **target_from(data))), 201
+    except OrderNotFound:
+        return jsonify({'error': 'Order not found'}), 404
+    except ReorderError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 500
+
+@franchise_bp.route('/admin/orders/<order_id>/entries/<entry_id>', methods=['PATCH'])
+@query_budget(3)
+def move_order_entry(order_id, entry_id):
+    """Move an entry (position, or after/before another entry) and/or update its notes"""
+    try:
+        data = request.get_json() or {}
+        store = SqlAlchemyOrderStore(db.session)
+        return jsonify(move_entry(store, order_id, entry_id, changes_from(data, store.fields), **target_from(data)))
+    except OrderNotFound:
+        return jsonify({'error': 'Order not found'}), 404
+    except ReorderError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 500
+
+@franchise_bp.route('/admin/orders/<order_id>/entries/<entry_id>', methods=['DELETE'])
+@query_budget(3)
+def delete_order_entry(order_id, entry_id):
+    """Remove an entry from an order without renumbering the rest"""
+    try:
+        return jsonify(delete_entry(SqlAlchemyOrderStore(db.session), order_id, entry_id))
+    except OrderNotFound:
+        return jsonify({'error': 'Order not found'}), 404
+    except ReorderError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 500
+
+@franchise_bp.route('/admin/orders/<order_id>/sequence', methods=['PUT'])
+@query_budget(6)
+def apply_order_sequence(order_id):
+    """Replace an order's sequence of items, writing only the entries that changed"""
+    try:
+        data = request.get_json()
+        if not data or not isinstance(data.get('items'), list):
+            return jsonify({'error': 'items array is required'}), 400
+        
+        return jsonify(apply_sequence(SqlAlchemyOrderStore(db.session), order_id, data['items']))
+    except OrderNotFound:
+        return jsonify({'error': 'Order not found'}), 404
+    except ReorderError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 500
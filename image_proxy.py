@@ -0,0 +1,310 @@
+"""Resizing image proxy for item artwork.
+
+Item.image_url points at the provider's artwork (TMDb w500 posters, RAWG
+background_image at full resolution), far larger than the grids display.
+/img/<item_id>/<size> serves a resized copy instead:
+
+- the source is fetched once per URL and kept in the disk cache, so every
+  size and format is derived from the local copy;
+- variants (resize, then WebP, or JPEG for clients that don't accept WebP)
+  are rendered in a worker pool. Pillow releases the GIL while decoding,
+  resizing and encoding, so the pool's threads run in parallel;
+- concurrent requests for the same file wait on a single fetch or render;
+- files live in a size-bounded LRU directory that is re-indexed from disk
+  at startup, so the cache survives restarts.
+
+Cache keys hash the source URL, so a changed image_url never serves the old
+artwork; the item -> URL lookups are cached and dropped through
+catalog_events when an item changes.
+"""
+
+import hashlib
+import io
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+
+import requests
+from flask import current_app
+from PIL import Image
+
+from src.services.catalog_events import subscribe
+from src.services.metrics import record_cache, record_outbound, register_gauge
+
+logger = logging.getLogger(__name__)
+
+# Target widths; sources are never upscaled
+SIZES = {'thumb': 185, 'card': 342, 'detail': 500}
+MIME_TYPES = {'webp': 'image/webp', 'jpeg': 'image/jpeg'}
+
+DEFAULT_CACHE_BYTES = 512 * 1024 * 1024
+DEFAULT_MAX_AGE = 30 * 24 * 3600
+DEFAULT_QUALITY = 80
+MAX_SOURCE_BYTES = 20 * 1024 * 1024
+FETCH_TIMEOUT = 10
+URL_CACHE_SIZE = 20000
+
+
+class SourceUnavailable(Exception):
+    """The source image could not be fetched or decoded."""
+
+
+def render_variant(source, width, fmt, quality=DEFAULT_QUALITY):
+    """Encode source image bytes at most `width` pixels wide as fmt ('webp' or 'jpeg')."""
+    try:
+        with Image.open(io.BytesIO(source)) as image:
+            # thumbnail() lets the JPEG decoder downscale while decoding (draft mode)
+            image.thumbnail((width, width * 4), Image.LANCZOS)
+            if fmt == 'jpeg' or image.mode not in ('RGB', 'RGBA'):
+                image = image.convert('RGBA' if fmt == 'webp' and image.mode in ('LA', 'P', 'PA') else 'RGB')
+            output = io.BytesIO()
+            if fmt == 'webp':
+                image.save(output, 'WEBP', quality=quality, method=4)
+            else:
+                image.save(output, 'JPEG', quality=quality, optimize=True, progressive=True)
+    except (OSError, ValueError, Image.DecompressionBombError) as e:
+        raise SourceUnavailable(f'Undecodable source image: {e}')
+    return output.getvalue()
+
+
+class DiskLRU:
+    """Files in one directory, evicted least recently used first beyond max_bytes."""
+    
+    def __init__(self, directory, max_bytes=DEFAULT_CACHE_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()   # name -> size in bytes
+        self._bytes = 0
+        os.makedirs(directory, exist_ok=True)
+        self._load()
+    
+    def _load(self):
+        """Index what a previous process left behind, oldest access first."""
+        found = []
+        for entry in os.scandir(self.directory):
+            if not entry.is_file():
+                continue
+            if entry.name.endswith('.tmp'):
+                os.unlink(entry.path)
+                continue
+            stat = entry.stat()
+            found.append((stat.st_mtime, entry.name, stat.st_size))
+        for _, name, size in sorted(found):
+            self._entries[name] = size
+            self._bytes += size
+        self._evict()
+    
+    def get(self, name):
+        with self._lock:
+            if name not in self._entries:
+                return None
+            self._entries.move_to_end(name)
+        path = os.path.join(self.directory, name)
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+            # mtime carries the access order across restarts
+            os.utime(path)
+        except FileNotFoundError:
+            with self._lock:
+                self._bytes -= self._entries.pop(name, 0)
+            return None
+        return data
+    
+    def put(self, name, data):
+        path = os.path.join(self.directory, name)
+        temporary = f'{path}.{threading.get_ident()}.tmp'
+        with open(temporary, 'wb') as f:
+            f.write(data)
+        os.replace(temporary, path)
+        with self._lock:
+            self._bytes += len(data) - self._entries.pop(name, 0)
+            self._entries[name] = len(data)
+            self._evict()
+    
+    def _evict(self):
+        while self._bytes > self.max_bytes and self._entries:
+            name, size = self._entries.popitem(last=False)
+            self._bytes -= size
+            try:
+                os.unlink(os.path.join(self.directory, name))
+            except FileNotFoundError:
+                pass
+    
+    def stats(self):
+        with self._lock:
+            return {'files': len(self._entries), 'bytes': self._bytes, 'max_bytes': self.max_bytes}
+
+
+class ImageProxy:
+    """Fetch, resize and cache item artwork; lookup(item_id) returns the item's image_url or None."""
+    
+    def __init__(self, lookup, cache, workers=4, max_age=DEFAULT_MAX_AGE, quality=DEFAULT_QUALITY):
+        self.lookup = lookup
+        self.cache = cache
+        self.max_age = max_age
+        self.quality = quality
+        self.pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='image-render')
+        self._lock = threading.Lock()
+        self._inflight = {}             # file name -> Future
+        self._urls = OrderedDict()      # item id -> image_url
+    
+    def source_url(self, item_id):
+        item_id = str(item_id)
+        with self._lock:
+            url = self._urls.get(item_id)
+            if url is not None:
+                self._urls.move_to_end(item_id)
+                return url
+        url = self.lookup(item_id)
+        if url:
+            with self._lock:
+                self._urls[item_id] = url
+                while len(self._urls) > URL_CACHE_SIZE:
+                    self._urls.popitem(last=False)
+        return url
+    
+    def etag(self, url, size, fmt):
+        return f'{hashlib.sha1(url.encode()).hexdigest()[:20]}-{size}-{fmt}'
+    
+    def variant(self, url, size, fmt):
+        """Bytes of url's artwork at size in fmt, from the disk cache or rendered once."""
+        name = f'{self.etag(url, size, fmt)}.{fmt}'
+        data = self.cache.get(name)
+        record_cache('image_proxy', data is not None)
+        if data is not None:
+            return data
+        
+        def render():
+            source = self.source(url)
+            data = self.pool.submit(render_variant, source, SIZES[size], fmt, self.quality).result()
+            self.cache.put(name, data)
+            return data
+        
+        return self._once(name, render)
+    
+    def source(self, url):
+        """The original image bytes, fetched at most once while they stay cached."""
+        name = f'{hashlib.sha1(url.encode()).hexdigest()[:20]}.src'
+        data = self.cache.get(name)
+        if data is not None:
+            return data
+        
+        def fetch():
+            data = fetch_source(url)
+            self.cache.put(name, data)
+            return data
+        
+        return self._once(name, fetch)
+    
+    def _once(self, name, produce):
+        """Run produce() for name unless another thread already is; then share its result."""
+        with self._lock:
+            future = self._inflight.get(name)
+            owner = future is None
+            if owner:
+                future = self._inflight[name] = Future()
+        if not owner:
+            return future.result()
+        try:
+            result = produce()
+            future.set_result(result)
+            return result
+        except Exception as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                self._inflight.pop(name, None)
+    
+    def apply(self, changes):
+        """catalog_events subscriber: forget cached image_urls of changed items."""
+        with self._lock:
+            for change in changes:
+                item_id = change.row.get('id')
+                if item_id is None:
+                    self._urls.clear()
+                    return
+                self._urls.pop(str(item_id), None)
+
+
+def fetch_source(url):
+    """Download an image, refusing non-http(s) URLs, error responses and oversized bodies."""
+    if not url.startswith(('http://', 'https://')):
+        raise SourceUnavailable(f'Unsupported image URL: {url}')
+    started = time.perf_counter()
+    status = 'error'
+    try:
+        with requests.get(url, timeout=FETCH_TIMEOUT, stream=True) as response:
+            status = response.status_code
+            if status != 200:
+                raise SourceUnavailable(f'Image source returned {status}')
+            if int(response.headers.get('Content-Length') or 0) > MAX_SOURCE_BYTES:
+                raise SourceUnavailable('Image source too large')
+            data = bytearray()
+            for chunk in response.iter_content(64 * 1024):
+                data += chunk
+                if len(data) > MAX_SOURCE_BYTES:
+                    raise SourceUnavailable('Image source too large')
+            return bytes(data)
+    except requests.exceptions.RequestException as e:
+        raise SourceUnavailable(f'Image source unreachable: {e}')
+    finally:
+        record_outbound('images', status, time.perf_counter() - started)
+
+
+def _sqlalchemy_lookup(item_id):
+    from src.config.database import read_session
+    from src.models.franchise import Item
+    
+    with read_session() as session:
+        row = session.query(Item.image_url).filter(Item.id == item_id).first()
+    return row[0] if row else None
+
+
+def _supabase_lookup(client, item_id):
+    result = client.table('items').select('image_url').eq('id', item_id).limit(1).execute()
+    return result.data[0]['image_url'] if result.data else None
+
+
+_active = None
+
+
+def _active_stat(key):
+    return _active.cache.stats()[key] if _active is not None else 0
+
+
+register_gauge('orderof_image_cache_bytes', 'Bytes held in the image proxy disk cache.',
+               lambda: _active_stat('bytes'))
+register_gauge('orderof_image_cache_files', 'Files held in the image proxy disk cache.',
+               lambda: _active_stat('files'))
+
+
+def init_image_proxy(app, supabase_client=None):
+    """Set up /img for the app's backend from IMAGE_CACHE_DIR, IMAGE_CACHE_MAX_BYTES and IMAGE_PROXY_WORKERS."""
+    global _active
+    from src.services.catalog_events import install_session_hooks
+    
+    if supabase_client is not None:
+        lookup = lambda item_id: _supabase_lookup(supabase_client, item_id)
+    else:
+        install_session_hooks()
+        lookup = _sqlalchemy_lookup
+    cache = DiskLRU(app.config['IMAGE_CACHE_DIR'], int(app.config.get('IMAGE_CACHE_MAX_BYTES', DEFAULT_CACHE_BYTES)))
+    proxy = ImageProxy(lookup, cache,
+                       workers=int(app.config.get('IMAGE_PROXY_WORKERS', min(4, os.cpu_count() or 1))),
+                       max_age=int(app.config.get('IMAGE_PROXY_MAX_AGE', DEFAULT_MAX_AGE)))
+    subscribe(proxy.apply, tables=('items',))
+    app.extensions['orderof_image_proxy'] = proxy
+    _active = proxy
+    logger.info(f"Image proxy cache: {cache.stats()}")
+    return proxy
+
+
+def get_image_proxy(app=None):
+    """The app's ImageProxy, or None when /img is not set up."""
+    return (app or current_app).extensions.get('orderof_image_proxy')
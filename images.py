@@ -0,0 +1,38 @@
+from flask import Blueprint, Response, request, jsonify
+from src.services.query_budget import query_budget
+from src.services.image_proxy import MIME_TYPES, SIZES, SourceUnavailable, get_image_proxy
+
+images_bp = Blueprint('images', __name__)
+
+@images_bp.route('/img/<item_id>/<size>', methods=['GET'])
+@query_budget(1)
+def get_item_image(item_id, size):
+    """Item artwork resized to thumb, card or detail width, as WebP when the client accepts it"""
+    try:
+        if size not in SIZES:
+            return jsonify({'error': f"Unknown size, expected one of: {', '.join(SIZES)}"}), 400
+        
+        proxy = get_image_proxy()
+        if proxy is None:
+            return jsonify({'error': 'Images are not available'}), 503
+        
+        url = proxy.source_url(item_id)
+        if not url:
+            return jsonify({'error': 'Image not found'}), 404
+        
+        fmt = 'webp' if 'image/webp' in request.headers.get('Accept', '') else 'jpeg'
+        response = Response(mimetype=MIME_TYPES[fmt])
+        response.set_etag(proxy.etag(url, size, fmt))
+        response.cache_control.public = True
+        response.cache_control.max_age = proxy.max_age
+        response.vary.add('Accept')
+        if request.if_none_match.contains(response.get_etag()[0]):
+            response.status_code = 304
+            return response
+        
+        response.set_data(proxy.variant(url, size, fmt))
+        return response
+    except SourceUnavailable as e:
+        return jsonify({'error': str(e)}), 502
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
@@ -0,0 +1,280 @@
+"""In-memory popularity leaderboards for /popular and the category listings.
+
+Every franchise's (popularity_score, id) is kept in one sorted list per
+category plus a global one, so the order is always exact; full rows are
+cached only for the franchises inside some board's top LEADERBOARD_SIZE.
+Boards are loaded at startup (one narrow scan plus one IN query for the top
+rows) and kept current from catalog_events: admin and sync writes as well
+as the score-only rows published by the popularity job. Large batches
+(a full recompute) rebuild the lists with one sort instead of inserting
+one by one.
+
+top() answers a page from memory, or returns None when the page goes past
+the cached depth or includes a franchise whose row is not cached yet. The
+route then runs its query as before and hands the rows back through
+remember(). Score-only batches (the popularity job, which runs outside any
+request budget) fetch the rows of franchises that entered a top list right
+away with one IN query per batch.
+"""
+
+import logging
+import threading
+from bisect import bisect_left, insort
+
+from flask import current_app
+
+from src.services.catalog_events import subscribe
+from src.services.metrics import record_cache, register_gauge
+
+logger = logging.getLogger(__name__)
+
+LEADERBOARD_SIZE = 100
+# Batches larger than this re-sort the boards instead of insort per change
+REBUILD_THRESHOLD = 2000
+
+GLOBAL = None
+
+
+def _key(score, franchise_id):
+    return (-(score or 0), str(franchise_id))
+
+
+class Leaderboard:
+    """Sorted popularity order per category and overall, with rows cached for the top entries."""
+    
+    def __init__(self, size=LEADERBOARD_SIZE, serialize=None, loader=None):
+        self.size = size
+        self._serialize = serialize or dict
+        self._loader = loader          # ids -> serialized rows, for score-only batches
+        self._lock = threading.Lock()
+        self._boards = {GLOBAL: []}   # category (None = all) -> sorted [(-score, id)]
+        self._meta = {}               # id -> (category, score)
+        self._rows = {}               # id -> serialized row, top entries only
+    
+    def load(self, scores):
+        """Bulk load (id, category, score) for every franchise; rows follow via remember()."""
+        with self._lock:
+            self._meta = {str(franchise_id): (category, score or 0) for franchise_id, category, score in scores}
+            self._rows = {}
+            self._rebuild()
+    
+    def top_ids(self):
+        """Ids inside some board's top entries (the rows worth caching)."""
+        with self._lock:
+            return self._members()
+    
+    def remember(self, rows):
+        """Cache already serialized rows, e.g. from a fallback query (only top entries are kept)."""
+        with self._lock:
+            self._store_rows(rows)
+            self._evict()
+    
+    def _rebuild(self):
+        boards = {GLOBAL: []}
+        for franchise_id, (category, score) in self._meta.items():
+            key = _key(score, franchise_id)
+            boards[GLOBAL].append(key)
+            boards.setdefault(category, []).append(key)
+        for keys in boards.values():
+            keys.sort()
+        self._boards = boards
+    
+    def _members(self):
+        return {franchise_id for keys in self._boards.values() for _, franchise_id in keys[:self.size]}
+    
+    def _store_rows(self, rows, serialize=dict):
+        members = self._members()
+        for row in rows:
+            franchise_id = str(row['id'])
+            if franchise_id in members:
+                self._rows[franchise_id] = serialize(row)
+    
+    def _evict(self):
+        members = self._members()
+        for franchise_id in [franchise_id for franchise_id in self._rows if franchise_id not in members]:
+            del self._rows[franchise_id]
+    
+    def _remove(self, franchise_id):
+        previous = self._meta.pop(franchise_id, None)
+        if previous is None:
+            return
+        key = _key(previous[1], franchise_id)
+        for board in (GLOBAL, previous[0]):
+            keys = self._boards.get(board, [])
+            position = bisect_left(keys, key)
+            if position < len(keys) and keys[position] == key:
+                del keys[position]
+    
+    def _insert(self, franchise_id, category, score):
+        self._meta[franchise_id] = (category, score)
+        key = _key(score, franchise_id)
+        insort(self._boards[GLOBAL], key)
+        insort(self._boards.setdefault(category, []), key)
+    
+    def apply(self, changes):
+        """catalog_events subscriber."""
+        changes = [change for change in changes if change.table == 'franchises']
+        if not changes:
+            return
+        with self._lock:
+            bulk = len(changes) > REBUILD_THRESHOLD
+            scores_only = False
+            rows = []
+            for change in changes:
+                row = change.row
+                franchise_id = str(row['id'])
+                if change.action == 'delete':
+                    if bulk:
+                        self._meta.pop(franchise_id, None)
+                    else:
+                        self._remove(franchise_id)
+                    self._rows.pop(franchise_id, None)
+                    continue
+                previous = self._meta.get(franchise_id)
+                # Score-only updates (popularity job) carry no category
+                category = row['category'] if 'category' in row else (previous or (None,))[0]
+                score = row['popularity_score'] if 'popularity_score' in row else (previous or (None, 0))[1]
+                score = score or 0
+                if 'name' in row:
+                    rows.append(row)
+                else:
+                    scores_only = True
+                    cached = self._rows.get(franchise_id)
+                    if cached is not None and 'popularity_score' in cached:
+                        cached['popularity_score'] = score
+                if previous == (category, score):
+                    continue
+                if bulk:
+                    self._meta[franchise_id] = (category, score)
+                else:
+                    self._remove(franchise_id)
+                    self._insert(franchise_id, category, score)
+            if bulk:
+                self._rebuild()
+            self._store_rows(rows, self._serialize)
+            self._evict()
+            missing = self._members() - self._rows.keys() if scores_only and self._loader else ()
+        if missing:
+            try:
+                self.remember(self._loader(list(missing)))
+            except Exception as e:
+                logger.warning(f"Leaderboard refill failed, listings fall back to queries: {e}")
+    
+    def top(self, category=None, limit=10, offset=0):
+        """Rows for one page of a board, or None if it cannot be answered from memory."""
+        with self._lock:
+            if offset + limit > self.size:
+                return None
+            keys = self._boards.get(category, [])[offset:offset + limit]
+            rows = [self._rows.get(franchise_id) for _, franchise_id in keys]
+        hit = all(row is not None for row in rows)
+        record_cache('leaderboard', hit)
+        return [dict(row) for row in rows] if hit else None
+    
+    def total(self, category=None):
+        with self._lock:
+            return len(self._boards.get(category, []))
+    
+    def stats(self):
+        with self._lock:
+            return {
+                'franchises': len(self._meta),
+                'boards': len(self._boards),
+                'cached_rows': len(self._rows),
+            }
+
+
+def _franchise_to_dict(row):
+    """Serialize an ORM change row (column values) the way the routes do."""
+    from src.models.franchise import Franchise
+    return Franchise(**row).to_dict()
+
+
+def _session_rows(session, ids):
+    from src.models.franchise import Franchise
+    return [franchise.to_dict() for franchise in session.query(Franchise).filter(Franchise.id.in_(ids))]
+
+
+def _read_rows(ids):
+    from src.config.database import read_session
+    with read_session() as session:
+        return _session_rows(session, ids)
+
+
+def load_session(board, session):
+    from src.models.franchise import Franchise
+    
+    scores = session.query(Franchise.id, Franchise.category, Franchise.popularity_score)
+    board.load(scores.yield_per(5000))
+    top_ids = list(board.top_ids())
+    if top_ids:
+        board.remember(_session_rows(session, top_ids))
+    return board
+
+
+def load_supabase(board, client, page_size=1000):
+    def scores():
+        start = 0
+        while True:
+            rows = client.table('franchises').select('id,category,popularity_score') \
+                .range(start, start + page_size - 1).execute().data
+            for row in rows:
+                yield row['id'], row.get('category'), row.get('popularity_score')
+            if len(rows) < page_size:
+                return
+            start += page_size
+    
+    board.load(scores())
+    board.remember(_supabase_rows(client, list(board.top_ids())))
+    return board
+
+
+def _supabase_rows(client, ids):
+    rows = []
+    for start in range(0, len(ids), 500):
+        rows.extend(client.table('franchises').select('*').in_('id', ids[start:start + 500]).execute().data)
+    return rows
+
+
+_active = None
+
+
+def _active_stat(name):
+    return _active.stats()[name] if _active is not None else 0
+
+
+register_gauge('orderof_leaderboard_franchises', 'Franchises ranked by the popularity leaderboards.',
+               lambda: _active_stat('franchises'))
+register_gauge('orderof_leaderboard_cached_rows', 'Franchise rows cached for the leaderboard top entries.',
+               lambda: _active_stat('cached_rows'))
+
+
+def init_leaderboard(app, supabase_client=None):
+    """Load the leaderboards at startup (SQLite or Supabase) and keep them current."""
+    global _active
+    if supabase_client is not None:
+        board = Leaderboard(loader=lambda ids: _supabase_rows(supabase_client, ids))
+        load_supabase(board, supabase_client)
+    else:
+        from src.config.database import read_session
+        from src.services.catalog_events import install_session_hooks
+        
+        install_session_hooks()
+        board = Leaderboard(serialize=_franchise_to_dict, loader=_read_rows)
+        with read_session() as session:
+            load_session(board, session)
+    subscribe(board.apply, tables=('franchises',))
+    # Keyed by backend: main_supabase also mounts the legacy SQLite routes
+    app.extensions[_extension_key(supabase_client is not None)] = board
+    _active = board
+    logger.info(f"Leaderboards loaded: {board.stats()}")
+    return board
+
+
+def _extension_key(supabase):
+    return 'orderof_leaderboard_supabase' if supabase else 'orderof_leaderboard'
+
+
+def get_leaderboard(app=None, supabase=False):
+    """The app's Leaderboard for a backend, or None when listings query the database directly."""
+    return (app or current_app).extensions.get(_extension_key(supabase))
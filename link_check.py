@@ -0,0 +1,29 @@
+from src.models.user import db
+
+class LinkHealthCheck(db.Model):
+    """Latest health check of an affiliate link: outcome, when it is due again and consecutive failures."""
+    __tablename__ = 'link_health_checks'
+
+    link_id = db.Column(db.String(36), primary_key=True)
+    checked_at = db.Column(db.DateTime)
+    next_check_at = db.Column(db.DateTime, index=True)
+    status = db.Column(db.String(20))
+    status_code = db.Column(db.Integer)
+    final_url = db.Column(db.Text)
+    error = db.Column(db.String(255))
+    failures = db.Column(db.Integer, nullable=False, default=0)
+
+    def __repr__(self):
+        return f'<LinkHealthCheck {self.link_id} {self.status}>'
+
+    def to_dict(self):
+        return {
+            'link_id': self.link_id,
+            'checked_at': self.checked_at.isoformat() if self.checked_at else None,
+            'next_check_at': self.next_check_at.isoformat() if self.next_check_at else None,
+            'status': self.status,
+            'status_code': self.status_code,
+            'final_url': self.final_url,
+            'error': self.error,
+            'failures': self.failures
+        }
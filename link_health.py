@@ -0,0 +1,250 @@
+"""Affiliate link health checks.
+
+Each run takes up to BATCH_SIZE active links that are due (never checked
+first, then the most overdue) and checks them concurrently with one
+httpx.AsyncClient. Each check sends HEAD first and falls back to GET when
+HEAD fails or is refused, since many retailers answer HEAD with 403/405.
+Redirects are followed up to MAX_REDIRECTS. Requests are bounded by
+MAX_CONCURRENCY overall and PER_HOST_CONCURRENCY per host, so one
+retailer's domain is never flooded.
+
+Outcomes:
+
+    ok         2xx after redirects: due again after CHECK_INTERVAL
+    throttled  429/503: says nothing about the link, retried after RETRY_AFTER
+    broken     any other status, a timeout or a connection error
+
+Broken links are retried with exponential backoff from RETRY_AFTER. After
+FAILURE_THRESHOLD consecutive broken checks, is_active is switched off so
+the link drops out of the site. Results are stored per link in
+link_health_checks on both backends.
+"""
+
+import asyncio
+import logging
+import threading
+import time
+from datetime import datetime, timedelta
+from urllib.parse import urlsplit
+
+import httpx
+
+from src.services.batching import MAX_ERROR_LENGTH, chunks
+from src.services.catalog_events import publish_rows
+from src.services.metrics import async_httpx_event_hooks
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = 2000
+WRITE_CHUNK_SIZE = 500
+MAX_CONCURRENCY = 50
+PER_HOST_CONCURRENCY = 4
+TIMEOUT = 10
+MAX_REDIRECTS = 5
+CHECK_INTERVAL = timedelta(days=7)
+RETRY_AFTER = timedelta(hours=1)
+FAILURE_THRESHOLD = 3
+THROTTLED_STATUSES = (429, 503)
+USER_AGENT = 'OrderOfLinkChecker/1.0'
+
+
+def _outcome(response=None, error=None, method=None):
+    if response is None:
+        return {'status': 'broken', 'status_code': None, 'final_url': None, 'error': error, 'method': method}
+    code = response.status_code
+    status = 'ok' if 200 <= code < 300 else 'throttled' if code in THROTTLED_STATUSES else 'broken'
+    return {
+        'status': status,
+        'status_code': code,
+        'final_url': str(response.url),
+        'error': None if status == 'ok' else f'HTTP {code}',
+        'method': method,
+    }
+
+
+async def check_url(client, url):
+    """Outcome of HEAD (then GET when HEAD fails) on url, following redirects."""
+    try:
+        response = await client.head(url)
+        if response.status_code < 400:
+            return _outcome(response, method='HEAD')
+    except httpx.TimeoutException as e:
+        return _outcome(error=f'Timeout: {e}', method='HEAD')
+    except (httpx.HTTPError, httpx.InvalidURL):
+        pass
+    try:
+        # Streamed so only the headers are read, never the page body
+        async with client.stream('GET', url) as response:
+            return _outcome(response, method='GET')
+    except (httpx.HTTPError, httpx.InvalidURL) as e:
+        return _outcome(error=f'{type(e).__name__}: {e}', method='GET')
+
+
+async def check_urls(urls, concurrency=MAX_CONCURRENCY, per_host=PER_HOST_CONCURRENCY, timeout=TIMEOUT):
+    """Outcomes aligned with urls, at most concurrency requests in flight and per_host per host."""
+    overall = asyncio.Semaphore(concurrency)
+    hosts = {}
+    
+    async def check(client, url):
+        host = urlsplit(url).netloc.lower()
+        limit = hosts.setdefault(host, asyncio.Semaphore(per_host))
+        # Wait for the host's slot before taking a global one, so a busy host doesn't starve the rest
+        async with limit:
+            async with overall:
+                return await check_url(client, url)
+    
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(follow_redirects=True, max_redirects=MAX_REDIRECTS, timeout=timeout,
+                                 limits=limits, headers={'User-Agent': USER_AGENT},
+                                 event_hooks=async_httpx_event_hooks('link_health')) as client:
+        return await asyncio.gather(*(check(client, url) for url in urls))
+
+
+def _check_row(link, outcome, now):
+    """link_health_checks row for an outcome, scheduling the next check."""
+    failures = link.get('failures') or 0
+    if outcome['status'] == 'ok':
+        failures, delay = 0, CHECK_INTERVAL
+    elif outcome['status'] == 'throttled':
+        delay = RETRY_AFTER
+    else:
+        failures += 1
+        delay = min(CHECK_INTERVAL, RETRY_AFTER * 2 ** (failures - 1))
+    error = outcome['error']
+    return {
+        'link_id': link['id'],
+        'checked_at': now,
+        'next_check_at': now + delay,
+        'status': outcome['status'],
+        'status_code': outcome['status_code'],
+        'final_url': outcome['final_url'],
+        'error': error[:MAX_ERROR_LENGTH] if error else None,
+        'failures': failures,
+    }
+
+
+def check_links(store, batch_size=BATCH_SIZE, now=None, concurrency=MAX_CONCURRENCY,
+                per_host=PER_HOST_CONCURRENCY, timeout=TIMEOUT):
+    """Check the due links, store the outcomes and deactivate links broken FAILURE_THRESHOLD times running."""
+    now = now or datetime.utcnow()
+    started = time.perf_counter()
+    links = store.due_links(batch_size, now)
+    outcomes = asyncio.run(check_urls([link['url'] for link in links], concurrency, per_host, timeout))
+    
+    report = {'checked': len(links), 'ok': 0, 'throttled': 0, 'broken': 0, 'deactivated': 0, 'broken_links': []}
+    checks, deactivate = [], []
+    for link, outcome in zip(links, outcomes):
+        check = _check_row(link, outcome, now)
+        checks.append(check)
+        report[check['status']] += 1
+        if check['status'] != 'broken':
+            continue
+        deactivated = check['failures'] >= FAILURE_THRESHOLD
+        if deactivated:
+            deactivate.append({'id': link['id'], 'item_id': link['item_id'], 'is_active': False})
+        report['broken_links'].append({
+            'link_id': link['id'],
+            'url': link['url'],
+            'status_code': check['status_code'],
+            'error': check['error'],
+            'failures': check['failures'],
+            'deactivated': deactivated,
+        })
+    report['deactivated'] = len(deactivate)
+    
+    deactivate_by_link = {link['id']: link for link in deactivate}
+    for chunk in chunks(checks, WRITE_CHUNK_SIZE):
+        links_off = [deactivate_by_link[check['link_id']] for check in chunk
+                     if check['link_id'] in deactivate_by_link]
+        store.write(chunk, [link['id'] for link in links_off])
+        publish_rows('affiliate_links', links_off)
+    
+    report['seconds'] = round(time.perf_counter() - started, 3)
+    logger.info(f"Links checked: { {key: value for key, value in report.items() if key != 'broken_links'} }")
+    return report
+
+
+class SqlAlchemyLinkHealthStore:
+    """Due links and bulk write-back through the legacy SQLAlchemy models."""
+    
+    def __init__(self, session):
+        self.session = session
+    
+    def due_links(self, limit, now):
+        from src.models.franchise import AffiliateLink
+        from src.models.link_check import LinkHealthCheck
+        
+        rows = self.session.query(
+            AffiliateLink.id, AffiliateLink.item_id, AffiliateLink.url, LinkHealthCheck.failures
+        ).outerjoin(
+            LinkHealthCheck, LinkHealthCheck.link_id == AffiliateLink.id
+        ).filter(
+            AffiliateLink.is_active == True,
+            (LinkHealthCheck.next_check_at == None) | (LinkHealthCheck.next_check_at <= now)
+        ).order_by(
+            LinkHealthCheck.next_check_at.asc().nullsfirst(), AffiliateLink.id
+        ).limit(limit).all()
+        return [{'id': link_id, 'item_id': item_id, 'url': url, 'failures': failures or 0}
+                for link_id, item_id, url, failures in rows]
+    
+    def write(self, checks, deactivate_ids):
+        from src.models.franchise import AffiliateLink
+        from src.models.link_check import LinkHealthCheck
+        
+        try:
+            ids = [check['link_id'] for check in checks]
+            existing = {link_id for link_id, in self.session.query(LinkHealthCheck.link_id).filter(
+                LinkHealthCheck.link_id.in_(ids))}
+            self.session.bulk_update_mappings(LinkHealthCheck, [check for check in checks
+                                                                if check['link_id'] in existing])
+            self.session.bulk_insert_mappings(LinkHealthCheck, [check for check in checks
+                                                                if check['link_id'] not in existing])
+            if deactivate_ids:
+                self.session.bulk_update_mappings(AffiliateLink, [{'id': link_id, 'is_active': False}
+                                                                  for link_id in deactivate_ids])
+            self.session.commit()
+        except Exception:
+            self.session.rollback()
+            raise
+
+
+class SupabaseLinkHealthStore:
+    """Due links and bulk write-back through SupabaseService (due_link_checks rpc)."""
+    
+    def __init__(self, service):
+        self.service = service
+    
+    def due_links(self, limit, now):
+        return self.service.get_due_link_checks(limit, now.isoformat())
+    
+    def write(self, checks, deactivate_ids):
+        self.service.apply_link_health([
+            dict(check, checked_at=check['checked_at'].isoformat(),
+                 next_check_at=check['next_check_at'].isoformat())
+            for check in checks
+        ], deactivate_ids)
+
+
+def init_link_health(app, supabase_service=None):
+    """Check due links every LINK_CHECK_SECONDS in a daemon thread (0 disables the schedule)."""
+    interval = float(app.config.get('LINK_CHECK_SECONDS', 0))
+    if interval <= 0:
+        return None
+    
+    def check_forever():
+        while True:
+            time.sleep(interval)
+            try:
+                if supabase_service is not None:
+                    check_links(SupabaseLinkHealthStore(supabase_service))
+                else:
+                    from src.models.user import db
+                    with app.app_context():
+                        check_links(SqlAlchemyLinkHealthStore(db.session))
+                        db.session.remove()
+            except Exception as e:
+                logger.warning(f"Link check failed, will retry: {e}")
+    
+    thread = threading.Thread(target=check_forever, name='link-health', daemon=True)
+    thread.start()
+    return thread
@@ -0,0 +1,288 @@
+"""Per-request affiliate link regions and the item -> region -> links index.
+
+Links belong to one storefront region (affiliate_links.region on Supabase;
+the legacy table has no region column, so it is read off the platform
+suffix, e.g. amazon_uk, or the currency). A request's region is, in order:
+
+1. an explicit ?region= parameter,
+2. the first Accept-Language tag with a known country (en-GB -> uk),
+3. the client address looked up in a local GeoIP database (GEOIP_DATABASE,
+   a MaxMind .mmdb file; needs the optional maxminddb package),
+4. LINK_DEFAULT_REGION.
+
+Order pages and the item link endpoint then return only that region's
+links (plus links without a region, which apply everywhere). They come
+from RegionLinkIndex, which holds every active link grouped by item and
+region. It is loaded at startup and invalidated per item through
+catalog_events on link writes; invalidated items are reloaded with one IN
+query the next time a request needs them.
+"""
+
+import logging
+import threading
+from collections import OrderedDict
+
+from flask import current_app, request
+
+from src.services.batching import chunks
+from src.services.catalog_events import subscribe
+from src.services.metrics import record_cache, register_gauge
+
+logger = logging.getLogger(__name__)
+
+REGIONS = ('uk', 'us')
+DEFAULT_REGION = 'uk'
+COUNTRY_REGIONS = {'GB': 'uk', 'UK': 'uk', 'US': 'us'}
+CURRENCY_REGIONS = {'GBP': 'uk', 'USD': 'us'}
+GEOIP_CACHE_SIZE = 10000
+LOAD_CHUNK_SIZE = 500
+
+
+class UnknownRegion(ValueError):
+    """An explicit ?region= that no storefront serves."""
+
+
+def link_region(link):
+    """Region of a serialized link, or None when it applies to every region."""
+    region = (link.get('region') or '').lower()
+    if region in REGIONS:
+        return region
+    suffix = (link.get('platform') or '').rsplit('_', 1)[-1].lower()
+    if suffix in REGIONS:
+        return suffix
+    return CURRENCY_REGIONS.get((link.get('currency') or '').upper())
+
+
+def region_from_accept_language(header):
+    """Region of the most preferred Accept-Language tag that names a known country."""
+    tags = []
+    for position, part in enumerate((header or '').split(',')):
+        tag, _, params = part.strip().partition(';')
+        quality = 1.0
+        if params.strip().startswith('q='):
+            try:
+                quality = float(params.strip()[2:])
+            except ValueError:
+                continue
+        if tag and quality > 0:
+            tags.append((-quality, position, tag))
+    for _, _, tag in sorted(tags):
+        for subtag in tag.split('-')[1:]:
+            region = COUNTRY_REGIONS.get(subtag.upper())
+            if region:
+                return region
+    return None
+
+
+class GeoIPLocator:
+    """Country lookups in a local MaxMind database, cached per address."""
+    
+    def __init__(self, path, cache_size=GEOIP_CACHE_SIZE):
+        import maxminddb
+        
+        self.reader = maxminddb.open_database(path)
+        self.cache_size = cache_size
+        self._lock = threading.Lock()
+        self._cache = OrderedDict()
+    
+    def region(self, address):
+        with self._lock:
+            if address in self._cache:
+                self._cache.move_to_end(address)
+                return self._cache[address]
+        try:
+            record = self.reader.get(address) or {}
+        except ValueError:
+            record = {}
+        country = (record.get('country') or record.get('registered_country') or {}).get('iso_code')
+        region = COUNTRY_REGIONS.get(country)
+        with self._lock:
+            self._cache[address] = region
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return region
+
+
+def resolve_region(app=None):
+    """The current request's region; raises UnknownRegion for a bad ?region=."""
+    app = app or current_app
+    explicit = request.args.get('region')
+    if explicit:
+        if explicit.lower() not in REGIONS:
+            raise UnknownRegion(f"Unknown region: {explicit}. Use one of: {', '.join(REGIONS)}")
+        return explicit.lower()
+    region = region_from_accept_language(request.headers.get('Accept-Language'))
+    if region:
+        return region
+    locator = app.extensions.get('orderof_geoip')
+    if locator is not None and request.access_route:
+        region = locator.region(request.access_route[0])
+        if region:
+            return region
+    return app.config.get('LINK_DEFAULT_REGION', DEFAULT_REGION)
+
+
+class RegionLinkIndex:
+    """Active links by item and region, reloaded per item after link writes."""
+    
+    def __init__(self, loader):
+        self._loader = loader          # item ids -> serialized active links
+        self._lock = threading.Lock()
+        self._items = {}               # item id -> {region: [links]}
+        self._link_items = {}          # link id -> item id
+        self._stale = set()
+        self._complete = False         # True once every item's links are loaded
+        self._generation = 0
+    
+    def load(self, links):
+        """Bulk load every active link; items without links then need no query."""
+        items, link_items = self._group(links)
+        with self._lock:
+            self._items = items
+            self._link_items = link_items
+            self._stale = set()
+            self._complete = True
+            self._generation += 1
+    
+    @staticmethod
+    def _group(links):
+        items, link_items = {}, {}
+        for link in links:
+            item_id = str(link['item_id'])
+            items.setdefault(item_id, {}).setdefault(link_region(link), []).append(link)
+            link_items[str(link['id'])] = item_id
+        return items, link_items
+    
+    def links(self, item_ids, region):
+        """{item id: links for region}, reloading stale or unknown items with one loader call."""
+        item_ids = [str(item_id) for item_id in item_ids]
+        with self._lock:
+            missing = [item_id for item_id in dict.fromkeys(item_ids)
+                       if item_id in self._stale or (item_id not in self._items and not self._complete)]
+            token = self._generation
+            found = {item_id: self._items.get(item_id, {}) for item_id in item_ids}
+        record_cache('link_regions', not missing)
+        
+        if missing:
+            loaded, link_items = self._group(self._loader(missing))
+            with self._lock:
+                # Only keep the reload when no write landed while it ran
+                if token == self._generation:
+                    for item_id in missing:
+                        self._items[item_id] = loaded.get(item_id, {})
+                        self._stale.discard(item_id)
+                    self._link_items.update(link_items)
+            for item_id in missing:
+                found[item_id] = loaded.get(item_id, {})
+        
+        return {item_id: by_region.get(region, []) + by_region.get(None, [])
+                for item_id, by_region in found.items()}
+    
+    def apply(self, changes):
+        """catalog_events subscriber."""
+        with self._lock:
+            self._generation += 1
+            for change in changes:
+                row = change.row
+                item_id = row.get('item_id') or self._link_items.get(str(row.get('id')))
+                if item_id is None:
+                    # Can't tell which item moved: reload everything lazily
+                    self._items.clear()
+                    self._stale.clear()
+                    self._complete = False
+                    return
+                self._stale.add(str(item_id))
+    
+    def stats(self):
+        with self._lock:
+            return {
+                'items': len(self._items),
+                'links': len(self._link_items),
+                'stale': len(self._stale),
+            }
+
+
+def _session_links(session, item_ids=None):
+    from src.models.franchise import AffiliateLink
+    
+    query = session.query(AffiliateLink).filter(AffiliateLink.is_active == True)
+    if item_ids is None:
+        return [link.to_dict() for link in query.yield_per(5000)]
+    links = []
+    for chunk in chunks(item_ids, LOAD_CHUNK_SIZE):
+        links.extend(link.to_dict() for link in query.filter(AffiliateLink.item_id.in_(chunk)))
+    return links
+
+
+def _read_links(item_ids):
+    from src.config.database import read_session
+    with read_session() as session:
+        return _session_links(session, item_ids)
+
+
+def _supabase_links(client, item_ids=None, page_size=1000):
+    if item_ids is not None:
+        links = []
+        for chunk in chunks(item_ids, LOAD_CHUNK_SIZE):
+            links.extend(client.table('affiliate_links').select('*').eq('is_active', True)
+                         .in_('item_id', chunk).execute().data)
+        return links
+    links, start = [], 0
+    while True:
+        rows = client.table('affiliate_links').select('*').eq('is_active', True) \
+            .order('id').range(start, start + page_size - 1).execute().data
+        links.extend(rows)
+        if len(rows) < page_size:
+            return links
+        start += page_size
+
+
+_active = None
+
+
+def _active_stat(name):
+    return _active.stats()[name] if _active is not None else 0
+
+
+register_gauge('orderof_link_index_items', 'Items held in the region affiliate link index.',
+               lambda: _active_stat('items'))
+register_gauge('orderof_link_index_links', 'Active affiliate links held in the region index.',
+               lambda: _active_stat('links'))
+
+
+def init_link_regions(app, supabase_client=None):
+    """Load the link index at startup (SQLite or Supabase) and open GEOIP_DATABASE when configured."""
+    global _active
+    if supabase_client is not None:
+        index = RegionLinkIndex(lambda ids: _supabase_links(supabase_client, ids))
+        index.load(_supabase_links(supabase_client))
+    else:
+        from src.config.database import read_session
+        from src.services.catalog_events import install_session_hooks
+        
+        install_session_hooks()
+        index = RegionLinkIndex(_read_links)
+        with read_session() as session:
+            index.load(_session_links(session))
+    subscribe(index.apply, tables=('affiliate_links',))
+    # Keyed by backend: main_supabase also mounts the legacy SQLite routes
+    app.extensions[_extension_key(supabase_client is not None)] = index
+    _active = index
+    
+    path = app.config.get('GEOIP_DATABASE')
+    if path and 'orderof_geoip' not in app.extensions:
+        try:
+            app.extensions['orderof_geoip'] = GeoIPLocator(path)
+        except (ImportError, OSError, ValueError) as e:
+            logger.warning(f"GeoIP database {path} not loaded, regions come from the request only: {e}")
+    logger.info(f"Link region index loaded: {index.stats()}")
+    return index
+
+
+def _extension_key(supabase):
+    return 'orderof_link_regions_supabase' if supabase else 'orderof_link_regions'
+
+
+def get_link_index(app=None, supabase=False):
+    """The app's RegionLinkIndex for a backend, or None when links are queried per request."""
+    return (app or current_app).extensions.get(_extension_key(supabase))
@@ -6,11 +6,30 @@ sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
 from flask import Flask, send_from_directory
 from flask_cors import CORS
 from src.models.user import db
+from src.config.database import configure_database
 from src.models.franchise import Franchise, Item, Order, OrderItem, AffiliateLink
+from src.models.activity import FranchiseActivity
+from src.models.price_check import LinkPriceCheck
+from src.models.link_check import LinkHealthCheck
+from src.models.sync_run import SyncCheckpoint
 from src.routes.user import user_bp
 from src.routes.franchise import franchise_bp
 from src.routes.sync import sync_bp
 from src.routes.affiliate import affiliate_bp
+from src.routes.monitoring import monitoring_bp
+from src.routes.suggest import suggest_bp
+from src.routes.images import images_bp
+from src.services.metrics import init_metrics
+from src.services.query_budget import init_query_guard
+from src.services.search_index import init_search_index, DEFAULT_THRESHOLD
+from src.services.suggest_index import init_suggest_index
+from src.services.popularity import init_activity_tracking
+from src.services.leaderboard import init_leaderboard
+from src.services.order_compare import init_order_compare
+from src.services.link_regions import init_link_regions
+from src.services.image_proxy import init_image_proxy
+from src.services.price_refresh import init_price_refresh
+from src.services.link_health import init_link_health
 
 app = Flask(__name__, static_folder=os.path.join(os.path.dirname(__file__), 'static'))
 app.config['SECRET_KEY'] = 'asdf#FGSgvasgf$5$WGT'
@@ -18,17 +37,66 @@ app.config['SECRET_KEY'] = 'asdf#FGSgvasgf$5$WGT'
 # Enable CORS for all routes
 CORS(app)
 
+# Request latency, query counts and outbound call metrics
+init_metrics(app)
+
+# Per-route query budgets: off, warn or strict
+app.config['QUERY_BUDGET_MODE'] = os.environ.get('QUERY_BUDGET_MODE', 'off')
+init_query_guard(app)
+
+# /search: 'trigram' (typo-tolerant, in-memory index) or 'ilike'
+app.config['SEARCH_MODE'] = os.environ.get('SEARCH_MODE', 'trigram')
+app.config['SEARCH_SIMILARITY_THRESHOLD'] = float(os.environ.get('SEARCH_SIMILARITY_THRESHOLD', DEFAULT_THRESHOLD))
+
 app.register_blueprint(user_bp, url_prefix='/api')
 app.register_blueprint(franchise_bp, url_prefix='/api')
 app.register_blueprint(sync_bp, url_prefix='/api')
 app.register_blueprint(affiliate_bp, url_prefix='/api')
+app.register_blueprint(monitoring_bp, url_prefix='/api')
+app.register_blueprint(suggest_bp, url_prefix='/api')
+# Resized item artwork at /img/<item_id>/<size>
+app.register_blueprint(images_bp)
 
-# Database configuration
-app.config['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{os.path.join(os.path.dirname(__file__), 'database', 'app.db')}"
+# Database configuration (WAL, tuned pragmas and a pooled read-only path)
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
-db.init_app(app)
+configure_database(app, db, os.path.join(os.path.dirname(__file__), 'database', 'app.db'))
 with app.app_context():
     db.create_all()
+    if app.config['SEARCH_MODE'] == 'trigram':
+        init_search_index(app)
+    # Typeahead prefix index, updated from admin and sync writes
+    init_suggest_index(app)
+    # Top franchises per category for /popular and the listings
+    init_leaderboard(app)
+    # Active affiliate links by item and region for the order pages
+    app.config['LINK_DEFAULT_REGION'] = os.environ.get('LINK_DEFAULT_REGION', 'uk')
+    app.config['GEOIP_DATABASE'] = os.environ.get('GEOIP_DATABASE')
+    init_link_regions(app)
+
+# Order comparisons, cached until either order changes
+init_order_compare(app)
+
+# /img: resized WebP/JPEG artwork in a size-bounded disk cache
+app.config['IMAGE_CACHE_DIR'] = os.environ.get('IMAGE_CACHE_DIR', os.path.join(os.path.dirname(__file__), 'database', 'image_cache'))
+app.config['IMAGE_CACHE_MAX_BYTES'] = int(os.environ.get('IMAGE_CACHE_MAX_BYTES', 512 * 1024 * 1024))
+init_image_proxy(app)
+
+# Page views and affiliate clicks for popularity scoring, flushed in the background
+init_activity_tracking(app)
+
+# Affiliate price refresh: PRICE_ADAPTERS="platform=adapter[:concurrency],...", every PRICE_REFRESH_SECONDS (0 = manual)
+app.config['PRICE_ADAPTERS'] = os.environ.get('PRICE_ADAPTERS', '')
+app.config['PRICE_REFRESH_SECONDS'] = float(os.environ.get('PRICE_REFRESH_SECONDS', 0))
+init_price_refresh(app)
+
+# Bulk syncs (POST /api/admin/sync/popular): franchises from the SEED_CATALOG file
+# (.csv/.json/.ndjson, default seed_catalog.csv), sharded over SYNC_WORKERS processes
+app.config['SEED_CATALOG'] = os.environ.get('SEED_CATALOG')
+app.config['SYNC_WORKERS'] = int(os.environ.get('SYNC_WORKERS', 1))
+
+# Dead-link checks of affiliate links every LINK_CHECK_SECONDS (0 = manual via POST /api/admin/links/check)
+app.config['LINK_CHECK_SECONDS'] = float(os.environ.get('LINK_CHECK_SECONDS', 0))
+init_link_health(app)
 
 @app.route('/', defaults={'path': ''})
 @app.route('/<path:path>')
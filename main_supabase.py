@@ -18,6 +18,23 @@ from src.routes.franchise import franchise_bp
 from src.routes.sync import sync_bp
 from src.routes.affiliate import affiliate_bp
 
+from src.routes.monitoring import monitoring_bp
+from src.routes.suggest import suggest_bp
+from src.routes.images import images_bp
+from src.services.metrics import init_metrics
+from src.services.query_budget import init_query_guard
+from src.services.supabase_service import get_supabase_service
+from src.services.supabase_async_service import get_async_supabase_service
+from src.services.suggest_index import init_suggest_index
+from src.services.popularity import init_activity_tracking
+from src.services.leaderboard import init_leaderboard
+from src.services.order_compare import init_order_compare
+from src.services.link_regions import init_link_regions
+from src.services.image_proxy import init_image_proxy
+from src.services.price_refresh import init_price_refresh
+from src.services.link_health import init_link_health
+from src.config.supabase import get_supabase_client
+
 app = Flask(__name__, static_folder=os.path.join(os.path.dirname(__file__), 'static'))
 app.config['SECRET_KEY'] = 'asdf#FGSgvasgf$5$WGT'
 
@@ -27,10 +44,21 @@ CORS(app)
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 
+# Request latency, query counts and outbound call metrics
+init_metrics(app)
+
+# Per-route query budgets: off, warn or strict
+app.config['QUERY_BUDGET_MODE'] = os.environ.get('QUERY_BUDGET_MODE', 'off')
+init_query_guard(app, supabase_services=[get_supabase_service(), get_async_supabase_service()])
+
 # Register Supabase blueprints (new primary routes)
 app.register_blueprint(supabase_franchise_bp, url_prefix='/api')
 app.register_blueprint(supabase_affiliate_bp, url_prefix='/api')
 app.register_blueprint(supabase_sync_bp, url_prefix='/api')
+app.register_blueprint(monitoring_bp, url_prefix='/api')
+app.register_blueprint(suggest_bp, url_prefix='/api')
+# Resized item artwork at /img/<item_id>/<size>
+app.register_blueprint(images_bp)
 
 # Register legacy blueprints (for backward compatibility)
 app.register_blueprint(user_bp, url_prefix='/api/legacy')
@@ -38,6 +66,53 @@ app.register_blueprint(franchise_bp, url_prefix='/api/legacy')
 app.register_blueprint(sync_bp, url_prefix='/api/legacy')
 app.register_blueprint(affiliate_bp, url_prefix='/api/legacy')
 
+# Typeahead prefix index, updated from Supabase admin and sync writes
+try:
+    init_suggest_index(app, supabase_client=get_supabase_client())
+except Exception as e:
+    logging.getLogger(__name__).error(f"Suggest index not built, /api/suggest disabled: {e}")
+
+# Top franchises per category for the listings, updated like the typeahead index
+try:
+    init_leaderboard(app, supabase_client=get_supabase_client())
+except Exception as e:
+    logging.getLogger(__name__).error(f"Leaderboard not loaded, listings query Supabase: {e}")
+
+# Active affiliate links by item and region; requests resolve their region from
+# ?region=, Accept-Language or the GEOIP_DATABASE file (.mmdb), else LINK_DEFAULT_REGION
+app.config['LINK_DEFAULT_REGION'] = os.environ.get('LINK_DEFAULT_REGION', 'uk')
+app.config['GEOIP_DATABASE'] = os.environ.get('GEOIP_DATABASE')
+try:
+    init_link_regions(app, supabase_client=get_supabase_client())
+except Exception as e:
+    logging.getLogger(__name__).error(f"Link region index not loaded, item links query Supabase: {e}")
+
+# Order comparisons, cached until either order changes (both backends share it)
+init_order_compare(app)
+
+# /img: resized WebP/JPEG artwork in a size-bounded disk cache
+app.config['IMAGE_CACHE_DIR'] = os.environ.get('IMAGE_CACHE_DIR', os.path.join(os.path.dirname(__file__), 'database', 'image_cache'))
+app.config['IMAGE_CACHE_MAX_BYTES'] = int(os.environ.get('IMAGE_CACHE_MAX_BYTES', 512 * 1024 * 1024))
+init_image_proxy(app, supabase_client=get_supabase_client())
+
+# Bulk syncs: franchises from the SEED_CATALOG_TABLE table if set, else the SEED_CATALOG
+# file (default seed_catalog.csv), sharded over SYNC_WORKERS processes
+app.config['SEED_CATALOG'] = os.environ.get('SEED_CATALOG')
+app.config['SEED_CATALOG_TABLE'] = os.environ.get('SEED_CATALOG_TABLE')
+app.config['SYNC_WORKERS'] = int(os.environ.get('SYNC_WORKERS', 1))
+
+# Page views for popularity scoring, flushed to franchise_activity in the background
+init_activity_tracking(app, supabase_client=get_supabase_client())
+
+# Affiliate price refresh: PRICE_ADAPTERS="platform=adapter[:concurrency],...", every PRICE_REFRESH_SECONDS (0 = manual)
+app.config['PRICE_ADAPTERS'] = os.environ.get('PRICE_ADAPTERS', '')
+app.config['PRICE_REFRESH_SECONDS'] = float(os.environ.get('PRICE_REFRESH_SECONDS', 0))
+init_price_refresh(app, supabase_service=get_supabase_service())
+
+# Dead-link checks of affiliate links every LINK_CHECK_SECONDS (0 = manual via POST /api/admin/links/check)
+app.config['LINK_CHECK_SECONDS'] = float(os.environ.get('LINK_CHECK_SECONDS', 0))
+init_link_health(app, supabase_service=get_supabase_service())
+
 @app.route('/api/health')
 def health_check():
     return jsonify({'status': 'healthy', 'backend': 'supabase'})
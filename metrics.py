@@ -0,0 +1,266 @@
+"""In-process metrics with Prometheus text exposition.
+
+Counters and histograms are plain dicts keyed by label values and guarded by
+one lock per metric, so recording is a dict lookup plus a bisect and cheap
+enough to leave on in production. Rendering happens only when /api/metrics
+is scraped.
+"""
+
+import time
+import threading
+from bisect import bisect_left
+from flask import g, request, has_app_context
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+# Latency buckets in seconds
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# Query-count buckets for per-request database usage
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100, 250)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(names, values, extra=None):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labelvalues, amount=1):
+        with self._lock:
+            self._values[labelvalues] = self._values.get(labelvalues, 0) + amount
+
+    def value(self, *labelvalues):
+        return self._values.get(labelvalues, 0)
+
+    def collect(self):
+        with self._lock:
+            values = dict(self._values)
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} counter']
+        for labelvalues, value in sorted(values.items()):
+            lines.append(f'{self.name}{_format_labels(self.labelnames, labelvalues)} {_format_value(value)}')
+        return lines
+
+
+class Histogram:
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self._series = {}  # labelvalues -> [bucket counts..., +Inf count, sum]
+        self._lock = threading.Lock()
+
+    def observe(self, value, *labelvalues):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labelvalues)
+            if series is None:
+                series = self._series[labelvalues] = [0] * (len(self.buckets) + 2)
+            series[index] += 1
+            series[-1] += value
+
+    def collect(self):
+        with self._lock:
+            snapshot = {labels: list(series) for labels, series in self._series.items()}
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} histogram']
+        for labelvalues, series in sorted(snapshot.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), series[:-1]):
+                cumulative += count
+                labels = _format_labels(self.labelnames, labelvalues, f'le="{_format_value(float(bound))}"')
+                lines.append(f'{self.name}_bucket{labels} {cumulative}')
+            labels = _format_labels(self.labelnames, labelvalues)
+            lines.append(f'{self.name}_sum{labels} {_format_value(series[-1])}')
+            lines.append(f'{self.name}_count{labels} {cumulative}')
+        return lines
+
+
+class Gauge:
+    """Gauge whose values are read from a callback at scrape time.
+
+    The callback returns either a number or a dict of label tuples to numbers.
+    """
+
+    def __init__(self, name, documentation, callback, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.callback = callback
+
+    def collect(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} gauge']
+        try:
+            values = self.callback()
+        except Exception:
+            return lines
+        if not isinstance(values, dict):
+            values = {(): values}
+        for labelvalues, value in sorted(values.items()):
+            lines.append(f'{self.name}{_format_labels(self.labelnames, labelvalues)} {_format_value(value)}')
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        with self._lock:
+            return self._metrics.setdefault(metric.name, metric)
+
+    def render(self):
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.collect())
+        return '\n'.join(lines) + '\n'
+
+
+registry = Registry()
+
+http_request_duration = registry.register(Histogram(
+    'orderof_http_request_duration_seconds', 'HTTP request latency by route.',
+    ('method', 'route', 'status')))
+db_queries_per_request = registry.register(Histogram(
+    'orderof_db_queries_per_request', 'Database queries issued per HTTP request.',
+    ('route', 'backend'), buckets=QUERY_COUNT_BUCKETS))
+db_queries_total = registry.register(Counter(
+    'orderof_db_queries_total', 'Database queries by backend.', ('backend',)))
+outbound_request_duration = registry.register(Histogram(
+    'orderof_outbound_request_duration_seconds', 'Latency of calls to external APIs.',
+    ('provider',)))
+outbound_requests_total = registry.register(Counter(
+    'orderof_outbound_requests_total', 'Calls to external APIs by provider and status code.',
+    ('provider', 'status')))
+cache_requests_total = registry.register(Counter(
+    'orderof_cache_requests_total', 'Cache lookups by cache and result.', ('cache', 'result')))
+
+
+def _cache_hit_ratios():
+    totals = {}
+    for (cache, result), value in list(cache_requests_total._values.items()):
+        hits, lookups = totals.get(cache, (0, 0))
+        totals[cache] = (hits + (value if result == 'hit' else 0), lookups + value)
+    return {(cache,): hits / lookups for cache, (hits, lookups) in totals.items() if lookups}
+
+
+registry.register(Gauge(
+    'orderof_cache_hit_ratio', 'Fraction of cache lookups that were hits.',
+    _cache_hit_ratios, ('cache',)))
+
+
+def register_gauge(name, documentation, callback, labelnames=()):
+    """Expose a callback-driven gauge, e.g. the size of an in-memory index."""
+    return registry.register(Gauge(name, documentation, callback, labelnames))
+
+
+def record_query(backend):
+    """Count one database query, attributing it to the current request."""
+    db_queries_total.inc(backend)
+    if has_app_context():
+        counts = g.get('_metrics_queries')
+        if counts is not None:
+            counts[backend] = counts.get(backend, 0) + 1
+
+
+def record_outbound(provider, status, seconds):
+    """Record one call to an external API."""
+    outbound_requests_total.inc(provider, str(status))
+    outbound_request_duration.observe(seconds, provider)
+
+
+def record_cache(cache, hit):
+    """Record a cache lookup for the hit-ratio metrics."""
+    cache_requests_total.inc(cache, 'hit' if hit else 'miss')
+
+
+def httpx_event_hooks(provider, backend=None):
+    """Event hooks for an httpx.Client that time every request.
+
+    When backend is given the call is also counted as a database query for
+    the current request (used for the Supabase PostgREST client).
+    """
+    def on_request(req):
+        req.extensions['orderof_started'] = time.perf_counter()
+
+    def on_response(response):
+        started = response.request.extensions.get('orderof_started')
+        if started is not None:
+            record_outbound(provider, response.status_code, time.perf_counter() - started)
+        if backend:
+            record_query(backend)
+
+    return {'request': [on_request], 'response': [on_response]}
+
+
+def async_httpx_event_hooks(provider, backend=None):
+    """Event hooks for an httpx.AsyncClient that time every request.
+
+    backend counts each call as a database query, as in httpx_event_hooks.
+    """
+    async def on_request(req):
+        req.extensions['orderof_started'] = time.perf_counter()
+
+    async def on_response(response):
+        started = response.request.extensions.get('orderof_started')
+        if started is not None:
+            record_outbound(provider, response.status_code, time.perf_counter() - started)
+        if backend:
+            record_query(backend)
+
+    return {'request': [on_request], 'response': [on_response]}
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    record_query(conn.dialect.name)
+
+
+def init_metrics(app):
+    """Hook request timing and SQL query counting into a Flask app."""
+    if not event.contains(Engine, 'before_cursor_execute', _before_cursor_execute):
+        event.listen(Engine, 'before_cursor_execute', _before_cursor_execute)
+
+    @app.before_request
+    def _start_request_metrics():
+        g._metrics_started = time.perf_counter()
+        g._metrics_queries = {}
+
+    @app.after_request
+    def _finish_request_metrics(response):
+        started = g.get('_metrics_started')
+        if started is None:
+            return response
+        route = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+        http_request_duration.observe(time.perf_counter() - started,
+                                      request.method, route, str(response.status_code))
+        for backend, count in g.get('_metrics_queries', {}).items():
+            db_queries_per_request.observe(count, route, backend)
+        return response
+
+
+def render_metrics():
+    """Render every registered metric in Prometheus text format."""
+    return registry.render()
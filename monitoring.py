@@ -0,0 +1,9 @@
+from flask import Blueprint, Response
+from src.services.metrics import render_metrics
+
+monitoring_bp = Blueprint('monitoring', __name__)
+
+@monitoring_bp.route('/metrics', methods=['GET'])
+def get_metrics():
+    """Expose application metrics in Prometheus text format"""
+    return Response(render_metrics(), mimetype='text/plain; version=0.0.4; charset=utf-8')
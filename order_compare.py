@@ -0,0 +1,191 @@
+"""Server-side comparison of two watch orders of a franchise.
+
+compare_orders() takes two serialized orders (as the /orders routes return
+them) and reports, for the items they share, the position in each order and
+the delta, plus the items only one order has and the longest common
+subsequence: the largest set of items that appear in the same relative
+order in both. Items outside it are the ones that "moved". Every order entry
+is keyed by (item id, occurrence) so the LCS is a longest increasing
+subsequence of b-positions taken in a-order, O(n log n) instead of the
+O(n*m) table.
+
+Results are kept in a ComparisonCache until either order changes: the cache
+subscribes to catalog_events and drops every comparison touching a changed
+order, order entry, or item of the franchise.
+"""
+
+import logging
+import threading
+from collections import OrderedDict
+
+from flask import current_app
+
+from src.services.catalog_events import subscribe
+from src.services.metrics import record_cache, register_gauge
+from src.services.order_ranks import longest_increasing_subsequence
+
+logger = logging.getLogger(__name__)
+
+CACHE_SIZE = 2048
+
+
+def matches(order_id, order_type, wanted):
+    """Whether an order is the one asked for by id or by order type."""
+    return str(order_id) == wanted or order_type == wanted
+
+
+def _keyed(items):
+    """[(item id, occurrence)] for an order's items, so repeated items stay distinct."""
+    seen = {}
+    keys = []
+    for item in items:
+        item_id = str(item['id'])
+        seen[item_id] = seen.get(item_id, 0) + 1
+        keys.append((item_id, seen[item_id]))
+    return keys
+
+
+def _summary(order):
+    return {
+        'id': order.get('id'),
+        'name': order.get('name'),
+        'order_type': order.get('order_type'),
+        'count': len(order.get('items', [])),
+    }
+
+
+def compare_orders(order_a, order_b):
+    """Position deltas, moved and missing items and the LCS of two serialized orders."""
+    items_a, items_b = order_a.get('items', []), order_b.get('items', [])
+    keys_a, keys_b = _keyed(items_a), _keyed(items_b)
+    index_b = {key: index for index, key in enumerate(keys_b)}
+    in_a = set(keys_a)
+    
+    common = [(index_a, index_b[key]) for index_a, key in enumerate(keys_a) if key in index_b]
+    in_lcs = {common[index] for index in longest_increasing_subsequence([index_b for _, index_b in common])}
+    
+    def entry(index_a, index_b):
+        item = items_a[index_a]
+        return {
+            'item_id': item['id'],
+            'title': item.get('title'),
+            'position_a': index_a + 1,
+            'position_b': index_b + 1,
+            'delta': index_b - index_a,
+        }
+    
+    deltas = [entry(index_a, index_b) for index_a, index_b in common]
+    lcs_length = len(in_lcs)
+    longest = max(len(items_a), len(items_b))
+    return {
+        'a': _summary(order_a),
+        'b': _summary(order_b),
+        'common': len(common),
+        'deltas': deltas,
+        'lcs': [delta for delta, pair in zip(deltas, common) if pair in in_lcs],
+        'lcs_length': lcs_length,
+        'moved': [delta for delta, pair in zip(deltas, common) if pair not in in_lcs],
+        'only_in_a': [
+            {'item_id': item['id'], 'title': item.get('title'), 'position': index + 1}
+            for index, (item, key) in enumerate(zip(items_a, keys_a)) if key not in index_b
+        ],
+        'only_in_b': [
+            {'item_id': item['id'], 'title': item.get('title'), 'position': index + 1}
+            for index, (item, key) in enumerate(zip(items_b, keys_b)) if key not in in_a
+        ],
+        'similarity': round(lcs_length / longest, 4) if longest else 1.0,
+    }
+
+
+class ComparisonCache:
+    """LRU of comparison results, invalidated per order and per franchise."""
+    
+    def __init__(self, size=CACHE_SIZE):
+        self.size = size
+        self._lock = threading.Lock()
+        self._results = OrderedDict()   # key -> result
+        self._by_order = {}             # order id -> keys
+        self._by_franchise = {}         # franchise id -> keys
+        self._generation = 0
+    
+    def token(self):
+        """Take before loading the orders; put() drops results computed across a change."""
+        with self._lock:
+            return self._generation
+    
+    def get(self, key):
+        with self._lock:
+            result = self._results.get(key)
+            if result is not None:
+                self._results.move_to_end(key)
+        record_cache('order_compare', result is not None)
+        return result
+    
+    def put(self, key, result, franchise_id, order_ids, token):
+        with self._lock:
+            if token != self._generation:
+                return
+            self._results[key] = result
+            self._results.move_to_end(key)
+            self._by_franchise.setdefault(str(franchise_id), set()).add(key)
+            for order_id in order_ids:
+                self._by_order.setdefault(str(order_id), set()).add(key)
+            while len(self._results) > self.size:
+                self._results.popitem(last=False)
+    
+    def _drop(self, keys):
+        for key in keys or ():
+            self._results.pop(key, None)
+    
+    def apply(self, changes):
+        """catalog_events subscriber."""
+        with self._lock:
+            self._generation += 1
+            for change in changes:
+                row = change.row
+                if change.table == 'order_items':
+                    order_id = row.get('order_id')
+                    if order_id is None:
+                        self._clear()
+                        return
+                    self._drop(self._by_order.pop(str(order_id), None))
+                elif change.table in ('orders', 'items'):
+                    # A renamed, added or deleted order changes what ?a=<type> resolves to
+                    franchise_id = row.get('franchise_id')
+                    if franchise_id is None:
+                        self._clear()
+                        return
+                    self._drop(self._by_franchise.pop(str(franchise_id), None))
+    
+    def _clear(self):
+        self._results.clear()
+        self._by_order.clear()
+        self._by_franchise.clear()
+    
+    def __len__(self):
+        with self._lock:
+            return len(self._results)
+
+
+_active = None
+
+register_gauge('orderof_order_compare_cached', 'Order comparisons held in the cache.',
+               lambda: len(_active) if _active is not None else 0)
+
+
+def init_order_compare(app, size=CACHE_SIZE):
+    """Create the comparison cache and keep it in step with catalog writes."""
+    global _active
+    from src.services.catalog_events import install_session_hooks
+    
+    install_session_hooks()
+    cache = ComparisonCache(size)
+    subscribe(cache.apply, tables=('orders', 'order_items', 'items'))
+    app.extensions['orderof_order_compare'] = cache
+    _active = cache
+    return cache
+
+
+def get_comparison_cache(app=None):
+    """The app's ComparisonCache, or None when comparisons are computed every time."""
+    return (app or current_app).extensions.get('orderof_order_compare')
@@ -0,0 +1,391 @@
+"""Sparse ranks for watch-order entries.
+
+order_items.position holds a sparse rank (multiples of RANK_GAP when an
+order is laid out fresh) instead of a dense 1..n index, so inserting,
+moving or deleting an entry writes one row: the new rank is picked from the
+gap between its neighbours. Only when a gap is used up is the order
+respread, and even then rows already on the new grid are left alone. The
+API keeps showing `position` as the dense 1-based index; the stored value
+is exposed as `rank`.
+
+Every operation is planned the same way (plan_sequence): the entries whose
+ranks are already increasing in the new sequence (a longest increasing
+subsequence) keep their rank, and the rest get ranks between those anchors.
+Deletes are written first and new ranks never reuse a rank held by a
+remaining row, so UNIQUE(order_id, position) holds after every statement
+whatever order the changed rows are written in. apply_sequence() diffs a whole new sequence
+against the stored one the same way and writes only the rows that changed.
+
+Orders written by the sync services with dense positions still work; the
+first insert into a full gap respreads that order once.
+"""
+
+import logging
+from bisect import bisect_left
+
+from src.services.catalog_events import publish_rows
+
+logger = logging.getLogger(__name__)
+
+RANK_GAP = 1024
+
+
+class ReorderError(ValueError):
+    """The requested change does not fit the order (bad position, unknown entry, ...)."""
+
+
+class OrderNotFound(LookupError):
+    pass
+
+
+def longest_increasing_subsequence(values):
+    """Indexes (ascending) of a longest strictly increasing subsequence; None values are skipped."""
+    tails, tail_indexes, previous = [], [], {}
+    for index, value in enumerate(values):
+        if value is None:
+            continue
+        slot = bisect_left(tails, value)
+        previous[index] = tail_indexes[slot - 1] if slot else None
+        if slot == len(tails):
+            tails.append(value)
+            tail_indexes.append(index)
+        else:
+            tails[slot] = value
+            tail_indexes[slot] = index
+    indexes = []
+    index = tail_indexes[-1] if tail_indexes else None
+    while index is not None:
+        indexes.append(index)
+        index = previous[index]
+    return indexes[::-1]
+
+
+def _between(low, high, count, used):
+    """count increasing ranks strictly between low and high (None = open end) avoiding used, or None."""
+    if low is None and high is None:
+        low, high = 0, (count + 1) * RANK_GAP
+    elif low is None:
+        low = high - (count + 1) * RANK_GAP
+    elif high is None:
+        high = low + (count + 1) * RANK_GAP
+    step = (high - low) / (count + 1)
+    ranks = []
+    for number in range(1, count + 1):
+        rank = max(low + round(step * number), ranks[-1] + 1 if ranks else low + 1)
+        while rank in used:
+            rank += 1
+        if rank >= high:
+            return None
+        ranks.append(rank)
+    return ranks
+
+
+def _respread(current_ranks, used):
+    """Fresh grid ranks for the whole sequence that collide with no rank held by another row."""
+    count = len(current_ranks)
+    for offset in [RANK_GAP] + list(range(1, RANK_GAP)):
+        ranks = [offset + number * RANK_GAP for number in range(count)]
+        if all(rank == current or rank not in used for rank, current in zip(ranks, current_ranks)):
+            return ranks
+    base = max(used) + RANK_GAP
+    return [base + number * RANK_GAP for number in range(count)]
+
+
+def plan_ranks(current_ranks):
+    """New ranks for a sequence given each position's current rank (None = new row).
+    
+    Returns (ranks, rebalanced).
+    """
+    used = {rank for rank in current_ranks if rank is not None}
+    anchors = set(longest_increasing_subsequence(current_ranks))
+    ranks = [current_ranks[index] if index in anchors else None for index in range(len(current_ranks))]
+    index = 0
+    while index < len(ranks):
+        if ranks[index] is not None:
+            index += 1
+            continue
+        end = index
+        while end < len(ranks) and ranks[end] is None:
+            end += 1
+        low = ranks[index - 1] if index else None
+        high = ranks[end] if end < len(ranks) else None
+        filled = _between(low, high, end - index, used)
+        if filled is None:
+            return _respread(current_ranks, used), True
+        ranks[index:end] = filled
+        index = end
+    return ranks, False
+
+
+def plan_sequence(current, sequence):
+    """Diff a new sequence against the current entries.
+    
+    current is the stored entries sorted by rank (dicts with id, item_id,
+    rank, notes, ...); sequence is the new order, each element an existing
+    entry dict (possibly with changed fields) or a new row without an id.
+    Entries of current missing from sequence are deleted.
+    """
+    by_id = {entry['id']: entry for entry in current}
+    kept = [entry['id'] for entry in sequence if entry.get('id') is not None]
+    if len(kept) != len(set(kept)):
+        raise ReorderError('An entry appears more than once in the sequence')
+    kept = set(kept)
+    unknown = kept - by_id.keys()
+    if unknown:
+        raise ReorderError(f"Unknown entries: {', '.join(map(str, sorted(unknown, key=str)))}")
+    
+    ranks, rebalanced = plan_ranks([by_id[entry['id']]['rank'] if entry.get('id') is not None else None
+                                    for entry in sequence])
+    plan = {'inserts': [], 'updates': [], 'deletes': [entry['id'] for entry in current if entry['id'] not in kept],
+            'entries': [], 'rebalanced': rebalanced}
+    for entry, rank in zip(sequence, ranks):
+        entry = dict(entry, rank=rank)
+        plan['entries'].append(entry)
+        if entry.get('id') is None:
+            plan['inserts'].append(entry)
+        elif entry != by_id[entry['id']]:
+            plan['updates'].append(entry)
+    return plan
+
+
+def _target_index(entries, position=None, after=None, before=None):
+    """0-based insertion index from a 1-based position or a neighbouring entry id."""
+    ids = [entry['id'] for entry in entries]
+    if after is not None or before is not None:
+        anchor = after if after is not None else before
+        matches = [index for index, entry_id in enumerate(ids) if str(entry_id) == str(anchor)]
+        if not matches:
+            raise ReorderError(f'Unknown entry {anchor}')
+        return matches[0] + 1 if after is not None else matches[0]
+    if position is None:
+        return len(entries)
+    try:
+        position = int(position)
+    except (TypeError, ValueError):
+        raise ReorderError('position must be an integer')
+    if not 1 <= position <= len(entries) + 1:
+        raise ReorderError(f'position must be between 1 and {len(entries) + 1}')
+    return position - 1
+
+
+def _find(entries, entry_id):
+    for index, entry in enumerate(entries):
+        if str(entry['id']) == str(entry_id):
+            return index
+    raise ReorderError(f'Unknown entry {entry_id}')
+
+
+def plan_insert(current, row, **target):
+    index = _target_index(current, **target)
+    plan = plan_sequence(current, current[:index] + [row] + current[index:])
+    plan['index'] = index
+    return plan
+
+
+def plan_move(current, entry_id, changes=None, **target):
+    sequence = list(current)
+    entry = dict(sequence.pop(_find(sequence, entry_id)), **(changes or {}))
+    if any(value is not None for value in target.values()):
+        sequence.insert(_target_index(sequence, **target), entry)
+    else:
+        sequence.insert(_find(current, entry_id), entry)
+    return plan_sequence(current, sequence)
+
+
+def plan_delete(current, entry_id):
+    index = _find(current, entry_id)
+    return plan_sequence(current, current[:index] + current[index + 1:])
+
+
+def sequence_from_items(current, items, fields=('notes', 'is_optional')):
+    """Map an apply-sequence body (item ids or {item_id, notes, ...}) onto the current entries.
+    
+    Each item reuses the first unused current entry for that item, so
+    repeated items keep their rows; items not in the order become new rows.
+    """
+    unused = {}
+    for entry in current:
+        unused.setdefault(str(entry['item_id']), []).append(entry)
+    sequence = []
+    for element in items:
+        if not isinstance(element, dict):
+            element = {'item_id': element}
+        if element.get('item_id') in (None, ''):
+            raise ReorderError('Every entry needs an item_id')
+        changes = {field: element[field] for field in fields if field in element}
+        candidates = unused.get(str(element['item_id']))
+        if candidates:
+            sequence.append(dict(candidates.pop(0), **changes))
+        else:
+            sequence.append(dict(changes, item_id=element['item_id']))
+    return sequence
+
+
+def target_from(data):
+    """position / after / before from a request body."""
+    return {key: data.get(key) for key in ('position', 'after', 'before')}
+
+
+def changes_from(data, fields):
+    """Entry fields (notes, ...) present in a request body."""
+    return {field: data[field] for field in fields if field in data}
+
+
+def serialize_entries(entries):
+    """Entries with the dense 1-based position the API shows and the stored rank."""
+    return [dict(entry, position=position) for position, entry in enumerate(entries, 1)]
+
+
+def summarize(order_id, plan):
+    summary = {
+        'order_id': order_id,
+        'entries': serialize_entries(plan['entries']),
+        'inserted': len(plan['inserts']),
+        'updated': len(plan['updates']),
+        'deleted': len(plan['deletes']),
+        'unchanged': len(plan['entries']) - len(plan['inserts']) - len(plan['updates']),
+        'rebalanced': plan['rebalanced'],
+    }
+    if 'index' in plan:
+        # The entry created by an insert
+        summary['entry'] = summary['entries'][plan['index']]
+    return summary
+
+
+class SqlAlchemyOrderStore:
+    """order_items access for the legacy SQLite models."""
+    
+    fields = ('notes', 'is_optional')
+    
+    def __init__(self, session):
+        from src.models.franchise import Order, OrderItem, Item
+        
+        self.session = session
+        self.Order, self.OrderItem, self.Item = Order, OrderItem, Item
+    
+    def entries(self, order_id):
+        if self.session.get(self.Order, order_id) is None:
+            raise OrderNotFound(order_id)
+        rows = self.session.query(self.OrderItem).filter_by(order_id=order_id).order_by(self.OrderItem.position)
+        return [{
+            'id': row.id,
+            'item_id': row.item_id,
+            'rank': row.position,
+            'notes': row.notes,
+            'is_optional': row.is_optional,
+        } for row in rows]
+    
+    def missing_items(self, item_ids):
+        found = {str(item_id) for item_id, in self.session.query(self.Item.id).filter(self.Item.id.in_(item_ids))}
+        return [item_id for item_id in item_ids if str(item_id) not in found]
+    
+    def to_row(self, order_id, entry):
+        row = {'order_id': order_id, 'item_id': entry['item_id'], 'position': entry['rank']}
+        row.update({field: entry[field] for field in self.fields if field in entry})
+        if entry.get('id') is not None:
+            row['id'] = entry['id']
+        return row
+    
+    def apply(self, order_id, plan):
+        OrderItem = self.OrderItem
+        try:
+            if plan['deletes']:
+                self.session.query(OrderItem).filter(OrderItem.id.in_(plan['deletes'])) \
+                    .delete(synchronize_session=False)
+            if plan['updates']:
+                updates = [self.to_row(order_id, entry) for entry in plan['updates']]
+                self.session.bulk_update_mappings(OrderItem, updates)
+            if plan['inserts']:
+                rows = [self.to_row(order_id, entry) for entry in plan['inserts']]
+                # return_defaults fills in the autoincrement ids
+                self.session.bulk_insert_mappings(OrderItem, rows, return_defaults=True)
+                for entry, row in zip(plan['inserts'], rows):
+                    entry['id'] = row['id']
+            self.session.commit()
+        except Exception:
+            self.session.rollback()
+            raise
+
+
+class SupabaseOrderStore:
+    """order_items access for Supabase."""
+    
+    fields = ('notes',)
+    
+    def __init__(self, client):
+        self.client = client
+    
+    def entries(self, order_id):
+        if not self.client.table('orders').select('id').eq('id', order_id).execute().data:
+            raise OrderNotFound(order_id)
+        rows = self.client.table('order_items').select('id,item_id,position,notes') \
+            .eq('order_id', order_id).order('position').execute().data
+        return [{'id': row['id'], 'item_id': row['item_id'], 'rank': row['position'], 'notes': row.get('notes')}
+                for row in rows]
+    
+    def missing_items(self, item_ids):
+        found = set()
+        for start in range(0, len(item_ids), 200):
+            rows = self.client.table('items').select('id').in_('id', item_ids[start:start + 200]).execute().data
+            found.update(str(row['id']) for row in rows)
+        return [item_id for item_id in item_ids if str(item_id) not in found]
+    
+    def to_row(self, order_id, entry):
+        row = {'order_id': order_id, 'item_id': entry['item_id'], 'position': entry['rank']}
+        row.update({field: entry[field] for field in self.fields if field in entry})
+        if entry.get('id') is not None:
+            row['id'] = entry['id']
+        return row
+    
+    def apply(self, order_id, plan):
+        # Ranks never collide with rows still in place, so the statements
+        # can run one after another without a transaction
+        if plan['deletes']:
+            self.client.table('order_items').delete().in_('id', plan['deletes']).execute()
+        if plan['updates']:
+            updates = [self.to_row(order_id, entry) for entry in plan['updates']]
+            self.client.table('order_items').upsert(updates).execute()
+        if plan['inserts']:
+            created = self.client.table('order_items').insert(
+                [self.to_row(order_id, entry) for entry in plan['inserts']]).execute().data
+            for entry, row in zip(plan['inserts'], created):
+                entry['id'] = row['id']
+
+
+def _run(store, order_id, planner):
+    current = store.entries(order_id)
+    plan = planner(current)
+    new_items = list({str(entry['item_id']) for entry in plan['inserts']})
+    missing = store.missing_items(new_items) if new_items else []
+    if missing:
+        raise ReorderError(f"Unknown items: {', '.join(missing)}")
+    if plan['inserts'] or plan['updates'] or plan['deletes']:
+        store.apply(order_id, plan)
+        _publish(store, order_id, plan)
+    if plan['rebalanced']:
+        logger.info(f"Order {order_id} respread: {len(plan['updates'])} entries re-ranked")
+    return summarize(order_id, plan)
+
+
+def _publish(store, order_id, plan):
+    rows = [store.to_row(order_id, entry) for entry in plan['inserts'] + plan['updates']]
+    publish_rows('order_items', rows)
+    if plan['deletes']:
+        publish_rows('order_items', [{'id': entry_id, 'order_id': order_id} for entry_id in plan['deletes']], 'delete')
+
+
+def insert_entry(store, order_id, row, **target):
+    return _run(store, order_id, lambda current: plan_insert(current, row, **target))
+
+
+def move_entry(store, order_id, entry_id, changes=None, **target):
+    return _run(store, order_id, lambda current: plan_move(current, entry_id, changes, **target))
+
+
+def delete_entry(store, order_id, entry_id):
+    return _run(store, order_id, lambda current: plan_delete(current, entry_id))
+
+
+def apply_sequence(store, order_id, items):
+    return _run(store, order_id, lambda current: plan_sequence(
+        current, sequence_from_items(current, items, store.fields)))
@@ -0,0 +1,23 @@
+from src.models.user import db
+
+class LinkPriceCheck(db.Model):
+    """Price refresh state of an affiliate link: last check, next due check and consecutive failures."""
+    __tablename__ = 'link_price_checks'
+
+    link_id = db.Column(db.String(36), primary_key=True)
+    checked_at = db.Column(db.DateTime)
+    next_check_at = db.Column(db.DateTime, index=True)
+    failures = db.Column(db.Integer, nullable=False, default=0)
+    last_error = db.Column(db.String(255))
+
+    def __repr__(self):
+        return f'<LinkPriceCheck {self.link_id} next={self.next_check_at}>'
+
+    def to_dict(self):
+        return {
+            'link_id': self.link_id,
+            'checked_at': self.checked_at.isoformat() if self.checked_at else None,
+            'next_check_at': self.next_check_at.isoformat() if self.next_check_at else None,
+            'failures': self.failures,
+            'last_error': self.last_error
+        }
@@ -0,0 +1,385 @@
+"""Scheduled affiliate link price refresh.
+
+Each run takes up to BATCH_SIZE links in staleness order: links never
+checked first, then the most overdue. Prices are fetched through the
+adapter registered for each link's platform. Every platform gets its own
+worker pool sized to the adapter's concurrency cap, so a slow or
+rate-limited retailer never holds up the others. Changed prices and the
+check bookkeeping are written back in WRITE_CHUNK_SIZE bulk writes.
+
+A successful check schedules the next one REFRESH_INTERVAL later. A failed
+check backs off exponentially from RETRY_AFTER, never beyond
+REFRESH_INTERVAL. Check state lives in link_price_checks on both backends.
+
+Adapters are configured as "platform=adapter[:concurrency]" pairs
+(PRICE_ADAPTERS), e.g. "amazon_uk=schema_org:2,amazon_us=schema_org:2".
+Links on platforms without an adapter are left alone.
+    
+    stub        deterministic prices without network access (tests, benchmarks)
+    schema_org  the product page's schema.org Offer (JSON-LD) or price meta tags
+"""
+
+import hashlib
+import json
+import logging
+import random
+import re
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime, timedelta
+from decimal import Decimal, InvalidOperation
+
+import requests
+
+from src.services.batching import MAX_ERROR_LENGTH, chunks
+from src.services.catalog_events import publish_rows
+from src.services.metrics import record_outbound
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = 500
+WRITE_CHUNK_SIZE = 500
+REFRESH_INTERVAL = timedelta(hours=24)
+RETRY_AFTER = timedelta(minutes=30)
+DEFAULT_CONCURRENCY = 4
+FETCH_TIMEOUT = 15
+
+# price is None when the retailer lists the product as unavailable
+PriceQuote = namedtuple('PriceQuote', 'price currency')
+
+
+class PriceFetchError(Exception):
+    """The adapter could not determine a price for the link."""
+
+
+class PriceAdapter:
+    """Fetches current prices for links on one or more platforms; fetch() may run in several threads."""
+    
+    def __init__(self, concurrency=DEFAULT_CONCURRENCY):
+        self.concurrency = concurrency
+    
+    def fetch(self, link):
+        """PriceQuote for a link mapping (id, url, platform, price, currency); raises PriceFetchError."""
+        raise NotImplementedError
+
+
+class StubPriceAdapter(PriceAdapter):
+    """Deterministic prices derived from the link URL, with optional latency and failures."""
+    
+    def __init__(self, concurrency=DEFAULT_CONCURRENCY, latency=0.0, failure_rate=0.0, currency='GBP',
+                 prices=None, seed=None):
+        super().__init__(concurrency)
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self.currency = currency
+        # url -> price (None = unavailable) overrides
+        self.prices = dict(prices or {})
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.calls = 0
+        self.in_flight = 0
+        self.peak = 0
+    
+    def fetch(self, link):
+        with self.lock:
+            self.calls += 1
+            self.in_flight += 1
+            self.peak = max(self.peak, self.in_flight)
+            failed = self.random.random() < self.failure_rate
+        try:
+            if self.latency:
+                time.sleep(self.latency)
+            if failed:
+                raise PriceFetchError('Injected failure')
+            url = link['url']
+            if url in self.prices:
+                price = self.prices[url]
+                return PriceQuote(None if price is None else Decimal(str(price)), self.currency)
+            cents = 499 + int(hashlib.sha1(url.encode()).hexdigest()[:8], 16) % 5000
+            return PriceQuote(Decimal(cents) / 100, self.currency)
+        finally:
+            with self.lock:
+                self.in_flight -= 1
+
+
+class SchemaOrgPriceAdapter(PriceAdapter):
+    """Read the price from the product page: schema.org Offer JSON-LD, then price meta tags."""
+    
+    LD_JSON = re.compile(r'<script[^>]+application/ld\+json[^>]*>(.*?)</script>', re.S | re.I)
+    META = re.compile(r'<meta[^>]+(?:property|name)=["\'](?:product|og):price:(amount|currency)["\'][^>]*>', re.I)
+    CONTENT = re.compile(r'content=["\']([^"\']+)["\']', re.I)
+    
+    def fetch(self, link):
+        started = time.perf_counter()
+        status = 'error'
+        try:
+            response = requests.get(link['url'], timeout=FETCH_TIMEOUT,
+                                    headers={'User-Agent': 'OrderOfPriceBot/1.0', 'Accept': 'text/html'})
+            status = response.status_code
+            if status != 200:
+                raise PriceFetchError(f'Product page returned {status}')
+            html = response.text
+        except requests.exceptions.RequestException as e:
+            raise PriceFetchError(f'Product page unreachable: {e}')
+        finally:
+            record_outbound(link['platform'], status, time.perf_counter() - started)
+        
+        for block in self.LD_JSON.findall(html):
+            try:
+                quote = self._offer(json.loads(block))
+            except ValueError:
+                continue
+            if quote is not None:
+                return quote
+        
+        meta = {}
+        for tag in self.META.finditer(html):
+            content = self.CONTENT.search(tag.group(0))
+            if content:
+                meta[tag.group(1).lower()] = content.group(1)
+        if 'amount' in meta:
+            return PriceQuote(_decimal(meta['amount']), meta.get('currency', link.get('currency')))
+        raise PriceFetchError('No price found on product page')
+    
+    def _offer(self, data):
+        """First schema.org Offer price in a JSON-LD document, or None."""
+        if isinstance(data, list):
+            for entry in data:
+                quote = self._offer(entry)
+                if quote is not None:
+                    return quote
+            return None
+        if not isinstance(data, dict):
+            return None
+        if '@graph' in data:
+            return self._offer(data['@graph'])
+        offers = data.get('offers')
+        if offers is None:
+            return None
+        for offer in offers if isinstance(offers, list) else [offers]:
+            if not isinstance(offer, dict):
+                continue
+            price = offer.get('price', offer.get('lowPrice'))
+            if price is None:
+                continue
+            if 'OutOfStock' in str(offer.get('availability', '')):
+                return PriceQuote(None, offer.get('priceCurrency'))
+            return PriceQuote(_decimal(price), offer.get('priceCurrency'))
+        return None
+
+
+ADAPTER_TYPES = {'stub': StubPriceAdapter, 'schema_org': SchemaOrgPriceAdapter}
+
+
+def _decimal(value):
+    text = str(value).strip()
+    if re.fullmatch(r'[^,]*,\d{2}', text):
+        # A lone comma before two digits is a decimal comma ("12,99", "1.299,99")
+        text = text.replace('.', '').replace(',', '.')
+    elif re.fullmatch(r'\d{1,3}(,\d{3})+(\.\d*)?', text):
+        # Otherwise commas may only group thousands ("1,299.50"); anything else fails below
+        text = text.replace(',', '')
+    try:
+        return Decimal(text).quantize(Decimal('0.01'))
+    except InvalidOperation:
+        raise PriceFetchError(f'Unparseable price: {value}')
+
+
+def configure_adapters(spec):
+    """{platform: adapter} from "platform=adapter[:concurrency],..."."""
+    adapters = {}
+    for entry in filter(None, (part.strip() for part in (spec or '').split(','))):
+        platform, _, name = entry.partition('=')
+        name, _, concurrency = name.strip().partition(':')
+        if name not in ADAPTER_TYPES:
+            raise ValueError(f'Unknown price adapter for {platform}: {name}')
+        adapters[platform.strip()] = ADAPTER_TYPES[name](concurrency=int(concurrency or DEFAULT_CONCURRENCY))
+    return adapters
+
+
+def _check(link_id, now, failures=0, error=None):
+    """link_price_checks row: due again after REFRESH_INTERVAL, or after a backoff on failure."""
+    delay = REFRESH_INTERVAL if not failures else min(REFRESH_INTERVAL, RETRY_AFTER * 2 ** (failures - 1))
+    return {
+        'link_id': link_id,
+        'checked_at': now,
+        'next_check_at': now + delay,
+        'failures': failures,
+        'last_error': error[:MAX_ERROR_LENGTH] if error else None,
+    }
+
+
+def _changed(link, quote):
+    current = link.get('price')
+    current = None if current is None else Decimal(str(current)).quantize(Decimal('0.01'))
+    if current != quote.price:
+        return True
+    return quote.currency is not None and quote.currency != link.get('currency')
+
+
+def refresh_prices(store, adapters, batch_size=BATCH_SIZE, now=None):
+    """Check the stalest batch_size links with their platform's adapter and write changes back."""
+    now = now or datetime.utcnow()
+    started = time.perf_counter()
+    links = store.due_links(list(adapters), batch_size, now)
+    by_platform = {}
+    for link in links:
+        by_platform.setdefault(link['platform'], []).append(link)
+    
+    report = {'checked': len(links), 'changed': 0, 'unchanged': 0, 'failed': 0, 'platforms': {}, 'errors': []}
+    prices, checks = [], []
+    pools = {platform: ThreadPoolExecutor(max_workers=adapters[platform].concurrency,
+                                          thread_name_prefix=f'price-{platform}')
+             for platform in by_platform}
+    try:
+        futures = {pools[platform].submit(adapters[platform].fetch, link): link
+                   for platform, platform_links in by_platform.items() for link in platform_links}
+        for future in as_completed(futures):
+            link = futures[future]
+            stats = report['platforms'].setdefault(link['platform'],
+                                                   {'checked': 0, 'changed': 0, 'failed': 0})
+            stats['checked'] += 1
+            try:
+                quote = future.result()
+            except Exception as e:
+                error = str(e) if isinstance(e, PriceFetchError) else f'{type(e).__name__}: {e}'
+                failures = (link.get('failures') or 0) + 1
+                checks.append(_check(link['id'], now, failures, error))
+                report['failed'] += 1
+                stats['failed'] += 1
+                report['errors'].append({'link_id': link['id'], 'platform': link['platform'], 'error': error})
+                continue
+            checks.append(_check(link['id'], now))
+            if _changed(link, quote):
+                prices.append({
+                    'id': link['id'],
+                    'item_id': link['item_id'],
+                    'price': None if quote.price is None else float(quote.price),
+                    'currency': quote.currency or link.get('currency'),
+                })
+                report['changed'] += 1
+                stats['changed'] += 1
+            else:
+                report['unchanged'] += 1
+    finally:
+        for pool in pools.values():
+            pool.shutdown(wait=True)
+    
+    prices_by_link = {price['id']: price for price in prices}
+    for chunk in chunks(checks, WRITE_CHUNK_SIZE):
+        changed = [prices_by_link[check['link_id']] for check in chunk if check['link_id'] in prices_by_link]
+        store.write(changed, chunk)
+        publish_rows('affiliate_links', changed)
+    
+    report['seconds'] = round(time.perf_counter() - started, 3)
+    logger.info(f"Prices refreshed: { {key: value for key, value in report.items() if key != 'errors'} }")
+    return report
+
+
+class SqlAlchemyPriceStore:
+    """Due links and bulk write-back through the legacy SQLAlchemy models."""
+    
+    def __init__(self, session):
+        self.session = session
+    
+    def due_links(self, platforms, limit, now):
+        from src.models.franchise import AffiliateLink
+        from src.models.price_check import LinkPriceCheck
+        
+        if not platforms:
+            return []
+        rows = self.session.query(AffiliateLink, LinkPriceCheck.failures).outerjoin(
+            LinkPriceCheck, LinkPriceCheck.link_id == AffiliateLink.id
+        ).filter(
+            AffiliateLink.is_active == True,
+            AffiliateLink.platform.in_(platforms),
+            (LinkPriceCheck.next_check_at == None) | (LinkPriceCheck.next_check_at <= now)
+        ).order_by(
+            LinkPriceCheck.next_check_at.asc().nullsfirst(), AffiliateLink.id
+        ).limit(limit).all()
+        return [{
+            'id': link.id,
+            'item_id': link.item_id,
+            'platform': link.platform,
+            'url': link.url,
+            'price': link.price,
+            'currency': link.currency,
+            'failures': failures or 0,
+        } for link, failures in rows]
+    
+    def write(self, prices, checks):
+        from src.models.franchise import AffiliateLink
+        from src.models.price_check import LinkPriceCheck
+        
+        try:
+            if prices:
+                self.session.bulk_update_mappings(AffiliateLink, [
+                    {'id': price['id'], 'price': price['price'], 'currency': price['currency']}
+                    for price in prices
+                ])
+            ids = [check['link_id'] for check in checks]
+            existing = {link_id for link_id, in self.session.query(LinkPriceCheck.link_id).filter(
+                LinkPriceCheck.link_id.in_(ids))}
+            self.session.bulk_update_mappings(LinkPriceCheck, [check for check in checks
+                                                               if check['link_id'] in existing])
+            self.session.bulk_insert_mappings(LinkPriceCheck, [check for check in checks
+                                                               if check['link_id'] not in existing])
+            self.session.commit()
+        except Exception:
+            self.session.rollback()
+            raise
+
+
+class SupabasePriceStore:
+    """Due links and bulk write-back through SupabaseService (price rpcs)."""
+    
+    def __init__(self, service):
+        self.service = service
+    
+    def due_links(self, platforms, limit, now):
+        if not platforms:
+            return []
+        return self.service.get_due_affiliate_links(platforms, limit, now.isoformat())
+    
+    def write(self, prices, checks):
+        self.service.apply_affiliate_prices(prices, [
+            dict(check, checked_at=check['checked_at'].isoformat(),
+                 next_check_at=check['next_check_at'].isoformat())
+            for check in checks
+        ])
+
+
+def init_price_refresh(app, supabase_service=None):
+    """Refresh due prices every PRICE_REFRESH_SECONDS in a daemon thread (0 disables the schedule)."""
+    adapters = configure_adapters(app.config.get('PRICE_ADAPTERS'))
+    app.extensions['orderof_price_adapters'] = adapters
+    interval = float(app.config.get('PRICE_REFRESH_SECONDS', 0))
+    if not adapters or interval <= 0:
+        return None
+    
+    def refresh_forever():
+        while True:
+            time.sleep(interval)
+            try:
+                if supabase_service is not None:
+                    refresh_prices(SupabasePriceStore(supabase_service), adapters)
+                else:
+                    from src.models.user import db
+                    with app.app_context():
+                        refresh_prices(SqlAlchemyPriceStore(db.session), adapters)
+                        db.session.remove()
+            except Exception as e:
+                logger.warning(f"Price refresh failed, will retry: {e}")
+    
+    thread = threading.Thread(target=refresh_forever, name='price-refresh', daemon=True)
+    thread.start()
+    return thread
+
+
+def get_price_adapters(app=None):
+    """The app's configured {platform: adapter}."""
+    from flask import current_app
+    
+    return (app or current_app).extensions.get('orderof_price_adapters', {})
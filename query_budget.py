@@ -0,0 +1,206 @@
+"""Per-request query budgets and N+1 detection.
+
+Every SQL statement (via SQLAlchemy engine events) and every Supabase query
+(via CountingSupabaseClient) issued while handling a request is recorded with
+a normalized "shape". After the request the total is checked against the
+budget declared on the view with @query_budget, and shapes that repeat more
+than QUERY_REPEAT_THRESHOLD times are reported as likely N+1 loops.
+
+QUERY_BUDGET_MODE controls enforcement:
+    off     -- nothing is recorded (default)
+    warn    -- violations are logged and exposed in X-Query-* headers
+    strict  -- violations raise QueryBudgetExceeded (tests and staging)
+"""
+
+import re
+import logging
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from flask import current_app, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_REPEAT_THRESHOLD = 5
+
+_active_log = ContextVar('orderof_query_log', default=None)
+
+_IN_LIST = re.compile(r'\bIN\s*\((?:[^()]|\([^()]*\))*\)', re.IGNORECASE)
+_STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_LITERAL = re.compile(r'\b\d+(?:\.\d+)?\b')
+_WHITESPACE = re.compile(r'\s+')
+
+
+class QueryBudgetExceeded(Exception):
+    """Raised in strict mode when a request issues more queries than allowed."""
+
+    def __init__(self, endpoint, budget, log):
+        self.endpoint = endpoint
+        self.budget = budget
+        self.log = log
+        super().__init__(
+            f"{endpoint} issued {log.total} queries (budget {budget}); "
+            f"most repeated: {log.repeated(1)[:3]}"
+        )
+
+
+class QueryLog:
+    """Query counts and shapes recorded for one request."""
+
+    def __init__(self):
+        self.shapes = Counter()
+        self.by_backend = Counter()
+
+    @property
+    def total(self):
+        return sum(self.by_backend.values())
+
+    def record(self, backend, shape):
+        self.by_backend[backend] += 1
+        self.shapes[(backend, shape)] += 1
+
+    def repeated(self, threshold=DEFAULT_REPEAT_THRESHOLD):
+        """Shapes issued more than threshold times, most frequent first."""
+        return [(backend, shape, count) for (backend, shape), count in self.shapes.most_common()
+                if count > threshold]
+
+
+def normalize_sql(statement):
+    """Reduce a SQL statement to its shape (literals and IN lists collapsed)."""
+    shape = _IN_LIST.sub('IN (?)', statement)
+    shape = _STRING_LITERAL.sub('?', shape)
+    shape = _NUMBER_LITERAL.sub('?', shape)
+    return _WHITESPACE.sub(' ', shape).strip()
+
+
+def record_query(backend, shape):
+    log = _active_log.get()
+    if log is not None:
+        log.record(backend, shape)
+
+
+@contextmanager
+def capture_queries():
+    """Record queries issued inside the block, e.g. from a test."""
+    log = QueryLog()
+    token = _active_log.set(log)
+    try:
+        yield log
+    finally:
+        _active_log.reset(token)
+
+
+def query_budget(max_queries):
+    """Declare the maximum number of queries a view may issue per request."""
+    def decorator(view):
+        view.query_budget = max_queries
+        return view
+    return decorator
+
+
+class _CountingQuery:
+    """Proxy around a postgrest request builder that records on execute()."""
+
+    def __init__(self, builder, shape):
+        self._builder = builder
+        self._shape = shape
+
+    def __getattr__(self, name):
+        attr = getattr(self._builder, name)
+        if not callable(attr):
+            return attr
+
+        def call(*args, **kwargs):
+            if name == 'execute':
+                record_query('supabase', self._shape)
+                return attr(*args, **kwargs)
+            result = attr(*args, **kwargs)
+            # Filters keep the column name but drop the value
+            detail = args[0] if args and isinstance(args[0], str) and name != 'select' else ''
+            if name == 'select':
+                detail = _WHITESPACE.sub('', ','.join(a for a in args if isinstance(a, str)))
+            return _CountingQuery(result, f"{self._shape}.{name}({detail})")
+        return call
+
+
+class CountingSupabaseClient:
+    """Wrap a Supabase client so every executed query is recorded."""
+
+    def __init__(self, client):
+        self._client = client
+
+    def table(self, name):
+        return _CountingQuery(self._client.table(name), name)
+
+    def from_(self, name):
+        return self.table(name)
+
+    def rpc(self, fn, params=None, *args, **kwargs):
+        return _CountingQuery(self._client.rpc(fn, params or {}, *args, **kwargs), f"rpc:{fn}")
+
+    def __getattr__(self, name):
+        return getattr(self._client, name)
+
+
+def instrument_supabase(service):
+    """Route a SupabaseService (or AsyncSupabaseService) through the counter."""
+    if hasattr(service, 'client_wrapper'):
+        service.client_wrapper = CountingSupabaseClient
+    elif not isinstance(service.client, CountingSupabaseClient):
+        service.client = CountingSupabaseClient(service.client)
+    return service
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    record_query(conn.dialect.name, normalize_sql(statement))
+
+
+def init_query_guard(app, supabase_services=()):
+    """Enable query recording and budget checks according to QUERY_BUDGET_MODE."""
+    mode = app.config.setdefault('QUERY_BUDGET_MODE', 'off')
+    app.config.setdefault('QUERY_REPEAT_THRESHOLD', DEFAULT_REPEAT_THRESHOLD)
+    if mode == 'off':
+        return
+
+    if not event.contains(Engine, 'before_cursor_execute', _before_cursor_execute):
+        event.listen(Engine, 'before_cursor_execute', _before_cursor_execute)
+    for service in supabase_services:
+        instrument_supabase(service)
+
+    @app.before_request
+    def _start_query_log():
+        request.environ['orderof.query_log_token'] = _active_log.set(QueryLog())
+
+    @app.after_request
+    def _check_query_budget(response):
+        log = _active_log.get()
+        if log is None:
+            return response
+
+        view = current_app.view_functions.get(request.endpoint)
+        budget = getattr(view, 'query_budget', None)
+        threshold = current_app.config['QUERY_REPEAT_THRESHOLD']
+        repeated = log.repeated(threshold)
+
+        response.headers['X-Query-Count'] = str(log.total)
+        if budget is not None:
+            response.headers['X-Query-Budget'] = str(budget)
+        for backend, shape, count in repeated:
+            logger.warning(f"Possible N+1 in {request.endpoint}: {count}x [{backend}] {shape}")
+
+        if budget is not None and log.total > budget:
+            if current_app.config['QUERY_BUDGET_MODE'] == 'strict':
+                raise QueryBudgetExceeded(request.endpoint, budget, log)
+            logger.warning(f"{request.endpoint} issued {log.total} queries (budget {budget})")
+        return response
+
+    @app.teardown_request
+    def _end_query_log(exc):
+        token = request.environ.pop('orderof.query_log_token', None)
+        if token is not None:
+            try:
+                _active_log.reset(token)
+            except ValueError:
+                _active_log.set(None)
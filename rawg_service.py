@@ -1,148 +1,392 @@
 import requests
+import threading
+import time
+import os
+from collections import OrderedDict
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 from datetime import datetime
+from itertools import chain, islice
+from urllib.parse import parse_qs, urlsplit
 from src.models.franchise import db, Franchise, Item, Order, OrderItem
+from src.services.batching import chunks
+from src.services.catalog_events import publish_rows
+from src.services.entity_resolution import EntityIndex, load_franchise_index, merge_into
+from src.services.metrics import record_cache, record_outbound, register_gauge
+from src.services.order_ranks import RANK_GAP
+from src.services.sync_runs import Checkpoint
+
+# Retries for 429 Too Many Requests, honouring Retry-After (capped)
+MAX_RATE_LIMIT_RETRIES = 3
+MAX_RETRY_AFTER = 10
+
+# Largest page RAWG serves
+RAWG_PAGE_SIZE = 40
+# A series search stops after this many non-matching results in a row
+SERIES_MISS_LIMIT = RAWG_PAGE_SIZE
+# Upper bound on the games a franchise sync takes from one search or crawl
+MAX_SERIES_GAMES = 500
+# Best name matches from the search that seed the game-series crawl
+SERIES_SEEDS = 3
+# game-series requests in flight during a crawl
+SERIES_CRAWL_CONCURRENCY = 6
+# Cached game-series neighbor lists, kept a day so new releases show up
+SERIES_CACHE_SIZE = 5000
+SERIES_CACHE_TTL = 24 * 60 * 60
+
+def misses_in_a_row(matches, limit):
+    """Stop predicate for iter_games: true once limit games in a row fail matches(game)"""
+    misses = 0
+    
+    def stop(game):
+        nonlocal misses
+        misses = 0 if matches(game) else misses + 1
+        return misses >= limit
+    return stop
+
+def name_matches(series_name):
+    """Whether a game's name contains the series name (case-insensitive)"""
+    wanted = series_name.lower()
+    return lambda game: wanted in (game.get('name') or '').lower()
+
+class PageUnavailable(Exception):
+    """A page after the first could not be fetched, so a stream of pages would end short"""
+
+class NeighborCache:
+    """LRU of game id -> games listed by games/{id}/game-series, shared by every RAWGService"""
+    
+    def __init__(self, size=SERIES_CACHE_SIZE, ttl=SERIES_CACHE_TTL):
+        self.size = size
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()   # game id -> (stored at, games)
+    
+    def get(self, game_id):
+        with self._lock:
+            entry = self._entries.get(game_id)
+            if entry is not None and time.monotonic() - entry[0] > self.ttl:
+                del self._entries[game_id]
+                entry = None
+            if entry is not None:
+                self._entries.move_to_end(game_id)
+        record_cache('rawg_series', entry is not None)
+        return entry[1] if entry is not None else None
+    
+    def put(self, game_id, games):
+        with self._lock:
+            self._entries[game_id] = (time.monotonic(), games)
+            self._entries.move_to_end(game_id)
+            while len(self._entries) > self.size:
+                self._entries.popitem(last=False)
+    
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+    
+    def __len__(self):
+        with self._lock:
+            return len(self._entries)
+
+series_neighbors = NeighborCache()
+
+register_gauge('orderof_rawg_series_cached', 'Games whose RAWG game-series neighbors are cached.',
+               lambda: len(series_neighbors))
 
 class RAWGService:
     def __init__(self):
-        self.api_key = "e27f4f6149ec4c358472cfd6913e6d85"
-        self.base_url = "https://api.rawg.io/api"
+        self.api_key = os.environ.get('RAWG_API_KEY', "e27f4f6149ec4c358472cfd6913e6d85")
+        # Overridable so syncs can run against the local API stub server
+        self.base_url = os.environ.get('RAWG_BASE_URL', "https://api.rawg.io/api")
+        # franchise id -> EntityIndex, loaded on first use in a sync
+        self._entity_indexes = {}
     
     def _make_request(self, endpoint, params=None):
         """Make a request to RAWG API"""
         if params is None:
             params = {}
         params['key'] = self.api_key
+        return self._get(f"{self.base_url}/{endpoint}", params)
+    
+    def _follow(self, url):
+        """Fetch a `next` page link, adding the key only when the link lacks it"""
+        has_key = 'key' in parse_qs(urlsplit(url).query)
+        return self._get(url, None if has_key else {'key': self.api_key})
+    
+    def _get(self, url, params):
+        for attempt in range(MAX_RATE_LIMIT_RETRIES + 1):
+            started = time.perf_counter()
+            status = 'error'
+            try:
+                response = requests.get(url, params=params)
+                status = response.status_code
+                if status == 429 and attempt < MAX_RATE_LIMIT_RETRIES:
+                    retry_after = response.headers.get('Retry-After', '1')
+                    delay = float(retry_after) if retry_after.replace('.', '', 1).isdigit() else 1.0
+                    time.sleep(min(delay, MAX_RETRY_AFTER))
+                    continue
+                response.raise_for_status()
+                return response.json()
+            except requests.exceptions.RequestException as e:
+                print(f"RAWG API error: {e}")
+                return None
+            finally:
+                record_outbound('rawg', status, time.perf_counter() - started)
+    
+    def iter_pages(self, endpoint, params=None, limit=None):
+        """Yield result pages, following `next` links
         
+        The following page is fetched in the background while the caller
+        works on the current one, so at most two pages are held at a time,
+        and none past the page that brings the results up to limit.
+        Closing the generator early stops the paging. A failed first page
+        yields nothing; a failed later page raises PageUnavailable instead
+        of ending the stream short.
+        """
+        params = dict(params or {})
+        params.setdefault('page_size', RAWG_PAGE_SIZE)
+        pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix='rawg-prefetch')
+        pending = pool.submit(self._make_request, endpoint, params)
+        pages = results = 0
         try:
-            response = requests.get(f"{self.base_url}/{endpoint}", params=params)
-            response.raise_for_status()
-            return response.json()
-        except requests.exceptions.RequestException as e:
-            print(f"RAWG API error: {e}")
-            return None
+            while pending is not None:
+                page = pending.result()
+                if not page:
+                    if pages:
+                        raise PageUnavailable(f"RAWG {endpoint}: page {pages + 1} could not be fetched")
+                    return
+                pages += 1
+                results += len(page.get('results', []))
+                next_url = page.get('next') if limit is None or results < limit else None
+                pending = pool.submit(self._follow, next_url) if next_url else None
+                yield page
+        finally:
+            if pending is not None:
+                pending.cancel()
+            pool.shutdown(wait=False)
+    
+    def iter_games(self, endpoint="games", params=None, stop=None, limit=None):
+        """Yield games across every page until stop(game) is true or limit games were yielded"""
+        yielded = 0
+        for page in self.iter_pages(endpoint, params, limit):
+            for game in page.get('results', []):
+                if (limit is not None and yielded >= limit) or (stop is not None and stop(game)):
+                    return
+                yielded += 1
+                yield game
     
     def search_games(self, query):
-        """Search for games by title"""
+        """Search for games by title (first page)"""
         return self._make_request("games", {"search": query})
     
+    def iter_search_games(self, query, stop=None, limit=None):
+        """Stream every search result for query, best matches first"""
+        return self.iter_games("games", {"search": query}, stop=stop, limit=limit)
+    
+    def iter_game_series(self, series_name, limit=MAX_SERIES_GAMES):
+        """Stream the games of a series
+        
+        The best SERIES_SEEDS name matches of the search seed a crawl of
+        RAWG's game-series relations, which finds renamed entries and leaves
+        out titles that merely share the name. When RAWG links none of the
+        seeds to other games, falls back to every search result named after
+        the series, until the search runs SERIES_MISS_LIMIT results past the
+        last match.
+        """
+        matches = name_matches(series_name)
+        games = self.iter_search_games(series_name, stop=misses_in_a_row(matches, SERIES_MISS_LIMIT))
+        named = (game for game in games if matches(game))
+        seeds = list(islice(named, SERIES_SEEDS))
+        if not seeds:
+            return iter(())
+        series = self.crawl_game_series(seeds, max_games=limit)
+        if len(series) > len(seeds):
+            games.close()
+            return iter(sorted(series.values(), key=lambda game: (game.get('released') or '9999', game['id'])))
+        return chain(seeds, islice(named, limit - len(seeds)))
+    
+    def get_series_neighbors(self, game_id):
+        """Games RAWG lists in the same series as game_id (every page, cached)"""
+        games = series_neighbors.get(game_id)
+        if games is None:
+            pages = list(self.iter_pages(f"games/{game_id}/game-series"))
+            if not pages:
+                # Failed request: nothing to cache, the next crawl asks again
+                return []
+            games = [game for page in pages for game in page.get('results', [])]
+            series_neighbors.put(game_id, games)
+        return games
+    
+    def crawl_game_series(self, seeds, concurrency=SERIES_CRAWL_CONCURRENCY, max_games=MAX_SERIES_GAMES):
+        """{game id: game} of everything reachable from seeds through game-series relations
+        
+        RAWG usually lists a whole series under each of its games, so the
+        games one neighbor list finds are probed one at a time: while a
+        probe turns up new games the next one is requested too, and once a
+        probe adds nothing the rest of that list is taken as already
+        covered. Each game's neighbors are requested at most once per crawl
+        (and served from the neighbor cache across crawls); the crawl stops
+        growing at max_games.
+        """
+        games = {}
+        for game in seeds:
+            games.setdefault(game['id'], game)
+        requested = set()
+        pending = {}    # future -> iterator over the rest of the list its game came from (None for seeds)
+        with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix='rawg-series') as pool:
+            def request(game_id, siblings):
+                requested.add(game_id)
+                pending[pool.submit(self.get_series_neighbors, game_id)] = siblings
+            
+            def probe(siblings):
+                for game_id in siblings:
+                    if game_id not in requested:
+                        request(game_id, siblings)
+                        return
+            
+            for game_id in list(games):
+                request(game_id, None)
+            while pending:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    siblings = pending.pop(future)
+                    neighbors = future.result()
+                    found = []
+                    for game in neighbors:
+                        if game['id'] not in games and len(games) < max_games:
+                            games[game['id']] = game
+                            found.append(game['id'])
+                    if len(games) >= max_games:
+                        continue
+                    if found:
+                        probe(iter(found))
+                    # An empty list is a failed request, which says nothing about the siblings
+                    if siblings is not None and (found or not neighbors):
+                        probe(siblings)
+        return games
+    
     def get_game_details(self, game_id):
         """Get detailed information about a game"""
         return self._make_request(f"games/{game_id}")
     
-    def get_game_series(self, series_name):
+    def get_game_series(self, series_name, limit=MAX_SERIES_GAMES):
         """Get games in a series"""
-        # RAWG doesn't have a direct series endpoint, so we search and filter
-        search_results = self.search_games(series_name)
-        if not search_results:
-            return None
-        
-        # Filter results to find games that likely belong to the series
-        series_games = []
-        for game in search_results.get('results', []):
-            if series_name.lower() in game.get('name', '').lower():
-                series_games.append(game)
-        
-        return {'results': series_games}
+        # RAWG doesn't have a direct series endpoint, so we search every page and filter
+        return {'results': list(self.iter_game_series(series_name, limit))}
     
-    def sync_game_franchise(self, franchise_name, franchise_id):
-        """Sync a game franchise from RAWG"""
+    def sync_game_franchise(self, franchise_name, franchise_id, checkpoint=None):
+        """Sync a game franchise from RAWG
+        
+        Every page of the series search is streamed: each page's games are
+        bulk-inserted as it arrives and only (release date, item id) pairs are
+        kept for the release order, so memory stays around one page however
+        long the series is. Those pairs go into the checkpoint with the items,
+        so a resumed sync builds the order without searching again.
+        """
+        checkpoint = checkpoint or Checkpoint()
         try:
-            # Search for games in the franchise
-            search_results = self.get_game_series(franchise_name)
-            if not search_results or not search_results.get('results'):
-                # Fallback to regular search
-                search_results = self.search_games(franchise_name)
-            
-            if not search_results or not search_results.get('results'):
-                return False
-            
-            games = search_results['results'][:10]  # Limit to first 10 results
-            
-            # Create items for each game
-            for game in games:
-                self._create_game_item(game, franchise_id)
+            created = {'items': [], 'order_items': []}
+            if not checkpoint.reached('items'):
+                releases = []
+                for games in chunks(self.iter_game_series(franchise_name), RAWG_PAGE_SIZE):
+                    releases.extend(self._bulk_create_games(games, franchise_id, created))
+                
+                if not releases:
+                    # Fallback to regular search
+                    search_results = self.search_games(franchise_name)
+                    if not search_results or not search_results.get('results'):
+                        return False
+                    releases = self._bulk_create_games(search_results['results'][:10], franchise_id, created)
+                
+                db.session.commit()
+                checkpoint.reach('items', releases=[(release_date.isoformat() if release_date else None, item_id)
+                                                    for release_date, item_id in releases])
+            releases = [(self._parse_release(release_date), item_id)
+                        for release_date, item_id in checkpoint.state['releases']]
             
             # Create release order
-            self._create_game_release_order(games, franchise_id)
+            self._fill_release_order(releases, franchise_id, created)
             
             db.session.commit()
+            for table, rows in created.items():
+                publish_rows(table, rows)
+            checkpoint.reach('order')
             return True
             
         except Exception as e:
             print(f"Error syncing game franchise: {e}")
             db.session.rollback()
+            checkpoint.error = str(e)
             return False
     
-    def _create_game_item(self, game_data, franchise_id):
-        """Create an Item from game data"""
+    def _game_row(self, game_data, franchise_id):
+        """Item row for a game from a search or list result"""
+        return {
+            'franchise_id': franchise_id,
+            'title': game_data.get('name', ''),
+            'slug': game_data.get('slug', ''),
+            'description': game_data.get('description_raw', ''),
+            'release_date': self._parse_release(game_data.get('released')),
+            'image_url': game_data.get('background_image'),
+            'external_id': str(game_data['id']),
+            'api_metadata': {
+                'rawg_id': game_data['id'],
+                'rating': game_data.get('rating'),
+                'rating_top': game_data.get('rating_top'),
+                'ratings_count': game_data.get('ratings_count'),
+                'metacritic': game_data.get('metacritic'),
+                'platforms': [p['platform']['name'] for p in game_data.get('platforms') or []],
+                'genres': [g['name'] for g in game_data.get('genres') or []]
+            }
+        }
+    
+    @staticmethod
+    def _parse_release(value):
         try:
-            # Check if item already exists
-            existing = Item.query.filter_by(
-                franchise_id=franchise_id,
-                external_id=str(game_data['id'])
-            ).first()
-            
-            if existing:
-                return existing
-            
-            release_date = None
-            if game_data.get('released'):
-                try:
-                    release_date = datetime.strptime(game_data['released'], '%Y-%m-%d').date()
-                except ValueError:
-                    pass
-            
-            # Get platforms
-            platforms = []
-            if game_data.get('platforms'):
-                platforms = [p['platform']['name'] for p in game_data['platforms']]
-            
-            # Get genres
-            genres = []
-            if game_data.get('genres'):
-                genres = [g['name'] for g in game_data['genres']]
-            
-            item = Item(
-                franchise_id=franchise_id,
-                title=game_data.get('name', ''),
-                slug=game_data.get('slug', ''),
-                description=game_data.get('description_raw', ''),
-                release_date=release_date,
-                image_url=game_data.get('background_image'),
-                external_id=str(game_data['id']),
-                api_metadata={
-                    'rawg_id': game_data['id'],
-                    'rating': game_data.get('rating'),
-                    'rating_top': game_data.get('rating_top'),
-                    'ratings_count': game_data.get('ratings_count'),
-                    'metacritic': game_data.get('metacritic'),
-                    'platforms': platforms,
-                    'genres': genres,
-                    'developers': [d['name'] for d in game_data.get('developers', [])],
-                    'publishers': [p['name'] for p in game_data.get('publishers', [])],
-                    'esrb_rating': game_data.get('esrb_rating', {}).get('name') if game_data.get('esrb_rating') else None
-                }
-            )
-            
-            db.session.add(item)
-            return item
-            
-        except Exception as e:
-            print(f"Error creating game item: {e}")
+            return datetime.strptime(value, '%Y-%m-%d').date() if value else None
+        except ValueError:
             return None
     
-    def _create_game_release_order(self, games, franchise_id):
-        """Create release order for games"""
-        try:
-            # Check if order already exists
-            existing_order = Order.query.filter_by(
-                franchise_id=franchise_id,
-                order_type='release'
-            ).first()
-            
-            if existing_order:
-                return existing_order
-            
+    def _entity_index(self, franchise_id):
+        """EntityIndex of the franchise's items, loaded once per service"""
+        if franchise_id not in self._entity_indexes:
+            self._entity_indexes[franchise_id] = load_franchise_index(db.session, franchise_id)
+        return self._entity_indexes[franchise_id]
+    
+    def _bulk_create_games(self, games, franchise_id, created):
+        """Insert one page of games, merging the ones the franchise already holds; returns (release date, item id) pairs
+        
+        A game matches an item with the same RAWG id, or with the same
+        normalized title and release year (e.g. the film it ties in with).
+        """
+        index = self._entity_index(franchise_id)
+        # Catches repeats within the page, which have no ids yet
+        page = EntityIndex()
+        matches, releases, new_rows = {}, [], []
+        for game in games:
+            row = self._game_row(game, franchise_id)
+            item_id = index.resolve(row)
+            if item_id is not None:
+                matches.setdefault(item_id, []).append(row)
+                releases.append((row['release_date'], item_id))
+            elif page.resolve(row) is None:
+                page.add(len(new_rows), row)
+                new_rows.append(row)
+        
+        if matches:
+            for item in Item.query.filter(Item.id.in_(list(matches))):
+                for row in matches[item.id]:
+                    merge_into(item, row)
+        if new_rows:
+            # return_defaults fills in the generated ids
+            db.session.bulk_insert_mappings(Item, new_rows, return_defaults=True)
+            created['items'].extend(new_rows)
+            for row in new_rows:
+                index.add(row['id'], row)
+        return releases + [(row['release_date'], row['id']) for row in new_rows]
+    
+    def _fill_release_order(self, releases, franchise_id, created):
+        """Create the release order if needed and append the games it doesn't hold yet, by release date"""
+        order = Order.query.filter_by(franchise_id=franchise_id, order_type='release').first()
+        if not order:
             order = Order(
                 franchise_id=franchise_id,
                 order_type='release',
@@ -150,51 +394,38 @@ class RAWGService:
                 description='Games in the order they were released',
                 is_official=True
             )
-            
             db.session.add(order)
             db.session.flush()  # Get the order ID
-            
-            # Sort games by release date
-            sorted_games = sorted(games, key=lambda x: x.get('released', ''))
-            
-            for position, game in enumerate(sorted_games, 1):
-                item = Item.query.filter_by(
-                    franchise_id=franchise_id,
-                    external_id=str(game['id'])
-                ).first()
-                
-                if item:
-                    order_item = OrderItem(
-                        order_id=order.id,
-                        item_id=item.id,
-                        position=position
-                    )
-                    db.session.add(order_item)
-            
-            return order
-            
-        except Exception as e:
-            print(f"Error creating game release order: {e}")
-            return None
+        
+        entries = db.session.query(OrderItem.item_id, OrderItem.position).filter(OrderItem.order_id == order.id).all()
+        present = {item_id for item_id, _ in entries}
+        last = max((position for _, position in entries), default=0)
+        rows = []
+        # Undated games go last
+        for release_date, item_id in sorted(releases, key=lambda entry: (entry[0] is None, entry[0] or '', str(entry[1]))):
+            if item_id not in present:
+                present.add(item_id)
+                last += RANK_GAP
+                rows.append({'order_id': order.id, 'item_id': item_id, 'position': last})
+        if rows:
+            db.session.bulk_insert_mappings(OrderItem, rows, return_defaults=True)
+            created['order_items'].extend(rows)
+        return order
+    
+    def _list_games(self, params, limit):
+        """Up to limit games across as many pages as needed"""
+        params = dict(params, page_size=min(limit, RAWG_PAGE_SIZE))
+        return {'results': list(self.iter_games("games", params, limit=limit))}
     
     def get_popular_games(self, limit=20):
         """Get popular games"""
-        return self._make_request("games", {
-            "ordering": "-rating",
-            "page_size": limit
-        })
+        return self._list_games({"ordering": "-rating"}, limit)
     
     def get_games_by_genre(self, genre_id, limit=20):
         """Get games by genre"""
-        return self._make_request("games", {
-            "genres": genre_id,
-            "page_size": limit
-        })
+        return self._list_games({"genres": genre_id}, limit)
     
     def get_games_by_platform(self, platform_id, limit=20):
         """Get games by platform"""
-        return self._make_request("games", {
-            "platforms": platform_id,
-            "page_size": limit
-        })
+        return self._list_games({"platforms": platform_id}, limit)
 
@@ -0,0 +1,449 @@
+"""In-process trigram index for typo-tolerant franchise and item search.
+
+Used by the SQLite backend; Supabase gets the same behaviour from pg_trgm
+(see setup_supabase_tables.sql). Trigrams are extracted the way pg_trgm
+does it: lowercase, split on non-alphanumerics, each word padded with two
+spaces in front and one behind.
+
+A document matches when the share of the query's trigrams it contains
+(close to pg_trgm's word_similarity) reaches the threshold, so "harry poter"
+still finds "Harry Potter and the Philosopher's Stone". Matches are ranked
+by that share, then by whole-string similarity, then by popularity.
+
+Postings are append-only arrays of document slots. With NumPy installed they
+are counted in one vectorized bincount; without it, prefix filtering keeps
+the pure Python path cheap for selective queries (a document reaching the
+threshold must appear in one of the rarest q - needed + 1 posting lists, so
+only those are scanned and the rest are probed by binary search).
+"""
+
+import logging
+import math
+import re
+import threading
+from array import array
+from bisect import bisect_left
+from collections import Counter
+
+from flask import current_app
+from src.config.database import read_session
+from src.services.catalog_events import subscribe, install_session_hooks
+from src.services.search_ranking import (
+    POPULARITY_WEIGHT, SCORE_DECIMALS, combined_score, sort_key, encode_cursor, decode_cursor,
+)
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - optional speedup
+    np = None
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_THRESHOLD = 0.5
+# Rebuild postings once this share of slots belongs to removed documents
+COMPACT_RATIO = 0.25
+
+_WORD_SPLIT = re.compile(r'[\W_]+')
+
+
+def normalize(text):
+    return ' '.join(_WORD_SPLIT.split((text or '').lower())).strip()
+
+
+def trigrams(text):
+    """pg_trgm style trigram set of a string."""
+    grams = set()
+    for word in normalize(text).split():
+        padded = f'  {word} '
+        for i in range(len(padded) - 2):
+            grams.add(padded[i:i + 3])
+    return grams
+
+
+class TrigramIndex:
+    """Trigram postings over (doc_id, text) pairs with incremental add/remove."""
+    
+    def __init__(self, use_numpy=True):
+        self.use_numpy = use_numpy and np is not None
+        self._lock = threading.RLock()
+        self._category_codes = {None: 0}
+        self._clear()
+    
+    def _clear(self):
+        self._postings = {}              # trigram -> array of slots, ascending
+        self._slot_of = {}               # doc_id -> slot
+        self._doc_ids = []               # slot -> doc_id, None once removed
+        self._alive = bytearray()
+        self._lengths = array('H')       # trigram count per slot
+        self._categories = array('H')    # category code per slot
+        self._popularity = array('d')
+        self._removed = 0
+    
+    def __len__(self):
+        return len(self._slot_of)
+    
+    def __contains__(self, doc_id):
+        return doc_id in self._slot_of
+    
+    def _category_code(self, category):
+        code = self._category_codes.get(category)
+        if code is None:
+            code = self._category_codes[category] = len(self._category_codes)
+        return code
+    
+    def add(self, doc_id, text, category=None, popularity=0):
+        """Index (or re-index) a document."""
+        grams = trigrams(text)
+        with self._lock:
+            self._remove(doc_id)
+            slot = len(self._doc_ids)
+            self._doc_ids.append(doc_id)
+            self._alive.append(1)
+            self._lengths.append(min(len(grams), 0xFFFF))
+            self._categories.append(self._category_code(category))
+            self._popularity.append(float(popularity or 0))
+            self._slot_of[doc_id] = slot
+            for gram in grams:
+                postings = self._postings.get(gram)
+                if postings is None:
+                    postings = self._postings[gram] = array('I')
+                postings.append(slot)
+    
+    def remove(self, doc_id):
+        with self._lock:
+            self._remove(doc_id)
+    
+    def _remove(self, doc_id):
+        slot = self._slot_of.pop(doc_id, None)
+        if slot is None:
+            return
+        self._doc_ids[slot] = None
+        self._alive[slot] = 0
+        self._removed += 1
+        if self._removed > 1000 and self._removed > COMPACT_RATIO * len(self._doc_ids):
+            self._compact()
+    
+    def update_meta(self, doc_id, category=None, popularity=None):
+        """Change category/popularity without re-tokenizing."""
+        with self._lock:
+            slot = self._slot_of.get(doc_id)
+            if slot is None:
+                return
+            if category is not None:
+                self._categories[slot] = self._category_code(category)
+            if popularity is not None:
+                self._popularity[slot] = float(popularity)
+    
+    def _compact(self):
+        """Drop removed slots and renumber, keeping postings sorted."""
+        remap = {}
+        for slot, alive in enumerate(self._alive):
+            if alive:
+                remap[slot] = len(remap)
+        keep = sorted(remap)
+        self._doc_ids = [self._doc_ids[slot] for slot in keep]
+        self._alive = bytearray(b'\x01' * len(keep))
+        self._lengths = array('H', (self._lengths[slot] for slot in keep))
+        self._categories = array('H', (self._categories[slot] for slot in keep))
+        self._popularity = array('d', (self._popularity[slot] for slot in keep))
+        postings = {}
+        for gram, slots in self._postings.items():
+            kept = array('I', (remap[slot] for slot in slots if slot in remap))
+            if kept:
+                postings[gram] = kept
+        self._postings = postings
+        self._slot_of = {doc_id: slot for slot, doc_id in enumerate(self._doc_ids)}
+        self._removed = 0
+    
+    def search(self, query, limit=20, threshold=DEFAULT_THRESHOLD, category=None):
+        """Return [(doc_id, similarity)] best first; similarity is the matched share of query trigrams."""
+        grams = trigrams(query)
+        if not grams or limit <= 0:
+            return []
+        with self._lock:
+            if category is not None and category not in self._category_codes:
+                return []
+            category_code = self._category_codes.get(category) if category is not None else None
+            lists = [self._postings.get(gram, ()) for gram in grams]
+            needed = max(1, math.ceil(threshold * len(lists)))
+            if self.use_numpy:
+                return self._search_numpy(lists, needed, limit, category_code)
+            return self._search_python(lists, needed, limit, category_code)
+    
+    def _search_numpy(self, lists, needed, limit, category_code):
+        query_size = len(lists)
+        slots = [np.frombuffer(postings, dtype=np.uint32) for postings in lists if len(postings)]
+        if not slots:
+            return []
+        counts = np.bincount(np.concatenate(slots), minlength=len(self._doc_ids))
+        mask = counts >= needed
+        mask &= np.frombuffer(self._alive, dtype=np.uint8).astype(bool)
+        if category_code is not None:
+            mask &= np.frombuffer(self._categories, dtype=np.uint16) == category_code
+        candidates = np.flatnonzero(mask)
+        if not len(candidates):
+            return []
+        
+        matched = counts[candidates]
+        lengths = np.frombuffer(self._lengths, dtype=np.uint16)[candidates]
+        keys = (
+            matched,
+            matched / (query_size + lengths.astype(np.float64) - matched),
+            np.frombuffer(self._popularity, dtype=np.float64)[candidates],
+        )
+        # Narrow by each key in turn before the final sort, so ties on the
+        # primary key over a large candidate set don't cost a full sort:
+        # rows above a key's cutoff are in, only rows tied at it go on to
+        # compete on the next key for the places that are left
+        selected = np.arange(len(candidates))
+        kept = []
+        remaining = limit
+        for key in keys:
+            if len(selected) <= remaining:
+                break
+            values = key[selected]
+            cutoff = np.partition(values, len(values) - remaining)[len(values) - remaining]
+            kept.append(selected[values > cutoff])
+            remaining -= len(kept[-1])
+            selected = selected[values == cutoff]
+        selected = np.concatenate(kept + [selected])
+        order = np.lexsort(tuple(-key[selected] for key in reversed(keys)))[:limit]
+        selected = selected[order]
+        doc_ids = self._doc_ids
+        return [(doc_ids[candidates[i]], round(float(matched[i]) / query_size, 4)) for i in selected]
+    
+    def _search_python(self, lists, needed, limit, category_code):
+        query_size = len(lists)
+        lists = sorted(lists, key=len)
+        split = query_size - needed + 1
+        
+        counts = Counter()
+        for slots in lists[:split]:
+            counts.update(slots)
+        for slots in lists[split:]:
+            size = len(slots)
+            if not size:
+                continue
+            for slot in counts:
+                position = bisect_left(slots, slot)
+                if position < size and slots[position] == slot:
+                    counts[slot] += 1
+        
+        matches = []
+        for slot, matched in counts.items():
+            if matched < needed or not self._alive[slot]:
+                continue
+            if category_code is not None and self._categories[slot] != category_code:
+                continue
+            jaccard = matched / (query_size + self._lengths[slot] - matched)
+            matches.append((matched, jaccard, self._popularity[slot], slot))
+        matches.sort(key=lambda match: (-match[0], -match[1], -match[2]))
+        return [(self._doc_ids[slot], round(matched / query_size, 4)) for matched, _, _, slot in matches[:limit]]
+    
+    def match(self, query, threshold=DEFAULT_THRESHOLD):
+        """Every live document at or above the threshold, as columns.
+        
+        Returns (slots, similarity, popularity, category codes); NumPy arrays
+        when NumPy is available, lists otherwise. Slots are only meaningful
+        while the caller holds the index lock (see doc_id / category_name).
+        """
+        grams = trigrams(query)
+        with self._lock:
+            lists = [self._postings.get(gram, ()) for gram in grams]
+            if not any(len(postings) for postings in lists):
+                return [], [], [], []
+            query_size = len(lists)
+            needed = max(1, math.ceil(threshold * query_size))
+            if self.use_numpy:
+                counts = np.bincount(np.concatenate([np.frombuffer(postings, dtype=np.uint32)
+                                                     for postings in lists if len(postings)]),
+                                     minlength=len(self._doc_ids))
+                mask = (counts >= needed) & np.frombuffer(self._alive, dtype=np.uint8).astype(bool)
+                slots = np.flatnonzero(mask)
+                return (slots, counts[slots] / query_size,
+                        np.frombuffer(self._popularity, dtype=np.float64)[slots],
+                        np.frombuffer(self._categories, dtype=np.uint16)[slots])
+            counts = Counter()
+            for postings in lists:
+                counts.update(postings)
+            slots = [slot for slot, matched in counts.items() if matched >= needed and self._alive[slot]]
+            return (slots, [counts[slot] / query_size for slot in slots],
+                    [self._popularity[slot] for slot in slots], [self._categories[slot] for slot in slots])
+    
+    def doc_id(self, slot):
+        return self._doc_ids[slot]
+    
+    def category_code(self, category):
+        """Code for a category name, or -1 if no document has it."""
+        return self._category_codes.get(category, -1)
+    
+    def category_names(self):
+        return {code: name for name, code in self._category_codes.items()}
+    
+    def stats(self):
+        with self._lock:
+            return {
+                'documents': len(self._slot_of),
+                'slots': len(self._doc_ids),
+                'trigrams': len(self._postings),
+                'postings': sum(len(slots) for slots in self._postings.values()),
+            }
+
+
+class CatalogSearchIndex:
+    """Trigram indexes over franchise names and item titles, kept current from catalog events."""
+    
+    def __init__(self):
+        self.franchises = TrigramIndex()
+        self.items = TrigramIndex()
+        self._lock = threading.Lock()
+        self._franchise_meta = {}    # franchise_id -> (category, popularity_score)
+        self._franchise_items = {}   # franchise_id -> set of item ids
+    
+    def build(self, session):
+        """Load every franchise name and item title (two streamed queries)."""
+        from src.models.franchise import Franchise, Item
+        
+        rows = session.query(Franchise.id, Franchise.name, Franchise.category, Franchise.popularity_score)
+        for franchise_id, name, category, popularity in rows.yield_per(5000):
+            self._add_franchise(franchise_id, name, category, popularity)
+        rows = session.query(Item.id, Item.title, Item.franchise_id)
+        for item_id, title, franchise_id in rows.yield_per(5000):
+            self._add_item(item_id, title, franchise_id)
+        return self
+    
+    def _add_franchise(self, franchise_id, name, category, popularity):
+        previous = self._franchise_meta.get(franchise_id)
+        self._franchise_meta[franchise_id] = (category, popularity or 0)
+        self.franchises.add(franchise_id, name, category, popularity)
+        if previous != (category, popularity or 0):
+            for item_id in self._franchise_items.get(franchise_id, ()):
+                self.items.update_meta(item_id, category, popularity or 0)
+    
+    def _set_popularity(self, franchise_id, popularity):
+        """Apply a score-only update (popularity recompute) without re-tokenizing."""
+        meta = self._franchise_meta.get(franchise_id)
+        if meta is None:
+            return
+        self._franchise_meta[franchise_id] = (meta[0], popularity or 0)
+        self.franchises.update_meta(franchise_id, popularity=popularity or 0)
+        for item_id in self._franchise_items.get(franchise_id, ()):
+            self.items.update_meta(item_id, popularity=popularity or 0)
+    
+    def _add_item(self, item_id, title, franchise_id):
+        category, popularity = self._franchise_meta.get(franchise_id, (None, 0))
+        self.items.add(item_id, title, category, popularity)
+        self._franchise_items.setdefault(franchise_id, set()).add(item_id)
+    
+    def apply(self, changes):
+        """catalog_events subscriber."""
+        with self._lock:
+            for change in changes:
+                row = change.row
+                if change.table == 'franchises':
+                    if change.action == 'delete':
+                        self.franchises.remove(row['id'])
+                        self._franchise_meta.pop(row['id'], None)
+                        for item_id in self._franchise_items.pop(row['id'], ()):
+                            self.items.remove(item_id)
+                    elif row.get('name') is None:
+                        self._set_popularity(row['id'], row.get('popularity_score'))
+                    else:
+                        self._add_franchise(row['id'], row.get('name'), row.get('category'),
+                                            row.get('popularity_score'))
+                elif change.table == 'items':
+                    if change.action == 'delete':
+                        self.items.remove(row['id'])
+                        self._franchise_items.get(row.get('franchise_id'), set()).discard(row['id'])
+                    else:
+                        self._add_item(row['id'], row.get('title'), row.get('franchise_id'))
+    
+    def _max_popularity(self):
+        return max((popularity for _, popularity in self._franchise_meta.values()), default=0)
+    
+    def search_all(self, query, limit=20, cursor=None, category=None, threshold=DEFAULT_THRESHOLD):
+        """One ranked stream over franchises and items, with category facets from the same pass.
+        
+        Results are (kind, doc_id, score, similarity) ordered by
+        search_ranking.sort_key; facets count matches per category before
+        the category filter, total counts them after it.
+        """
+        after = decode_cursor(cursor)
+        max_popularity = self._max_popularity()
+        facets = Counter()
+        total = 0
+        page = []
+        with self.franchises._lock, self.items._lock:
+            for kind, index in (('franchise', self.franchises), ('item', self.items)):
+                slots, similarity, popularity, codes = index.match(query, threshold)
+                if not len(slots):
+                    continue
+                names = index.category_names()
+                wanted = index.category_code(category) if category else None
+                if np is not None and isinstance(slots, np.ndarray):
+                    counts = np.bincount(codes)
+                    for code in np.flatnonzero(counts):
+                        facets[names[code]] += int(counts[code])
+                    keep = np.ones(len(slots), dtype=bool) if wanted is None else codes == wanted
+                    total += int(keep.sum())
+                    boost = np.log1p(np.maximum(popularity, 0)) / math.log1p(max(max_popularity, 1))
+                    scores = np.round(similarity + POPULARITY_WEIGHT * boost, SCORE_DECIMALS)
+                    if after is not None:
+                        # Ties with the cursor's score are resolved on (kind, id)
+                        tied = np.flatnonzero(keep & (scores == after[0]))
+                        keep &= scores < after[0]
+                        for i in tied:
+                            keep[i] = sort_key(after[0], kind, index.doc_id(slots[i])) > sort_key(*after)
+                    chosen = np.flatnonzero(keep)
+                    if len(chosen) > limit + 1:
+                        values = scores[chosen]
+                        cutoff = np.partition(values, len(values) - limit - 1)[len(values) - limit - 1]
+                        chosen = chosen[values >= cutoff]
+                    rows = ((kind, index.doc_id(slots[i]), float(scores[i]), float(similarity[i])) for i in chosen)
+                else:
+                    for code in codes:
+                        facets[names[code]] += 1
+                    chosen = [i for i in range(len(slots)) if wanted is None or codes[i] == wanted]
+                    total += len(chosen)
+                    rows = ((kind, index.doc_id(slots[i]),
+                             combined_score(similarity[i], popularity[i], max_popularity), similarity[i])
+                            for i in chosen)
+                for row in rows:
+                    if after is None or sort_key(row[2], row[0], row[1]) > sort_key(*after):
+                        page.append(row)
+        
+        facets.pop(None, None)
+        page.sort(key=lambda row: sort_key(row[2], row[0], row[1]))
+        next_cursor = None
+        if len(page) > limit:
+            last = page[limit - 1]
+            next_cursor = encode_cursor(last[2], last[0], last[1])
+        return {
+            'results': [(kind, doc_id, score, round(similarity, 4)) for kind, doc_id, score, similarity in page[:limit]],
+            'facets': dict(facets),
+            'total': total,
+            'next_cursor': next_cursor,
+        }
+    
+    def search_franchises(self, query, limit=20, threshold=DEFAULT_THRESHOLD, category=None):
+        return self.franchises.search(query, limit, threshold, category)
+    
+    def search_items(self, query, limit=20, threshold=DEFAULT_THRESHOLD, category=None):
+        return self.items.search(query, limit, threshold, category)
+
+
+def init_search_index(app):
+    """Build the index at startup (inside an app context) and keep it current."""
+    install_session_hooks()
+    index = CatalogSearchIndex()
+    with read_session() as session:
+        index.build(session)
+    subscribe(index.apply, tables=('franchises', 'items'))
+    app.extensions['orderof_search'] = index
+    logger.info(f"Search index built: {len(index.franchises)} franchises, {len(index.items)} items")
+    return index
+
+
+def get_search_index(app=None):
+    """The app's CatalogSearchIndex, or None when search falls back to ilike."""
+    return (app or current_app).extensions.get('orderof_search')
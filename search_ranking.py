@@ -0,0 +1,49 @@
+"""Ranking and cursor helpers shared by the SQLite and Supabase unified search.
+
+Both backends order results by (score desc, type, id) where
+
+    score = similarity + POPULARITY_WEIGHT * log(1 + popularity) / log(1 + max popularity)
+
+rounded to SCORE_DECIMALS so the value round-trips through the cursor and
+through Postgres unchanged. Items use their franchise's popularity_score.
+The search_catalog SQL function in setup_supabase_tables.sql applies the
+same formula.
+"""
+
+import base64
+import json
+import math
+
+POPULARITY_WEIGHT = 0.25
+SCORE_DECIMALS = 6
+
+# Franchises sort before items at equal score
+KIND_RANKS = {'franchise': 0, 'item': 1}
+KINDS = {rank: kind for kind, rank in KIND_RANKS.items()}
+
+
+def combined_score(similarity, popularity, max_popularity):
+    boost = math.log1p(max(popularity or 0, 0)) / math.log1p(max(max_popularity or 0, 1))
+    return round(similarity + POPULARITY_WEIGHT * boost, SCORE_DECIMALS)
+
+
+def sort_key(score, kind, doc_id):
+    return (-score, KIND_RANKS[kind], str(doc_id))
+
+
+def encode_cursor(score, kind, doc_id):
+    """Opaque cursor pointing just after the given result."""
+    payload = json.dumps([score, KIND_RANKS[kind], str(doc_id)], separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """(score, kind, id) from encode_cursor, or None for no cursor. Raises ValueError for an invalid one."""
+    if not cursor:
+        return None
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        score, rank, doc_id = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        return float(score), KINDS[int(rank)], str(doc_id)
+    except (ValueError, KeyError, TypeError):
+        raise ValueError('Invalid cursor')
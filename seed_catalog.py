@@ -0,0 +1,291 @@
+"""Seed catalog for bulk syncs, and sharding a sync across worker processes.
+
+The franchises POST /admin/sync/popular syncs come from a seed catalog: a
+file (SEED_CATALOG, seed_catalog.csv by default) or, on Supabase, a table
+(SEED_CATALOG_TABLE). One entry per franchise:
+
+    name,category,query,provider,description
+    Marvel Cinematic Universe,movies,,,
+    Star Trek,series,Star Trek: The Next Generation,tmdb_tv,
+
+Only name and category are required. query is what the provider is
+searched for (the name by default), provider the sync used (tmdb_movies,
+tmdb_tv or rawg; by category by default). .json files hold a list of
+entries and .ndjson/.jsonl files one entry per line.
+
+A catalog of thousands of franchises is bounded by provider round trips,
+not CPU, so SYNC_WORKERS > 1 splits it round-robin into that many shards
+and syncs each in its own process. The shards share one run id, so a
+resume picks every shard's checkpoints back up, and the report has each
+shard's throughput next to the run's. Workers start a fresh interpreter
+and open their own database (SQLite) or client (Supabase); what they write
+never passes through this process's change feed, so the synced franchises
+are republished to it when the shards are done.
+"""
+
+import csv
+import json
+import logging
+import multiprocessing
+import os
+import time
+import uuid
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from src.services.catalog_events import publish_rows
+from src.services.slugs import slugify
+from src.services.sync_runs import franchise_key
+
+logger = logging.getLogger(__name__)
+
+# Category -> word used in default franchise descriptions
+CATEGORIES = {'movies': 'movie', 'games': 'game', 'series': 'TV'}
+# Category -> provider sync used unless an entry names one
+DEFAULT_PROVIDERS = {'movies': 'tmdb_movies', 'games': 'rawg', 'series': 'tmdb_tv'}
+PROVIDERS = ('tmdb_movies', 'tmdb_tv', 'rawg')
+
+DEFAULT_SEED_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'seed_catalog.csv')
+DEFAULT_SEED_TABLE = 'seed_franchises'
+LOAD_PAGE_SIZE = 1000
+REPUBLISH_CHUNK_SIZE = 200
+
+SeedEntry = namedtuple('SeedEntry', 'name category description query provider')
+
+
+class SeedCatalogError(ValueError):
+    """A seed catalog that can't be read, with the entry at fault."""
+
+
+def seed_entry(name, category, description=None, query=None, provider=None):
+    """A validated SeedEntry, with defaults filled in."""
+    name = ' '.join((name or '').split())
+    category = (category or '').strip().lower()
+    if not name:
+        raise SeedCatalogError('name is required')
+    if category not in CATEGORIES:
+        raise SeedCatalogError(f"unknown category {category!r} (expected one of {', '.join(CATEGORIES)})")
+    provider = (provider or '').strip() or DEFAULT_PROVIDERS[category]
+    if provider not in PROVIDERS:
+        raise SeedCatalogError(f"unknown provider {provider!r} (expected one of {', '.join(PROVIDERS)})")
+    return SeedEntry(
+        name=name,
+        category=category,
+        description=(description or '').strip() or f'Popular {CATEGORIES[category]} franchise: {name}',
+        query=(query or '').strip() or name,
+        provider=provider,
+    )
+
+
+def parse_seed_rows(rows):
+    """SeedEntries from dicts; an entry listed twice (same name and category) is kept once."""
+    entries, seen = [], set()
+    for number, row in enumerate(rows, 1):
+        try:
+            entry = seed_entry(**{field: row.get(field) for field in SeedEntry._fields})
+        except (SeedCatalogError, AttributeError) as e:
+            raise SeedCatalogError(f'Entry {number}: {e}') from None
+        key = franchise_key(entry.name, entry.category)
+        if key in seen:
+            logger.warning(f'Seed catalog entry {number} repeats {entry.name} ({entry.category}); skipped')
+            continue
+        seen.add(key)
+        entries.append(entry)
+    return entries
+
+
+def load_seed_file(path=DEFAULT_SEED_FILE):
+    """Seed catalog from a .csv, .json or .ndjson/.jsonl file."""
+    with open(path, encoding='utf-8', newline='') as source:
+        if path.endswith('.json'):
+            rows = json.load(source)
+        elif path.endswith(('.ndjson', '.jsonl')):
+            rows = [json.loads(line) for line in source if line.strip()]
+        else:
+            rows = list(csv.DictReader(source))
+    return parse_seed_rows(rows)
+
+
+def load_seed_table(client, table=DEFAULT_SEED_TABLE):
+    """Seed catalog from a Supabase table, in pages."""
+    rows, start = [], 0
+    while True:
+        page = client.table(table).select('*').order('id').range(start, start + LOAD_PAGE_SIZE - 1).execute().data
+        rows.extend(page)
+        if len(page) < LOAD_PAGE_SIZE:
+            return parse_seed_rows(rows)
+        start += LOAD_PAGE_SIZE
+
+
+def load_seed_catalog(config, supabase_client=None):
+    """The configured seed catalog: SEED_CATALOG_TABLE on Supabase, else the SEED_CATALOG file."""
+    table = config.get('SEED_CATALOG_TABLE')
+    if table and supabase_client is not None:
+        return load_seed_table(supabase_client, table)
+    return load_seed_file(config.get('SEED_CATALOG') or DEFAULT_SEED_FILE)
+
+
+# Sharded runs
+
+def _shard_summary(index, report):
+    seconds = report.get('seconds') or 0
+    synced = report.get('synced', 0)
+    summary = {
+        'shard': index,
+        'total': report.get('total', 0),
+        'synced': synced,
+        'skipped': report.get('skipped', 0),
+        'failed': len(report.get('failed', [])),
+        'seconds': seconds,
+        'per_minute': round(synced * 60 / seconds, 1) if seconds else None,
+    }
+    if 'error' in report:
+        summary['error'] = report['error']
+    return summary
+
+
+def merge_reports(reports, run_id, resumed, seconds):
+    """One run report from its shards' SyncRun reports, with per-shard throughput.
+    
+    errors lists the shards whose worker failed outright; their franchises
+    are in neither synced nor failed.
+    """
+    synced = sum(report.get('synced', 0) for report in reports)
+    return {
+        'run_id': run_id,
+        'resumed': resumed,
+        'workers': len(reports),
+        'total': sum(report.get('total', 0) for report in reports),
+        'synced': synced,
+        'skipped': sum(report.get('skipped', 0) for report in reports),
+        'failed': [failure for report in reports for failure in report.get('failed', [])],
+        'errors': [{'shard': index, 'error': report['error']}
+                   for index, report in enumerate(reports) if 'error' in report],
+        'franchises': [franchise for report in reports for franchise in report.get('franchises', [])],
+        'shards': [_shard_summary(index, report) for index, report in enumerate(reports)],
+        'seconds': round(seconds, 3),
+        'per_minute': round(synced * 60 / seconds, 1) if seconds else None,
+    }
+
+
+def run_sharded(sync_shard, catalog, workers, run_id=None, failed_only=False, **options):
+    """Sync catalog in `workers` processes with sync_shard(entries, run_id, failed_only, **options) -> report.
+    
+    sync_shard must be a module-level function (it is pickled by name). A
+    shard whose process fails is reported with its error; its checkpoints
+    are kept, so resuming the run retries it.
+    """
+    started = time.perf_counter()
+    resumed = run_id is not None
+    run_id = run_id or str(uuid.uuid4())
+    shards = [catalog[index::workers] for index in range(min(workers, len(catalog)))]
+    reports = [None] * len(shards)
+    
+    # spawn, not fork: the parent has live database connections and background threads
+    with ProcessPoolExecutor(max_workers=len(shards), mp_context=multiprocessing.get_context('spawn')) as pool:
+        futures = {pool.submit(sync_shard, entries, run_id, failed_only, **options): index
+                   for index, entries in enumerate(shards)}
+        for future in as_completed(futures):
+            index = futures[future]
+            try:
+                reports[index] = future.result()
+            except Exception as e:
+                logger.error(f"Sync shard {index} of run {run_id} failed: {e}")
+                reports[index] = {'total': len(shards[index]), 'error': str(e)}
+            summary = _shard_summary(index, reports[index])
+            logger.info(f"Sync shard {index} of run {run_id}: {summary['synced']}/{summary['total']} synced "
+                        f"in {summary['seconds']}s ({summary['per_minute']}/min)")
+    
+    return merge_reports(reports, run_id, resumed, time.perf_counter() - started)
+
+
+def republish(catalog, franchise_ids):
+    """Publish synced franchises with their items, orders and order entries to the change feed.
+    
+    catalog is a SqlAlchemyCatalog or SupabaseCatalog.
+    """
+    franchise_ids = list(dict.fromkeys(franchise_id for franchise_id in franchise_ids if franchise_id is not None))
+    for start in range(0, len(franchise_ids), REPUBLISH_CHUNK_SIZE):
+        chunk = franchise_ids[start:start + REPUBLISH_CHUNK_SIZE]
+        orders = catalog.fetch('orders', catalog.columns('orders'), 'franchise_id', chunk)
+        publish_rows('franchises', catalog.fetch('franchises', catalog.columns('franchises'), 'id', chunk))
+        publish_rows('items', catalog.fetch('items', catalog.columns('items'), 'franchise_id', chunk))
+        publish_rows('orders', orders)
+        publish_rows('order_items', catalog.fetch('order_items', catalog.columns('order_items'), 'order_id',
+                                                  [order['id'] for order in orders]))
+
+
+# Legacy (SQLite) syncs
+
+def legacy_entry_sync(session):
+    """sync_entry(entry, checkpoint) for run_catalog_sync on the legacy models."""
+    from src.models.franchise import Franchise
+    from src.services.rawg_service import RAWGService
+    from src.services.tmdb_service import TMDbService
+    
+    tmdb_service = TMDbService()
+    rawg_service = RAWGService()
+    syncs = {
+        'tmdb_movies': tmdb_service.sync_movie_franchise,
+        'tmdb_tv': tmdb_service.sync_tv_franchise,
+        'rawg': rawg_service.sync_game_franchise,
+    }
+    
+    def sync_entry(entry, checkpoint):
+        try:
+            if not checkpoint.reached('franchise'):
+                slug = slugify(entry.name)
+                franchise = session.query(Franchise).filter_by(slug=slug).first()
+                
+                if not franchise:
+                    franchise = Franchise(
+                        name=entry.name,
+                        slug=slug,
+                        category=entry.category,
+                        description=entry.description,
+                        popularity_score=100
+                    )
+                    session.add(franchise)
+                    session.commit()
+                checkpoint.reach('franchise', franchise_id=franchise.id)
+            
+            return syncs[entry.provider](entry.query, checkpoint.state['franchise_id'], checkpoint=checkpoint)
+        except Exception:
+            session.rollback()
+            raise
+    
+    return sync_entry
+
+
+def _sync_legacy(session, catalog, run_id, failed_only):
+    from src.services.sync_runs import SqlAlchemySyncStore, SyncRun, run_catalog_sync
+    
+    run = SyncRun(SqlAlchemySyncStore(session), run_id)
+    return run_catalog_sync(run, catalog, legacy_entry_sync(session), failed_only)
+
+
+def sync_sqlite_shard(entries, run_id, failed_only, database):
+    """Worker process: sync entries against the SQLite database file."""
+    from flask import Flask
+    from src.models.franchise import db
+    from src.config.database import configure_database
+    
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    configure_database(app, db, database)
+    with app.app_context():
+        return _sync_legacy(db.session, entries, run_id, failed_only)
+
+
+def sync_legacy_catalog(session, catalog, run_id=None, failed_only=False, workers=1):
+    """Sync a seed catalog on the legacy models, in `workers` processes when more than one."""
+    if workers <= 1 or len(catalog) <= 1:
+        report = _sync_legacy(session, catalog, run_id, failed_only)
+        return merge_reports([report], report['run_id'], report['resumed'], report['seconds'])
+    
+    from src.services.catalog_transfer import SqlAlchemyCatalog
+    
+    report = run_sharded(sync_sqlite_shard, catalog, workers, run_id, failed_only,
+                         database=session.get_bind().url.database)
+    republish(SqlAlchemyCatalog(session), [franchise['franchise_id'] for franchise in report['franchises']])
+    return report
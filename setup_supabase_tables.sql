@@ -97,4 +97,337 @@ CREATE INDEX IF NOT EXISTS idx_orders_franchise_id ON orders(franchise_id);
 CREATE INDEX IF NOT EXISTS idx_order_items_order_id ON order_items(order_id);
 CREATE INDEX IF NOT EXISTS idx_order_items_position ON order_items(order_id, position);
 CREATE INDEX IF NOT EXISTS idx_affiliate_links_item_id ON affiliate_links(item_id);
+-- Natural key lookups for catalog imports
+CREATE INDEX IF NOT EXISTS idx_items_external_id ON items(external_id);
 
+
+-- Typo-tolerant search: trigram indexes and ranked search functions
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
+CREATE INDEX IF NOT EXISTS idx_franchises_name_trgm ON franchises USING GIN (name gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS idx_items_title_trgm ON items USING GIN (title gin_trgm_ops);
+
+-- Franchises whose name contains the query approximately (word_similarity),
+-- best match first, then whole-name similarity, then popularity
+CREATE OR REPLACE FUNCTION search_franchises_fuzzy(
+    query TEXT,
+    match_threshold REAL DEFAULT 0.5,
+    match_limit INTEGER DEFAULT 20,
+    match_category TEXT DEFAULT NULL
+)
+RETURNS TABLE (
+    id UUID,
+    name VARCHAR(255),
+    slug VARCHAR(255),
+    description TEXT,
+    category VARCHAR(50),
+    image_url TEXT,
+    external_id VARCHAR(100),
+    api_metadata JSONB,
+    popularity_score INTEGER,
+    created_at TIMESTAMP WITH TIME ZONE,
+    updated_at TIMESTAMP WITH TIME ZONE,
+    similarity REAL
+)
+LANGUAGE plpgsql AS $$
+BEGIN
+    -- <% uses the GIN index and honours this threshold
+    PERFORM set_config('pg_trgm.word_similarity_threshold', match_threshold::TEXT, true);
+    RETURN QUERY
+    SELECT f.id, f.name, f.slug, f.description, f.category, f.image_url, f.external_id,
+           f.api_metadata, f.popularity_score, f.created_at, f.updated_at,
+           word_similarity(query, f.name) AS similarity
+    FROM franchises f
+    WHERE query <% f.name
+      AND (match_category IS NULL OR f.category = match_category)
+    ORDER BY word_similarity(query, f.name) DESC, similarity(query, f.name) DESC, f.popularity_score DESC
+    LIMIT match_limit;
+END;
+$$;
+
+CREATE OR REPLACE FUNCTION search_items_fuzzy(
+    query TEXT,
+    match_threshold REAL DEFAULT 0.5,
+    match_limit INTEGER DEFAULT 20,
+    match_category TEXT DEFAULT NULL
+)
+RETURNS TABLE (
+    id UUID,
+    franchise_id UUID,
+    title VARCHAR(255),
+    description TEXT,
+    release_date DATE,
+    image_url TEXT,
+    external_id VARCHAR(100),
+    api_metadata JSONB,
+    rating DECIMAL(3,1),
+    created_at TIMESTAMP WITH TIME ZONE,
+    updated_at TIMESTAMP WITH TIME ZONE,
+    similarity REAL
+)
+LANGUAGE plpgsql AS $$
+BEGIN
+    PERFORM set_config('pg_trgm.word_similarity_threshold', match_threshold::TEXT, true);
+    RETURN QUERY
+    SELECT i.id, i.franchise_id, i.title, i.description, i.release_date, i.image_url, i.external_id,
+           i.api_metadata, i.rating, i.created_at, i.updated_at,
+           word_similarity(query, i.title) AS similarity
+    FROM items i
+    JOIN franchises f ON f.id = i.franchise_id
+    WHERE query <% i.title
+      AND (match_category IS NULL OR f.category = match_category)
+    ORDER BY word_similarity(query, i.title) DESC, similarity(query, i.title) DESC, f.popularity_score DESC
+    LIMIT match_limit;
+END;
+$$;
+
+-- One ranked stream over franchises and items for the unified /search
+-- (same formula as src/services/search_ranking.py):
+--   score = word_similarity + 0.25 * ln(1 + popularity) / ln(1 + max popularity)
+-- rounded to 6 places; items use their franchise's popularity. Keyset
+-- pagination on (score DESC, kind, id) where kind is 0 = franchise, 1 = item.
+-- Facets count matches per category before the category filter; the page
+-- holds match_limit + 1 rows so the caller can tell whether there is more.
+CREATE OR REPLACE FUNCTION search_catalog(
+    query TEXT,
+    match_threshold REAL DEFAULT 0.5,
+    match_limit INTEGER DEFAULT 20,
+    match_category TEXT DEFAULT NULL,
+    after_score DOUBLE PRECISION DEFAULT NULL,
+    after_kind INTEGER DEFAULT NULL,
+    after_id TEXT DEFAULT NULL
+)
+RETURNS JSONB
+LANGUAGE plpgsql AS $$
+DECLARE
+    max_popularity DOUBLE PRECISION;
+    result JSONB;
+BEGIN
+    PERFORM set_config('pg_trgm.word_similarity_threshold', match_threshold::TEXT, true);
+    SELECT GREATEST(COALESCE(MAX(popularity_score), 0), 1) INTO max_popularity FROM franchises;
+
+    WITH matches AS (
+        SELECT 0 AS kind, f.id::TEXT AS id, f.category, f.popularity_score AS popularity,
+               word_similarity(query, f.name) AS similarity, to_jsonb(f) AS row
+        FROM franchises f
+        WHERE query <% f.name
+        UNION ALL
+        SELECT 1, i.id::TEXT, f.category, f.popularity_score,
+               word_similarity(query, i.title), to_jsonb(i)
+        FROM items i
+        JOIN franchises f ON f.id = i.franchise_id
+        WHERE query <% i.title
+    ),
+    scored AS (
+        SELECT m.*,
+               ROUND((m.similarity + 0.25 * ln(1 + GREATEST(COALESCE(m.popularity, 0), 0)) / ln(1 + max_popularity))::NUMERIC, 6)::DOUBLE PRECISION AS score
+        FROM matches m
+        WHERE match_category IS NULL OR m.category = match_category
+    ),
+    page AS (
+        SELECT * FROM scored
+        WHERE after_score IS NULL
+           OR score < after_score
+           OR (score = after_score AND (kind > after_kind OR (kind = after_kind AND id COLLATE "C" > after_id)))
+        ORDER BY score DESC, kind, id COLLATE "C"
+        LIMIT match_limit + 1
+    )
+    SELECT jsonb_build_object(
+        'results', COALESCE((
+            SELECT jsonb_agg(p.row || jsonb_build_object(
+                       'type', CASE p.kind WHEN 0 THEN 'franchise' ELSE 'item' END,
+                       'score', p.score,
+                       'similarity', ROUND(p.similarity::NUMERIC, 4))
+                   ORDER BY p.score DESC, p.kind, p.id COLLATE "C")
+            FROM page p), '[]'::JSONB),
+        'facets', COALESCE((
+            SELECT jsonb_object_agg(category, n)
+            FROM (SELECT category, COUNT(*) AS n FROM matches WHERE category IS NOT NULL GROUP BY category) c), '{}'::JSONB),
+        'total', (SELECT COUNT(*) FROM scored)
+    ) INTO result;
+    RETURN result;
+END;
+$$;
+
+-- Popularity scoring (src/services/popularity.py): daily page view and
+-- affiliate click rollups plus the bulk read and write used by the job
+CREATE TABLE IF NOT EXISTS franchise_activity (
+    franchise_id UUID REFERENCES franchises(id) ON DELETE CASCADE,
+    day DATE NOT NULL,
+    page_views INTEGER NOT NULL DEFAULT 0,
+    affiliate_clicks INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (franchise_id, day)
+);
+
+ALTER TABLE franchise_activity ENABLE ROW LEVEL SECURITY;
+CREATE POLICY IF NOT EXISTS "Service role full access" ON franchise_activity FOR ALL USING (auth.role() = 'service_role');
+CREATE INDEX IF NOT EXISTS idx_franchise_activity_day ON franchise_activity(day);
+
+-- Add buffered counts: rows is a JSON array of
+-- {franchise_id, day, page_views, affiliate_clicks}; unknown franchises are skipped
+CREATE OR REPLACE FUNCTION record_franchise_activity(rows JSONB)
+RETURNS VOID
+LANGUAGE sql AS $$
+    INSERT INTO franchise_activity (franchise_id, day, page_views, affiliate_clicks)
+    SELECT r.franchise_id, r.day, r.page_views, r.affiliate_clicks
+    FROM jsonb_to_recordset(rows) AS r(franchise_id UUID, day DATE, page_views INTEGER, affiliate_clicks INTEGER)
+    WHERE EXISTS (SELECT 1 FROM franchises f WHERE f.id = r.franchise_id)
+    ON CONFLICT (franchise_id, day) DO UPDATE
+    SET page_views = franchise_activity.page_views + EXCLUDED.page_views,
+        affiliate_clicks = franchise_activity.affiliate_clicks + EXCLUDED.affiliate_clicks;
+$$;
+
+-- Every scoring input in one round trip, column-oriented (one JSON array per
+-- column) so the response is not cut by the API row limit
+CREATE OR REPLACE FUNCTION popularity_signals(since DATE)
+RETURNS JSONB
+LANGUAGE sql STABLE AS $$
+    SELECT jsonb_build_object(
+        'franchises', (
+            SELECT jsonb_build_object(
+                'id', COALESCE(jsonb_agg(id), '[]'::JSONB),
+                'popularity_score', COALESCE(jsonb_agg(popularity_score), '[]'::JSONB))
+            FROM franchises),
+        'items', (
+            SELECT jsonb_build_object(
+                'franchise_id', COALESCE(jsonb_agg(franchise_id), '[]'::JSONB),
+                'release_date', COALESCE(jsonb_agg(release_date), '[]'::JSONB),
+                'tmdb_popularity', COALESCE(jsonb_agg((api_metadata->>'popularity')::FLOAT), '[]'::JSONB),
+                'vote_count', COALESCE(jsonb_agg((api_metadata->>'vote_count')::FLOAT), '[]'::JSONB),
+                'rawg_rating', COALESCE(jsonb_agg((api_metadata->>'rating')::FLOAT), '[]'::JSONB),
+                'ratings_count', COALESCE(jsonb_agg((api_metadata->>'ratings_count')::FLOAT), '[]'::JSONB))
+            FROM items),
+        'activity', (
+            SELECT jsonb_build_object(
+                'franchise_id', COALESCE(jsonb_agg(franchise_id), '[]'::JSONB),
+                'day', COALESCE(jsonb_agg(day), '[]'::JSONB),
+                'page_views', COALESCE(jsonb_agg(page_views), '[]'::JSONB),
+                'affiliate_clicks', COALESCE(jsonb_agg(affiliate_clicks), '[]'::JSONB))
+            FROM franchise_activity
+            WHERE day >= since)
+    );
+$$;
+
+-- Bulk score write-back: parallel arrays of franchise ids and scores
+CREATE OR REPLACE FUNCTION apply_popularity_scores(franchise_ids UUID[], scores INTEGER[])
+RETURNS INTEGER
+LANGUAGE plpgsql AS $$
+DECLARE
+    updated INTEGER;
+BEGIN
+    UPDATE franchises f
+    SET popularity_score = s.score, updated_at = NOW()
+    FROM unnest(franchise_ids, scores) AS s(id, score)
+    WHERE f.id = s.id;
+    GET DIAGNOSTICS updated = ROW_COUNT;
+    RETURN updated;
+END;
+$$;
+
+-- Affiliate price refresh (src/services/price_refresh.py): when each link
+-- was last checked and when it is due
+CREATE TABLE IF NOT EXISTS link_price_checks (
+    link_id UUID PRIMARY KEY REFERENCES affiliate_links(id) ON DELETE CASCADE,
+    checked_at TIMESTAMP WITH TIME ZONE,
+    next_check_at TIMESTAMP WITH TIME ZONE,
+    failures INTEGER NOT NULL DEFAULT 0,
+    last_error VARCHAR(255)
+);
+
+ALTER TABLE link_price_checks ENABLE ROW LEVEL SECURITY;
+CREATE POLICY IF NOT EXISTS "Service role full access" ON link_price_checks FOR ALL USING (auth.role() = 'service_role');
+CREATE INDEX IF NOT EXISTS idx_link_price_checks_next ON link_price_checks(next_check_at);
+
+-- Links due for a price check, never checked first, then the most overdue
+CREATE OR REPLACE FUNCTION due_price_checks(platforms TEXT[], due_before TIMESTAMP WITH TIME ZONE, batch_size INTEGER)
+RETURNS TABLE (id UUID, item_id UUID, platform VARCHAR, region VARCHAR, url TEXT, price DECIMAL,
+               currency VARCHAR, failures INTEGER)
+LANGUAGE sql STABLE AS $$
+    SELECT l.id, l.item_id, l.platform, l.region, l.url, l.price, l.currency, COALESCE(c.failures, 0)
+    FROM affiliate_links l
+    LEFT JOIN link_price_checks c ON c.link_id = l.id
+    WHERE l.platform = ANY(platforms)
+      AND (c.next_check_at IS NULL OR c.next_check_at <= due_before)
+    ORDER BY c.next_check_at ASC NULLS FIRST, l.id
+    LIMIT batch_size;
+$$;
+
+-- Bulk price write-back: parallel arrays of link ids, prices and currencies
+CREATE OR REPLACE FUNCTION apply_link_prices(link_ids UUID[], prices DECIMAL[], currencies VARCHAR[])
+RETURNS INTEGER
+LANGUAGE plpgsql AS $$
+DECLARE
+    updated INTEGER;
+BEGIN
+    UPDATE affiliate_links l
+    SET price = p.price, currency = COALESCE(p.currency, l.currency), updated_at = NOW()
+    FROM unnest(link_ids, prices, currencies) AS p(id, price, currency)
+    WHERE l.id = p.id;
+    GET DIAGNOSTICS updated = ROW_COUNT;
+    RETURN updated;
+END;
+$$;
+
+-- Affiliate link health (src/services/link_health.py): the latest check of
+-- each link; links broken several checks running are switched off
+ALTER TABLE affiliate_links ADD COLUMN IF NOT EXISTS is_active BOOLEAN NOT NULL DEFAULT TRUE;
+
+CREATE TABLE IF NOT EXISTS link_health_checks (
+    link_id UUID PRIMARY KEY REFERENCES affiliate_links(id) ON DELETE CASCADE,
+    checked_at TIMESTAMP WITH TIME ZONE,
+    next_check_at TIMESTAMP WITH TIME ZONE,
+    status VARCHAR(20),
+    status_code INTEGER,
+    final_url TEXT,
+    error VARCHAR(255),
+    failures INTEGER NOT NULL DEFAULT 0
+);
+
+ALTER TABLE link_health_checks ENABLE ROW LEVEL SECURITY;
+CREATE POLICY IF NOT EXISTS "Service role full access" ON link_health_checks FOR ALL USING (auth.role() = 'service_role');
+CREATE INDEX IF NOT EXISTS idx_link_health_checks_next ON link_health_checks(next_check_at);
+
+-- Active links due for a health check, never checked first, then the most overdue
+CREATE OR REPLACE FUNCTION due_link_checks(due_before TIMESTAMP WITH TIME ZONE, batch_size INTEGER)
+RETURNS TABLE (id UUID, item_id UUID, url TEXT, failures INTEGER)
+LANGUAGE sql STABLE AS $$
+    SELECT l.id, l.item_id, l.url, COALESCE(c.failures, 0)
+    FROM affiliate_links l
+    LEFT JOIN link_health_checks c ON c.link_id = l.id
+    WHERE l.is_active
+      AND (c.next_check_at IS NULL OR c.next_check_at <= due_before)
+    ORDER BY c.next_check_at ASC NULLS FIRST, l.id
+    LIMIT batch_size;
+$$;
+
+-- Bulk sync checkpoints: the last phase each franchise of a run reached, so the run can resume
+CREATE TABLE IF NOT EXISTS sync_checkpoints (
+    run_id VARCHAR(36) NOT NULL,
+    franchise_key VARCHAR(255) NOT NULL,
+    name VARCHAR(255) NOT NULL,
+    category VARCHAR(50) NOT NULL,
+    phase VARCHAR(20),
+    state JSONB,
+    error VARCHAR(255),
+    attempts INTEGER NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP WITH TIME ZONE,
+    PRIMARY KEY (run_id, franchise_key)
+);
+
+ALTER TABLE sync_checkpoints ENABLE ROW LEVEL SECURITY;
+CREATE POLICY IF NOT EXISTS "Service role full access" ON sync_checkpoints FOR ALL USING (auth.role() = 'service_role');
+
+-- Seed catalog for bulk syncs (SEED_CATALOG_TABLE): one row per franchise to sync.
+-- query (search term) and provider (tmdb_movies, tmdb_tv or rawg) default by name and category
+CREATE TABLE IF NOT EXISTS seed_franchises (
+    id SERIAL PRIMARY KEY,
+    name VARCHAR(255) NOT NULL,
+    category VARCHAR(50) NOT NULL CHECK (category IN ('movies', 'games', 'series')),
+    query VARCHAR(255),
+    provider VARCHAR(20) CHECK (provider IN ('tmdb_movies', 'tmdb_tv', 'rawg')),
+    description TEXT,
+    UNIQUE(name, category)
+);
+
+ALTER TABLE seed_franchises ENABLE ROW LEVEL SECURITY;
+CREATE POLICY IF NOT EXISTS "Service role full access" ON seed_franchises FOR ALL USING (auth.role() = 'service_role');
@@ -0,0 +1,7 @@
+import re
+
+
+def slugify(text):
+    """Convert text to URL-friendly slug"""
+    text = re.sub(r'[^\w\s-]', '', text.lower())
+    return re.sub(r'[-\s]+', '-', text).strip('-')
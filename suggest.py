@@ -0,0 +1,28 @@
+from flask import Blueprint, request, jsonify
+from src.services.query_budget import query_budget
+from src.services.suggest_index import get_suggest_index
+
+suggest_bp = Blueprint('suggest', __name__)
+
+MAX_SUGGESTIONS = 20
+
+@suggest_bp.route('/suggest', methods=['GET'])
+@query_budget(0)
+def suggest():
+    """Typeahead suggestions for franchise names and item titles, served from memory"""
+    try:
+        query = request.args.get('q', '')
+        limit = min(request.args.get('limit', 8, type=int), MAX_SUGGESTIONS)
+        kind = request.args.get('type')
+        category = request.args.get('category')
+        
+        index = get_suggest_index()
+        if index is None:
+            return jsonify({'error': 'Suggestions are not available'}), 503
+        
+        return jsonify({
+            'query': query,
+            'suggestions': index.suggest(query, limit, kind, category)
+        })
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
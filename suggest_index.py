@@ -0,0 +1,381 @@
+"""In-memory typeahead over franchise names and item titles.
+
+Every suggestion is reachable by the start of any of its first few words
+("zel" finds "The Legend of Zelda"), and results are the highest weighted
+entries under the prefix: popularity_score for franchises, a fraction of
+the parent franchise's score for items.
+
+Keys live in one sorted list with a max-weight segment tree on top, so a
+lookup is two bisects plus a best-first walk of the tree that touches
+O(limit * log n) nodes however many keys share the prefix. Entries added
+after the last build go to a small sorted pending list searched the same way;
+removals and weight changes update the tree in place. The whole structure
+is rebuilt once the pending list grows past REBUILD_PENDING.
+
+Memory is bounded by indexing at most MAX_WORD_KEYS keys per entry, each
+truncated to MAX_KEY_LENGTH characters; the current estimate is exported
+as orderof_suggest_index_bytes.
+"""
+
+import heapq
+import logging
+import sys
+import threading
+from array import array
+from bisect import bisect_left, insort
+
+from flask import current_app
+from src.services.catalog_events import subscribe
+from src.services.metrics import register_gauge
+from src.services.search_index import normalize
+
+logger = logging.getLogger(__name__)
+
+MAX_WORD_KEYS = 4
+MAX_KEY_LENGTH = 40
+REBUILD_PENDING = 20000
+# Items rank below their franchise at equal popularity
+ITEM_WEIGHT = 0.8
+# Words that never start a key on their own
+SKIP_WORDS = {'the', 'a', 'an', 'of', 'and'}
+
+
+def keys_for(label):
+    """Keys under which a label is suggested: the label from each of its first word starts."""
+    words = normalize(label).split()
+    keys = []
+    for start, word in enumerate(words):
+        if len(keys) >= MAX_WORD_KEYS:
+            break
+        if start and word in SKIP_WORDS:
+            continue
+        keys.append(' '.join(words[start:])[:MAX_KEY_LENGTH])
+    return keys
+
+
+class PrefixIndex:
+    """Weighted prefix lookup with in-place weight updates and buffered inserts."""
+    
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._entries = {}      # entry id -> [kind, id, label, category, weight]
+        self._positions = {}    # entry id -> positions in the sorted key list
+        self._keys = []
+        self._owners = []       # position -> entry id
+        self._tree = array('i')
+        self._size = 1
+        self._pending = []      # sorted (key, entry id) added since the last build
+        self._bytes = 0
+    
+    def __len__(self):
+        return len(self._entries)
+    
+    # Building
+    def load(self, rows):
+        """Replace the contents with (kind, id, label, category, weight) rows and build."""
+        with self._lock:
+            self._entries = {(kind, entry_id): [kind, entry_id, label, category, float(weight or 0)]
+                             for kind, entry_id, label, category, weight in rows}
+            self.rebuild()
+    
+    def rebuild(self):
+        """Re-tokenize every entry and rebuild the key list and tree."""
+        with self._lock:
+            pairs = sorted(
+                (key, entry_id)
+                for entry_id, entry in self._entries.items()
+                for key in keys_for(entry[2])
+            )
+            self._install(pairs)
+    
+    def merge_pending(self):
+        """Fold pending keys into the sorted key list, dropping removed entries."""
+        with self._lock:
+            entries = self._entries
+            live = ((key, owner) for key, owner in zip(self._keys, self._owners) if owner in entries)
+            self._install(list(heapq.merge(live, self._pending)))
+    
+    def _install(self, pairs):
+        self._keys = [key for key, _ in pairs]
+        self._owners = [entry_id for _, entry_id in pairs]
+        self._positions = {}
+        for position, entry_id in enumerate(self._owners):
+            self._positions.setdefault(entry_id, []).append(position)
+        self._pending = []
+        self._build_tree()
+        self._bytes = self._estimate_bytes()
+    
+    def _build_tree(self):
+        count = len(self._keys)
+        size = 1
+        while size < count:
+            size *= 2
+        entries = self._entries
+        weights = [entries[owner][4] for owner in self._owners] + [float('-inf')] * (size - count)
+        tree = [-1] * (2 * size)
+        tree[size:size + count] = range(count)
+        best = weights + weights  # best[node] = weight of tree[node], leaves first
+        for node in range(size - 1, 0, -1):
+            left, right = 2 * node, 2 * node + 1
+            if best[left] >= best[right]:
+                tree[node], best[node] = tree[left], best[left]
+            else:
+                tree[node], best[node] = tree[right], best[right]
+        self._tree = array('i', tree)
+        self._size = size
+    
+    def _weight(self, position):
+        if position < 0:
+            return float('-inf')
+        entry = self._entries.get(self._owners[position])
+        return entry[4] if entry is not None else float('-inf')
+    
+    def _better(self, a, b):
+        return a if self._weight(a) >= self._weight(b) else b
+    
+    def _refresh(self, position):
+        node = (position + self._size) // 2
+        while node:
+            self._tree[node] = self._better(self._tree[2 * node], self._tree[2 * node + 1])
+            node //= 2
+    
+    def _estimate_bytes(self):
+        keys = sum(sys.getsizeof(key) for key in self._keys)
+        entries = sum(sys.getsizeof(entry) + sys.getsizeof(entry[2]) for entry in self._entries.values())
+        return (keys + entries + sys.getsizeof(self._keys) + sys.getsizeof(self._owners)
+                + self._tree.itemsize * len(self._tree) + 120 * len(self._entries))
+    
+    # Incremental updates
+    def put(self, kind, entry_id, label, category=None, weight=0.0):
+        """Add or update an entry; only a changed label needs new keys."""
+        key_id = (kind, entry_id)
+        with self._lock:
+            entry = self._entries.get(key_id)
+            if entry is not None and entry[2] == label:
+                entry[3] = category
+                entry[4] = float(weight or 0)
+                for position in self._positions.get(key_id, ()):
+                    self._refresh(position)
+                return
+            if entry is not None:
+                self._drop(key_id)
+            self._entries[key_id] = [kind, entry_id, label, category, float(weight or 0)]
+            for key in keys_for(label):
+                insort(self._pending, (key, key_id))
+            self._bytes += 200 + 2 * len(label) * MAX_WORD_KEYS
+            if len(self._pending) > REBUILD_PENDING:
+                self.merge_pending()
+    
+    def set_weight(self, kind, entry_id, weight):
+        key_id = (kind, entry_id)
+        with self._lock:
+            entry = self._entries.get(key_id)
+            if entry is None:
+                return
+            entry[4] = float(weight or 0)
+            for position in self._positions.get(key_id, ()):
+                self._refresh(position)
+    
+    def remove(self, kind, entry_id):
+        with self._lock:
+            self._drop((kind, entry_id))
+    
+    def _drop(self, key_id):
+        # Positions stay in the key list until the next rebuild but weigh -inf
+        if self._entries.pop(key_id, None) is None:
+            return
+        for position in self._positions.pop(key_id, ()):
+            self._owners[position] = None
+            self._refresh(position)
+        self._pending = [(key, owner) for key, owner in self._pending if owner != key_id]
+    
+    # Lookup
+    def suggest(self, prefix, limit=10, kind=None, category=None):
+        """Best weighted entries whose keys start with prefix, as dicts."""
+        prefix = normalize(prefix)[:MAX_KEY_LENGTH]
+        if not prefix or limit <= 0:
+            return []
+        with self._lock:
+            found = {}
+            for key_id in self._walk(prefix, limit, kind, category):
+                found.setdefault(key_id, self._entries[key_id])
+            start = bisect_left(self._pending, (prefix,))
+            for key, key_id in self._pending[start:bisect_left(self._pending, (prefix + '\uffff',))]:
+                if key_id not in found and self._wanted(key_id, kind, category):
+                    found[key_id] = self._entries[key_id]
+            ranked = sorted(found.values(), key=lambda entry: -entry[4])[:limit]
+            return [{'type': entry[0], 'id': entry[1], 'label': entry[2], 'category': entry[3],
+                     'weight': entry[4]} for entry in ranked]
+    
+    def _wanted(self, key_id, kind, category):
+        entry = self._entries.get(key_id)
+        if entry is None:
+            return False
+        return (kind is None or entry[0] == kind) and (category is None or entry[3] == category)
+    
+    def _walk(self, prefix, limit, kind, category):
+        """Yield distinct entry ids under the prefix, heaviest first."""
+        lo = bisect_left(self._keys, prefix)
+        hi = bisect_left(self._keys, prefix + '\uffff')
+        if lo >= hi:
+            return
+        tree, size = self._tree, self._size
+        heap = []
+        left, right = lo + size, hi + size
+        while left < right:
+            if left & 1:
+                heap.append((-self._weight(tree[left]), left))
+                left += 1
+            if right & 1:
+                right -= 1
+                heap.append((-self._weight(tree[right]), right))
+            left //= 2
+            right //= 2
+        heapq.heapify(heap)
+        seen = set()
+        while heap and len(seen) < limit:
+            negative_weight, node = heapq.heappop(heap)
+            if negative_weight == float('inf'):
+                break
+            if node >= size:
+                key_id = self._owners[node - size]
+                if key_id not in seen and self._wanted(key_id, kind, category):
+                    seen.add(key_id)
+                    yield key_id
+                continue
+            for child in (2 * node, 2 * node + 1):
+                if tree[child] >= 0:
+                    heapq.heappush(heap, (-self._weight(tree[child]), child))
+    
+    def stats(self):
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'keys': len(self._keys) + len(self._pending),
+                'pending': len(self._pending),
+                'bytes': self._bytes,
+            }
+
+
+class CatalogSuggestIndex:
+    """Franchise and item suggestions, kept current from catalog events."""
+    
+    def __init__(self):
+        self.index = PrefixIndex()
+        self._lock = threading.Lock()
+        self._franchises = {}        # franchise_id -> (category, popularity_score)
+        self._franchise_items = {}   # franchise_id -> set of item ids
+    
+    def load(self, franchises, items):
+        """Bulk load (id, name, category, popularity) and (id, title, franchise_id) rows, then build."""
+        def rows():
+            for franchise_id, name, category, popularity in franchises:
+                self._franchises[franchise_id] = (category, popularity or 0)
+                yield 'franchise', franchise_id, name, category, popularity or 0
+            for item_id, title, franchise_id in items:
+                category, popularity = self._franchises.get(franchise_id, (None, 0))
+                self._franchise_items.setdefault(franchise_id, set()).add(item_id)
+                yield 'item', item_id, title, category, popularity * ITEM_WEIGHT
+        
+        with self._lock:
+            self.index.load(rows())
+        return self
+    
+    def load_session(self, session):
+        from src.models.franchise import Franchise, Item
+        
+        franchises = session.query(Franchise.id, Franchise.name, Franchise.category,
+                                   Franchise.popularity_score).yield_per(5000)
+        items = session.query(Item.id, Item.title, Item.franchise_id).yield_per(5000)
+        return self.load(franchises, items)
+    
+    def load_supabase(self, client, page_size=1000):
+        def pages(table, columns):
+            start = 0
+            while True:
+                rows = client.table(table).select(columns).range(start, start + page_size - 1).execute().data
+                yield from rows
+                if len(rows) < page_size:
+                    return
+                start += page_size
+        
+        franchises = ((row['id'], row['name'], row.get('category'), row.get('popularity_score'))
+                      for row in pages('franchises', 'id,name,category,popularity_score'))
+        items = ((row['id'], row['title'], row.get('franchise_id'))
+                 for row in pages('items', 'id,title,franchise_id'))
+        return self.load(franchises, items)
+    
+    def apply(self, changes):
+        """catalog_events subscriber."""
+        with self._lock:
+            for change in changes:
+                row = change.row
+                if change.table == 'franchises':
+                    if change.action == 'delete':
+                        self.index.remove('franchise', row['id'])
+                        self._franchises.pop(row['id'], None)
+                        for item_id in self._franchise_items.pop(row['id'], ()):
+                            self.index.remove('item', item_id)
+                        continue
+                    previous = self._franchises.get(row['id'])
+                    popularity = row.get('popularity_score') or 0
+                    # Score-only updates carry no category
+                    category = row['category'] if 'category' in row else (previous or (None,))[0]
+                    self._franchises[row['id']] = (category, popularity)
+                    if row.get('name') is not None:
+                        self.index.put('franchise', row['id'], row['name'], category, popularity)
+                    else:
+                        self.index.set_weight('franchise', row['id'], popularity)
+                    if previous is not None and previous[1] != popularity:
+                        for item_id in self._franchise_items.get(row['id'], ()):
+                            self.index.set_weight('item', item_id, popularity * ITEM_WEIGHT)
+                elif change.table == 'items':
+                    if change.action == 'delete':
+                        self.index.remove('item', row['id'])
+                        self._franchise_items.get(row.get('franchise_id'), set()).discard(row['id'])
+                    elif row.get('title') is not None:
+                        category, popularity = self._franchises.get(row.get('franchise_id'), (None, 0))
+                        self.index.put('item', row['id'], row['title'], category, popularity * ITEM_WEIGHT)
+                        self._franchise_items.setdefault(row.get('franchise_id'), set()).add(row['id'])
+    
+    def suggest(self, prefix, limit=10, kind=None, category=None):
+        return self.index.suggest(prefix, limit, kind, category)
+
+
+_active = None
+
+
+def _active_stat(name):
+    return _active.index.stats()[name] if _active is not None else 0
+
+
+register_gauge('orderof_suggest_index_entries', 'Entries in the typeahead index.',
+               lambda: _active_stat('entries'))
+register_gauge('orderof_suggest_index_keys', 'Prefix keys in the typeahead index.',
+               lambda: _active_stat('keys'))
+register_gauge('orderof_suggest_index_bytes', 'Estimated memory held by the typeahead index.',
+               lambda: _active_stat('bytes'))
+
+
+def init_suggest_index(app, supabase_client=None):
+    """Build the typeahead index at startup from SQLite (or Supabase) and keep it current."""
+    global _active
+    index = CatalogSuggestIndex()
+    if supabase_client is not None:
+        index.load_supabase(supabase_client)
+    else:
+        from src.config.database import read_session
+        from src.services.catalog_events import install_session_hooks
+        
+        install_session_hooks()
+        with read_session() as session:
+            index.load_session(session)
+    subscribe(index.apply, tables=('franchises', 'items'))
+    app.extensions['orderof_suggest'] = index
+    _active = index
+    logger.info(f"Suggest index built: {index.index.stats()}")
+    return index
+
+
+def get_suggest_index(app=None):
+    return (app or current_app).extensions.get('orderof_suggest')
@@ -1,22 +1,47 @@
 from flask import Blueprint, request, jsonify
-from src.services.supabase_service import SupabaseService
+from src.services.supabase_service import get_supabase_service
+from src.services.affiliate_import import BulkImportError, iter_request_rows, import_links_supabase
+from src.services.link_regions import UnknownRegion, get_link_index, resolve_region
+from src.services.popularity import record_click
 import logging
 
 logger = logging.getLogger(__name__)
 
 supabase_affiliate_bp = Blueprint('supabase_affiliate', __name__)
-supabase_service = SupabaseService()
+supabase_service = get_supabase_service()
 
 @supabase_affiliate_bp.route('/items/<item_id>/affiliate-links', methods=['GET'])
 def get_item_affiliate_links(item_id):
-    """Get all affiliate links for an item."""
+    """Get an item's affiliate links for the request's region."""
     try:
-        links = supabase_service.get_item_affiliate_links(item_id)
-        return jsonify({'affiliate_links': links}), 200
+        region = resolve_region()
+        index = get_link_index(supabase=True)
+        if index is not None:
+            links = index.links([item_id], region)[item_id]
+        else:
+            links = supabase_service.get_item_affiliate_links(item_id, region=region)
+        return jsonify({'affiliate_links': links, 'region': region}), 200, {'Vary': 'Accept-Language'}
+    except UnknownRegion as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         logger.error(f"Error in get_item_affiliate_links: {e}")
         return jsonify({'error': 'Internal server error'}), 500
 
+@supabase_affiliate_bp.route('/affiliate-links/<link_id>/click', methods=['POST'])
+def track_affiliate_click(link_id):
+    """Count an affiliate link click and return the link's URL to redirect to."""
+    try:
+        link = supabase_service.get_affiliate_link(link_id)
+        if not link:
+            return jsonify({'error': 'Affiliate link not found'}), 404
+        
+        # Counted in memory and rolled up into franchise_activity for popularity scoring
+        record_click(link['item_id'])
+        return jsonify({'url': link['url'], 'tracked': True}), 200
+    except Exception as e:
+        logger.error(f"Error in track_affiliate_click: {e}")
+        return jsonify({'error': 'Internal server error'}), 500
+
 @supabase_affiliate_bp.route('/admin/items/<item_id>/affiliate-links', methods=['POST'])
 def create_affiliate_link(item_id):
     """Create a new affiliate link for an item."""
@@ -45,6 +70,18 @@ def create_affiliate_link(item_id):
         logger.error(f"Error in create_affiliate_link: {e}")
         return jsonify({'error': 'Internal server error'}), 500
 
+@supabase_affiliate_bp.route('/admin/affiliate-links/bulk-create', methods=['POST'])
+def bulk_create_affiliate_links():
+    """Bulk create affiliate links from a JSON body or a streamed NDJSON feed."""
+    try:
+        report = import_links_supabase(supabase_service.client, iter_request_rows(request))
+        return jsonify({'message': f"Created {report['created']} affiliate links", **report}), 201
+    except BulkImportError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        logger.error(f"Error in bulk_create_affiliate_links: {e}")
+        return jsonify({'error': 'Internal server error'}), 500
+
 @supabase_affiliate_bp.route('/admin/affiliate-links/<link_id>', methods=['PUT'])
 def update_affiliate_link(link_id):
     """Update an existing affiliate link."""
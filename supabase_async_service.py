@@ -0,0 +1,282 @@
+from typing import List, Dict, Any, Optional, Awaitable, TypeVar
+from datetime import datetime
+import asyncio
+import threading
+import contextvars
+from src.config.supabase import get_async_supabase_client
+from src.services.catalog_events import publish_rows
+from src.services.link_regions import link_region
+import logging
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar('T')
+
+_loop = None
+_loop_lock = threading.Lock()
+
+def _background_loop() -> asyncio.AbstractEventLoop:
+    """Start (once) the event loop that owns the async Supabase client."""
+    global _loop
+    if _loop is None:
+        with _loop_lock:
+            if _loop is None:
+                loop = asyncio.new_event_loop()
+                thread = threading.Thread(target=loop.run_forever, name='supabase-async', daemon=True)
+                thread.start()
+                _loop = loop
+    return _loop
+
+def run_async(coro: Awaitable[T]) -> T:
+    """Run a coroutine on the shared background loop and wait for the result.
+    
+    Lets synchronous Flask views use AsyncSupabaseService without creating a
+    new event loop (and a new connection pool) per request.
+    """
+    caller_context = contextvars.copy_context()
+    
+    async def run_in_caller_context():
+        # Carry the caller's context variables (e.g. the per-request query
+        # log) over to the background loop's task
+        for var, value in caller_context.items():
+            var.set(value)
+        return await coro
+    
+    return asyncio.run_coroutine_threadsafe(run_in_caller_context(), _background_loop()).result()
+
+
+class AsyncSupabaseService:
+    """Async counterpart of SupabaseService for fan-out heavy operations."""
+    
+    # Optional wrapper applied to the client, e.g. CountingSupabaseClient
+    client_wrapper = None
+    
+    async def _client(self):
+        client = await get_async_supabase_client()
+        return self.client_wrapper(client) if self.client_wrapper else client
+    
+    # Franchise operations
+    async def get_franchise_by_id(self, franchise_id: str) -> Optional[Dict[str, Any]]:
+        """Get a single franchise by ID."""
+        try:
+            client = await self._client()
+            result = await client.table('franchises').select('*').eq('id', franchise_id).execute()
+            return result.data[0] if result.data else None
+        except Exception as e:
+            logger.error(f"Error fetching franchise {franchise_id}: {e}")
+            return None
+    
+    async def get_franchise_by_slug(self, slug: str) -> Optional[Dict[str, Any]]:
+        """Get a single franchise by slug."""
+        try:
+            client = await self._client()
+            result = await client.table('franchises').select('*').eq('slug', slug).execute()
+            return result.data[0] if result.data else None
+        except Exception as e:
+            logger.error(f"Error fetching franchise {slug}: {e}")
+            return None
+    
+    async def create_franchise(self, franchise_data: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Create a new franchise."""
+        try:
+            if 'slug' not in franchise_data:
+                franchise_data['slug'] = franchise_data['name'].lower().replace(' ', '-').replace('&', 'and')
+            
+            client = await self._client()
+            result = await client.table('franchises').insert(franchise_data).execute()
+            publish_rows('franchises', result.data)
+            return result.data[0] if result.data else None
+        except Exception as e:
+            logger.error(f"Error creating franchise: {e}")
+            return None
+    
+    async def update_franchise(self, franchise_id: str, franchise_data: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Update an existing franchise."""
+        try:
+            franchise_data['updated_at'] = datetime.utcnow().isoformat()
+            client = await self._client()
+            result = await client.table('franchises').update(franchise_data).eq('id', franchise_id).execute()
+            publish_rows('franchises', result.data)
+            return result.data[0] if result.data else None
+        except Exception as e:
+            logger.error(f"Error updating franchise {franchise_id}: {e}")
+            return None
+    
+    # Item operations
+    async def get_franchise_items(self, franchise_id: str) -> List[Dict[str, Any]]:
+        """Get all items for a franchise."""
+        try:
+            client = await self._client()
+            result = await client.table('items').select('*').eq('franchise_id', franchise_id).order('release_date').execute()
+            return result.data
+        except Exception as e:
+            logger.error(f"Error fetching items for franchise {franchise_id}: {e}")
+            return []
+    
+    async def get_items_by_external_ids(self, franchise_id: str, external_ids: List[str]) -> List[Dict[str, Any]]:
+        """Get a franchise's items with the given external ids."""
+        if not external_ids:
+            return []
+        try:
+            client = await self._client()
+            result = await client.table('items').select('*').eq('franchise_id', franchise_id) \
+                .in_('external_id', external_ids).execute()
+            return result.data
+        except Exception as e:
+            logger.error(f"Error fetching items by external id for franchise {franchise_id}: {e}")
+            return []
+    
+    async def create_item(self, item_data: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Create a new item."""
+        try:
+            client = await self._client()
+            result = await client.table('items').insert(item_data).execute()
+            publish_rows('items', result.data)
+            return result.data[0] if result.data else None
+        except Exception as e:
+            logger.error(f"Error creating item: {e}")
+            return None
+    
+    async def create_items(self, items_data: List[Dict[str, Any]]) -> List[Optional[Dict[str, Any]]]:
+        """Create several items concurrently, preserving input order."""
+        return list(await asyncio.gather(*(self.create_item(item) for item in items_data)))
+    
+    async def update_item(self, item_id: str, item_data: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Update an existing item."""
+        try:
+            client = await self._client()
+            result = await client.table('items').update(item_data).eq('id', item_id).execute()
+            publish_rows('items', result.data)
+            return result.data[0] if result.data else None
+        except Exception as e:
+            logger.error(f"Error updating item {item_id}: {e}")
+            return None
+    
+    # Order operations
+    async def get_franchise_orders(self, franchise_id: str) -> Dict[str, Any]:
+        """Get all orders for a franchise with their items.
+        
+        The franchise and its orders are fetched concurrently, then the items
+        of every order are fetched with a single query.
+        """
+        try:
+            client = await self._client()
+            franchise, orders_result = await asyncio.gather(
+                self.get_franchise_by_id(franchise_id),
+                client.table('orders').select('*').eq('franchise_id', franchise_id).execute(),
+            )
+            if not franchise:
+                return {'franchise': None, 'orders': []}
+            
+            orders = orders_result.data
+            for order in orders:
+                order['items'] = []
+            
+            if orders:
+                orders_by_id = {order['id']: order for order in orders}
+                order_items_result = await client.table('order_items').select('''
+                    *,
+                    items (*)
+                ''').in_('order_id', list(orders_by_id)).order('position').execute()
+                
+                for order_item in order_items_result.data:
+                    item = order_item['items']
+                    entries = orders_by_id[order_item['order_id']]['items']
+                    # position is the 1-based place in the order; rank is the stored sparse value
+                    item['position'] = len(entries) + 1
+                    item['rank'] = order_item['position']
+                    item['entry_id'] = order_item['id']
+                    item['notes'] = order_item['notes']
+                    entries.append(item)
+            
+            return {
+                'franchise': franchise,
+                'orders': orders
+            }
+        except Exception as e:
+            logger.error(f"Error fetching orders for franchise {franchise_id}: {e}")
+            return {'franchise': None, 'orders': []}
+    
+    async def get_order_by_type(self, franchise_id: str, order_type: str) -> Optional[Dict[str, Any]]:
+        """Get a franchise's order of a type, e.g. its release order."""
+        try:
+            client = await self._client()
+            result = await client.table('orders').select('*').eq('franchise_id', franchise_id) \
+                .eq('order_type', order_type).limit(1).execute()
+            return result.data[0] if result.data else None
+        except Exception as e:
+            logger.error(f"Error fetching {order_type} order for franchise {franchise_id}: {e}")
+            return None
+    
+    async def get_order_entries(self, order_id: str) -> List[Dict[str, Any]]:
+        """Get an order's entries (item ids and positions), without the items."""
+        try:
+            client = await self._client()
+            result = await client.table('order_items').select('id,item_id,position').eq('order_id', order_id).execute()
+            return result.data
+        except Exception as e:
+            logger.error(f"Error fetching entries of order {order_id}: {e}")
+            return []
+    
+    async def create_order(self, order_data: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Create a new order."""
+        try:
+            client = await self._client()
+            result = await client.table('orders').insert(order_data).execute()
+            publish_rows('orders', result.data)
+            return result.data[0] if result.data else None
+        except Exception as e:
+            logger.error(f"Error creating order: {e}")
+            return None
+    
+    async def add_item_to_order(self, order_id: str, item_id: str, position: int, notes: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """Add an item to an order."""
+        try:
+            order_item_data = {
+                'order_id': order_id,
+                'item_id': item_id,
+                'position': position,
+                'notes': notes
+            }
+            client = await self._client()
+            result = await client.table('order_items').insert(order_item_data).execute()
+            publish_rows('order_items', result.data)
+            return result.data[0] if result.data else None
+        except Exception as e:
+            logger.error(f"Error adding item to order: {e}")
+            return None
+    
+    # Affiliate link operations
+    async def get_item_affiliate_links(self, item_id: str, region: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Get an item's active affiliate links, optionally only one region's.
+        
+        A region keeps the links that apply everywhere, as the link index does.
+        """
+        try:
+            client = await self._client()
+            query = client.table('affiliate_links').select('*').eq('item_id', item_id).eq('is_active', True)
+            result = await query.execute()
+            if region:
+                return [link for link in result.data if link_region(link) in (region, None)]
+            return result.data
+        except Exception as e:
+            logger.error(f"Error fetching affiliate links for item {item_id}: {e}")
+            return []
+    
+    async def create_affiliate_link(self, link_data: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Create a new affiliate link."""
+        try:
+            client = await self._client()
+            result = await client.table('affiliate_links').insert(link_data).execute()
+            publish_rows('affiliate_links', result.data)
+            return result.data[0] if result.data else None
+        except Exception as e:
+            logger.error(f"Error creating affiliate link: {e}")
+            return None
+
+
+_shared_async_service = AsyncSupabaseService()
+
+def get_async_supabase_service() -> AsyncSupabaseService:
+    """Get the process-wide AsyncSupabaseService."""
+    return _shared_async_service
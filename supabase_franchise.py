@@ -1,13 +1,25 @@
 from flask import Blueprint, request, jsonify
-from src.services.supabase_service import SupabaseService
+from src.services.supabase_service import get_supabase_service
+from src.services.supabase_async_service import get_async_supabase_service, run_async
+from src.services.query_budget import query_budget
+from src.services.popularity import record_view
+from src.services.leaderboard import get_leaderboard
+from src.services.order_compare import compare_orders, get_comparison_cache, matches
+from src.services.link_regions import UnknownRegion, get_link_index, resolve_region
+from src.services.order_ranks import (
+    OrderNotFound, ReorderError, SupabaseOrderStore, apply_sequence, changes_from, delete_entry, insert_entry,
+    move_entry, target_from
+)
 import logging
 
 logger = logging.getLogger(__name__)
 
 supabase_franchise_bp = Blueprint('supabase_franchise', __name__)
-supabase_service = SupabaseService()
+supabase_service = get_supabase_service()
+async_supabase_service = get_async_supabase_service()
 
 @supabase_franchise_bp.route('/franchises', methods=['GET'])
+@query_budget(1)
 def get_franchises():
     """Get all franchises with optional filtering."""
     try:
@@ -15,13 +27,23 @@ def get_franchises():
         limit = int(request.args.get('limit', 50))
         offset = int(request.args.get('offset', 0))
         
+        # Top pages come from the in-memory leaderboard without a query
+        board = get_leaderboard(supabase=True)
+        if board is not None:
+            franchises = board.top(category, limit, offset)
+            if franchises is not None:
+                return jsonify({'franchises': franchises, 'total': len(franchises)}), 200
+        
         result = supabase_service.get_franchises(category=category, limit=limit, offset=offset)
+        if board is not None:
+            board.remember(result['franchises'])
         return jsonify(result), 200
     except Exception as e:
         logger.error(f"Error in get_franchises: {e}")
         return jsonify({'error': 'Internal server error'}), 500
 
 @supabase_franchise_bp.route('/franchises/<franchise_id>', methods=['GET'])
+@query_budget(1)
 def get_franchise(franchise_id):
     """Get a specific franchise by ID."""
     try:
@@ -29,12 +51,14 @@ def get_franchise(franchise_id):
         if not franchise:
             return jsonify({'error': 'Franchise not found'}), 404
         
+        record_view(franchise['id'])
         return jsonify(franchise), 200
     except Exception as e:
         logger.error(f"Error in get_franchise: {e}")
         return jsonify({'error': 'Internal server error'}), 500
 
 @supabase_franchise_bp.route('/franchises/<franchise_id>/items', methods=['GET'])
+@query_budget(1)
 def get_franchise_items(franchise_id):
     """Get all items for a franchise."""
     try:
@@ -45,36 +69,90 @@ def get_franchise_items(franchise_id):
         return jsonify({'error': 'Internal server error'}), 500
 
 @supabase_franchise_bp.route('/franchises/<franchise_id>/orders', methods=['GET'])
+@query_budget(3)
 def get_franchise_orders(franchise_id):
-    """Get all orders for a franchise."""
+    """Get all orders for a franchise, with affiliate links for the request's region."""
     try:
-        result = supabase_service.get_franchise_orders(franchise_id)
+        region = resolve_region()
+        result = run_async(async_supabase_service.get_franchise_orders(franchise_id))
         if not result['franchise']:
             return jsonify({'error': 'Franchise not found'}), 404
         
-        return jsonify(result), 200
+        # Links come from the in-memory index, so they cost no query
+        index = get_link_index(supabase=True)
+        if index is not None:
+            items = [item for order in result['orders'] for item in order['items']]
+            links = index.links([item['id'] for item in items], region)
+            for item in items:
+                item['affiliate_links'] = links[str(item['id'])]
+        result['region'] = region
+        return jsonify(result), 200, {'Vary': 'Accept-Language'}
+    except UnknownRegion as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         logger.error(f"Error in get_franchise_orders: {e}")
         return jsonify({'error': 'Internal server error'}), 500
 
+@supabase_franchise_bp.route('/franchises/<franchise_id>/orders/compare', methods=['GET'])
+@query_budget(3)
+def compare_franchise_orders(franchise_id):
+    """Compare two orders of a franchise (?a=release&b=chronological, by order type or id)."""
+    wanted_a, wanted_b = request.args.get('a'), request.args.get('b')
+    if not wanted_a or not wanted_b:
+        return jsonify({'error': 'Both a and b order types are required'}), 400
+    try:
+        cache = get_comparison_cache()
+        key = ('supabase', franchise_id, wanted_a, wanted_b)
+        if cache is not None:
+            cached = cache.get(key)
+            if cached is not None:
+                return jsonify(cached), 200
+            token = cache.token()
+        
+        result = run_async(async_supabase_service.get_franchise_orders(franchise_id))
+        if not result['franchise']:
+            return jsonify({'error': 'Franchise not found'}), 404
+        picked = []
+        for wanted in (wanted_a, wanted_b):
+            order = next((order for order in result['orders']
+                          if matches(order['id'], order.get('order_type'), wanted)), None)
+            if not order:
+                return jsonify({'error': f'Order not found: {wanted}'}), 404
+            picked.append(order)
+        
+        comparison = dict(compare_orders(*picked), franchise_id=franchise_id)
+        if cache is not None:
+            cache.put(key, comparison, franchise_id, [order['id'] for order in picked], token)
+        return jsonify(comparison), 200
+    except Exception as e:
+        logger.error(f"Error in compare_franchise_orders: {e}")
+        return jsonify({'error': 'Internal server error'}), 500
+
 @supabase_franchise_bp.route('/search', methods=['GET'])
+@query_budget(1)
 def search_franchises():
-    """Search franchises by name or description."""
+    """Search franchises and items in one ranked stream with category facets."""
     try:
         query = request.args.get('q', '').strip()
         if not query:
-            return jsonify({'franchises': []}), 200
+            return jsonify({'results': [], 'facets': {}, 'total': 0, 'next_cursor': None}), 200
         
         limit = int(request.args.get('limit', 20))
-        franchises = supabase_service.search_franchises(query, limit)
+        category = request.args.get('category')
+        cursor = request.args.get('cursor')
+        try:
+            page = supabase_service.search_catalog(query, limit, cursor, category)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
         
-        return jsonify({'franchises': franchises}), 200
+        return jsonify(dict(page, query=query, category=category)), 200
     except Exception as e:
         logger.error(f"Error in search_franchises: {e}")
         return jsonify({'error': 'Internal server error'}), 500
 
 # Admin routes for creating/updating data
 @supabase_franchise_bp.route('/admin/franchises', methods=['POST'])
+@query_budget(1)
 def create_franchise():
     """Create a new franchise."""
     try:
@@ -92,6 +170,7 @@ def create_franchise():
         return jsonify({'error': 'Internal server error'}), 500
 
 @supabase_franchise_bp.route('/admin/franchises/<franchise_id>', methods=['PUT'])
+@query_budget(1)
 def update_franchise(franchise_id):
     """Update an existing franchise."""
     try:
@@ -109,6 +188,7 @@ def update_franchise(franchise_id):
         return jsonify({'error': 'Internal server error'}), 500
 
 @supabase_franchise_bp.route('/admin/items', methods=['POST'])
+@query_budget(1)
 def create_item():
     """Create a new item."""
     try:
@@ -126,6 +206,7 @@ def create_item():
         return jsonify({'error': 'Internal server error'}), 500
 
 @supabase_franchise_bp.route('/admin/orders', methods=['POST'])
+@query_budget(1)
 def create_order():
     """Create a new order."""
     try:
@@ -143,24 +224,91 @@ def create_order():
         return jsonify({'error': 'Internal server error'}), 500
 
 @supabase_franchise_bp.route('/admin/orders/<order_id>/items', methods=['POST'])
+@query_budget(5)
 def add_item_to_order(order_id):
-    """Add an item to an order."""
+    """Add an item to an order at a 1-based position; later entries are not renumbered."""
     try:
         data = request.get_json()
         if not data or 'item_id' not in data or 'position' not in data:
             return jsonify({'error': 'Item ID and position are required'}), 400
         
-        order_item = supabase_service.add_item_to_order(
-            order_id, 
-            data['item_id'], 
-            data['position'], 
-            data.get('notes')
-        )
-        if not order_item:
-            return jsonify({'error': 'Failed to add item to order'}), 500
-        
-        return jsonify(order_item), 201
+        row = {'item_id': data['item_id'], 'notes': data.get('notes')}
+        result = insert_entry(SupabaseOrderStore(supabase_service.client), order_id, row, position=data['position'])
+        return jsonify(dict(result['entry'], order_id=order_id)), 201
+    except OrderNotFound:
+        return jsonify({'error': 'Order not found'}), 404
+    except ReorderError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         logger.error(f"Error in add_item_to_order: {e}")
         return jsonify({'error': 'Internal server error'}), 500
 
+@supabase_franchise_bp.route('/admin/orders/<order_id>/entries', methods=['POST'])
+@query_budget(5)
+def insert_order_entry(order_id):
+    """Insert an item into an order at a position (or after/before an entry) with a single row write."""
+    try:
+        data = request.get_json()
+        if not data or not data.get('item_id'):
+            return jsonify({'error': 'item_id is required'}), 400
+        
+        store = SupabaseOrderStore(supabase_service.client)
+        row = dict(changes_from(data, store.fields), item_id=data['item_id'])
+        return jsonify(insert_entry(store, order_id, row, **target_from(data))), 201
+    except OrderNotFound:
+        return jsonify({'error': 'Order not found'}), 404
+    except ReorderError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        logger.error(f"Error in insert_order_entry: {e}")
+        return jsonify({'error': 'Internal server error'}), 500
+
+@supabase_franchise_bp.route('/admin/orders/<order_id>/entries/<entry_id>', methods=['PATCH'])
+@query_budget(3)
+def move_order_entry(order_id, entry_id):
+    """Move an entry (position, or after/before another entry) and/or update its notes."""
+    try:
+        data = request.get_json() or {}
+        store = SupabaseOrderStore(supabase_service.client)
+        result = move_entry(store, order_id, entry_id, changes_from(data, store.fields), **target_from(data))
+        return jsonify(result), 200
+    except OrderNotFound:
+        return jsonify({'error': 'Order not found'}), 404
+    except ReorderError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        logger.error(f"Error in move_order_entry: {e}")
+        return jsonify({'error': 'Internal server error'}), 500
+
+@supabase_franchise_bp.route('/admin/orders/<order_id>/entries/<entry_id>', methods=['DELETE'])
+@query_budget(3)
+def delete_order_entry(order_id, entry_id):
+    """Remove an entry from an order without renumbering the rest."""
+    try:
+        return jsonify(delete_entry(SupabaseOrderStore(supabase_service.client), order_id, entry_id)), 200
+    except OrderNotFound:
+        return jsonify({'error': 'Order not found'}), 404
+    except ReorderError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        logger.error(f"Error in delete_order_entry: {e}")
+        return jsonify({'error': 'Internal server error'}), 500
+
+@supabase_franchise_bp.route('/admin/orders/<order_id>/sequence', methods=['PUT'])
+@query_budget(6)
+def apply_order_sequence(order_id):
+    """Replace an order's sequence of items, writing only the entries that changed."""
+    try:
+        data = request.get_json()
+        if not data or not isinstance(data.get('items'), list):
+            return jsonify({'error': 'items array is required'}), 400
+        
+        return jsonify(apply_sequence(SupabaseOrderStore(supabase_service.client), order_id, data['items'])), 200
+    except OrderNotFound:
+        return jsonify({'error': 'Order not found'}), 404
+    except ReorderError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        logger.error(f"Error in apply_order_sequence: {e}")
+        return jsonify({'error': 'Internal server error'}), 500
+
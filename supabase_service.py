@@ -1,14 +1,39 @@
 from typing import List, Dict, Any, Optional
 from datetime import datetime
 import uuid
+import threading
 from src.config.supabase import get_supabase_client
+from src.services.catalog_events import publish_rows
+from src.services.link_regions import link_region
+from src.services.search_ranking import KIND_RANKS, decode_cursor, encode_cursor
 import logging
 
 logger = logging.getLogger(__name__)
 
+# Minimum word_similarity for search_franchises_fuzzy (see setup_supabase_tables.sql)
+SEARCH_SIMILARITY_THRESHOLD = 0.5
+
+_shared_service = None
+_shared_service_lock = threading.Lock()
+
+def get_supabase_service() -> 'SupabaseService':
+    """Get the process-wide SupabaseService backed by the shared client."""
+    global _shared_service
+    if _shared_service is None:
+        with _shared_service_lock:
+            if _shared_service is None:
+                _shared_service = SupabaseService()
+    return _shared_service
+
 class SupabaseService:
-    def __init__(self):
-        self.client = get_supabase_client()
+    # Optional wrapper applied to the client, e.g. CountingSupabaseClient
+    client_wrapper = None
+    
+    @property
+    def client(self):
+        """The shared client, resolved on every use so use_supabase_client() reaches existing services."""
+        client = get_supabase_client()
+        return self.client_wrapper(client) if self.client_wrapper else client
     
     # Franchise operations
     def get_franchises(self, category: Optional[str] = None, limit: int = 50, offset: int = 0) -> Dict[str, Any]:
@@ -47,6 +72,7 @@ class SupabaseService:
                 franchise_data['slug'] = franchise_data['name'].lower().replace(' ', '-').replace('&', 'and')
             
             result = self.client.table('franchises').insert(franchise_data).execute()
+            publish_rows('franchises', result.data)
             return result.data[0] if result.data else None
         except Exception as e:
             logger.error(f"Error creating franchise: {e}")
@@ -57,6 +83,7 @@ class SupabaseService:
         try:
             franchise_data['updated_at'] = datetime.utcnow().isoformat()
             result = self.client.table('franchises').update(franchise_data).eq('id', franchise_id).execute()
+            publish_rows('franchises', result.data)
             return result.data[0] if result.data else None
         except Exception as e:
             logger.error(f"Error updating franchise {franchise_id}: {e}")
@@ -76,6 +103,7 @@ class SupabaseService:
         """Create a new item."""
         try:
             result = self.client.table('items').insert(item_data).execute()
+            publish_rows('items', result.data)
             return result.data[0] if result.data else None
         except Exception as e:
             logger.error(f"Error creating item: {e}")
@@ -103,19 +131,26 @@ class SupabaseService:
             orders_result = self.client.table('orders').select('*').eq('franchise_id', franchise_id).execute()
             orders = orders_result.data
             
-            # Get order items for each order
             for order in orders:
+                order['items'] = []
+            
+            # Get order items for all orders in one query
+            if orders:
+                orders_by_id = {order['id']: order for order in orders}
                 order_items_result = self.client.table('order_items').select('''
                     *,
                     items (*)
-                ''').eq('order_id', order['id']).order('position').execute()
+                ''').in_('order_id', list(orders_by_id)).order('position').execute()
                 
-                order['items'] = []
                 for order_item in order_items_result.data:
                     item = order_item['items']
-                    item['position'] = order_item['position']
+                    entries = orders_by_id[order_item['order_id']]['items']
+                    # position is the 1-based place in the order; rank is the stored sparse value
+                    item['position'] = len(entries) + 1
+                    item['rank'] = order_item['position']
+                    item['entry_id'] = order_item['id']
                     item['notes'] = order_item['notes']
-                    order['items'].append(item)
+                    entries.append(item)
             
             return {
                 'franchise': franchise,
@@ -129,6 +164,7 @@ class SupabaseService:
         """Create a new order."""
         try:
             result = self.client.table('orders').insert(order_data).execute()
+            publish_rows('orders', result.data)
             return result.data[0] if result.data else None
         except Exception as e:
             logger.error(f"Error creating order: {e}")
@@ -144,16 +180,32 @@ class SupabaseService:
                 'notes': notes
             }
             result = self.client.table('order_items').insert(order_item_data).execute()
+            publish_rows('order_items', result.data)
             return result.data[0] if result.data else None
         except Exception as e:
             logger.error(f"Error adding item to order: {e}")
             return None
     
     # Affiliate link operations
-    def get_item_affiliate_links(self, item_id: str) -> List[Dict[str, Any]]:
-        """Get all affiliate links for an item."""
+    def get_affiliate_link(self, link_id: str) -> Optional[Dict[str, Any]]:
+        """Get a single affiliate link by ID."""
         try:
-            result = self.client.table('affiliate_links').select('*').eq('item_id', item_id).execute()
+            result = self.client.table('affiliate_links').select('*').eq('id', link_id).execute()
+            return result.data[0] if result.data else None
+        except Exception as e:
+            logger.error(f"Error fetching affiliate link {link_id}: {e}")
+            return None
+    
+    def get_item_affiliate_links(self, item_id: str, region: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Get an item's active affiliate links, optionally only one region's.
+        
+        A region keeps the links that apply everywhere, as the link index does.
+        """
+        try:
+            query = self.client.table('affiliate_links').select('*').eq('item_id', item_id).eq('is_active', True)
+            result = query.execute()
+            if region:
+                return [link for link in result.data if link_region(link) in (region, None)]
             return result.data
         except Exception as e:
             logger.error(f"Error fetching affiliate links for item {item_id}: {e}")
@@ -163,6 +215,7 @@ class SupabaseService:
         """Create a new affiliate link."""
         try:
             result = self.client.table('affiliate_links').insert(link_data).execute()
+            publish_rows('affiliate_links', result.data)
             return result.data[0] if result.data else None
         except Exception as e:
             logger.error(f"Error creating affiliate link: {e}")
@@ -173,6 +226,7 @@ class SupabaseService:
         try:
             link_data['updated_at'] = datetime.utcnow().isoformat()
             result = self.client.table('affiliate_links').update(link_data).eq('id', link_id).execute()
+            publish_rows('affiliate_links', result.data)
             return result.data[0] if result.data else None
         except Exception as e:
             logger.error(f"Error updating affiliate link {link_id}: {e}")
@@ -182,19 +236,122 @@ class SupabaseService:
         """Delete an affiliate link."""
         try:
             result = self.client.table('affiliate_links').delete().eq('id', link_id).execute()
+            publish_rows('affiliate_links', result.data, 'delete')
             return len(result.data) > 0
         except Exception as e:
             logger.error(f"Error deleting affiliate link {link_id}: {e}")
             return False
     
+    def get_due_affiliate_links(self, platforms: List[str], limit: int, due_before: str) -> List[Dict[str, Any]]:
+        """Links on platforms whose price check is due, never checked first (due_price_checks rpc)."""
+        result = self.client.rpc('due_price_checks', {
+            'platforms': platforms,
+            'due_before': due_before,
+            'batch_size': limit,
+        }).execute()
+        return result.data or []
+    
+    def apply_affiliate_prices(self, prices: List[Dict[str, Any]], checks: List[Dict[str, Any]]) -> int:
+        """Bulk-write refreshed prices (apply_link_prices rpc) and upsert their link_price_checks rows."""
+        updated = 0
+        if prices:
+            updated = self.client.rpc('apply_link_prices', {
+                'link_ids': [price['id'] for price in prices],
+                'prices': [price['price'] for price in prices],
+                'currencies': [price['currency'] for price in prices],
+            }).execute().data or 0
+        if checks:
+            self.client.table('link_price_checks').upsert(checks, on_conflict='link_id').execute()
+        return updated
+    
+    def get_due_link_checks(self, limit: int, due_before: str) -> List[Dict[str, Any]]:
+        """Active links whose health check is due, never checked first (due_link_checks rpc)."""
+        result = self.client.rpc('due_link_checks', {
+            'due_before': due_before,
+            'batch_size': limit,
+        }).execute()
+        return result.data or []
+    
+    def apply_link_health(self, checks: List[Dict[str, Any]], deactivate_ids: List[str]) -> None:
+        """Upsert link_health_checks rows and switch off the links that keep failing."""
+        if checks:
+            self.client.table('link_health_checks').upsert(checks, on_conflict='link_id').execute()
+        if deactivate_ids:
+            self.client.table('affiliate_links').update({
+                'is_active': False,
+                'updated_at': datetime.utcnow().isoformat()
+            }).in_('id', deactivate_ids).execute()
+    
     # Search operations
-    def search_franchises(self, query: str, limit: int = 20) -> List[Dict[str, Any]]:
+    def search_franchises(self, query: str, limit: int = 20, category: Optional[str] = None,
+                          threshold: float = SEARCH_SIMILARITY_THRESHOLD) -> List[Dict[str, Any]]:
+        """Typo-tolerant franchise search ranked by trigram similarity (pg_trgm)."""
+        try:
+            result = self.client.rpc('search_franchises_fuzzy', {
+                'query': query,
+                'match_threshold': threshold,
+                'match_limit': limit,
+                'match_category': category,
+            }).execute()
+            return result.data
+        except Exception as e:
+            # Databases without the pg_trgm migration still get substring search
+            logger.warning(f"Fuzzy franchise search unavailable, using ilike: {e}")
+            return self.search_franchises_ilike(query, limit, category)
+    
+    def search_catalog(self, query: str, limit: int = 20, cursor: Optional[str] = None,
+                       category: Optional[str] = None,
+                       threshold: float = SEARCH_SIMILARITY_THRESHOLD) -> Dict[str, Any]:
+        """Ranked franchises and items in one stream with category facets (search_catalog rpc).
+        
+        Raises ValueError for a malformed cursor.
+        """
+        after = decode_cursor(cursor)
+        try:
+            result = self.client.rpc('search_catalog', {
+                'query': query,
+                'match_threshold': threshold,
+                'match_limit': limit,
+                'match_category': category,
+                'after_score': after[0] if after else None,
+                'after_kind': KIND_RANKS[after[1]] if after else None,
+                'after_id': after[2] if after else None,
+            }).execute()
+            page = result.data or {}
+        except Exception as e:
+            logger.warning(f"Unified search unavailable, using ilike: {e}")
+            if after:
+                return {'results': [], 'facets': {}, 'total': 0, 'next_cursor': None}
+            franchises = self.search_franchises_ilike(query, limit, category)
+            return {
+                'results': [dict(franchise, type='franchise') for franchise in franchises],
+                'facets': {},
+                'total': len(franchises),
+                'next_cursor': None
+            }
+        
+        results = page.get('results') or []
+        next_cursor = None
+        if len(results) > limit:
+            last = results[limit - 1]
+            next_cursor = encode_cursor(last['score'], last['type'], last['id'])
+        return {
+            'results': results[:limit],
+            'facets': page.get('facets') or {},
+            'total': page.get('total', 0),
+            'next_cursor': next_cursor
+        }
+    
+    def search_franchises_ilike(self, query: str, limit: int = 20, category: Optional[str] = None) -> List[Dict[str, Any]]:
         """Search franchises by name or description."""
         try:
             # Use ilike for case-insensitive search
-            result = self.client.table('franchises').select('*').or_(
+            request = self.client.table('franchises').select('*').or_(
                 f'name.ilike.%{query}%,description.ilike.%{query}%'
-            ).order('popularity_score', desc=True).limit(limit).execute()
+            )
+            if category:
+                request = request.eq('category', category)
+            result = request.order('popularity_score', desc=True).limit(limit).execute()
             return result.data
         except Exception as e:
             logger.error(f"Error searching franchises: {e}")
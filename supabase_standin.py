@@ -0,0 +1,539 @@
+"""In-memory stand-in for the Supabase client.
+
+Implements the subset of the supabase-py / postgrest query builder used by
+SupabaseService and AsyncSupabaseService (select with embedded `items (*)`,
+eq/neq/gt/gte/lt/lte/in_/ilike/or_ filters, order, range, limit, insert,
+update, upsert, delete and rpc) over plain Python lists, so benchmarks and
+tests can run the Supabase routes without a live project.
+
+    standin = SupabaseStandIn()
+    use_supabase_client(standin, AsyncSupabaseStandIn(standin))
+"""
+
+import re
+import uuid
+import threading
+from collections import Counter
+from datetime import datetime
+
+# Unique constraints from setup_supabase_tables.sql
+UNIQUE_KEYS = {
+    'franchises': [('slug',)],
+    'order_items': [('order_id', 'position')],
+    'affiliate_links': [('item_id', 'platform', 'region')],
+}
+
+# Column defaults from setup_supabase_tables.sql that reads filter on
+DEFAULTS = {
+    'affiliate_links': {'is_active': True},
+}
+
+# Embedded resources: table -> {embedded name: (foreign key column, target table)}
+EMBEDS = {
+    'order_items': {'items': ('item_id', 'items'), 'orders': ('order_id', 'orders')},
+    'items': {'franchises': ('franchise_id', 'franchises')},
+    'affiliate_links': {'items': ('item_id', 'items')},
+}
+
+_EMBED_PATTERN = re.compile(r'(\w+)\s*\(\s*\*\s*\)')
+
+
+class StandInError(Exception):
+    """Mirrors postgrest.APIError closely enough for the service's handlers."""
+
+    def __init__(self, message, code=None):
+        super().__init__(message)
+        self.message = message
+        self.code = code
+
+
+class StandInResponse:
+    def __init__(self, data, count=None):
+        self.data = data
+        self.count = count
+
+
+def _like_to_regex(pattern):
+    parts = [re.escape(part) for part in pattern.split('%')]
+    return re.compile('^' + '.*'.join(parts) + '$', re.IGNORECASE | re.DOTALL)
+
+
+def _sort_key(value):
+    # None sorts last, like Postgres' default NULLS LAST for ascending order
+    return (value is None, value if value is not None else 0)
+
+
+class QueryBuilder:
+    def __init__(self, store, table):
+        self._store = store
+        self._table = table
+        self._action = 'select'
+        self._columns = '*'
+        self._count = None
+        self._payload = None
+        self._on_conflict = None
+        self._filters = []
+        self._order = []
+        self._range = None
+
+    # Actions
+    def select(self, columns='*', count=None):
+        self._action = 'select'
+        self._columns = columns
+        self._count = count
+        return self
+
+    def insert(self, rows, **kwargs):
+        self._action = 'insert'
+        self._payload = rows
+        return self
+
+    def upsert(self, rows, on_conflict=None, **kwargs):
+        self._action = 'upsert'
+        self._payload = rows
+        self._on_conflict = on_conflict
+        return self
+
+    def update(self, values, **kwargs):
+        self._action = 'update'
+        self._payload = values
+        return self
+
+    def delete(self, **kwargs):
+        self._action = 'delete'
+        return self
+
+    # Filters
+    def _filter(self, predicate):
+        self._filters.append(predicate)
+        return self
+
+    def eq(self, column, value):
+        return self._filter(lambda row: str(row.get(column)) == str(value))
+
+    def neq(self, column, value):
+        return self._filter(lambda row: str(row.get(column)) != str(value))
+
+    def gt(self, column, value):
+        return self._filter(lambda row: row.get(column) is not None and row[column] > value)
+
+    def gte(self, column, value):
+        return self._filter(lambda row: row.get(column) is not None and row[column] >= value)
+
+    def lt(self, column, value):
+        return self._filter(lambda row: row.get(column) is not None and row[column] < value)
+
+    def lte(self, column, value):
+        return self._filter(lambda row: row.get(column) is not None and row[column] <= value)
+
+    def in_(self, column, values):
+        wanted = {str(value) for value in values}
+        return self._filter(lambda row: str(row.get(column)) in wanted)
+
+    def is_(self, column, value):
+        target = None if value in (None, 'null') else value
+        return self._filter(lambda row: row.get(column) is target)
+
+    def ilike(self, column, pattern):
+        regex = _like_to_regex(pattern)
+        return self._filter(lambda row: row.get(column) is not None and regex.match(str(row[column])))
+
+    def or_(self, expression):
+        """Supports the `col.ilike.pattern,col.eq.value` form."""
+        clauses = []
+        for clause in expression.split(','):
+            column, operator, value = clause.split('.', 2)
+            if operator == 'ilike':
+                regex = _like_to_regex(value)
+                clauses.append(lambda row, c=column, r=regex: row.get(c) is not None and r.match(str(row[c])))
+            elif operator == 'eq':
+                clauses.append(lambda row, c=column, v=value: str(row.get(c)) == v)
+            else:
+                raise StandInError(f"Unsupported or_ operator: {operator}")
+        return self._filter(lambda row: any(clause(row) for clause in clauses))
+
+    # Modifiers
+    def order(self, column, desc=False, **kwargs):
+        self._order.append((column, desc))
+        return self
+
+    def range(self, start, end):
+        self._range = (start, end + 1)
+        return self
+
+    def limit(self, count):
+        start = self._range[0] if self._range else 0
+        self._range = (start, start + count)
+        return self
+
+    def single(self):
+        return self
+
+    def execute(self):
+        with self._store.lock:
+            if self._action == 'select':
+                return self._execute_select()
+            if self._action in ('insert', 'upsert'):
+                return self._execute_insert()
+            if self._action == 'update':
+                return self._execute_update()
+            return self._execute_delete()
+
+    def _matching(self):
+        rows = self._store.tables.setdefault(self._table, [])
+        return [row for row in rows if all(predicate(row) for predicate in self._filters)]
+
+    def _execute_select(self):
+        rows = self._matching()
+        for column, desc in reversed(self._order):
+            rows.sort(key=lambda row: _sort_key(row.get(column)), reverse=desc)
+        total = len(rows)
+        if self._range:
+            rows = rows[self._range[0]:self._range[1]]
+
+        embeds = [name for name in _EMBED_PATTERN.findall(self._columns)
+                  if name in EMBEDS.get(self._table, {})]
+        data = []
+        for row in rows:
+            result = dict(row)
+            for name in embeds:
+                column, target = EMBEDS[self._table][name]
+                result[name] = self._store.get(target, row.get(column))
+            data.append(result)
+        return StandInResponse(data, total if self._count else None)
+
+    def _execute_insert(self):
+        rows = self._payload if isinstance(self._payload, list) else [self._payload]
+        conflict_columns = tuple(c.strip() for c in self._on_conflict.split(',')) if self._on_conflict else ('id',)
+        created = []
+        added = []
+        try:
+            for row in rows:
+                row = dict(row)
+                if self._action == 'upsert':
+                    existing = self._store.find(self._table, conflict_columns, row)
+                    if existing is not None:
+                        existing.update(row)
+                        existing['updated_at'] = datetime.utcnow().isoformat()
+                        created.append(dict(existing))
+                        continue
+                added.append(self._store.add(self._table, row))
+                created.append(dict(added[-1]))
+        except StandInError:
+            # One statement: a rejected row leaves none of the batch's new rows behind
+            self._store.remove(self._table, added)
+            raise
+        return StandInResponse(created)
+
+    def _execute_update(self):
+        rows = self._matching()
+        for row in rows:
+            row.update(self._payload)
+        return StandInResponse([dict(row) for row in rows])
+
+    def _execute_delete(self):
+        rows = self._matching()
+        self._store.remove(self._table, rows)
+        return StandInResponse([dict(row) for row in rows])
+
+
+class SupabaseStandIn:
+    """Thread-safe in-memory tables with Supabase client semantics."""
+
+    def __init__(self):
+        self.lock = threading.RLock()
+        self.tables = {}
+        self._by_id = {}
+        self._rpc = {}
+
+    def table(self, name):
+        return QueryBuilder(self, name)
+
+    def from_(self, name):
+        return self.table(name)
+
+    def register_rpc(self, name, function):
+        """Register a Python function to answer client.rpc(name, params)."""
+        self._rpc[name] = function
+
+    def rpc(self, name, params=None, **kwargs):
+        if name not in self._rpc:
+            raise StandInError(f"Could not find the function {name}", code='PGRST202')
+        return _RpcCall(lambda: self._rpc[name](self, **(params or {})))
+
+    # Storage helpers used by the query builder and bulk loaders
+    def get(self, table, row_id):
+        return self._by_id.get(table, {}).get(str(row_id))
+
+    def find(self, table, columns, values):
+        if columns == ('id',):
+            return self.get(table, values.get('id'))
+        for row in self.tables.get(table, []):
+            if all(row.get(column) == values.get(column) for column in columns):
+                return row
+        return None
+
+    def add(self, table, row):
+        row.setdefault('id', str(uuid.uuid4()))
+        row.setdefault('created_at', datetime.utcnow().isoformat())
+        for column, value in DEFAULTS.get(table, {}).items():
+            row.setdefault(column, value)
+        for columns in UNIQUE_KEYS.get(table, []):
+            if self.find(table, columns, row) is not None:
+                raise StandInError(
+                    f'duplicate key value violates unique constraint on {table}({", ".join(columns)})',
+                    code='23505',
+                )
+        self.tables.setdefault(table, []).append(row)
+        self._by_id.setdefault(table, {})[str(row['id'])] = row
+        return row
+
+    def bulk_load(self, table, rows):
+        """Append rows without constraint checks (for seeding large catalogs)."""
+        with self.lock:
+            target = self.tables.setdefault(table, [])
+            index = self._by_id.setdefault(table, {})
+            defaults = DEFAULTS.get(table, {})
+            for row in rows:
+                row.setdefault('id', str(uuid.uuid4()))
+                for column, value in defaults.items():
+                    row.setdefault(column, value)
+                target.append(row)
+                index[str(row['id'])] = row
+
+    def remove(self, table, rows):
+        doomed = {id(row) for row in rows}
+        self.tables[table] = [row for row in self.tables.get(table, []) if id(row) not in doomed]
+        index = self._by_id.get(table, {})
+        for row in rows:
+            index.pop(str(row.get('id')), None)
+
+
+class _RpcCall:
+    def __init__(self, function):
+        self._function = function
+
+    def execute(self):
+        return StandInResponse(self._function())
+
+
+class _AsyncQuery:
+    def __init__(self, builder):
+        self._builder = builder
+
+    def __getattr__(self, name):
+        attr = getattr(self._builder, name)
+
+        def call(*args, **kwargs):
+            result = attr(*args, **kwargs)
+            return self if result is self._builder else result
+        return call
+
+    async def execute(self):
+        return self._builder.execute()
+
+
+class AsyncSupabaseStandIn:
+    """Async facade over a SupabaseStandIn sharing the same tables."""
+
+    def __init__(self, standin):
+        self._standin = standin
+
+    def table(self, name):
+        return _AsyncQuery(self._standin.table(name))
+
+    def from_(self, name):
+        return self.table(name)
+
+    def rpc(self, name, params=None, **kwargs):
+        return _AsyncQuery(self._standin.rpc(name, params, **kwargs))
+
+
+def register_search_rpcs(standin):
+    """Answer search_franchises_fuzzy / search_items_fuzzy / search_catalog like the SQL functions.
+
+    The trigram index is rebuilt whenever the table's row count changes,
+    which is enough for benchmarks that load once and then only read.
+    """
+    from src.services.search_index import TrigramIndex
+    from src.services.search_ranking import KINDS, combined_score, sort_key
+
+    cache = {}
+
+    def franchise_of(store, item):
+        return store.get('franchises', item.get('franchise_id')) or {}
+
+    def index_of(store, table, column):
+        rows = store.tables.get(table, [])
+        cached = cache.get(table)
+        if cached is None or cached[0] != len(rows):
+            index = TrigramIndex()
+            for row in rows:
+                owner = row if table == 'franchises' else franchise_of(store, row)
+                index.add(row['id'], row.get(column), owner.get('category'), owner.get('popularity_score'))
+            cached = cache[table] = (len(rows), index)
+        return cached[1]
+
+    def fuzzy(table, column):
+        def search(store, query, match_threshold=0.5, match_limit=20, match_category=None):
+            with store.lock:
+                hits = index_of(store, table, column).search(query, match_limit, match_threshold, match_category)
+                return [dict(store.get(table, doc_id), similarity=similarity) for doc_id, similarity in hits]
+        return search
+
+    def search_catalog(store, query, match_threshold=0.5, match_limit=20, match_category=None,
+                       after_score=None, after_kind=None, after_id=None):
+        after = sort_key(after_score, KINDS[after_kind], after_id) if after_score is not None else None
+        facets = Counter()
+        matches = []
+        with store.lock:
+            franchises = store.tables.get('franchises', [])
+            max_popularity = max((row.get('popularity_score') or 0 for row in franchises), default=0)
+            for kind, table, column in (('franchise', 'franchises', 'name'), ('item', 'items', 'title')):
+                index = index_of(store, table, column)
+                slots, similarity, popularity, codes = index.match(query, match_threshold)
+                names = index.category_names()
+                for i in range(len(slots)):
+                    category = names[int(codes[i])]
+                    facets[category] += 1
+                    if match_category is not None and category != match_category:
+                        continue
+                    score = combined_score(float(similarity[i]), float(popularity[i]), max_popularity)
+                    matches.append((sort_key(score, kind, index.doc_id(slots[i])), kind, table,
+                                    index.doc_id(slots[i]), score, float(similarity[i])))
+            matches.sort()
+            page = [match for match in matches if after is None or match[0] > after][:match_limit + 1]
+            results = [dict(store.get(table, doc_id), type=kind, score=score, similarity=round(similarity, 4))
+                       for _, kind, table, doc_id, score, similarity in page]
+        facets.pop(None, None)
+        return {'results': results, 'facets': dict(facets), 'total': len(matches)}
+
+    standin.register_rpc('search_franchises_fuzzy', fuzzy('franchises', 'name'))
+    standin.register_rpc('search_items_fuzzy', fuzzy('items', 'title'))
+    standin.register_rpc('search_catalog', search_catalog)
+    return standin
+
+
+def register_popularity_rpcs(standin):
+    """Answer record_franchise_activity / popularity_signals / apply_popularity_scores."""
+
+    def record_franchise_activity(store, rows):
+        with store.lock:
+            for row in rows:
+                if store.get('franchises', row['franchise_id']) is None:
+                    continue
+                key = f"{row['franchise_id']}:{row['day']}"
+                existing = store.get('franchise_activity', key)
+                if existing is None:
+                    store.add('franchise_activity', dict(row, id=key))
+                else:
+                    existing['page_views'] += row['page_views']
+                    existing['affiliate_clicks'] += row['affiliate_clicks']
+
+    def popularity_signals(store, since):
+        def columns(rows, names):
+            return {name: [getter(row) for row in rows] for name, getter in names.items()}
+
+        def metadata(key):
+            return lambda row: (row.get('api_metadata') or {}).get(key)
+
+        with store.lock:
+            return {
+                'franchises': columns(store.tables.get('franchises', []), {
+                    'id': lambda row: row['id'],
+                    'popularity_score': lambda row: row.get('popularity_score'),
+                }),
+                'items': columns(store.tables.get('items', []), {
+                    'franchise_id': lambda row: row.get('franchise_id'),
+                    'release_date': lambda row: row.get('release_date'),
+                    'tmdb_popularity': metadata('popularity'),
+                    'vote_count': metadata('vote_count'),
+                    'rawg_rating': metadata('rating'),
+                    'ratings_count': metadata('ratings_count'),
+                }),
+                'activity': columns([row for row in store.tables.get('franchise_activity', [])
+                                     if row['day'] >= since], {
+                    'franchise_id': lambda row: row['franchise_id'],
+                    'day': lambda row: row['day'],
+                    'page_views': lambda row: row['page_views'],
+                    'affiliate_clicks': lambda row: row['affiliate_clicks'],
+                }),
+            }
+
+    def apply_popularity_scores(store, franchise_ids, scores):
+        updated = 0
+        now = datetime.utcnow().isoformat()
+        with store.lock:
+            for franchise_id, score in zip(franchise_ids, scores):
+                row = store.get('franchises', franchise_id)
+                if row is not None:
+                    row['popularity_score'] = score
+                    row['updated_at'] = now
+                    updated += 1
+        return updated
+
+    standin.register_rpc('record_franchise_activity', record_franchise_activity)
+    standin.register_rpc('popularity_signals', popularity_signals)
+    standin.register_rpc('apply_popularity_scores', apply_popularity_scores)
+    return standin
+
+
+def register_price_rpcs(standin):
+    """Answer due_price_checks / apply_link_prices."""
+
+    def due_price_checks(store, platforms, due_before, batch_size):
+        with store.lock:
+            checks = {row['link_id']: row for row in store.tables.get('link_price_checks', [])}
+            due = []
+            for link in store.tables.get('affiliate_links', []):
+                check = checks.get(str(link['id']))
+                if link.get('platform') not in platforms:
+                    continue
+                if check is not None and check['next_check_at'] > due_before:
+                    continue
+                due.append((check is not None, check['next_check_at'] if check else '', str(link['id']),
+                            dict({column: link.get(column) for column in
+                                  ('id', 'item_id', 'platform', 'region', 'url', 'price', 'currency')},
+                                 failures=check['failures'] if check else 0)))
+        due.sort(key=lambda entry: entry[:3])
+        return [entry[3] for entry in due[:batch_size]]
+
+    def apply_link_prices(store, link_ids, prices, currencies):
+        updated = 0
+        now = datetime.utcnow().isoformat()
+        with store.lock:
+            for link_id, price, currency in zip(link_ids, prices, currencies):
+                row = store.get('affiliate_links', link_id)
+                if row is not None:
+                    row['price'] = price
+                    row['currency'] = currency or row.get('currency')
+                    row['updated_at'] = now
+                    updated += 1
+        return updated
+
+    standin.register_rpc('due_price_checks', due_price_checks)
+    standin.register_rpc('apply_link_prices', apply_link_prices)
+    return standin
+
+
+def register_link_health_rpcs(standin):
+    """Answer due_link_checks."""
+
+    def due_link_checks(store, due_before, batch_size):
+        with store.lock:
+            checks = {row['link_id']: row for row in store.tables.get('link_health_checks', [])}
+            due = []
+            for link in store.tables.get('affiliate_links', []):
+                check = checks.get(str(link['id']))
+                if not link.get('is_active', True):
+                    continue
+                if check is not None and check['next_check_at'] > due_before:
+                    continue
+                due.append((check is not None, check['next_check_at'] if check else '', str(link['id']),
+                            {'id': link['id'], 'item_id': link.get('item_id'), 'url': link.get('url'),
+                             'failures': check['failures'] if check else 0}))
+        due.sort(key=lambda entry: entry[:3])
+        return [entry[3] for entry in due[:batch_size]]
+
+    standin.register_rpc('due_link_checks', due_link_checks)
+    return standin
@@ -1,5 +1,16 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, Response, current_app, request, jsonify
 from src.services.supabase_sync_service import SupabaseSyncService
+from src.services.popularity import recompute_popularity_supabase
+from src.services.entity_resolution import dedupe_catalog
+from src.services.sync_runs import SupabaseSyncStore, run_status
+from src.services.seed_catalog import load_seed_catalog
+from src.services.link_health import BATCH_SIZE as LINK_BATCH_SIZE, SupabaseLinkHealthStore, check_links
+from src.services.price_refresh import BATCH_SIZE, SupabasePriceStore, get_price_adapters, refresh_prices
+from src.services.supabase_service import get_supabase_service
+from src.services.catalog_transfer import (
+    TABLES, CatalogImportError, SupabaseCatalog, export_lines, import_lines, iter_lines
+)
+from src.config.supabase import get_supabase_client
 import logging
 
 logger = logging.getLogger(__name__)
@@ -9,11 +20,19 @@ sync_service = SupabaseSyncService()
 
 @supabase_sync_bp.route('/admin/sync/popular', methods=['POST'])
 def sync_popular_franchises():
-    """Sync popular franchises from various sources."""
+    """Sync the seed catalog's franchises from various sources.
+    
+    {"run_id": ...} resumes a run where it stopped; add "failed_only": true to
+    retry only the franchises that failed. "workers" overrides SYNC_WORKERS.
+    """
     try:
-        result = sync_service.sync_popular_franchises()
+        data = request.get_json(silent=True) or {}
+        catalog = load_seed_catalog(current_app.config, get_supabase_client())
+        workers = int(data.get('workers') or current_app.config.get('SYNC_WORKERS', 1))
+        result = sync_service.sync_popular_franchises(data.get('run_id'), bool(data.get('failed_only')),
+                                                      catalog, workers)
         
-        if 'error' in result:
+        if 'error' in result or result['errors']:
             return jsonify(result), 500
         
         return jsonify(result), 201
@@ -21,6 +40,18 @@ def sync_popular_franchises():
         logger.error(f"Error in sync_popular_franchises: {e}")
         return jsonify({'error': 'Internal server error'}), 500
 
+@supabase_sync_bp.route('/admin/sync/runs/<run_id>', methods=['GET'])
+def get_sync_run(run_id):
+    """Progress of a bulk sync run, with its failed franchises."""
+    try:
+        status = run_status(SupabaseSyncStore(get_supabase_client()), run_id)
+        if status is None:
+            return jsonify({'error': 'Sync run not found'}), 404
+        return jsonify(status), 200
+    except Exception as e:
+        logger.error(f"Error in get_sync_run: {e}")
+        return jsonify({'error': 'Internal server error'}), 500
+
 @supabase_sync_bp.route('/admin/sync/tmdb/movies', methods=['POST'])
 def sync_tmdb_movies():
     """Sync movies from TMDb for a specific franchise."""
@@ -34,7 +65,7 @@ def sync_tmdb_movies():
             data['franchise_name']
         )
         
-        if 'error' in result:
+        if 'error' in result or result['errors']:
             return jsonify(result), 500
         
         return jsonify(result), 201
@@ -55,7 +86,7 @@ def sync_rawg_games():
             data['franchise_name']
         )
         
-        if 'error' in result:
+        if 'error' in result or result['errors']:
             return jsonify(result), 500
         
         return jsonify(result), 201
@@ -63,3 +94,66 @@ def sync_rawg_games():
         logger.error(f"Error in sync_rawg_games: {e}")
         return jsonify({'error': 'Internal server error'}), 500
 
+@supabase_sync_bp.route('/admin/popularity/recompute', methods=['POST'])
+def recompute_popularity_scores():
+    """Recompute popularity_score for every franchise from API metadata, views and clicks."""
+    try:
+        return jsonify(recompute_popularity_supabase(get_supabase_client())), 200
+    except Exception as e:
+        logger.error(f"Error in recompute_popularity_scores: {e}")
+        return jsonify({'error': 'Internal server error'}), 500
+
+@supabase_sync_bp.route('/admin/prices/refresh', methods=['POST'])
+def refresh_affiliate_prices():
+    """Re-check the stalest affiliate link prices now (?limit= links, default one batch)."""
+    adapters = get_price_adapters()
+    if not adapters:
+        return jsonify({'error': 'No price adapters configured (PRICE_ADAPTERS)'}), 400
+    try:
+        limit = request.args.get('limit', BATCH_SIZE, type=int)
+        return jsonify(refresh_prices(SupabasePriceStore(get_supabase_service()), adapters, limit)), 200
+    except Exception as e:
+        logger.error(f"Error in refresh_affiliate_prices: {e}")
+        return jsonify({'error': 'Internal server error'}), 500
+
+@supabase_sync_bp.route('/admin/links/check', methods=['POST'])
+def check_affiliate_links():
+    """Check the due affiliate links for dead URLs now (?limit= links, default one batch)."""
+    try:
+        limit = request.args.get('limit', LINK_BATCH_SIZE, type=int)
+        return jsonify(check_links(SupabaseLinkHealthStore(get_supabase_service()), limit)), 200
+    except Exception as e:
+        logger.error(f"Error in check_affiliate_links: {e}")
+        return jsonify({'error': 'Internal server error'}), 500
+
+@supabase_sync_bp.route('/admin/items/dedupe', methods=['POST'])
+def dedupe_items():
+    """Merge duplicate items across providers and syncs (?dry_run=1 only reports the groups)."""
+    try:
+        dry_run = request.args.get('dry_run', '0') in ('1', 'true')
+        return jsonify(dedupe_catalog(SupabaseCatalog(get_supabase_client()), dry_run=dry_run)), 200
+    except Exception as e:
+        logger.error(f"Error in dedupe_items: {e}")
+        return jsonify({'error': 'Internal server error'}), 500
+
+@supabase_sync_bp.route('/admin/export', methods=['GET'])
+def export_catalog():
+    """Stream the catalog as NDJSON (?tables=franchises,items,... for a subset)."""
+    tables = request.args.get('tables')
+    tables = [table.strip() for table in tables.split(',')] if tables else list(TABLES)
+    unknown = [table for table in tables if table not in TABLES]
+    if unknown:
+        return jsonify({'error': f"Unknown tables: {', '.join(unknown)}"}), 400
+    return Response(export_lines(SupabaseCatalog(get_supabase_client()), tables), mimetype='application/x-ndjson',
+                    headers={'Content-Disposition': 'attachment; filename=orderof-catalog.ndjson'})
+
+@supabase_sync_bp.route('/admin/import', methods=['POST'])
+def import_catalog():
+    """Upsert a streamed NDJSON catalog snapshot by natural keys."""
+    try:
+        return jsonify(import_lines(SupabaseCatalog(get_supabase_client()), iter_lines(request.stream))), 200
+    except CatalogImportError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        logger.error(f"Error in import_catalog: {e}")
+        return jsonify({'error': 'Internal server error'}), 500
@@ -1,116 +1,127 @@
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
+import asyncio
 import requests
 from datetime import datetime
-from src.services.supabase_service import SupabaseService
+from src.services.supabase_service import get_supabase_service
+from src.services.supabase_async_service import get_async_supabase_service, run_async
 from src.services.tmdb_service import TMDbService
-from src.services.rawg_service import RAWGService
+from src.services.rawg_service import RAWG_PAGE_SIZE, RAWGService
+from src.services.order_ranks import RANK_GAP
+from src.services.sync_runs import Checkpoint, SupabaseSyncStore, SyncRun, run_catalog_sync_async
+from src.services.seed_catalog import SeedEntry, load_seed_file, merge_reports, republish, run_sharded
+from src.services.batching import chunks
+from src.services.catalog_transfer import SupabaseCatalog
+from src.services.entity_resolution import EntityIndex, merged_fields
+from src.config.supabase import get_supabase_client
 import logging
 
 logger = logging.getLogger(__name__)
 
+# Maximum number of franchises synced at the same time
+SYNC_CONCURRENCY = 5
+
 class SupabaseSyncService:
     def __init__(self):
-        self.supabase_service = SupabaseService()
+        self.supabase_service = get_supabase_service()
+        self.async_service = get_async_supabase_service()
         self.tmdb_service = TMDbService()
         self.rawg_service = RAWGService()
     
-    def sync_popular_franchises(self) -> Dict[str, Any]:
-        """Sync popular franchises from various APIs."""
+    def sync_popular_franchises(self, run_id: Optional[str] = None, failed_only: bool = False,
+                                catalog: Optional[List[SeedEntry]] = None, workers: int = 1) -> Dict[str, Any]:
+        """Sync the seed catalog's franchises, in `workers` processes when more than one.
+        
+        Pass a run_id to resume that run; failed_only retries only its failed franchises.
+        """
         try:
-            created_franchises = []
-            
-            # Popular movie franchises
-            movie_franchises = [
-                "Star Wars", "Marvel Cinematic Universe", "Harry Potter", 
-                "The Lord of the Rings", "Fast & Furious", "James Bond",
-                "Mission: Impossible", "Jurassic Park", "Transformers", "X-Men"
-            ]
-            
-            for franchise_name in movie_franchises:
-                franchise_data = {
-                    'name': franchise_name,
-                    'slug': franchise_name.lower().replace(' ', '-').replace('&', 'and'),
-                    'category': 'movies',
-                    'description': f'Popular movie franchise: {franchise_name}',
-                    'popularity_score': 100
-                }
-                
-                franchise = self.supabase_service.create_franchise(franchise_data)
-                if franchise:
-                    created_franchises.append(franchise)
-                    
-                    # Sync movies for this franchise
-                    self.sync_tmdb_movies_for_franchise(franchise['id'], franchise_name)
-            
-            # Popular TV series
-            tv_franchises = [
-                "Game of Thrones", "Breaking Bad", "The Walking Dead",
-                "Stranger Things", "The Office", "Friends", "Marvel",
-                "Star Trek", "Doctor Who", "Sherlock"
-            ]
-            
-            for franchise_name in tv_franchises:
-                franchise_data = {
-                    'name': franchise_name,
-                    'slug': franchise_name.lower().replace(' ', '-').replace('&', 'and'),
-                    'category': 'series',
-                    'description': f'Popular TV franchise: {franchise_name}',
-                    'popularity_score': 100
-                }
-                
-                franchise = self.supabase_service.create_franchise(franchise_data)
-                if franchise:
-                    created_franchises.append(franchise)
-            
-            # Popular game franchises
-            game_franchises = [
-                "The Legend of Zelda", "Super Mario", "Call of Duty",
-                "Grand Theft Auto", "The Elder Scrolls", "Final Fantasy",
-                "Assassin's Creed", "Halo", "Pokemon", "The Witcher"
-            ]
-            
-            for franchise_name in game_franchises:
-                franchise_data = {
-                    'name': franchise_name,
-                    'slug': franchise_name.lower().replace(' ', '-').replace('&', 'and'),
-                    'category': 'games',
-                    'description': f'Popular game franchise: {franchise_name}',
-                    'popularity_score': 100
-                }
-                
-                franchise = self.supabase_service.create_franchise(franchise_data)
-                if franchise:
-                    created_franchises.append(franchise)
-            
-            return {
-                'message': f'Synced {len(created_franchises)} popular franchises',
-                'franchises': created_franchises
-            }
+            catalog = load_seed_file() if catalog is None else catalog
+            if workers <= 1 or len(catalog) <= 1:
+                report = self.sync_catalog(catalog, run_id, failed_only)
+                report = merge_reports([report], report['run_id'], report['resumed'], report['seconds'])
+            else:
+                report = run_sharded(sync_supabase_shard, catalog, workers, run_id, failed_only)
+                republish(SupabaseCatalog(get_supabase_client()),
+                          [franchise['franchise_id'] for franchise in report['franchises']])
+            report['message'] = f"Synced {report['synced']} popular franchises"
+            if report['errors']:
+                report['message'] += f"; {len(report['errors'])} shards failed"
+            return report
         except Exception as e:
             logger.error(f"Error syncing popular franchises: {e}")
             return {'error': str(e)}
     
+    def sync_catalog(self, catalog: List[SeedEntry], run_id: Optional[str] = None,
+                     failed_only: bool = False) -> Dict[str, Any]:
+        """Sync seed catalog entries in this process; returns the SyncRun report."""
+        return run_async(self.sync_catalog_async(catalog, run_id, failed_only))
+    
+    async def sync_catalog_async(self, catalog: List[SeedEntry], run_id: Optional[str] = None,
+                                 failed_only: bool = False) -> Dict[str, Any]:
+        """Sync seed catalog entries, several franchises at a time, checkpointed per franchise and phase."""
+        store = SupabaseSyncStore(get_supabase_client())
+        run = await asyncio.to_thread(SyncRun, store, run_id)
+        return await run_catalog_sync_async(run, catalog, self._sync_entry, SYNC_CONCURRENCY, failed_only)
+    
+    async def _sync_entry(self, entry: SeedEntry, checkpoint: Checkpoint) -> bool:
+        if not checkpoint.reached('franchise'):
+            slug = entry.name.lower().replace(' ', '-').replace('&', 'and')
+            # An earlier attempt may have created it already
+            franchise = await self.async_service.get_franchise_by_slug(slug)
+            if not franchise:
+                franchise = await self.async_service.create_franchise({
+                    'name': entry.name,
+                    'slug': slug,
+                    'category': entry.category,
+                    'description': entry.description,
+                    'popularity_score': 100
+                })
+            if not franchise:
+                checkpoint.error = f'Could not create franchise {slug}'
+                return False
+            await checkpoint.reach_async('franchise', franchise_id=franchise['id'])
+        
+        if entry.provider == 'tmdb_movies':
+            # Sync movies for this franchise
+            result = await self.sync_tmdb_movies_for_franchise_async(
+                checkpoint.state['franchise_id'], entry.query, checkpoint)
+            checkpoint.error = result.get('error')
+            return 'error' not in result
+        # Other providers only get the franchise row here
+        await checkpoint.reach_async('order')
+        return True
+    
     def sync_tmdb_movies_for_franchise(self, franchise_id: str, franchise_name: str) -> Dict[str, Any]:
         """Sync movies from TMDb for a specific franchise."""
+        return run_async(self.sync_tmdb_movies_for_franchise_async(franchise_id, franchise_name))
+    
+    async def sync_tmdb_movies_for_franchise_async(self, franchise_id: str, franchise_name: str,
+                                                   checkpoint: Optional[Checkpoint] = None) -> Dict[str, Any]:
+        """Sync movies from TMDb, creating items and order entries concurrently.
+        
+        Items and order entries already stored are reused, so a retry (or a
+        run resumed from checkpoint) adds only what is missing.
+        """
+        checkpoint = checkpoint or Checkpoint()
         try:
-            # Search for movies related to the franchise
-            search_url = f"https://api.themoviedb.org/3/search/movie"
-            params = {
-                'api_key': self.tmdb_service.api_key,
-                'query': franchise_name,
-                'language': 'en-US'
-            }
-            
-            response = requests.get(search_url, params=params)
-            if response.status_code != 200:
-                return {'error': 'Failed to fetch from TMDb'}
-            
-            data = response.json()
-            created_items = []
+            if not checkpoint.reached('search'):
+                # Search for movies related to the franchise
+                search_url = f"{self.tmdb_service.base_url}/search/movie"
+                params = {
+                    'api_key': self.tmdb_service.api_key,
+                    'query': franchise_name,
+                    'language': 'en-US'
+                }
+                
+                response = await asyncio.to_thread(requests.get, search_url, params=params)
+                if response.status_code != 200:
+                    return {'error': 'Failed to fetch from TMDb'}
+                
+                await checkpoint.reach_async('search', movies=response.json().get('results', [])[:10])  # Limit to 10 movies
             
             # Create items for each movie
-            for i, movie in enumerate(data.get('results', [])[:10]):  # Limit to 10 movies
-                item_data = {
+            items_data = []
+            for movie in checkpoint.state['movies']:
+                items_data.append({
                     'franchise_id': franchise_id,
                     'title': movie.get('title', ''),
                     'description': movie.get('overview', ''),
@@ -124,75 +135,98 @@ class SupabaseSyncService:
                         'popularity': movie.get('popularity')
                     },
                     'rating': movie.get('vote_average')
-                }
-                
-                item = self.supabase_service.create_item(item_data)
-                if item:
-                    created_items.append(item)
+                })
+            
+            items = await self._stored_or_created_items(franchise_id, items_data)
+            await checkpoint.reach_async('items')
             
             # Create a release order for the franchise
-            if created_items:
-                order_data = {
-                    'franchise_id': franchise_id,
-                    'name': 'Release Order',
-                    'order_type': 'release',
-                    'description': 'Movies in the order they were released'
-                }
+            if items:
+                order = await self.async_service.get_order_by_type(franchise_id, 'release')
+                if not order:
+                    order = await self.async_service.create_order({
+                        'franchise_id': franchise_id,
+                        'name': 'Release Order',
+                        'order_type': 'release',
+                        'description': 'Movies in the order they were released'
+                    })
+                if not order:
+                    return {'error': f'Failed to create the release order for {franchise_name}'}
                 
-                order = self.supabase_service.create_order(order_data)
-                if order:
-                    # Add items to the order
-                    for i, item in enumerate(sorted(created_items, key=lambda x: x.get('release_date', ''))):
-                        self.supabase_service.add_item_to_order(order['id'], item['id'], i + 1)
+                # Add the items the order doesn't hold yet, after its last entry
+                entries = await self.async_service.get_order_entries(order['id'])
+                present = {entry['item_id'] for entry in entries}
+                last = max((entry['position'] for entry in entries), default=0)
+                missing = [item for item in sorted(items, key=lambda x: x.get('release_date') or '')
+                           if item['id'] not in present]
+                added = await asyncio.gather(*(
+                    self.async_service.add_item_to_order(order['id'], item['id'], last + (i + 1) * RANK_GAP)
+                    for i, item in enumerate(missing)
+                ))
+                if not all(added):
+                    return {'error': f'Failed to add every movie to the release order for {franchise_name}'}
+            await checkpoint.reach_async('order')
             
             return {
-                'message': f'Synced {len(created_items)} movies for {franchise_name}',
-                'items': created_items
+                'message': f'Synced {len(items)} movies for {franchise_name}',
+                'items': items
             }
         except Exception as e:
             logger.error(f"Error syncing TMDb movies for {franchise_name}: {e}")
             return {'error': str(e)}
     
+    async def _stored_or_created_items(self, franchise_id: str, items_data: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Items for items_data in input order, resolved against the franchise's stored items.
+        
+        A row duplicating a stored item (same external id, provider id, or title
+        and year) is merged into it instead of inserted, as the legacy syncs do;
+        rows duplicating each other are created once.
+        """
+        stored = {item['id']: item for item in await self.async_service.get_franchise_items(franchise_id)}
+        by_external_id = {item['external_id']: item['id'] for item in stored.values() if item.get('external_id')}
+        index = EntityIndex.from_rows(stored.values())
+        owners, missing, updates = [], [], {}
+        for data in items_data:
+            owner = by_external_id.get(data['external_id']) or index.resolve(data)
+            if owner in stored:
+                changes = merged_fields(stored[owner], data)
+                if changes:
+                    stored[owner] = dict(stored[owner], **changes)
+                    updates[owner] = dict(updates.get(owner, {}), **changes)
+            elif owner is None:
+                # Rows still to be created are indexed by their position among the missing ones
+                owner = ('new', len(missing))
+                index.add(owner, data)
+                missing.append(data)
+            owners.append(owner)
+        
+        created = await self.async_service.create_items(missing)
+        updated = await asyncio.gather(*(self.async_service.update_item(item_id, changes)
+                                         for item_id, changes in updates.items()))
+        stored.update((item['id'], item) for item in updated if item)
+        items = {}
+        for owner in owners:
+            item = created[owner[1]] if isinstance(owner, tuple) else stored[owner]
+            if item:
+                items.setdefault(item['id'], item)
+        return list(items.values())
+    
     def sync_rawg_games_for_franchise(self, franchise_id: str, franchise_name: str) -> Dict[str, Any]:
         """Sync games from RAWG for a specific franchise."""
+        return run_async(self.sync_rawg_games_for_franchise_async(franchise_id, franchise_name))
+    
+    async def sync_rawg_games_for_franchise_async(self, franchise_id: str, franchise_name: str) -> Dict[str, Any]:
+        """Sync every game of a RAWG series, streamed a page at a time with items created concurrently per page."""
         try:
-            # Search for games related to the franchise
-            search_url = "https://api.rawg.io/api/games"
-            params = {
-                'key': self.rawg_service.api_key,
-                'search': franchise_name,
-                'page_size': 10
-            }
-            
-            response = requests.get(search_url, params=params)
-            if response.status_code != 200:
-                return {'error': 'Failed to fetch from RAWG'}
-            
-            data = response.json()
+            # The paginator is blocking (and prefetches the next page itself), so pages are pulled in a thread
+            pages = chunks(self.rawg_service.iter_game_series(franchise_name), RAWG_PAGE_SIZE)
             created_items = []
-            
-            # Create items for each game
-            for game in data.get('results', []):
-                item_data = {
-                    'franchise_id': franchise_id,
-                    'title': game.get('name', ''),
-                    'description': game.get('description_raw', ''),
-                    'release_date': game.get('released'),
-                    'image_url': game.get('background_image'),
-                    'external_id': str(game.get('id')),
-                    'api_metadata': {
-                        'rawg_id': game.get('id'),
-                        'rating': game.get('rating'),
-                        'ratings_count': game.get('ratings_count'),
-                        'metacritic': game.get('metacritic'),
-                        'platforms': [p.get('platform', {}).get('name') for p in game.get('platforms', [])]
-                    },
-                    'rating': game.get('rating')
-                }
-                
-                item = self.supabase_service.create_item(item_data)
-                if item:
-                    created_items.append(item)
+            while True:
+                games = await asyncio.to_thread(next, pages, None)
+                if games is None:
+                    break
+                created_items.extend(item for item in await self.async_service.create_items(
+                    [self._rawg_item_data(game, franchise_id) for game in games]) if item)
             
             return {
                 'message': f'Synced {len(created_items)} games for {franchise_name}',
@@ -201,4 +235,27 @@ class SupabaseSyncService:
         except Exception as e:
             logger.error(f"Error syncing RAWG games for {franchise_name}: {e}")
             return {'error': str(e)}
+    
+    def _rawg_item_data(self, game: Dict[str, Any], franchise_id: str) -> Dict[str, Any]:
+        """Supabase items row for a RAWG game."""
+        return {
+            'franchise_id': franchise_id,
+            'title': game.get('name', ''),
+            'description': game.get('description_raw', ''),
+            'release_date': game.get('released'),
+            'image_url': game.get('background_image'),
+            'external_id': str(game.get('id')),
+            'api_metadata': {
+                'rawg_id': game.get('id'),
+                'rating': game.get('rating'),
+                'ratings_count': game.get('ratings_count'),
+                'metacritic': game.get('metacritic'),
+                'platforms': [p.get('platform', {}).get('name') for p in game.get('platforms', [])]
+            },
+            'rating': game.get('rating')
+        }
+
 
+def sync_supabase_shard(entries, run_id, failed_only):
+    """Worker process: sync one shard of a seed catalog against Supabase."""
+    return SupabaseSyncService().sync_catalog(entries, run_id, failed_only)
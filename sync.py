@@ -1,16 +1,21 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, Response, current_app, request, jsonify, stream_with_context
 from src.models.franchise import db, Franchise
+from src.config.database import read_session
 from src.services.tmdb_service import TMDbService
 from src.services.rawg_service import RAWGService
-import re
+from src.services.popularity import recompute_popularity
+from src.services.link_health import BATCH_SIZE as LINK_BATCH_SIZE, SqlAlchemyLinkHealthStore, check_links
+from src.services.entity_resolution import dedupe_catalog
+from src.services.sync_runs import SqlAlchemySyncStore, run_status
+from src.services.seed_catalog import load_seed_catalog, sync_legacy_catalog
+from src.services.price_refresh import BATCH_SIZE, SqlAlchemyPriceStore, get_price_adapters, refresh_prices
+from src.services.catalog_transfer import (
+    TABLES, CatalogImportError, SqlAlchemyCatalog, export_lines, import_lines, iter_lines
+)
+from src.services.slugs import slugify
 
 sync_bp = Blueprint('sync', __name__)
 
-def slugify(text):
-    """Convert text to URL-friendly slug"""
-    text = re.sub(r'[^\w\s-]', '', text.lower())
-    return re.sub(r'[-\s]+', '-', text).strip('-')
-
 @sync_bp.route('/admin/sync/tmdb/movies', methods=['POST'])
 def sync_tmdb_movies():
     """Sync movie franchise from TMDb"""
@@ -53,7 +58,7 @@ def sync_tmdb_movies():
 
 @sync_bp.route('/admin/sync/tmdb/tv', methods=['POST'])
 def sync_tmdb_tv():
-    """Sync TV franchise from TMDb"""
+    """Sync TV franchise from TMDb with its seasons ({"episodes": true} adds every episode)"""
     try:
         data = request.get_json()
         franchise_name = data.get('franchise_name')
@@ -78,7 +83,7 @@ def sync_tmdb_tv():
         
         # Sync with TMDb
         tmdb_service = TMDbService()
-        success = tmdb_service.sync_tv_franchise(franchise_name, franchise.id)
+        success = tmdb_service.sync_tv_franchise(franchise_name, franchise.id, episodes=bool(data.get('episodes')))
         
         if success:
             return jsonify({
@@ -133,130 +138,102 @@ def sync_rawg_games():
 
 @sync_bp.route('/admin/sync/popular', methods=['POST'])
 def sync_popular_franchises():
-    """Sync popular franchises from multiple APIs"""
+    """Sync the seed catalog's franchises from multiple APIs, checkpointed per franchise and phase
+    
+    {"run_id": ...} resumes a run where it stopped; add "failed_only": true to
+    retry only the franchises that failed. "workers" overrides SYNC_WORKERS.
+    """
     try:
-        # Popular movie franchises
-        movie_franchises = [
-            'Marvel Cinematic Universe',
-            'Star Wars',
-            'Harry Potter',
-            'The Lord of the Rings',
-            'Fast & Furious',
-            'James Bond',
-            'Mission: Impossible',
-            'Jurassic Park',
-            'Transformers',
-            'X-Men'
-        ]
-        
-        # Popular game franchises
-        game_franchises = [
-            'The Legend of Zelda',
-            'Super Mario',
-            'Call of Duty',
-            'Grand Theft Auto',
-            'The Elder Scrolls',
-            'Final Fantasy',
-            'Assassin\'s Creed',
-            'Halo',
-            'Pokemon',
-            'The Witcher'
-        ]
-        
-        # Popular TV franchises
-        tv_franchises = [
-            'Game of Thrones',
-            'Breaking Bad',
-            'The Walking Dead',
-            'Stranger Things',
-            'The Office',
-            'Friends',
-            'Marvel',
-            'Star Trek',
-            'Doctor Who',
-            'Sherlock'
-        ]
-        
-        tmdb_service = TMDbService()
-        rawg_service = RAWGService()
-        
-        synced_count = 0
-        
-        # Sync movie franchises
-        for franchise_name in movie_franchises:
-            try:
-                slug = slugify(franchise_name)
-                existing = Franchise.query.filter_by(slug=slug).first()
-                
-                if not existing:
-                    franchise = Franchise(
-                        name=franchise_name,
-                        slug=slug,
-                        category='movies',
-                        description=f'Popular movie franchise: {franchise_name}',
-                        popularity_score=100
-                    )
-                    db.session.add(franchise)
-                    db.session.commit()
-                    
-                    if tmdb_service.sync_movie_franchise(franchise_name, franchise.id):
-                        synced_count += 1
-            except Exception as e:
-                print(f"Error syncing {franchise_name}: {e}")
-                continue
-        
-        # Sync game franchises
-        for franchise_name in game_franchises:
-            try:
-                slug = slugify(franchise_name)
-                existing = Franchise.query.filter_by(slug=slug).first()
-                
-                if not existing:
-                    franchise = Franchise(
-                        name=franchise_name,
-                        slug=slug,
-                        category='games',
-                        description=f'Popular game franchise: {franchise_name}',
-                        popularity_score=100
-                    )
-                    db.session.add(franchise)
-                    db.session.commit()
-                    
-                    if rawg_service.sync_game_franchise(franchise_name, franchise.id):
-                        synced_count += 1
-            except Exception as e:
-                print(f"Error syncing {franchise_name}: {e}")
-                continue
-        
-        # Sync TV franchises
-        for franchise_name in tv_franchises:
-            try:
-                slug = slugify(franchise_name)
-                existing = Franchise.query.filter_by(slug=slug).first()
-                
-                if not existing:
-                    franchise = Franchise(
-                        name=franchise_name,
-                        slug=slug,
-                        category='series',
-                        description=f'Popular TV franchise: {franchise_name}',
-                        popularity_score=100
-                    )
-                    db.session.add(franchise)
-                    db.session.commit()
-                    
-                    if tmdb_service.sync_tv_franchise(franchise_name, franchise.id):
-                        synced_count += 1
-            except Exception as e:
-                print(f"Error syncing {franchise_name}: {e}")
-                continue
-        
-        return jsonify({
-            'message': f'Successfully synced {synced_count} popular franchises',
-            'total_attempted': len(movie_franchises) + len(game_franchises) + len(tv_franchises)
-        })
+        data = request.get_json(silent=True) or {}
+        workers = int(data.get('workers') or current_app.config.get('SYNC_WORKERS', 1))
+        report = sync_legacy_catalog(db.session, load_seed_catalog(current_app.config), data.get('run_id'),
+                                     bool(data.get('failed_only')), workers)
+        report['total_attempted'] = report['total'] - report['skipped']
+        if report['errors']:
+            report['message'] = f"Synced {report['synced']} popular franchises; {len(report['errors'])} shards failed"
+            return jsonify(report), 500
+        report['message'] = f"Successfully synced {report['synced']} popular franchises"
+        return jsonify(report)
         
     except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 500
+
+@sync_bp.route('/admin/sync/runs/<run_id>', methods=['GET'])
+def get_sync_run(run_id):
+    """Progress of a bulk sync run, with its failed franchises"""
+    status = run_status(SqlAlchemySyncStore(db.session), run_id)
+    if status is None:
+        return jsonify({'error': 'Sync run not found'}), 404
+    return jsonify(status)
+
+@sync_bp.route('/admin/popularity/recompute', methods=['POST'])
+def recompute_popularity_scores():
+    """Recompute popularity_score for every franchise from API metadata, views and clicks"""
+    try:
+        return jsonify(recompute_popularity(db.session))
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 500
+
+@sync_bp.route('/admin/prices/refresh', methods=['POST'])
+def refresh_affiliate_prices():
+    """Re-check the stalest affiliate link prices now (?limit= links, default one batch)"""
+    adapters = get_price_adapters()
+    if not adapters:
+        return jsonify({'error': 'No price adapters configured (PRICE_ADAPTERS)'}), 400
+    try:
+        limit = request.args.get('limit', BATCH_SIZE, type=int)
+        return jsonify(refresh_prices(SqlAlchemyPriceStore(db.session), adapters, limit))
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 500
+
+@sync_bp.route('/admin/links/check', methods=['POST'])
+def check_affiliate_links():
+    """Check the due affiliate links for dead URLs now (?limit= links, default one batch)"""
+    try:
+        limit = request.args.get('limit', LINK_BATCH_SIZE, type=int)
+        return jsonify(check_links(SqlAlchemyLinkHealthStore(db.session), limit))
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 500
+
+@sync_bp.route('/admin/items/dedupe', methods=['POST'])
+def dedupe_items():
+    """Merge duplicate items across providers and syncs (?dry_run=1 only reports the groups)"""
+    try:
+        dry_run = request.args.get('dry_run', '0') in ('1', 'true')
+        return jsonify(dedupe_catalog(SqlAlchemyCatalog(db.session), dry_run=dry_run))
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 500
+
+@sync_bp.route('/admin/export', methods=['GET'])
+def export_catalog():
+    """Stream the catalog as NDJSON (?tables=franchises,items,... for a subset)"""
+    tables = request.args.get('tables')
+    tables = [table.strip() for table in tables.split(',')] if tables else list(TABLES)
+    unknown = [table for table in tables if table not in TABLES]
+    if unknown:
+        return jsonify({'error': f"Unknown tables: {', '.join(unknown)}"}), 400
+    
+    def generate():
+        with read_session() as session:
+            yield from export_lines(SqlAlchemyCatalog(session), tables)
+    
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson',
+                    headers={'Content-Disposition': 'attachment; filename=orderof-catalog.ndjson'})
+
+@sync_bp.route('/admin/import', methods=['POST'])
+def import_catalog():
+    """Upsert a streamed NDJSON catalog snapshot by natural keys"""
+    try:
+        return jsonify(import_lines(SqlAlchemyCatalog(db.session), iter_lines(request.stream)))
+    except CatalogImportError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        db.session.rollback()
         return jsonify({'error': str(e)}), 500
 
 @sync_bp.route('/admin/sync/status', methods=['GET'])
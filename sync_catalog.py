@@ -0,0 +1,54 @@
+#!/usr/bin/env python3
+"""Sync a seed catalog of franchises, sharded over worker processes.
+
+The same run as POST /api/admin/sync/popular, without holding a request
+open for it: entries come from a seed catalog file (see
+services/seed_catalog.py), each shard reports its throughput, and a run
+id resumes a run where it stopped.
+
+    python sync_catalog.py --catalog franchises.csv --workers 8
+    python sync_catalog.py --run-id <id> --failed-only --workers 8
+    python sync_catalog.py --backend supabase --catalog franchises.ndjson --workers 4
+"""
+
+import argparse
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+
+from src.services.seed_catalog import DEFAULT_SEED_FILE, load_seed_file
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--backend', choices=['sqlite', 'supabase'], default='sqlite')
+    parser.add_argument('--database', default=os.path.join(os.path.dirname(__file__), 'database', 'app.db'),
+                        help='SQLite database file (sqlite backend)')
+    parser.add_argument('--catalog', default=DEFAULT_SEED_FILE, help='seed catalog (.csv, .json or .ndjson)')
+    parser.add_argument('--workers', type=int, default=int(os.environ.get('SYNC_WORKERS', 1)))
+    parser.add_argument('--run-id', help='resume this run')
+    parser.add_argument('--failed-only', action='store_true', help="retry only the run's failed franchises")
+    args = parser.parse_args()
+    
+    catalog = load_seed_file(args.catalog)
+    if args.backend == 'supabase':
+        from src.services.supabase_sync_service import SupabaseSyncService
+        report = SupabaseSyncService().sync_popular_franchises(args.run_id, args.failed_only, catalog, args.workers)
+    else:
+        from src.transfer_catalog import sqlite_app
+        # Registers sync_checkpoints, so the app creates it with the catalog tables
+        from src.models.sync_run import SyncCheckpoint
+        from src.services.seed_catalog import sync_legacy_catalog
+        app, db = sqlite_app(args.database)
+        with app.app_context():
+            report = sync_legacy_catalog(db.session, catalog, args.run_id, args.failed_only, args.workers)
+    
+    print(json.dumps(report, indent=2, default=str))
+    if 'error' in report or report['failed'] or report['errors']:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
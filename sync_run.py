@@ -0,0 +1,31 @@
+from src.models.user import db
+
+class SyncCheckpoint(db.Model):
+    """Progress of one franchise in a bulk sync run: last phase reached, what it produced and the last error."""
+    __tablename__ = 'sync_checkpoints'
+
+    run_id = db.Column(db.String(36), primary_key=True)
+    franchise_key = db.Column(db.String(255), primary_key=True)
+    name = db.Column(db.String(255), nullable=False)
+    category = db.Column(db.String(50), nullable=False)
+    phase = db.Column(db.String(20))
+    state = db.Column(db.JSON)
+    error = db.Column(db.String(255))
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime)
+
+    def __repr__(self):
+        return f'<SyncCheckpoint {self.run_id} {self.franchise_key} {self.phase}>'
+
+    def to_dict(self):
+        return {
+            'run_id': self.run_id,
+            'franchise_key': self.franchise_key,
+            'name': self.name,
+            'category': self.category,
+            'phase': self.phase,
+            'state': self.state,
+            'error': self.error,
+            'attempts': self.attempts,
+            'updated_at': self.updated_at.isoformat() if self.updated_at else None
+        }
@@ -0,0 +1,242 @@
+"""Checkpointed, resumable bulk syncs.
+
+A bulk sync (POST /admin/sync/popular) is a run: a run id plus one
+checkpoint per catalog entry (franchise name and category). A franchise
+goes through the phases
+
+    franchise   the franchise row exists; its id is kept
+    search      provider search results are kept
+    details     the provider details items are built from are kept
+    items       items are written and committed
+    order       the official order is written: the franchise is done
+
+and its checkpoint is saved after each one, with what the phase produced,
+so a resumed run makes no provider call it already made. Providers without
+a separate phase skip it: RAWG writes each page of its series search as it
+arrives, so games go from franchise straight to items.
+
+Every phase is idempotent. Franchises are found by slug, items resolve to
+the ones already stored and orders only get the items they miss, so a phase
+that ran but died before its checkpoint was saved simply runs again.
+
+Resuming a run (same run_id) skips the franchises it finished. A failure is
+stored on the checkpoint with the phase reached and the run carries on; the
+report lists failed franchises, and failed_only retries just those.
+"""
+
+import asyncio
+import logging
+import threading
+import time
+import uuid
+from datetime import datetime
+
+from src.services.batching import MAX_ERROR_LENGTH
+
+logger = logging.getLogger(__name__)
+
+PHASES = ('franchise', 'search', 'details', 'items', 'order')
+LOAD_PAGE_SIZE = 1000
+
+
+def franchise_key(name, category):
+    """Identity of a catalog entry within a run."""
+    return f"{category}:{' '.join(name.lower().split())}"
+
+
+class Checkpoint:
+    """One franchise's progress: the last phase reached and what the phases produced.
+    
+    Syncs skip the phases already reached and call reach() after each one.
+    Without a save callback it only tracks a one-off sync.
+    """
+    
+    def __init__(self, phase=None, state=None, save=None):
+        self.phase = phase
+        self.state = dict(state or {})
+        self.error = None
+        self._save = save
+    
+    def reached(self, phase):
+        return self.phase is not None and PHASES.index(self.phase) >= PHASES.index(phase)
+    
+    def reach(self, phase, **state):
+        self.state.update(state)
+        self.phase = phase
+        if self._save is not None:
+            self._save(self)
+    
+    async def reach_async(self, phase, **state):
+        """reach() from a coroutine, saving in a thread."""
+        await asyncio.to_thread(self.reach, phase, **state)
+
+
+class SyncRun:
+    """A bulk sync run: its saved checkpoints, the entries left to sync and the report."""
+    
+    def __init__(self, store, run_id=None):
+        self.store = store
+        self.resumed = run_id is not None
+        self.run_id = run_id or str(uuid.uuid4())
+        self._rows = store.load(self.run_id)
+        self._lock = threading.Lock()
+        self._started = time.perf_counter()
+        self._total = 0
+        self._skipped = 0
+        self._synced = []
+        self._keys = set()
+    
+    def pending(self, catalog, failed_only=False):
+        """(entry, Checkpoint) for each (name, category, ...) entry still to sync.
+        
+        Finished entries are skipped; failed_only also skips the ones that haven't failed.
+        """
+        for entry in catalog:
+            name, category = entry[0], entry[1]
+            key = franchise_key(name, category)
+            row = self._rows.setdefault(key, {
+                'run_id': self.run_id, 'franchise_key': key, 'name': name, 'category': category,
+                'phase': None, 'state': {}, 'error': None, 'attempts': 0, 'updated_at': None,
+            })
+            self._keys.add(key)
+            self._total += 1
+            if row['phase'] == PHASES[-1]:
+                self._skipped += 1
+                continue
+            if failed_only and not row['error']:
+                continue
+            yield entry, Checkpoint(row['phase'], row['state'],
+                                    save=lambda checkpoint, row=row: self._save(row, checkpoint, row['error']))
+    
+    def _save(self, row, checkpoint, error):
+        row.update(phase=checkpoint.phase, state=checkpoint.state, error=error, updated_at=datetime.utcnow())
+        self.store.save(dict(row))
+    
+    def finish(self, entry, checkpoint, ok, error=None):
+        """Record an entry's outcome; a failure keeps the phase reached so a resume carries on from it."""
+        row = self._rows[franchise_key(entry[0], entry[1])]
+        if not ok:
+            error = error or checkpoint.error or f"Sync stopped after phase {checkpoint.phase}"
+            logger.warning(f"Sync of {entry[0]} ({entry[1]}) failed after phase {checkpoint.phase}: {error}")
+        with self._lock:
+            row['attempts'] += 1
+            self._save(row, checkpoint, error[:MAX_ERROR_LENGTH] if error else None)
+            if ok:
+                self._synced.append({'name': entry[0], 'category': entry[1],
+                                     'franchise_id': checkpoint.state.get('franchise_id')})
+    
+    def report(self):
+        with self._lock:
+            return {
+                'run_id': self.run_id,
+                'resumed': self.resumed,
+                'total': self._total,
+                'synced': len(self._synced),
+                'skipped': self._skipped,
+                # Only this call's entries: shards of one run share its checkpoints
+                'failed': _failed(row for key, row in self._rows.items() if key in self._keys),
+                'franchises': list(self._synced),
+                'seconds': round(time.perf_counter() - self._started, 3),
+            }
+
+
+def _failed(rows):
+    return [{'name': row['name'], 'category': row['category'], 'phase': row['phase'],
+             'error': row['error'], 'attempts': row['attempts']}
+            for row in rows if row['error']]
+
+
+def run_status(store, run_id):
+    """Progress of a stored run, or None for an unknown run id."""
+    rows = list(store.load(run_id).values())
+    if not rows:
+        return None
+    phases = {}
+    for row in rows:
+        phases[row['phase'] or 'pending'] = phases.get(row['phase'] or 'pending', 0) + 1
+    return {
+        'run_id': run_id,
+        'franchises': len(rows),
+        'done': phases.get(PHASES[-1], 0),
+        'phases': phases,
+        'failed': _failed(rows),
+    }
+
+
+def run_catalog_sync(run, catalog, sync_entry, failed_only=False):
+    """Sync the pending entries one at a time with sync_entry(entry, checkpoint) -> bool."""
+    for entry, checkpoint in run.pending(catalog, failed_only):
+        try:
+            ok, error = sync_entry(entry, checkpoint), None
+        except Exception as e:
+            ok, error = False, str(e)
+        run.finish(entry, checkpoint, ok, error)
+    return run.report()
+
+
+async def run_catalog_sync_async(run, catalog, sync_entry, concurrency, failed_only=False):
+    """Sync the pending entries, concurrency at a time, with the coroutine sync_entry(entry, checkpoint) -> bool."""
+    semaphore = asyncio.Semaphore(concurrency)
+    
+    async def sync_one(entry, checkpoint):
+        async with semaphore:
+            try:
+                ok, error = await sync_entry(entry, checkpoint), None
+            except Exception as e:
+                ok, error = False, str(e)
+            await asyncio.to_thread(run.finish, entry, checkpoint, ok, error)
+    
+    await asyncio.gather(*(sync_one(entry, checkpoint) for entry, checkpoint in run.pending(catalog, failed_only)))
+    return run.report()
+
+
+class SqlAlchemySyncStore:
+    """Checkpoints in the legacy sync_checkpoints table.
+    
+    save() commits the shared session, so syncs only reach a phase after
+    committing (or before writing) that phase's rows.
+    """
+    
+    def __init__(self, session):
+        self.session = session
+    
+    def load(self, run_id):
+        from src.models.sync_run import SyncCheckpoint
+        
+        columns = [column.key for column in SyncCheckpoint.__table__.columns]
+        return {row.franchise_key: {column: getattr(row, column) for column in columns}
+                for row in self.session.query(SyncCheckpoint).filter(SyncCheckpoint.run_id == run_id)}
+    
+    def save(self, row):
+        from src.models.sync_run import SyncCheckpoint
+        
+        try:
+            self.session.merge(SyncCheckpoint(**row))
+            self.session.commit()
+        except Exception:
+            self.session.rollback()
+            raise
+
+
+class SupabaseSyncStore:
+    """Checkpoints in the Supabase sync_checkpoints table."""
+    
+    def __init__(self, client):
+        self.client = client
+    
+    def load(self, run_id):
+        rows, start = {}, 0
+        while True:
+            page = self.client.table('sync_checkpoints').select('*').eq('run_id', run_id) \
+                .order('franchise_key').range(start, start + LOAD_PAGE_SIZE - 1).execute().data
+            rows.update((row['franchise_key'], row) for row in page)
+            if len(page) < LOAD_PAGE_SIZE:
+                return rows
+            start += LOAD_PAGE_SIZE
+    
+    def save(self, row):
+        updated_at = row['updated_at']
+        self.client.table('sync_checkpoints').upsert(
+            dict(row, updated_at=updated_at.isoformat() if updated_at else None),
+            on_conflict='run_id,franchise_key'
+        ).execute()
@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+"""Affiliate link clicks reach franchise_activity on both backends.
+
+A POST to the click route is counted in memory by record_click; flushing
+the activity buffer rolls it up into the franchise's row for the day.
+"""
+
+import os
+import sys
+from datetime import date
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+
+from flask import Flask
+from src.models.user import db
+from src.models.franchise import Franchise, Item, AffiliateLink
+from src.models.activity import FranchiseActivity
+from src.config.supabase import use_supabase_client
+from src.routes.affiliate import affiliate_bp
+from src.services.popularity import activity, flush_activity, flush_activity_supabase
+from src.services.supabase_standin import SupabaseStandIn, register_popularity_rpcs
+
+
+@pytest.fixture(autouse=True)
+def empty_activity_buffer():
+    activity.drain()
+    yield
+    activity.drain()
+
+
+def test_click_counts_towards_franchise_activity(sqlite_app):
+    app = sqlite_app
+    app.register_blueprint(affiliate_bp, url_prefix='/api')
+    with app.app_context():
+        franchise = Franchise(name='Halo', slug='halo', category='games')
+        db.session.add(franchise)
+        db.session.flush()
+        item = Item(franchise_id=franchise.id, title='Halo 3', slug='halo-3')
+        db.session.add(item)
+        db.session.flush()
+        link = AffiliateLink(item_id=item.id, platform='steam', url='https://example.com/halo-3')
+        db.session.add(link)
+        db.session.commit()
+
+        client = app.test_client()
+        for _ in range(2):
+            response = client.post(f'/api/affiliate-links/{link.id}/click', json={})
+            assert response.status_code == 200
+            assert response.get_json() == {'url': 'https://example.com/halo-3', 'tracked': True}
+        assert client.post('/api/affiliate-links/missing/click', json={}).status_code == 404
+
+        assert flush_activity(db.session) == 1
+        row = FranchiseActivity.query.one()
+        assert (row.franchise_id, row.day, row.affiliate_clicks, row.page_views) == \
+            (franchise.id, date.today(), 2, 0)
+
+
+def test_supabase_click_counts_towards_franchise_activity():
+    standin = register_popularity_rpcs(SupabaseStandIn())
+    use_supabase_client(standin)
+    try:
+        from src.routes.supabase_affiliate import supabase_affiliate_bp
+
+        franchise = standin.add('franchises', {'name': 'Halo', 'slug': 'halo', 'category': 'games'})
+        item = standin.add('items', {'franchise_id': franchise['id'], 'title': 'Halo 3'})
+        link = standin.add('affiliate_links', {'item_id': item['id'], 'platform': 'steam', 'region': 'us',
+                                               'url': 'https://example.com/halo-3'})
+        app = Flask(__name__)
+        app.register_blueprint(supabase_affiliate_bp, url_prefix='/api')
+
+        client = app.test_client()
+        response = client.post(f"/api/affiliate-links/{link['id']}/click")
+        assert response.status_code == 200
+        assert response.get_json() == {'url': 'https://example.com/halo-3', 'tracked': True}
+        assert client.post('/api/affiliate-links/missing/click').status_code == 404
+
+        assert flush_activity_supabase(standin) == 1
+        [row] = standin.tables['franchise_activity']
+        assert (row['franchise_id'], row['day'], row['affiliate_clicks'], row['page_views']) == \
+            (franchise['id'], date.today().isoformat(), 1, 0)
+    finally:
+        use_supabase_client(None)
@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+"""Bulk affiliate link imports in affiliate_import.py.
+
+Chunks are inserted in one statement each; a chunk the database rejects is
+retried row by row so only the offending rows are reported, on the legacy
+SQLite table and the Supabase stand-in alike.
+"""
+
+import json
+import os
+import sys
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+
+from sqlalchemy import text
+from src.models.user import db
+from src.models.franchise import Franchise, Item, AffiliateLink
+from src.routes.affiliate import affiliate_bp
+from src.services.affiliate_import import import_links_supabase, import_links_sqlalchemy
+from src.services.supabase_standin import SupabaseStandIn
+
+
+def rows(*links):
+    return [(number, link, None) for number, link in enumerate(links, 1)]
+
+
+def link(item_id, platform, region=None):
+    row = {'item_id': item_id, 'platform': platform, 'url': f'https://example.com/{item_id}/{platform}'}
+    if region:
+        row['region'] = region
+    return row
+
+
+@pytest.fixture
+def app(sqlite_app):
+    sqlite_app.register_blueprint(affiliate_bp, url_prefix='/api')
+    with sqlite_app.app_context():
+        franchise = Franchise(name='Halo', slug='halo', category='games')
+        db.session.add(franchise)
+        db.session.flush()
+        db.session.add_all([Item(id=f'halo-{number}', franchise_id=franchise.id, title=f'Halo {number}')
+                            for number in range(1, 4)])
+        db.session.commit()
+        yield sqlite_app
+
+
+def stored_links():
+    return sorted((link.item_id, link.platform) for link in AffiliateLink.query)
+
+
+def test_unique_violation_fails_only_the_offending_rows(app):
+    db.session.execute(text('CREATE UNIQUE INDEX affiliate_links_item_platform ON affiliate_links (item_id, platform)'))
+    db.session.add(AffiliateLink(item_id='halo-1', platform='steam', url='https://example.com/halo-1/steam'))
+    db.session.commit()
+
+    report = import_links_sqlalchemy(db.session, rows(
+        link('halo-1', 'xbox'),
+        link('halo-1', 'steam'),
+        link('halo-2', 'steam'),
+        link('nowhere', 'steam'),
+        link('halo-3', 'steam'),
+    ), chunk_size=3)
+
+    assert (report['created'], report['failed'], report['chunks']) == (3, 2, 2)
+    assert [(error['row'], error['item_id']) for error in report['errors']] == [(2, 'halo-1'), (4, 'nowhere')]
+    assert 'UNIQUE constraint failed' in report['errors'][0]['error']
+    assert report['errors'][1]['error'] == 'Unknown item_id'
+    assert stored_links() == [('halo-1', 'steam'), ('halo-1', 'xbox'), ('halo-2', 'steam'), ('halo-3', 'steam')]
+
+
+def test_supabase_duplicate_within_a_chunk_fails_only_the_second_row():
+    standin = SupabaseStandIn()
+    items = [standin.add('items', {'title': f'Halo {number}'})['id'] for number in range(1, 3)]
+
+    report = import_links_supabase(standin, rows(
+        link(items[0], 'steam', 'us'),
+        link(items[0], 'steam', 'us'),
+        link(items[0], 'steam', 'gb'),
+        link(items[1], 'steam'),
+    ), chunk_size=10)
+
+    assert (report['created'], report['failed'], report['chunks']) == (2, 2, 1)
+    assert [error['row'] for error in report['errors']] == [2, 4]
+    assert 'duplicate key' in report['errors'][0]['error']
+    assert report['errors'][1]['error'] == 'Missing region'
+    # The rejected bulk insert left nothing behind, so the retry did not trip over its own rows
+    assert sorted(row['region'] for row in standin.tables['affiliate_links']) == ['gb', 'us']
+
+
+def test_ndjson_body_is_imported_line_by_line(app):
+    body = '\n'.join([
+        json.dumps(link('halo-1', 'steam')),
+        '',
+        '{"item_id": "halo-2", ',
+        json.dumps(link('halo-2', 'steam')),
+        json.dumps(['not', 'an', 'object']),
+    ]) + '\n'
+
+    response = app.test_client().post('/api/admin/affiliate-links/bulk-create', data=body,
+                                      content_type='application/x-ndjson')
+
+    assert response.status_code == 201
+    report = response.get_json()
+    assert (report['created'], report['failed']) == (2, 2)
+    # Blank lines are skipped without using up a row number
+    assert [error['row'] for error in report['errors']] == [2, 4]
+    assert report['errors'][0]['error'].startswith('Invalid JSON')
+    assert report['errors'][1]['error'] == 'Row must be a JSON object'
+    assert stored_links() == [('halo-1', 'steam'), ('halo-2', 'steam')]
+
+
+@pytest.mark.parametrize('body', [{}, {'links': []}, {'links': 'halo'}, None])
+def test_json_body_without_links_is_rejected(app, body):
+    client = app.test_client()
+    if body is None:
+        response = client.post('/api/admin/affiliate-links/bulk-create')
+    else:
+        response = client.post('/api/admin/affiliate-links/bulk-create', json=body)
+
+    assert response.status_code == 400
+    assert response.get_json() == {'error': 'Links array is required'}
+    assert stored_links() == []
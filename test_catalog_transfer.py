@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+"""NDJSON catalog snapshots in catalog_transfer.py, on both backends.
+
+Each test imports a small snapshot into an empty catalog; rows refer to
+each other by natural key, so the same lines load into the legacy SQLite
+models and the Supabase stand-in alike.
+"""
+
+import json
+import os
+import sys
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+
+from src.models.user import db
+from src.services.catalog_transfer import (
+    FORMAT, TABLES, VERSION, CatalogImportError, SqlAlchemyCatalog, SupabaseCatalog, export_lines, import_lines,
+    iter_lines
+)
+from src.services.supabase_standin import SupabaseStandIn
+
+HEADER = {'format': FORMAT, 'version': VERSION, 'tables': list(TABLES)}
+NEW_HOPE = {'franchise': 'star-wars', 'external_id': '11', 'title': 'A New Hope'}
+EMPIRE = {'franchise': 'star-wars', 'external_id': '1891', 'title': 'The Empire Strikes Back'}
+CLONE_WARS = {'franchise': 'star-wars', 'external_id': None, 'title': 'The Clone Wars'}
+RELEASE = {'franchise': 'star-wars', 'name': 'Release Order'}
+
+SNAPSHOT = [
+    HEADER,
+    {'table': 'franchises', 'row': {'slug': 'star-wars', 'name': 'Star Wars', 'category': 'movies'}},
+    {'table': 'franchises', 'row': {'slug': 'halo', 'name': 'Halo', 'category': 'games'}},
+    {'table': 'items', 'row': dict(NEW_HOPE, release_date='1977-05-25')},
+    {'table': 'items', 'row': dict(EMPIRE, release_date='1980-05-21')},
+    {'table': 'items', 'row': CLONE_WARS},
+    {'table': 'items', 'row': {'franchise': 'halo', 'external_id': '4062', 'title': 'Halo: Combat Evolved'}},
+    {'table': 'orders', 'row': dict(RELEASE, order_type='release')},
+    {'table': 'order_items', 'row': {'order': RELEASE, 'item': NEW_HOPE, 'position': 1}},
+    {'table': 'order_items', 'row': {'order': RELEASE, 'item': EMPIRE, 'position': 2}},
+    {'table': 'order_items', 'row': {'order': RELEASE, 'item': CLONE_WARS, 'position': 3}},
+    {'table': 'affiliate_links', 'row': {'item': NEW_HOPE, 'platform': 'amazon', 'region': 'us',
+                                         'url': 'https://example.com/new-hope'}},
+]
+COUNTS = {'franchises': 2, 'items': 4, 'orders': 1, 'order_items': 3, 'affiliate_links': 1}
+
+
+@pytest.fixture(params=['sqlite', 'supabase'])
+def catalog(request):
+    if request.param == 'supabase':
+        yield SupabaseCatalog(SupabaseStandIn())
+        return
+    # Register the catalog models before sqlite_app creates the tables
+    import src.models.franchise
+    app = request.getfixturevalue('sqlite_app')
+    with app.app_context():
+        yield SqlAlchemyCatalog(db.session)
+
+
+def lines(*objects):
+    return iter_lines(json.dumps(line) + '\n' for line in objects)
+
+
+def row_counts(catalog):
+    return {table: len(list(catalog.scan(table))) for table in TABLES}
+
+
+def test_reimporting_an_export_updates_every_row(catalog):
+    report = import_lines(catalog, lines(*SNAPSHOT), chunk_size=2)
+    assert report['failed'] == 0
+    assert {table: counts['created'] for table, counts in report['tables'].items()} == COUNTS
+
+    exported = list(export_lines(catalog))
+    assert json.loads(exported[0]) == HEADER
+    assert len(exported) == 1 + sum(COUNTS.values())
+
+    report = import_lines(catalog, iter_lines(exported), chunk_size=2)
+    assert report['failed'] == 0
+    assert report['tables'] == {table: {'created': 0, 'updated': count, 'failed': 0} for table, count in COUNTS.items()}
+    assert row_counts(catalog) == COUNTS
+
+
+def test_lines_with_unknown_references_fail_alone(catalog):
+    report = import_lines(catalog, lines(
+        *SNAPSHOT[:3],
+        {'table': 'items', 'row': {'franchise': 'dune', 'external_id': '438631', 'title': 'Dune'}},
+        SNAPSHOT[3],
+        {'table': 'orders', 'row': dict(RELEASE, order_type='release')},
+        {'table': 'order_items', 'row': {'order': dict(RELEASE, name='Machete Order'), 'item': NEW_HOPE,
+                                         'position': 1}},
+        {'table': 'affiliate_links', 'row': {'item': EMPIRE, 'platform': 'amazon', 'region': 'us',
+                                             'url': 'https://example.com/empire'}},
+        {'table': 'characters', 'row': {'name': 'Luke'}},
+        'not a line',
+    ))
+
+    assert [(error['line'], error['table']) for error in report['errors']] == \
+        [(4, 'items'), (7, 'order_items'), (8, 'affiliate_links'), (9, None), (10, None)]
+    assert report['errors'][0]['error'] == "Unknown franchise 'dune'"
+    assert report['errors'][1]['error'].startswith('Unknown order')
+    assert report['errors'][2]['error'].startswith('Unknown item')
+    assert report['failed'] == 5
+    assert row_counts(catalog) == dict(dict.fromkeys(TABLES, 0), franchises=2, items=1, orders=1)
+
+
+@pytest.mark.parametrize('header', [
+    {'format': 'someone-elses-catalog', 'version': VERSION},
+    {'format': FORMAT, 'version': VERSION + 1},
+])
+def test_unsupported_header_is_rejected(catalog, header):
+    with pytest.raises(CatalogImportError, match='Unsupported snapshot format'):
+        import_lines(catalog, lines(header, *SNAPSHOT[1:]))
+    assert row_counts(catalog) == dict.fromkeys(TABLES, 0)
+
+
+def test_repeated_key_within_a_chunk_is_written_once(catalog):
+    report = import_lines(catalog, lines(
+        HEADER,
+        {'table': 'franchises', 'row': {'slug': 'halo', 'name': 'Halo', 'category': 'games'}},
+        {'table': 'franchises', 'row': {'slug': 'halo', 'name': 'Halo (Xbox)', 'category': 'games'}},
+        {'table': 'items', 'row': {'franchise': 'halo', 'external_id': '4062', 'title': 'Halo'}},
+        {'table': 'items', 'row': {'franchise': 'halo', 'external_id': '4062', 'title': 'Halo: Combat Evolved'}},
+    ))
+
+    assert report['failed'] == 0
+    assert (report['tables']['franchises']['created'], report['tables']['items']['created']) == (1, 1)
+    # The later line wins
+    assert [row['name'] for row in catalog.scan('franchises')] == ['Halo (Xbox)']
+    assert [row['title'] for row in catalog.scan('items')] == ['Halo: Combat Evolved']
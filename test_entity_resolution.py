@@ -0,0 +1,194 @@
+#!/usr/bin/env python3
+"""Entity resolution: title normalization, sync-time merges and the catalog dedupe job.
+
+The dedupe job runs on SQLite and on the Supabase stand-in; the sync path
+is driven through RAWGService._bulk_create_games with canned search
+results, so no provider is called.
+"""
+
+import os
+import sys
+from datetime import date
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+
+from src.models.user import db
+from src.models.franchise import Franchise, Item, Order, OrderItem, AffiliateLink
+from src.services.catalog_transfer import SqlAlchemyCatalog, SupabaseCatalog
+from src.services.entity_resolution import EntityIndex, dedupe_catalog, find_duplicates, normalize_title
+from src.services.rawg_service import RAWGService
+from src.services.supabase_standin import SupabaseStandIn
+
+
+def add_items(franchise, *items):
+    rows = [Item(franchise_id=franchise.id, slug=item['title'].lower(), **item) for item in items]
+    db.session.add_all(rows)
+    db.session.flush()
+    return rows
+
+
+def test_normalize_title():
+    assert normalize_title('The Lord of the Rings: The Two Towers') == 'lord of the rings the two towers'
+    assert normalize_title('Pokémon Red & Blue') == 'pokemon red and blue'
+    assert normalize_title('Final Fantasy VII') == normalize_title('FINAL FANTASY 7')
+    assert normalize_title('V for Vendetta') == 'v for vendetta'
+
+
+def test_find_duplicates_groups_through_shared_keys():
+    items = [
+        {'id': 'a', 'franchise_id': 1, 'title': 'Halo', 'release_date': '2001-11-15', 'api_metadata': {'rawg_id': 1}},
+        # Same title and year as a, and the same TMDb id as c: all three are one work
+        {'id': 'b', 'franchise_id': 1, 'title': 'HALO', 'release_date': '2001-01-01', 'api_metadata': {'tmdb_id': 9}},
+        {'id': 'c', 'franchise_id': 1, 'title': 'Halo: The Movie', 'api_metadata': {'tmdb_id': 9},
+         'description': 'Longer', 'image_url': 'poster'},
+        # Another franchise, or a season with a generic title, never matches
+        {'id': 'd', 'franchise_id': 2, 'title': 'Halo', 'release_date': '2001-06-01'},
+        {'id': 'e', 'franchise_id': 1, 'title': 'Halo', 'release_date': '2001-06-01',
+         'api_metadata': {'tmdb_id': 5, 'season_number': 1}},
+    ]
+    assert find_duplicates(items) == [['c', 'a', 'b']]
+
+
+def test_sync_merges_into_existing_item(sqlite_app):
+    with sqlite_app.app_context():
+        franchise = Franchise(name='Halo', slug='halo', category='games')
+        db.session.add(franchise)
+        db.session.flush()
+        movie, = add_items(franchise, {'title': 'Halo', 'release_date': date(2001, 11, 15), 'external_id': '77',
+                                       'api_metadata': {'tmdb_id': 77}})
+        db.session.commit()
+
+        created = {'items': [], 'order_items': []}
+        games = [
+            {'id': 1, 'name': 'Halo: Combat Evolved', 'released': '2001-11-15', 'background_image': 'cover'},
+            {'id': 2, 'name': 'Halo', 'released': '2001-11-15', 'background_image': 'cover'},
+            {'id': 2, 'name': 'Halo', 'released': '2001-11-15'},
+        ]
+        releases = RAWGService()._bulk_create_games(games, franchise.id, created)
+        db.session.commit()
+
+        assert len(created['items']) == 1
+        assert [item_id for _, item_id in releases] == [movie.id, movie.id, created['items'][0]['id']]
+        db.session.refresh(movie)
+        assert movie.image_url == 'cover'
+        assert movie.api_metadata['provider_ids'] == ['rawg:2', 'tmdb:movie:77']
+        assert Item.query.count() == 2
+
+        # The merged RAWG id now resolves straight to the movie's item
+        index = EntityIndex.from_rows([{'id': movie.id, 'franchise_id': franchise.id,
+                                        'api_metadata': movie.api_metadata}])
+        game = {'franchise_id': franchise.id, 'title': 'Other', 'api_metadata': {'rawg_id': 2}}
+        assert index.resolve(game) == movie.id
+
+
+def test_dedupe_sqlite(sqlite_app):
+    with sqlite_app.app_context():
+        franchise = Franchise(name='Matrix', slug='matrix', category='movies')
+        db.session.add(franchise)
+        db.session.flush()
+        movie, game, sequel = add_items(
+            franchise,
+            {'title': 'The Matrix', 'release_date': date(1999, 3, 31), 'description': 'Neo',
+             'image_url': 'poster', 'api_metadata': {'tmdb_id': 603}},
+            {'title': 'Matrix', 'release_date': date(1999, 1, 1), 'image_url': 'cover',
+             'api_metadata': {'rawg_id': 42}},
+            {'title': 'The Matrix Reloaded', 'release_date': date(2003, 5, 15)},
+        )
+        orders = [Order(franchise_id=franchise.id, order_type=kind, name=kind) for kind in ('release', 'chronological')]
+        db.session.add_all(orders)
+        db.session.flush()
+        db.session.add_all([
+            OrderItem(order_id=orders[0].id, item_id=movie.id, position=1),
+            OrderItem(order_id=orders[0].id, item_id=game.id, position=2),
+            OrderItem(order_id=orders[0].id, item_id=sequel.id, position=3),
+            OrderItem(order_id=orders[1].id, item_id=game.id, position=1),
+            AffiliateLink(item_id=game.id, platform='amazon_uk', url='https://amazon.test/matrix'),
+        ])
+        db.session.commit()
+
+        dry = dedupe_catalog(SqlAlchemyCatalog(db.session), dry_run=True)
+        assert (dry['items'], dry['groups'], dry['duplicates'], dry['merged']) == (3, 1, 1, 0)
+        assert Item.query.count() == 3
+
+        report = dedupe_catalog(SqlAlchemyCatalog(db.session))
+        assert report['merged'] == 1
+        assert (report['order_items_moved'], report['order_items_dropped']) == (1, 1)
+        assert report['links_moved'] == 1
+
+        db.session.expire_all()
+        assert {item.title for item in Item.query.all()} == {'The Matrix', 'The Matrix Reloaded'}
+        # The movie was the more complete item; it keeps its poster and gains the RAWG id
+        merged = Item.query.filter_by(title='The Matrix').one()
+        assert merged.image_url == 'poster'
+        assert merged.api_metadata['provider_ids'] == ['rawg:42', 'tmdb:movie:603']
+        assert [entry.item_id for entry in OrderItem.query.filter_by(order_id=orders[0].id).order_by('position')] == \
+            [merged.id, sequel.id]
+        assert OrderItem.query.filter_by(order_id=orders[1].id).one().item_id == merged.id
+        assert AffiliateLink.query.one().item_id == merged.id
+
+        assert dedupe_catalog(SqlAlchemyCatalog(db.session))['groups'] == 0
+
+
+def test_dedupe_supabase():
+    standin = SupabaseStandIn()
+    franchise = standin.table('franchises').insert({'name': 'Zelda', 'slug': 'zelda'}).execute().data[0]
+    items = standin.table('items').insert([
+        {'franchise_id': franchise['id'], 'title': title, 'release_date': released, 'image_url': image,
+         'api_metadata': metadata}
+        for title, released, image, metadata in (
+            ('Breath of the Wild', '2017-03-03', 'cover', {'rawg_id': 1}),
+            ('Breath of the Wild', '2017-03-03', None, {'rawg_id': 1, 'rating': 4.5}),
+            ('Tears of the Kingdom', '2023-05-12', None, {'rawg_id': 2}),
+        )
+    ]).execute().data
+    order = standin.table('orders').insert({'franchise_id': franchise['id'], 'name': 'Release'}).execute().data[0]
+    standin.table('order_items').insert([
+        {'order_id': order['id'], 'item_id': item['id'], 'position': n} for n, item in enumerate(items)
+    ]).execute()
+    standin.table('affiliate_links').insert([
+        {'item_id': item['id'], 'platform': 'amazon', 'region': 'uk', 'url': f'https://amazon.test/{n}'}
+        for n, item in enumerate(items[:2])
+    ]).execute()
+
+    report = dedupe_catalog(SupabaseCatalog(standin))
+    assert (report['groups'], report['merged'], report['order_items_dropped'], report['links_dropped']) == (1, 1, 1, 1)
+    assert len(standin.tables['items']) == 2
+    assert standin.tables['items'][0]['api_metadata'] == {'rawg_id': 1, 'rating': 4.5}
+    assert {row['item_id'] for row in standin.tables['order_items']} == {items[0]['id'], items[2]['id']}
+    assert [row['url'] for row in standin.tables['affiliate_links']] == ['https://amazon.test/0']
+
+
+def test_supabase_sync_resolves_against_stored_items():
+    from src.config.supabase import use_supabase_client
+    from src.services.supabase_async_service import run_async
+    from src.services.supabase_standin import AsyncSupabaseStandIn
+    from src.services.supabase_sync_service import SupabaseSyncService
+
+    standin = SupabaseStandIn()
+    franchise = standin.add('franchises', {'name': 'Dune', 'slug': 'dune'})
+    # Stored by another provider (or an import), so its external id is no help
+    stored = standin.add('items', {'franchise_id': franchise['id'], 'title': 'Dune', 'release_date': '2021-09-15',
+                                   'external_id': 'imdb-1160419', 'api_metadata': {}})
+    movies = [
+        {'franchise_id': franchise['id'], 'title': 'Dune', 'release_date': '2021-10-22', 'external_id': '438631',
+         'description': 'Paul Atreides', 'api_metadata': {'tmdb_id': 438631}},
+        {'franchise_id': franchise['id'], 'title': 'Dune: Part Two', 'release_date': '2024-02-27',
+         'external_id': '693134', 'api_metadata': {'tmdb_id': 693134}},
+        {'franchise_id': franchise['id'], 'title': 'Dune Part II', 'release_date': '2024-03-01',
+         'external_id': '693134', 'api_metadata': {'tmdb_id': 693134}},
+    ]
+    use_supabase_client(standin, AsyncSupabaseStandIn(standin))
+    try:
+        service = SupabaseSyncService()
+        items = run_async(service._stored_or_created_items(franchise['id'], movies))
+        again = run_async(service._stored_or_created_items(franchise['id'], movies))
+    finally:
+        use_supabase_client(None)
+
+    assert [item['title'] for item in items] == ['Dune', 'Dune: Part Two']
+    assert [item['id'] for item in again] == [item['id'] for item in items]
+    assert items[0]['id'] == stored['id']
+    assert items[0]['description'] == 'Paul Atreides'
+    assert items[0]['api_metadata'] == {'tmdb_id': 438631, 'provider_ids': ['tmdb:movie:438631']}
+    assert len(standin.tables['items']) == 2
@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+"""Exercise /img against the API stub server's image endpoint.
+
+Items point at images served by api_stub_server, so the tests can count how
+often the proxy goes upstream: once per source, however many sizes, formats
+or concurrent requests ask for it.
+"""
+
+import io
+import os
+import sys
+import tempfile
+import threading
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+
+Image = pytest.importorskip('PIL.Image')
+
+from src.models.user import db
+from src.models.franchise import Franchise, Item
+from src.routes.images import images_bp
+from src.services.image_proxy import DiskLRU, init_image_proxy
+
+
+@pytest.fixture
+def app(sqlite_app, stub):
+    app = sqlite_app
+    app.config['IMAGE_CACHE_DIR'] = tempfile.mkdtemp()
+    app.register_blueprint(images_bp)
+    with app.app_context():
+        franchise = Franchise(name='Stub', slug='stub', category='movies')
+        db.session.add(franchise)
+        db.session.flush()
+        db.session.add_all([
+            Item(franchise_id=franchise.id, title='Poster', slug='poster',
+                 image_url=f'{stub.image_base_url}/t/p/w500/poster.jpg'),
+            Item(franchise_id=franchise.id, title='Backdrop', slug='backdrop',
+                 image_url=f'{stub.image_base_url}/games/backdrop.jpg'),
+            Item(franchise_id=franchise.id, title='Missing', slug='missing'),
+        ])
+        db.session.commit()
+        app.item_ids = {item.slug: item.id for item in Item.query.all()}
+    init_image_proxy(app)
+    return app
+
+
+def image_requests(stub):
+    return stub.stats()['by_provider'].get('images', 0)
+
+
+def test_resizes_to_webp_with_cache_headers(app, stub):
+    client = app.test_client()
+    response = client.get(f"/img/{app.item_ids['poster']}/card", headers={'Accept': 'image/webp,*/*'})
+
+    assert response.status_code == 200
+    assert response.mimetype == 'image/webp'
+    assert 'max-age=' in response.headers['Cache-Control']
+    assert 'Accept' in response.headers['Vary']
+    assert response.headers['ETag']
+    with Image.open(io.BytesIO(response.data)) as image:
+        assert image.format == 'WEBP'
+        assert image.size == (342, 513)
+
+
+def test_source_fetched_once_for_every_size_and_format(app, stub):
+    client = app.test_client()
+    poster = app.item_ids['poster']
+    for size in ('thumb', 'card', 'detail'):
+        client.get(f'/img/{poster}/{size}', headers={'Accept': 'image/webp'})
+        response = client.get(f'/img/{poster}/{size}', headers={'Accept': 'image/jpeg'})
+        assert response.mimetype == 'image/jpeg'
+
+    with Image.open(io.BytesIO(response.data)) as image:
+        # The w500 source is never upscaled
+        assert image.size == (500, 750)
+    assert image_requests(stub) == 1
+
+
+def test_concurrent_requests_share_one_render(app, stub):
+    backdrop = app.item_ids['backdrop']
+    statuses = []
+
+    def fetch():
+        statuses.append(app.test_client().get(f'/img/{backdrop}/thumb').status_code)
+
+    threads = [threading.Thread(target=fetch) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert statuses == [200] * 8
+    assert image_requests(stub) == 1
+
+
+def test_revalidation_returns_304(app, stub):
+    client = app.test_client()
+    path = f"/img/{app.item_ids['poster']}/thumb"
+    etag = client.get(path).headers['ETag']
+
+    response = client.get(path, headers={'If-None-Match': etag})
+    assert response.status_code == 304
+    assert response.data == b''
+
+
+def test_errors(app, stub):
+    client = app.test_client()
+    assert client.get(f"/img/{app.item_ids['poster']}/huge").status_code == 400
+    assert client.get(f"/img/{app.item_ids['missing']}/card").status_code == 404
+    assert client.get('/img/no-such-item/card').status_code == 404
+
+    stub.state.error_rate = 1.0
+    assert client.get(f"/img/{app.item_ids['backdrop']}/card").status_code == 502
+
+
+def test_disk_cache_evicts_least_recently_used_and_survives_restart():
+    directory = tempfile.mkdtemp()
+    cache = DiskLRU(directory, max_bytes=250)
+    cache.put('a', b'x' * 100)
+    cache.put('b', b'x' * 100)
+    assert cache.get('a') is not None
+    cache.put('c', b'x' * 100)
+
+    assert cache.get('b') is None
+    assert sorted(os.listdir(directory)) == ['a', 'c']
+
+    reopened = DiskLRU(directory, max_bytes=250)
+    assert reopened.stats()['bytes'] == 200
+    assert reopened.get('c') == b'x' * 100
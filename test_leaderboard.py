@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+"""Popularity leaderboards in leaderboard.py behind the legacy listing routes.
+
+The board caches rows only for its top entries, so pages inside that depth
+cost no query while deeper pages (and pages with an uncached row) fall back
+to the database. X-Query-Count from the query guard tells the two apart.
+"""
+
+import os
+import sys
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+
+from src.models.user import db
+from src.models.franchise import Franchise
+from src.routes.franchise import franchise_bp
+from src.services.catalog_events import publish_rows, unsubscribe
+from src.services.leaderboard import Leaderboard, init_leaderboard
+from src.services.query_budget import init_query_guard
+
+FRANCHISES = [
+    ('star-wars', 'movies', 100),
+    ('halo', 'games', 90),
+    ('dune', 'movies', 80),
+    ('zelda', 'games', 70),
+    ('alien', 'movies', 60),
+    ('mass-effect', 'games', 50),
+]
+DEPTH = 4
+
+
+@pytest.fixture
+def app(sqlite_app):
+    sqlite_app.config['QUERY_BUDGET_MODE'] = 'strict'
+    init_query_guard(sqlite_app)
+    sqlite_app.register_blueprint(franchise_bp, url_prefix='/api')
+    with sqlite_app.app_context():
+        db.session.add_all([Franchise(id=slug, name=slug.title(), slug=slug, category=category, popularity_score=score)
+                            for slug, category, score in FRANCHISES])
+        db.session.commit()
+        board = init_leaderboard(sqlite_app)
+        board.size = DEPTH
+        yield sqlite_app
+    unsubscribe(board.apply)
+
+
+def listing(app, path):
+    """(franchise ids, total, queries run) for a listing page."""
+    response = app.test_client().get(path)
+    assert response.status_code == 200, response.get_json()
+    body = response.get_json()
+    return [franchise['id'] for franchise in body['franchises']], body['total'], int(response.headers['X-Query-Count'])
+
+
+def test_top_pages_come_from_memory(app):
+    assert listing(app, '/api/franchises?limit=3') == (['star-wars', 'halo', 'dune'], 6, 0)
+    assert listing(app, '/api/franchises?limit=2&offset=2') == (['dune', 'zelda'], 6, 0)
+    assert listing(app, '/api/categories/games/franchises?limit=3') == (['halo', 'zelda', 'mass-effect'], 3, 0)
+
+
+def test_pages_past_the_cached_depth_fall_back_to_the_database(app):
+    assert listing(app, '/api/franchises?limit=2&offset=3') == (['zelda', 'alien'], 6, 2)
+    assert listing(app, '/api/franchises?limit=20') == ([slug for slug, _, _ in FRANCHISES], 6, 2)
+    # A search is never answered by the board
+    assert listing(app, '/api/franchises?search=dune') == (['dune'], 1, 2)
+
+
+def test_score_only_updates_reorder_and_fetch_new_top_rows(app):
+    # The popularity job publishes partial rows; the one entering the top is read in one query
+    publish_rows('franchises', [{'id': 'mass-effect', 'popularity_score': 1000},
+                                {'id': 'star-wars', 'popularity_score': 5}])
+
+    ids, _, queries = listing(app, '/api/franchises?limit=4')
+    assert (ids, queries) == (['mass-effect', 'halo', 'dune', 'zelda'], 0)
+    response = app.test_client().get('/api/franchises?limit=1')
+    assert response.get_json()['franchises'][0]['popularity_score'] == 1000
+    assert listing(app, '/api/categories/movies/franchises?limit=3') == (['dune', 'alien', 'star-wars'], 3, 0)
+
+
+def test_committed_writes_reach_the_board(app):
+    db.session.add(Franchise(id='witcher', name='The Witcher', slug='witcher', category='games', popularity_score=95))
+    db.session.delete(db.session.get(Franchise, 'halo'))
+    db.session.commit()
+
+    assert listing(app, '/api/franchises?limit=3') == (['star-wars', 'witcher', 'dune'], 6, 0)
+    assert listing(app, '/api/categories/games/franchises?limit=3') == (['witcher', 'zelda', 'mass-effect'], 3, 0)
+
+
+def test_uncached_rows_are_remembered_from_the_fallback():
+    board = Leaderboard(size=2)
+    board.load([('a', 'games', 10), ('b', 'games', 20), ('c', 'movies', 30), ('d', 'games', 1)])
+    assert board.top(limit=2) is None
+
+    # Rows outside every board's top entries are not kept
+    board.remember([{'id': slug, 'name': slug.upper()} for slug in 'abcd'])
+    assert board.top(limit=2) == [{'id': 'c', 'name': 'C'}, {'id': 'b', 'name': 'B'}]
+    assert board.top('games', limit=2) == [{'id': 'b', 'name': 'B'}, {'id': 'a', 'name': 'A'}]
+    assert board.top(limit=2, offset=1) is None
+    assert board.stats() == {'franchises': 4, 'boards': 3, 'cached_rows': 3}
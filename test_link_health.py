@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+"""Dead-link checks against the API stub server's /links/ pages.
+
+The stub answers like a retailer would (HEAD refused, redirects, 404s,
+503s) and records the peak number of concurrent requests per Host header,
+so the per-host limit can be checked without touching the network.
+"""
+
+import os
+import sys
+from datetime import datetime
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+
+from src.models.user import db
+from src.models.franchise import Franchise, Item, AffiliateLink
+from src.models.link_check import LinkHealthCheck
+from src.config.supabase import use_supabase_client
+from src.services.link_health import (
+    CHECK_INTERVAL, FAILURE_THRESHOLD, RETRY_AFTER, SqlAlchemyLinkHealthStore, SupabaseLinkHealthStore, check_links
+)
+from src.services.supabase_service import SupabaseService
+from src.services.supabase_standin import SupabaseStandIn, register_link_health_rpcs
+
+NOW = datetime(2024, 6, 1, 12, 0)
+PAGES = ('ok', 'no-head', 'redirect/3', 'status/404', 'status/503')
+
+
+@pytest.fixture
+def app(sqlite_app, stub):
+    with sqlite_app.app_context():
+        franchise = Franchise(name='Links', slug='links', category='movies')
+        db.session.add(franchise)
+        db.session.flush()
+        item = Item(franchise_id=franchise.id, title='Item', slug='item')
+        db.session.add(item)
+        db.session.flush()
+        for page in PAGES:
+            db.session.add(AffiliateLink(item_id=item.id, platform=page, url=f'{stub.link_base_url}/{page}',
+                                         is_active=True))
+        db.session.commit()
+        yield sqlite_app
+
+
+def checks_by_page():
+    links = {link.id: link.platform for link in AffiliateLink.query.all()}
+    return {links[check.link_id]: check for check in LinkHealthCheck.query.all()}
+
+
+def test_outcomes(app, stub):
+    with app.app_context():
+        report = check_links(SqlAlchemyLinkHealthStore(db.session), now=NOW)
+
+        assert (report['checked'], report['ok'], report['throttled'], report['broken']) == (5, 3, 1, 1)
+        assert [link['status_code'] for link in report['broken_links']] == [404]
+        checks = checks_by_page()
+        assert checks['ok'].status == 'ok'
+        assert checks['no-head'].status == 'ok'
+        assert checks['redirect/3'].final_url == f'{stub.link_base_url}/ok'
+        assert checks['status/404'].error == 'HTTP 404'
+        assert (checks['status/503'].status, checks['status/503'].failures) == ('throttled', 0)
+        assert checks['ok'].next_check_at == NOW + CHECK_INTERVAL
+        assert checks['status/404'].next_check_at == NOW + RETRY_AFTER
+
+
+def test_rechecks_only_when_due(app):
+    with app.app_context():
+        store = SqlAlchemyLinkHealthStore(db.session)
+        check_links(store, now=NOW)
+        # Throttled and broken links come back after RETRY_AFTER, the rest after CHECK_INTERVAL
+        assert check_links(store, now=NOW + RETRY_AFTER)['checked'] == 2
+        # Then the broken link backs off to twice RETRY_AFTER while throttling keeps the flat delay
+        assert check_links(store, now=NOW + RETRY_AFTER * 2)['checked'] == 1
+        report = check_links(store, now=NOW + RETRY_AFTER * 3)
+        assert report['checked'] == 2
+        # That was the broken link's third failure, so only four links are left to check
+        assert report['deactivated'] == 1
+        assert check_links(store, now=NOW + CHECK_INTERVAL)['checked'] == 4
+
+
+def test_repeated_failures_deactivate(app):
+    with app.app_context():
+        store = SqlAlchemyLinkHealthStore(db.session)
+        when = NOW
+        for run in range(FAILURE_THRESHOLD):
+            report = check_links(store, now=when)
+            when = when + CHECK_INTERVAL
+        assert report['deactivated'] == 1
+        assert report['broken_links'][0]['deactivated']
+
+        db.session.expire_all()
+        inactive = AffiliateLink.query.filter_by(is_active=False).all()
+        assert [link.platform for link in inactive] == ['status/404']
+        assert checks_by_page()['status/404'].failures == FAILURE_THRESHOLD
+        assert check_links(store, now=when)['checked'] == 4
+
+
+def test_per_host_limit(stub):
+    stub.state.latency = 50
+    hosts = (stub.link_base_url, stub.link_base_url.replace('127.0.0.1', 'localhost'))
+
+    class Store:
+        def due_links(self, limit, now):
+            return [{'id': f'{n}', 'item_id': 'item', 'url': f'{hosts[n % 2]}/ok'} for n in range(12)]
+
+        def write(self, checks, deactivate_ids):
+            self.checks = checks
+
+    store = Store()
+    report = check_links(store, now=NOW, per_host=2)
+    assert report['ok'] == 12
+    assert sorted(stub.stats()['links_peak'].values()) == [2, 2]
+
+
+def test_supabase_store(stub):
+    standin = register_link_health_rpcs(SupabaseStandIn())
+    use_supabase_client(standin)
+    item = standin.table('items').insert({'title': 'Item'}).execute().data[0]
+    standin.table('affiliate_links').insert([
+        {'item_id': item['id'], 'platform': 'shop', 'region': page, 'url': f'{stub.link_base_url}/{page}'}
+        for page in PAGES
+    ]).execute()
+    service = SupabaseService()
+    store = SupabaseLinkHealthStore(service)
+
+    when = NOW
+    for run in range(FAILURE_THRESHOLD):
+        report = check_links(store, now=when)
+        when = when + CHECK_INTERVAL
+    assert report['deactivated'] == 1
+    assert len(standin.tables['link_health_checks']) == 5
+    assert len(service.get_item_affiliate_links(item['id'])) == 4
+    assert check_links(store, now=when)['checked'] == 4
@@ -0,0 +1,181 @@
+#!/usr/bin/env python3
+"""Request regions and region-filtered affiliate links in link_regions.py.
+
+Routes are exercised with the link index loaded and without it (links
+queried per request); both must return the same links for a region.
+"""
+
+import os
+import sys
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+
+from flask import Flask
+from src.models.user import db
+from src.models.franchise import Franchise, Item, Order, OrderItem, AffiliateLink
+from src.config.supabase import use_supabase_client
+from src.routes.franchise import franchise_bp
+from src.services.catalog_events import publish_rows, unsubscribe
+from src.services.link_regions import (
+    UnknownRegion, init_link_regions, link_region, region_from_accept_language, resolve_region
+)
+from src.services.supabase_standin import SupabaseStandIn
+
+
+class FakeLocator:
+    def __init__(self, regions):
+        self.regions = regions
+
+    def region(self, address):
+        return self.regions.get(address)
+
+
+@pytest.mark.parametrize('link,region', [
+    ({'region': 'US', 'platform': 'amazon_uk'}, 'us'),
+    ({'region': 'eu', 'platform': 'amazon_uk'}, 'uk'),
+    ({'platform': 'Amazon_US'}, 'us'),
+    ({'platform': 'steam', 'currency': 'gbp'}, 'uk'),
+    ({'platform': 'amazon_uk', 'currency': 'USD'}, 'uk'),
+    ({'platform': 'steam', 'currency': 'EUR'}, None),
+    ({'platform': None}, None),
+])
+def test_link_region(link, region):
+    assert link_region(link) == region
+
+
+@pytest.mark.parametrize('header,region', [
+    ('en-GB', 'uk'),
+    ('fr-FR, en-US;q=0.5, en-GB;q=0.8', 'uk'),
+    ('en-GB;q=0.2, en-US', 'us'),
+    ('en-GB;q=0, en-US;q=0.1', 'us'),
+    ('en-GB;q=high, en-US;q=0.1', 'us'),
+    ('zh-Hant-US', 'us'),
+    ('en, fr', None),
+    ('', None),
+])
+def test_region_from_accept_language(header, region):
+    assert region_from_accept_language(header) == region
+
+
+@pytest.mark.parametrize('query,headers,address,region', [
+    ('?region=US', {'Accept-Language': 'en-GB'}, '1.1.1.1', 'us'),
+    ('', {'Accept-Language': 'fr-FR, en-US;q=0.5'}, '2.2.2.2', 'us'),
+    ('', {'Accept-Language': 'fr-FR'}, '2.2.2.2', 'uk'),
+    ('', {}, '1.1.1.1', 'us'),
+    ('', {}, '3.3.3.3', 'us'),
+])
+def test_region_resolution_order(query, headers, address, region):
+    app = Flask(__name__)
+    app.config['LINK_DEFAULT_REGION'] = 'us'
+    app.extensions['orderof_geoip'] = FakeLocator({'1.1.1.1': 'us', '2.2.2.2': 'uk'})
+    with app.test_request_context(f'/{query}', headers=headers, environ_base={'REMOTE_ADDR': address}):
+        assert resolve_region() == region
+
+
+def test_unknown_explicit_region_is_rejected():
+    app = Flask(__name__)
+    with app.test_request_context('/?region=fr', headers={'Accept-Language': 'en-GB'}):
+        with pytest.raises(UnknownRegion, match='Unknown region: fr'):
+            resolve_region()
+    with app.test_request_context('/'):
+        assert resolve_region() == 'uk'
+
+
+@pytest.fixture
+def legacy_app(sqlite_app):
+    sqlite_app.register_blueprint(franchise_bp, url_prefix='/api')
+    with sqlite_app.app_context():
+        db.session.add(Franchise(id='halo', name='Halo', slug='halo', category='games'))
+        db.session.add(Item(id='halo-1', franchise_id='halo', title='Halo: Combat Evolved'))
+        db.session.add(Order(id='release', franchise_id='halo', order_type='release', name='Release'))
+        db.session.add(OrderItem(order_id='release', item_id='halo-1', position=1))
+        db.session.add_all([
+            AffiliateLink(id='uk', item_id='halo-1', platform='amazon_uk', url='https://example.com/uk'),
+            AffiliateLink(id='us', item_id='halo-1', platform='steam', currency='USD', url='https://example.com/us'),
+            AffiliateLink(id='anywhere', item_id='halo-1', platform='gog', url='https://example.com/gog'),
+            AffiliateLink(id='retired', item_id='halo-1', platform='amazon_us', url='https://example.com/old',
+                          is_active=False),
+        ])
+        db.session.commit()
+        yield sqlite_app
+
+
+def order_links(app, query='', headers=None):
+    response = app.test_client().get(f'/api/franchises/halo/orders{query}', headers=headers or {})
+    assert response.status_code == 200, response.get_json()
+    body = response.get_json()
+    assert response.headers['Vary'] == 'Accept-Language'
+    return body['region'], sorted(link['id'] for link in body['orders'][0]['items'][0]['affiliate_links'])
+
+
+@pytest.mark.parametrize('indexed', [False, True])
+def test_order_links_are_filtered_by_region(legacy_app, indexed):
+    if indexed:
+        index = init_link_regions(legacy_app)
+    try:
+        assert order_links(legacy_app, '?region=us') == ('us', ['anywhere', 'us'])
+        assert order_links(legacy_app, headers={'Accept-Language': 'en-GB'}) == ('uk', ['anywhere', 'uk'])
+        assert order_links(legacy_app) == ('uk', ['anywhere', 'uk'])
+
+        response = legacy_app.test_client().get('/api/franchises/halo/orders?region=fr')
+        assert response.status_code == 400
+        assert 'Unknown region' in response.get_json()['error']
+        response = legacy_app.test_client().get('/api/franchises/halo/orders/release?region=de')
+        assert response.status_code == 400
+    finally:
+        if indexed:
+            unsubscribe(index.apply)
+
+
+@pytest.fixture
+def supabase_app():
+    standin = SupabaseStandIn()
+    use_supabase_client(standin)
+    from src.routes.supabase_affiliate import supabase_affiliate_bp
+
+    item = standin.add('items', {'title': 'Halo: Combat Evolved'})
+    for region, platform, currency in [('uk', 'amazon', 'GBP'), ('us', 'amazon', 'USD'), ('eu', 'gog', 'EUR')]:
+        standin.add('affiliate_links', {'item_id': item['id'], 'platform': platform, 'region': region,
+                                        'currency': currency, 'url': f'https://example.com/{region}'})
+    app = Flask(__name__)
+    app.register_blueprint(supabase_affiliate_bp, url_prefix='/api')
+    yield app, standin, item['id']
+    use_supabase_client(None)
+
+
+def item_links(app, item_id, query=''):
+    response = app.test_client().get(f'/api/items/{item_id}/affiliate-links{query}')
+    assert response.status_code == 200, response.get_json()
+    return sorted(link['url'] for link in response.get_json()['affiliate_links'])
+
+
+@pytest.mark.parametrize('indexed', [False, True])
+def test_supabase_item_links_are_filtered_by_region(supabase_app, indexed):
+    app, standin, item_id = supabase_app
+    if indexed:
+        index = init_link_regions(app, supabase_client=standin)
+    try:
+        # A region no storefront serves is read off the currency, else applies everywhere
+        assert item_links(app, item_id, '?region=uk') == ['https://example.com/eu', 'https://example.com/uk']
+        assert item_links(app, item_id, '?region=us') == ['https://example.com/eu', 'https://example.com/us']
+        assert app.test_client().get(f'/api/items/{item_id}/affiliate-links?region=fr').status_code == 400
+    finally:
+        if indexed:
+            unsubscribe(index.apply)
+
+
+def test_link_writes_reload_only_the_changed_item(supabase_app):
+    app, standin, item_id = supabase_app
+    index = init_link_regions(app, supabase_client=standin)
+    try:
+        link = standin.add('affiliate_links', {'item_id': item_id, 'platform': 'steam', 'region': 'us',
+                                               'url': 'https://example.com/steam'})
+        assert 'https://example.com/steam' not in item_links(app, item_id, '?region=us')
+
+        publish_rows('affiliate_links', [link])
+        assert index.stats()['stale'] == 1
+        assert 'https://example.com/steam' in item_links(app, item_id, '?region=us')
+        assert index.stats()['stale'] == 0
+    finally:
+        unsubscribe(index.apply)
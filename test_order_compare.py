@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+"""Order comparisons in order_compare.py and their cache.
+
+Orders are built as the /orders routes serialize them; the cache is wired
+to catalog_events as the app does, and fed changes with publish_rows.
+"""
+
+import os
+import sys
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+
+from flask import Flask
+from src.services.catalog_events import publish_rows, unsubscribe
+from src.services.order_compare import compare_orders, get_comparison_cache, init_order_compare
+
+
+def order(order_id, order_type, *item_ids, optional=()):
+    return {'id': order_id, 'name': order_type.title(), 'order_type': order_type, 'items': [
+        {'id': item_id, 'title': f'Title {item_id}', 'is_optional': item_id in optional} for item_id in item_ids
+    ]}
+
+
+def test_identical_orders():
+    result = compare_orders(order('a', 'release', 1, 2, 3), order('b', 'chronological', 1, 2, 3))
+    assert (result['common'], result['lcs_length'], result['similarity']) == (3, 3, 1.0)
+    assert (result['moved'], result['only_in_a'], result['only_in_b']) == ([], [], [])
+    assert [delta['delta'] for delta in result['deltas']] == [0, 0, 0]
+    assert result['a'] == {'id': 'a', 'name': 'Release', 'order_type': 'release', 'count': 3}
+
+
+def test_missing_items():
+    result = compare_orders(order('a', 'release', 1, 2, 3, 4), order('b', 'chronological', 1, 3, 5))
+    assert result['only_in_a'] == [
+        {'item_id': 2, 'title': 'Title 2', 'position': 2},
+        {'item_id': 4, 'title': 'Title 4', 'position': 4},
+    ]
+    assert result['only_in_b'] == [{'item_id': 5, 'title': 'Title 5', 'position': 3}]
+    assert [(delta['item_id'], delta['position_a'], delta['position_b']) for delta in result['deltas']] == \
+        [(1, 1, 1), (3, 3, 2)]
+    assert result['moved'] == []
+    assert result['similarity'] == 0.5
+
+
+def test_reordered_items():
+    # Star Wars: release order against episode order
+    result = compare_orders(order('a', 'release', 4, 5, 6, 1, 2, 3), order('b', 'chronological', 1, 2, 3, 4, 5, 6))
+    assert result['lcs_length'] == 3
+    assert {delta['item_id'] for delta in result['moved']} | {delta['item_id'] for delta in result['lcs']} == \
+        {1, 2, 3, 4, 5, 6}
+    assert [(delta['item_id'], delta['delta']) for delta in result['deltas']] == \
+        [(4, 3), (5, 3), (6, 3), (1, -3), (2, -3), (3, -3)]
+    assert result['similarity'] == 0.5
+
+
+def test_optional_items():
+    # The optional special only the chronological order has shifts what follows it
+    result = compare_orders(order('a', 'release', 1, 2, 3), order('b', 'chronological', 1, 'special', 2, 3,
+                                                                  optional={'special'}))
+    assert result['only_in_b'] == [{'item_id': 'special', 'title': 'Title special', 'position': 2}]
+    assert [(delta['item_id'], delta['delta']) for delta in result['deltas']] == [(1, 0), (2, 1), (3, 1)]
+    assert (result['moved'], result['lcs_length'], result['similarity']) == ([], 3, 0.75)
+
+
+def test_repeated_items_are_matched_by_occurrence():
+    result = compare_orders(order('a', 'release', 1, 2, 1), order('b', 'chronological', 1, 1, 2))
+    assert [(delta['item_id'], delta['position_a'], delta['position_b']) for delta in result['deltas']] == \
+        [(1, 1, 1), (2, 2, 3), (1, 3, 2)]
+    assert result['lcs_length'] == 2
+    assert (result['only_in_a'], result['only_in_b']) == ([], [])
+
+
+def test_empty_orders():
+    result = compare_orders(order('a', 'release'), order('b', 'chronological'))
+    assert (result['common'], result['lcs_length'], result['similarity']) == (0, 0, 1.0)
+
+
+@pytest.fixture
+def cache():
+    app = Flask(__name__)
+    cache = init_order_compare(app)
+    assert get_comparison_cache(app) is cache
+    yield cache
+    unsubscribe(cache.apply)
+
+
+def cached(cache, franchise_id, order_a, order_b):
+    key = ('sqlite', franchise_id, order_a['order_type'], order_b['order_type'])
+    cache.put(key, compare_orders(order_a, order_b), franchise_id, [order_a['id'], order_b['id']], cache.token())
+    return key
+
+
+def test_cache_drops_comparisons_of_a_changed_order(cache):
+    star_wars = cached(cache, 'f1', order('a', 'release', 1, 2), order('b', 'chronological', 2, 1))
+    halo = cached(cache, 'f2', order('c', 'release', 3), order('d', 'chronological', 3))
+    assert cache.get(star_wars)['lcs_length'] == 1
+
+    publish_rows('order_items', [{'id': 9, 'order_id': 'b', 'item_id': 1, 'position': 2048}])
+    assert cache.get(star_wars) is None
+    assert cache.get(halo) is not None
+
+
+def test_cache_drops_a_franchise_on_order_and_item_changes(cache):
+    star_wars = cached(cache, 'f1', order('a', 'release', 1), order('b', 'chronological', 1))
+    halo = cached(cache, 'f2', order('c', 'release', 3), order('d', 'chronological', 3))
+
+    publish_rows('orders', [{'id': 'e', 'franchise_id': 'f1', 'order_type': 'machete'}])
+    assert cache.get(star_wars) is None
+    assert cache.get(halo) is not None
+
+    publish_rows('items', [{'id': 3, 'franchise_id': 'f2', 'title': 'Halo: Combat Evolved'}])
+    assert cache.get(halo) is None
+
+
+def test_cache_clears_on_a_change_it_cannot_place(cache):
+    star_wars = cached(cache, 'f1', order('a', 'release', 1), order('b', 'chronological', 1))
+    publish_rows('order_items', [{'id': 9}], action='delete')
+    assert cache.get(star_wars) is None
+    assert len(cache) == 0
+
+
+def test_cache_skips_results_computed_across_a_change(cache):
+    token = cache.token()
+    publish_rows('order_items', [{'id': 9, 'order_id': 'b'}])
+    cache.put('stale', {}, 'f1', ['a', 'b'], token)
+    assert cache.get('stale') is None
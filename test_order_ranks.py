@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+"""Sparse rank planning in order_ranks.py.
+
+Pure planning functions, so no database: each test checks which rows a
+change rewrites and that the ranks it picks keep the order and never
+collide with a rank held by another row.
+"""
+
+import os
+import sys
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+
+from src.services.order_ranks import (
+    RANK_GAP, ReorderError, _respread, longest_increasing_subsequence, plan_delete, plan_insert, plan_move,
+    plan_ranks, plan_sequence
+)
+
+
+def entries(*ranks):
+    return [{'id': index, 'item_id': f'item-{index}', 'rank': rank} for index, rank in enumerate(ranks, 1)]
+
+
+def assert_valid(ranks, current_ranks):
+    assert ranks == sorted(set(ranks))
+    used = {rank for rank in current_ranks if rank is not None}
+    for rank, current in zip(ranks, current_ranks):
+        assert rank == current or rank not in used
+
+
+def test_longest_increasing_subsequence():
+    assert longest_increasing_subsequence([3, 1, 2, None, 4]) == [1, 2, 4]
+    assert longest_increasing_subsequence([None, None]) == []
+    assert longest_increasing_subsequence([]) == []
+
+
+def test_reorder_keeps_increasing_entries_in_place():
+    current_ranks = [4 * RANK_GAP, RANK_GAP, 2 * RANK_GAP, 3 * RANK_GAP]
+    ranks, rebalanced = plan_ranks(current_ranks)
+    assert not rebalanced
+    assert ranks[1:] == current_ranks[1:]
+    assert ranks[0] < RANK_GAP
+    assert_valid(ranks, current_ranks)
+
+
+def test_move_writes_only_the_moved_entry():
+    current = entries(*(number * RANK_GAP for number in range(1, 6)))
+    plan = plan_move(current, 2, position=5)
+    assert [entry['id'] for entry in plan['entries']] == [1, 3, 4, 5, 2]
+    assert [entry['id'] for entry in plan['updates']] == [2]
+    assert plan['updates'][0]['rank'] > 5 * RANK_GAP
+    assert (plan['inserts'], plan['deletes'], plan['rebalanced']) == ([], [], False)
+
+
+def test_reversed_order_keeps_one_anchor():
+    current = entries(*(number * RANK_GAP for number in range(1, 6)))
+    plan = plan_sequence(current, current[::-1])
+    assert len(plan['updates']) == 4
+    assert_valid([entry['rank'] for entry in plan['entries']], [entry['rank'] for entry in current[::-1]])
+
+
+def test_insert_into_exhausted_gap_respreads():
+    # Dense positions as written by the sync services
+    current = entries(1, 2, 3)
+    plan = plan_insert(current, {'item_id': 'new'}, position=2)
+    assert plan['rebalanced']
+    assert [entry['rank'] for entry in plan['entries']] == [RANK_GAP, 2 * RANK_GAP, 3 * RANK_GAP, 4 * RANK_GAP]
+    assert [entry['id'] for entry in plan['updates']] == [1, 2, 3]
+    assert plan['inserts'] == [{'item_id': 'new', 'rank': 2 * RANK_GAP}]
+
+
+def test_insert_into_open_gap_writes_one_row():
+    current = entries(RANK_GAP, 2 * RANK_GAP)
+    plan = plan_insert(current, {'item_id': 'new'}, after=1)
+    assert not plan['rebalanced']
+    assert plan['updates'] == []
+    assert RANK_GAP < plan['inserts'][0]['rank'] < 2 * RANK_GAP
+
+
+def test_respread_leaves_rows_on_the_grid_alone():
+    assert _respread([RANK_GAP, 2 * RANK_GAP, 5, 4 * RANK_GAP], {RANK_GAP, 2 * RANK_GAP, 5, 4 * RANK_GAP}) == \
+        [RANK_GAP, 2 * RANK_GAP, 3 * RANK_GAP, 4 * RANK_GAP]
+
+
+def test_respread_avoids_ranks_held_by_other_rows():
+    current_ranks = [None, RANK_GAP, 2 * RANK_GAP]
+    ranks = _respread(current_ranks, {RANK_GAP, 2 * RANK_GAP})
+    assert len(ranks) == 3
+    assert_valid(ranks, current_ranks)
+
+
+def test_empty_and_single_entry_orders():
+    assert plan_ranks([]) == ([], False)
+    assert plan_ranks([None]) == ([RANK_GAP], False)
+    assert plan_ranks([7]) == ([7], False)
+
+    plan = plan_sequence([], [])
+    assert (plan['inserts'], plan['updates'], plan['deletes'], plan['entries']) == ([], [], [], [])
+
+    plan = plan_insert([], {'item_id': 'first'})
+    assert plan['inserts'] == [{'item_id': 'first', 'rank': RANK_GAP}]
+
+    single = entries(RANK_GAP)
+    assert plan_move(single, 1, position=1)['updates'] == []
+    plan = plan_delete(single, 1)
+    assert (plan['deletes'], plan['entries']) == ([1], [])
+
+
+def test_invalid_sequences():
+    current = entries(RANK_GAP, 2 * RANK_GAP)
+    with pytest.raises(ReorderError, match='more than once'):
+        plan_sequence(current, [current[0], current[0]])
+    with pytest.raises(ReorderError, match='Unknown entries: 9'):
+        plan_sequence(current, [dict(current[0], id=9)])
+    with pytest.raises(ReorderError, match='position must be between 1 and 3'):
+        plan_insert(current, {'item_id': 'new'}, position=4)
@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+"""Price refresh against the stub adapter, on SQLite and the Supabase stand-in.
+
+Covers staleness ordering, write-back of changed prices only, failure
+backoff and the per-platform concurrency caps.
+"""
+
+import os
+import sys
+from datetime import datetime, timedelta
+from decimal import Decimal
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+
+from src.models.user import db
+from src.models.franchise import Franchise, Item, AffiliateLink
+from src.models.price_check import LinkPriceCheck
+from src.config.supabase import use_supabase_client
+from src.services import price_refresh
+from src.services.price_refresh import (
+    REFRESH_INTERVAL, RETRY_AFTER, PriceFetchError, PriceQuote, SchemaOrgPriceAdapter, SqlAlchemyPriceStore,
+    StubPriceAdapter, SupabasePriceStore, refresh_prices
+)
+from src.services.supabase_service import SupabaseService
+from src.services.supabase_standin import SupabaseStandIn, register_price_rpcs
+
+NOW = datetime(2024, 6, 1, 12, 0)
+
+
+@pytest.fixture
+def app(sqlite_app):
+    with sqlite_app.app_context():
+        franchise = Franchise(name='Prices', slug='prices', category='movies')
+        db.session.add(franchise)
+        db.session.flush()
+        item = Item(franchise_id=franchise.id, title='Item', slug='item')
+        db.session.add(item)
+        db.session.flush()
+        for platform, count in (('amazon_uk', 6), ('amazon_us', 4), ('unsupported', 2)):
+            for n in range(count):
+                db.session.add(AffiliateLink(item_id=item.id, platform=platform, url=f'https://{platform}.test/{n}',
+                                             price=19.99, currency='GBP', is_active=True))
+        db.session.commit()
+        yield sqlite_app
+
+
+def adapters(**options):
+    return {'amazon_uk': StubPriceAdapter(concurrency=2, **options),
+            'amazon_us': StubPriceAdapter(concurrency=3, **options)}
+
+
+def test_writes_changed_prices_and_schedules_next_check(app):
+    stub = adapters(prices={'https://amazon_uk.test/0': 19.99, 'https://amazon_uk.test/1': None})
+    with app.app_context():
+        store = SqlAlchemyPriceStore(db.session)
+        report = refresh_prices(store, stub, now=NOW)
+
+        assert report['checked'] == 10
+        assert report['unchanged'] == 1
+        assert report['changed'] == 9
+        assert report['failed'] == 0
+        prices = {link.url: link.price for link in AffiliateLink.query.all()}
+        assert prices['https://amazon_uk.test/0'] == 19.99
+        assert prices['https://amazon_uk.test/1'] is None
+        assert prices['https://unsupported.test/0'] == 19.99
+        checks = LinkPriceCheck.query.all()
+        assert len(checks) == 10
+        assert {check.next_check_at for check in checks} == {NOW + REFRESH_INTERVAL}
+
+        assert refresh_prices(store, stub, now=NOW + timedelta(hours=1))['checked'] == 0
+        again = refresh_prices(store, stub, now=NOW + REFRESH_INTERVAL)
+        assert again['checked'] == 10
+        assert again['changed'] == 0
+
+
+def test_stalest_links_first(app):
+    with app.app_context():
+        store = SqlAlchemyPriceStore(db.session)
+        refresh_prices(store, adapters(), batch_size=4, now=NOW)
+        # The first four are overdue by now, but never-checked links still come first
+        refresh_prices(store, adapters(), batch_size=4, now=NOW + REFRESH_INTERVAL * 2)
+        assert LinkPriceCheck.query.count() == 8
+
+        refresh_prices(store, adapters(), batch_size=4, now=NOW + REFRESH_INTERVAL * 3)
+        assert LinkPriceCheck.query.count() == 10
+        assert LinkPriceCheck.query.filter_by(checked_at=NOW).count() == 2
+
+
+def test_failures_back_off(app):
+    with app.app_context():
+        store = SqlAlchemyPriceStore(db.session)
+        report = refresh_prices(store, adapters(failure_rate=1.0), now=NOW)
+        assert report['failed'] == 10
+        assert report['errors'][0]['error'] == 'Injected failure'
+        check = LinkPriceCheck.query.first()
+        assert (check.failures, check.next_check_at) == (1, NOW + RETRY_AFTER)
+
+        refresh_prices(store, adapters(failure_rate=1.0), now=NOW + RETRY_AFTER)
+        db.session.expire_all()
+        check = LinkPriceCheck.query.first()
+        assert (check.failures, check.next_check_at) == (2, NOW + RETRY_AFTER * 3)
+
+
+def test_concurrency_capped_per_platform(app):
+    stub = adapters(latency=0.02)
+    with app.app_context():
+        refresh_prices(SqlAlchemyPriceStore(db.session), stub, now=NOW)
+    assert stub['amazon_uk'].peak == 2
+    assert stub['amazon_us'].peak == 3
+
+
+def test_supabase_store():
+    standin = register_price_rpcs(SupabaseStandIn())
+    use_supabase_client(standin)
+    service = SupabaseService()
+    item = standin.table('items').insert({'title': 'Item'}).execute().data[0]
+    standin.table('affiliate_links').insert([
+        {'item_id': item['id'], 'platform': 'amazon_uk', 'region': f'R{n}', 'url': f'https://amazon_uk.test/{n}',
+         'price': 19.99, 'currency': 'GBP'} for n in range(5)
+    ]).execute()
+
+    store = SupabasePriceStore(service)
+    stub = adapters(prices={'https://amazon_uk.test/0': 19.99})
+    report = refresh_prices(store, stub, now=NOW)
+    assert (report['checked'], report['changed'], report['unchanged']) == (5, 4, 1)
+    assert len(standin.tables['link_price_checks']) == 5
+    assert refresh_prices(store, stub, now=NOW + timedelta(hours=1))['checked'] == 0
+    assert refresh_prices(store, stub, now=NOW + REFRESH_INTERVAL)['changed'] == 0
+    assert len(standin.tables['link_price_checks']) == 5
+
+
+class FakePage:
+    status_code = 200
+
+    def __init__(self, text):
+        self.text = text
+
+
+def page_quote(monkeypatch, html):
+    monkeypatch.setattr(price_refresh.requests, 'get', lambda url, **kwargs: FakePage(html))
+    return SchemaOrgPriceAdapter().fetch({'url': 'https://shop.test/p', 'platform': 'shop', 'currency': 'EUR'})
+
+
+@pytest.mark.parametrize('amount,price', [
+    ('12,99', Decimal('12.99')),
+    ('1.299,99', Decimal('1299.99')),
+    ('1,299', Decimal('1299.00')),
+    ('1,299.50', Decimal('1299.50')),
+    (12.5, Decimal('12.50')),
+])
+def test_page_prices_read_decimal_commas(monkeypatch, amount, price):
+    html = f'<meta property="product:price:amount" content="{amount}">'
+    assert page_quote(monkeypatch, html) == PriceQuote(price, 'EUR')
+
+
+def test_page_price_falls_back_past_malformed_offers(monkeypatch):
+    html = '''
+        <script type="application/ld+json">{"@type": "Product", "offers": "see retailer"}</script>
+        <script type="application/ld+json">{"@type": "Product", "offers": ["in store only"]}</script>
+        <meta property="og:price:amount" content="24,99"><meta property="og:price:currency" content="GBP">
+    '''
+    assert page_quote(monkeypatch, html) == PriceQuote(Decimal('24.99'), 'GBP')
+
+    with pytest.raises(PriceFetchError, match='Unparseable price'):
+        page_quote(monkeypatch, '<meta property="product:price:amount" content="12,9,9">')
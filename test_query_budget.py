@@ -0,0 +1,174 @@
+#!/usr/bin/env python3
+"""Pin the query count of the read endpoints in franchise.py and supabase_franchise.py.
+
+Runs the legacy blueprint against a temporary SQLite database, and the
+Supabase blueprint against a SupabaseStandIn, with the query guard in strict
+mode, so any endpoint whose query count changes (or grows with the number of
+rows, i.e. an N+1 loop) fails here.
+"""
+
+import os
+import sys
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+
+from flask import Flask
+from src.models.user import db
+from src.models.franchise import Franchise, Item, Order, OrderItem, AffiliateLink
+from src.routes.franchise import franchise_bp
+from src.services.query_budget import init_query_guard, capture_queries, normalize_sql, QueryBudgetExceeded
+from src.services.supabase_standin import SupabaseStandIn, AsyncSupabaseStandIn, register_search_rpcs
+from src.config.supabase import use_supabase_client
+
+
+@pytest.fixture
+def app(sqlite_app):
+    sqlite_app.config['QUERY_BUDGET_MODE'] = 'strict'
+    init_query_guard(sqlite_app)
+    sqlite_app.register_blueprint(franchise_bp, url_prefix='/api')
+    return sqlite_app
+
+
+def seed_franchise(app, slug, item_count):
+    with app.app_context():
+        franchise = Franchise(name=slug, slug=slug, category='movies', popularity_score=10)
+        db.session.add(franchise)
+        db.session.flush()
+        orders = [Order(franchise_id=franchise.id, order_type=order_type, name=order_type)
+                  for order_type in ('release', 'chronological')]
+        db.session.add_all(orders)
+        db.session.flush()
+        for position in range(1, item_count + 1):
+            item = Item(franchise_id=franchise.id, title=f'{slug} {position}', slug=f'{slug}-{position}')
+            db.session.add(item)
+            db.session.flush()
+            db.session.add(AffiliateLink(item_id=item.id, platform='amazon_uk',
+                                         url=f'https://example.com/{slug}/{position}', is_active=True))
+            for order in orders:
+                db.session.add(OrderItem(order_id=order.id, item_id=item.id, position=position))
+        db.session.commit()
+        return franchise.id
+
+
+def query_count(app, path):
+    response = app.test_client().get(path)
+    assert response.status_code == 200, response.get_json()
+    return int(response.headers['X-Query-Count'])
+
+
+@pytest.mark.parametrize('path,queries', [
+    ('/api/franchises', 2),
+    ('/api/franchises?category=movies', 2),
+    ('/api/categories/movies/franchises', 2),
+    ('/api/popular', 1),
+    ('/api/search?q=small', 2),
+])
+def test_listing_endpoints_query_count(app, path, queries):
+    seed_franchise(app, 'small', 3)
+    assert query_count(app, path) == queries
+
+
+@pytest.mark.parametrize('suffix,queries', [
+    ('', 1),
+    ('/items', 2),
+    ('/orders', 4),
+    ('/orders/release', 4),
+])
+def test_detail_endpoints_do_not_grow_with_rows(app, suffix, queries):
+    small = seed_franchise(app, 'small', 2)
+    large = seed_franchise(app, 'large', 40)
+
+    small_count = query_count(app, f'/api/franchises/{small}{suffix}')
+    large_count = query_count(app, f'/api/franchises/{large}{suffix}')
+
+    assert small_count == large_count == queries
+
+
+@pytest.fixture
+def supabase_app():
+    from src.services.supabase_service import get_supabase_service
+    from src.services.supabase_async_service import get_async_supabase_service
+    from src.routes.supabase_franchise import supabase_franchise_bp
+
+    standin = register_search_rpcs(SupabaseStandIn())
+    use_supabase_client(standin, AsyncSupabaseStandIn(standin))
+    app = Flask(__name__)
+    app.config['TESTING'] = True
+    app.config['QUERY_BUDGET_MODE'] = 'strict'
+    init_query_guard(app, supabase_services=[get_supabase_service(), get_async_supabase_service()])
+    app.register_blueprint(supabase_franchise_bp, url_prefix='/api')
+    app.standin = standin
+    yield app
+    use_supabase_client(None)
+
+
+def seed_supabase_franchise(app, slug, item_count):
+    standin = app.standin
+    franchise = standin.add('franchises', {'name': slug, 'slug': slug, 'category': 'movies',
+                                           'popularity_score': 10})
+    orders = [standin.add('orders', {'franchise_id': franchise['id'], 'order_type': order_type, 'name': order_type})
+              for order_type in ('release', 'chronological')]
+    for position in range(1, item_count + 1):
+        item = standin.add('items', {'franchise_id': franchise['id'], 'title': f'{slug} {position}',
+                                     'slug': f'{slug}-{position}'})
+        for order in orders:
+            standin.add('order_items', {'order_id': order['id'], 'item_id': item['id'],
+                                        'position': position * 1024, 'notes': None})
+    return franchise['id']
+
+
+@pytest.mark.parametrize('path,queries', [
+    ('/api/franchises', 1),
+    ('/api/franchises?category=movies', 1),
+    ('/api/search?q=small', 1),
+])
+def test_supabase_listing_endpoints_query_count(supabase_app, path, queries):
+    seed_supabase_franchise(supabase_app, 'small', 3)
+    assert query_count(supabase_app, path) == queries
+
+
+@pytest.mark.parametrize('suffix,queries', [
+    ('', 1),
+    ('/items', 1),
+    ('/orders', 3),
+    ('/orders/compare?a=release&b=chronological', 3),
+])
+def test_supabase_detail_endpoints_do_not_grow_with_rows(supabase_app, suffix, queries):
+    small = seed_supabase_franchise(supabase_app, 'small', 2)
+    large = seed_supabase_franchise(supabase_app, 'large', 40)
+
+    small_count = query_count(supabase_app, f'/api/franchises/{small}{suffix}')
+    large_count = query_count(supabase_app, f'/api/franchises/{large}{suffix}')
+
+    assert small_count == large_count == queries
+
+
+def test_strict_mode_raises_over_budget(app):
+    @app.route('/api/n-plus-one')
+    def n_plus_one():
+        for franchise in Franchise.query.all():
+            Item.query.filter_by(franchise_id=franchise.id).all()
+        return 'ok'
+    n_plus_one.query_budget = 2
+
+    for index in range(5):
+        seed_franchise(app, f'f{index}', 1)
+
+    with pytest.raises(QueryBudgetExceeded) as excinfo:
+        app.test_client().get('/api/n-plus-one')
+    assert excinfo.value.log.repeated(1)
+
+
+def test_capture_queries_groups_shapes(app):
+    seed_franchise(app, 'shape', 1)
+    with app.app_context(), capture_queries() as log:
+        for _ in range(3):
+            Franchise.query.filter_by(slug='shape').all()
+    assert log.total == 3
+    assert len(log.shapes) == 1
+
+
+def test_normalize_sql_collapses_literals_and_in_lists():
+    assert normalize_sql("SELECT * FROM item WHERE id IN (?, ?, ?) AND title = 'x' LIMIT 5") == \
+        "SELECT * FROM item WHERE id IN (?) AND title = ? LIMIT ?"
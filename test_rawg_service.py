@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+"""RAWGService paging and game-series crawls against the API stub server.
+
+The stub lists the twelve games of a hundred-id block as one series under
+each of them, and counts every request it serves.
+"""
+
+import os
+import sys
+import threading
+import time
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+
+from src.services.rawg_service import RAWG_PAGE_SIZE, PageUnavailable, RAWGService, series_neighbors
+
+GAMES_ENDPOINT = 'rawg:games'
+SERIES_ENDPOINT = 'rawg:games/{id}/game-series'
+
+
+@pytest.fixture
+def server(stub):
+    series_neighbors.clear()
+    yield stub
+    series_neighbors.clear()
+
+
+def requests_to(server, endpoint):
+    return server.stats()['by_endpoint'].get(endpoint, 0)
+
+
+def prefetch_threads_exit():
+    deadline = time.monotonic() + 5
+    while any(thread.name.startswith('rawg-prefetch') for thread in threading.enumerate()):
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.01)
+    return True
+
+
+@pytest.mark.parametrize('limit,pages', [
+    (5, 1),
+    (RAWG_PAGE_SIZE, 1),
+    (RAWG_PAGE_SIZE + 1, 2),
+])
+def test_iter_games_stops_at_limit_without_prefetching_past_it(server, limit, pages):
+    # The stub lists 200 games without a search
+    games = list(RAWGService().iter_games(limit=limit))
+
+    assert len(games) == limit
+    assert requests_to(server, GAMES_ENDPOINT) == pages
+
+
+def test_iter_pages_stops_when_next_is_null(server):
+    pages = list(RAWGService().iter_pages('games'))
+
+    assert [len(page['results']) for page in pages] == [40, 40, 40, 40, 40]
+    assert pages[-1]['next'] is None
+    assert requests_to(server, GAMES_ENDPOINT) == 5
+
+
+def test_iter_pages_yields_nothing_when_the_first_page_fails(server):
+    assert list(RAWGService().iter_pages('nowhere')) == []
+    assert prefetch_threads_exit()
+
+
+def test_failed_page_surfaces_to_the_caller(server):
+    service = RAWGService()
+    # Send the second page's `next` link to an endpoint the stub answers with a 404
+    service._follow = lambda url, follow=service._follow: follow(url.replace('/games?', '/nowhere?'))
+    pages = service.iter_pages('games')
+
+    assert len(next(pages)['results']) == RAWG_PAGE_SIZE
+    with pytest.raises(PageUnavailable, match='page 2'):
+        next(pages)
+    assert prefetch_threads_exit()
+
+
+def test_page_exception_surfaces_to_the_caller(server):
+    service = RAWGService()
+
+    def follow(url):
+        raise ValueError('not JSON')
+    service._follow = follow
+
+    with pytest.raises(ValueError, match='not JSON'):
+        list(service.iter_games())
+    assert prefetch_threads_exit()
+
+
+def test_crawl_stops_once_a_series_is_covered(server):
+    seeds = [{'id': 100}, {'id': 101}, {'id': 250}]
+    games = RAWGService().crawl_game_series(seeds)
+
+    assert sorted(games) == list(range(100, 112)) + list(range(200, 212)) + [250]
+    # One request per seed and one probe per series, not one per game
+    assert requests_to(server, SERIES_ENDPOINT) == 5
+
+    server.state.reset()
+    assert RAWGService().crawl_game_series(seeds) == games
+    assert requests_to(server, SERIES_ENDPOINT) == 0
+
+
+def test_crawl_stops_growing_at_max_games(server):
+    games = RAWGService().crawl_game_series([{'id': 100}], max_games=5)
+
+    assert len(games) == 5
+    assert requests_to(server, SERIES_ENDPOINT) == 1
+
+
+def test_iter_game_series_crawls_from_search_seeds(server):
+    games = list(RAWGService().iter_game_series('Halo'))
+
+    assert len(games) == 12
+    assert [game['released'] for game in games] == sorted(game['released'] for game in games)
+    assert requests_to(server, SERIES_ENDPOINT) == 4
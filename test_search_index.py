@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+"""Trigram search in search_index.py and its cursor pagination.
+
+Every index is exercised with NumPy scoring and with the pure Python
+fallback; the two must agree result for result.
+"""
+
+import os
+import random
+import sys
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+
+from src.services.catalog_events import Change
+from src.services.search_index import CatalogSearchIndex, TrigramIndex, np, trigrams
+from src.services.search_ranking import decode_cursor, encode_cursor
+
+needs_numpy = pytest.mark.skipif(np is None, reason='NumPy scoring needs numpy')
+scoring = pytest.mark.parametrize('use_numpy', [pytest.param(True, marks=needs_numpy), False])
+
+HARRY_POTTER = [
+    "Harry Potter and the Philosopher's Stone",
+    'Harry Potter and the Chamber of Secrets',
+    'Harry Potter and the Prisoner of Azkaban',
+]
+WORDS = ['star', 'wars', 'trek', 'halo', 'harry', 'potter', 'mass', 'effect', 'dune', 'alien', 'rings', 'lord']
+
+
+def catalog(use_numpy, franchises, items_per_franchise=3, seed=7):
+    """CatalogSearchIndex fed through catalog events, as the app keeps it current."""
+    index = CatalogSearchIndex()
+    index.franchises.use_numpy = index.items.use_numpy = use_numpy
+    rng = random.Random(seed)
+    changes = []
+    for number in range(franchises):
+        franchise_id = f'f{number:03d}'
+        name = ' '.join(rng.sample(WORDS, 2))
+        # Few distinct scores, so pages end on ties that the cursor breaks on (kind, id)
+        changes.append(Change('franchises', 'upsert', {'id': franchise_id, 'name': name,
+                                                       'category': rng.choice(['movies', 'games']),
+                                                       'popularity_score': rng.choice([0, 10, 100])}))
+        for item in range(items_per_franchise):
+            changes.append(Change('items', 'upsert', {'id': f'{franchise_id}-i{item}', 'franchise_id': franchise_id,
+                                                      'title': f'{name} {rng.choice(WORDS)} {item + 1}'}))
+    index.apply(changes)
+    return index
+
+
+def test_trigrams_pad_each_word_like_pg_trgm():
+    assert trigrams('Cat') == {'  c', ' ca', 'cat', 'at '}
+    assert trigrams('Halo-3') == trigrams('halo 3') == {'  h', ' ha', 'hal', 'alo', 'lo ', '  3', ' 3 '}
+    assert trigrams('  ') == set()
+
+
+@scoring
+def test_misspelled_query_finds_the_title(use_numpy):
+    index = TrigramIndex(use_numpy=use_numpy)
+    for number, title in enumerate(HARRY_POTTER):
+        index.add(number, title)
+    index.add('halo', 'Halo: Combat Evolved')
+
+    assert sorted(doc_id for doc_id, _ in index.search('harry poter')) == [0, 1, 2]
+    assert [doc_id for doc_id, _ in index.search('philosophers stone')] == [0]
+    assert index.search('azkabn')[0][0] == 2
+    assert index.search('halo combat evolvd') == [('halo', 0.8947)]
+
+
+@scoring
+def test_similarity_is_the_matched_share_of_query_trigrams(use_numpy):
+    index = TrigramIndex(use_numpy=use_numpy)
+    index.add('halo', 'Halo')
+    index.add('odst', 'Halo 3: ODST')
+
+    # 'halp' shares '  h', ' ha' and 'hal' of its five trigrams with 'halo'
+    assert index.search('halp', threshold=0.6) == [('halo', 0.6), ('odst', 0.6)]
+    assert index.search('halp', threshold=0.61) == []
+    # Equal shares rank the closer whole string first
+    assert [doc_id for doc_id, _ in index.search('halo')] == ['halo', 'odst']
+    assert index.search('halo', limit=1) == [('halo', 1.0)]
+
+
+@scoring
+def test_category_filter_and_removal(use_numpy):
+    index = TrigramIndex(use_numpy=use_numpy)
+    index.add('movie', 'Dune', category='movies')
+    index.add('game', 'Dune II', category='games')
+
+    assert [doc_id for doc_id, _ in index.search('dune', category='games')] == ['game']
+    assert index.search('dune', category='books') == []
+    index.remove('game')
+    assert [doc_id for doc_id, _ in index.search('dune')] == ['movie']
+    assert 'game' not in index and len(index) == 1
+
+
+@needs_numpy
+@pytest.mark.parametrize('threshold', [0.3, 0.5, 0.8])
+def test_numpy_and_python_scoring_agree(threshold):
+    rng = random.Random(11)
+    indexes = [TrigramIndex(use_numpy=True), TrigramIndex(use_numpy=False)]
+    for number in range(400):
+        title, category = ' '.join(rng.sample(WORDS, 3)), rng.choice(['movies', 'games'])
+        for index in indexes:
+            # Distinct popularity, so no two results tie on every sort key
+            index.add(number, title, category=category, popularity=number)
+    for doc_id in range(0, 400, 7):
+        for index in indexes:
+            index.remove(doc_id)
+
+    for query in ['star wars', 'harry poter', 'lord of the rings', 'mass efect', 'xyz']:
+        for limit in (5, 50, 1000):
+            assert indexes[0].search(query, limit, threshold) == indexes[1].search(query, limit, threshold)
+        assert indexes[0].search(query, 50, threshold, category='games') == \
+            indexes[1].search(query, 50, threshold, category='games')
+
+
+@needs_numpy
+def test_numpy_and_python_search_all_agree():
+    with_numpy, without = catalog(True, 60), catalog(False, 60)
+    for query in ['star wars', 'halo', 'harry poter']:
+        for category in (None, 'games'):
+            assert with_numpy.search_all(query, 1000, category=category) == \
+                without.search_all(query, 1000, category=category)
+
+
+@scoring
+@pytest.mark.parametrize('limit', [1, 7, 25])
+def test_cursor_pages_are_disjoint_and_exhaustive(use_numpy, limit):
+    index = catalog(use_numpy, 60)
+    everything = index.search_all('star wars', limit=10000)
+    assert len(everything['results']) == everything['total'] > 2 * limit
+    assert everything['next_cursor'] is None
+
+    pages, cursor = [], None
+    while True:
+        page = index.search_all('star wars', limit=limit, cursor=cursor)
+        assert (page['total'], page['facets']) == (everything['total'], everything['facets'])
+        pages.append(page['results'])
+        cursor = page['next_cursor']
+        if cursor is None:
+            break
+
+    assert all(len(results) == limit for results in pages[:-1])
+    assert [result for results in pages for result in results] == everything['results']
+
+
+@scoring
+def test_category_filter_counts_facets_before_filtering(use_numpy):
+    index = catalog(use_numpy, 40)
+    everything = index.search_all('halo', limit=10000)
+    games = index.search_all('halo', limit=10000, category='games')
+
+    assert games['facets'] == everything['facets']
+    assert games['total'] == everything['facets'].get('games', 0) > 0
+    assert sum(everything['facets'].values()) == everything['total']
+
+
+def test_cursor_round_trip():
+    assert decode_cursor(encode_cursor(1.234567, 'item', 'f001-i2')) == (1.234567, 'item', 'f001-i2')
+    assert decode_cursor(None) is None
+    assert decode_cursor('') is None
+    for cursor in ['not-a-cursor', encode_cursor(1.0, 'item', 'x')[:-3], 'WzEsOSwieCJd']:
+        with pytest.raises(ValueError, match='Invalid cursor'):
+            decode_cursor(cursor)
@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+"""Seed catalog files and sharded bulk syncs.
+
+The sharded run spawns worker processes against a SQLite file and the API
+stub server, then checks that the shards' report adds up and that a resume
+of the same run skips what every shard finished.
+"""
+
+import json
+import os
+import sys
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+
+from flask import Flask
+from src.models.user import db
+from src.models.franchise import Franchise, Item
+from src.models.sync_run import SyncCheckpoint
+from src.services.catalog_events import subscribe, unsubscribe
+from src.services.seed_catalog import (
+    DEFAULT_SEED_FILE, SeedCatalogError, legacy_entry_sync, load_seed_file, merge_reports, parse_seed_rows,
+    seed_entry, sync_legacy_catalog
+)
+from src.services.sync_runs import Checkpoint
+
+
+def test_seed_file_defaults():
+    catalog = load_seed_file(DEFAULT_SEED_FILE)
+    assert len(catalog) == 30
+    assert {entry.category for entry in catalog} == {'movies', 'games', 'series'}
+    star_wars = next(entry for entry in catalog if entry.name == 'Star Wars')
+    assert star_wars.query == 'Star Wars'
+    assert star_wars.provider == 'tmdb_movies'
+    assert star_wars.description == 'Popular movie franchise: Star Wars'
+
+
+def test_parse_seed_rows(tmp_path):
+    path = tmp_path / 'seed.ndjson'
+    path.write_text('\n'.join(json.dumps(row) for row in [
+        {'name': 'Star  Trek', 'category': 'series', 'query': 'Star Trek: The Next Generation'},
+        {'name': 'star trek', 'category': 'series'},
+        {'name': 'Star Trek', 'category': 'movies', 'provider': 'tmdb_movies', 'description': 'Films'},
+    ]) + '\n')
+    catalog = load_seed_file(str(path))
+    assert [(entry.name, entry.category, entry.query, entry.provider) for entry in catalog] == [
+        ('Star Trek', 'series', 'Star Trek: The Next Generation', 'tmdb_tv'),
+        ('Star Trek', 'movies', 'Star Trek', 'tmdb_movies'),
+    ]
+    assert catalog[1].description == 'Films'
+
+    with pytest.raises(SeedCatalogError, match='Entry 2: unknown category'):
+        parse_seed_rows([{'name': 'Halo', 'category': 'games'}, {'name': 'Halo', 'category': 'books'}])
+    with pytest.raises(SeedCatalogError, match='Entry 1: unknown provider'):
+        parse_seed_rows([{'name': 'Halo', 'category': 'games', 'provider': 'steam'}])
+
+
+def test_merge_reports():
+    reports = [
+        {'total': 3, 'synced': 2, 'skipped': 0, 'failed': [{'name': 'Halo'}], 'franchises': [{}, {}], 'seconds': 30},
+        {'total': 2, 'error': 'worker died'},
+    ]
+    report = merge_reports(reports, 'run', False, 60)
+    assert (report['workers'], report['total'], report['synced'], report['per_minute']) == (2, 5, 2, 2.0)
+    assert report['failed'] == [{'name': 'Halo'}]
+    assert report['errors'] == [{'shard': 1, 'error': 'worker died'}]
+    assert report['shards'][0]['per_minute'] == 4.0
+    assert report['shards'][1]['error'] == 'worker died'
+
+
+def test_sync_route_fails_when_a_shard_crashes(monkeypatch):
+    from src.routes import sync
+
+    crashed = merge_reports([{'total': 2, 'synced': 2, 'skipped': 0, 'failed': [], 'seconds': 1},
+                             {'total': 2, 'error': 'worker died'}], 'run', False, 1)
+    monkeypatch.setattr(sync, 'load_seed_catalog', lambda config: [])
+    monkeypatch.setattr(sync, 'sync_legacy_catalog', lambda *args: crashed)
+    app = Flask(__name__)
+    app.register_blueprint(sync.sync_bp, url_prefix='/api')
+    response = app.test_client().post('/api/admin/sync/popular', json={})
+    assert response.status_code == 500
+    assert response.get_json()['errors'] == [{'shard': 1, 'error': 'worker died'}]
+    assert response.get_json()['message'] == 'Synced 2 popular franchises; 1 shards failed'
+
+
+def test_legacy_entry_sync(sqlite_app, stub):
+    with sqlite_app.app_context():
+        sync_entry = legacy_entry_sync(db.session)
+        checkpoint = Checkpoint()
+        assert sync_entry(seed_entry('Mission: Impossible', 'movies'), checkpoint)
+        assert checkpoint.phase == 'order'
+        franchise = Franchise.query.one()
+        assert (franchise.slug, franchise.id) == ('mission-impossible', checkpoint.state['franchise_id'])
+        assert Item.query.filter_by(franchise_id=franchise.id).count() > 0
+
+        # The franchise is found by slug the second time round
+        assert sync_entry(seed_entry('Mission: Impossible', 'movies'), Checkpoint())
+        assert Franchise.query.count() == 1
+
+
+def test_sharded_sync(sqlite_app, stub):
+    published = []
+    callback = published.extend
+    subscribe(callback, tables=['franchises'])
+    try:
+        with sqlite_app.app_context():
+            catalog = load_seed_file(DEFAULT_SEED_FILE)
+            report = sync_legacy_catalog(db.session, catalog, workers=3)
+            assert (report['workers'], report['total'], report['synced'], report['failed']) == (3, 30, 30, [])
+            assert [shard['total'] for shard in report['shards']] == [10, 10, 10]
+            assert Franchise.query.count() == 30
+            assert Item.query.count() > 0
+            # Worker writes reach this process's change feed once the shards are done
+            assert len(published) == 30
+            assert SyncCheckpoint.query.filter_by(run_id=report['run_id'], phase='order').count() == 30
+
+            resumed = sync_legacy_catalog(db.session, catalog, report['run_id'], workers=2)
+            assert (resumed['resumed'], resumed['synced'], resumed['skipped']) == (True, 0, 30)
+    finally:
+        unsubscribe(callback)
@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+"""Typeahead suggestions in suggest_index.py and the /suggest route.
+
+The index is loaded from a SupabaseStandIn and then kept current from
+catalog_events, as main_supabase wires it; changes are fed with
+publish_rows the way the bulk writers and the popularity job do.
+"""
+
+import os
+import sys
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+
+from flask import Flask
+from src.routes.suggest import suggest_bp
+from src.services import suggest_index
+from src.services.catalog_events import publish_rows, unsubscribe
+from src.services.suggest_index import ITEM_WEIGHT, PrefixIndex, init_suggest_index, keys_for
+from src.services.supabase_standin import SupabaseStandIn
+
+
+def labels(suggestions):
+    return [suggestion['label'] for suggestion in suggestions]
+
+
+@pytest.fixture
+def standin():
+    standin = SupabaseStandIn()
+    for slug, name, category, popularity in [('zelda', 'The Legend of Zelda', 'games', 90),
+                                             ('star-wars', 'Star Wars', 'movies', 100),
+                                             ('star-trek', 'Star Trek', 'movies', 60)]:
+        standin.add('franchises', {'slug': slug, 'name': name, 'category': category, 'popularity_score': popularity})
+    standin.add('items', {'franchise_id': zelda_id(standin), 'title': 'Breath of the Wild'})
+    return standin
+
+
+@pytest.fixture
+def app(standin):
+    app = Flask(__name__)
+    app.register_blueprint(suggest_bp, url_prefix='/api')
+    index = init_suggest_index(app, supabase_client=standin)
+    yield app
+    unsubscribe(index.apply)
+
+
+def zelda_id(standin):
+    return standin.find('franchises', ('slug',), {'slug': 'zelda'})['id']
+
+
+def suggest(app, query, **params):
+    response = app.test_client().get('/api/suggest', query_string=dict(params, q=query))
+    assert response.status_code == 200
+    return response.get_json()['suggestions']
+
+
+def test_keys_start_at_each_leading_word():
+    assert keys_for('The Legend of Zelda') == ['the legend of zelda', 'legend of zelda', 'zelda']
+    assert keys_for('a b c d e f') == ['a b c d e f', 'b c d e f', 'c d e f', 'd e f']
+
+
+def test_suggestions_rank_by_weight_under_any_word_prefix(app):
+    assert labels(suggest(app, 'star')) == ['Star Wars', 'Star Trek']
+    assert labels(suggest(app, 'zel')) == ['The Legend of Zelda']
+    # 'of' never starts a key on its own
+    assert suggest(app, 'of the') == []
+    assert labels(suggest(app, 'wild')) == ['Breath of the Wild']
+    assert suggest(app, 'breath')[0]['weight'] == 90 * ITEM_WEIGHT
+    assert labels(suggest(app, 'star', category='games')) == []
+    assert labels(suggest(app, 'star', limit=1)) == ['Star Wars']
+
+
+def test_published_rows_update_the_index(app, standin):
+    publish_rows('franchises', [{'id': 'dune', 'name': 'Dune', 'category': 'movies', 'popularity_score': 70}])
+    publish_rows('items', [{'id': 'dune-1', 'franchise_id': 'dune', 'title': 'Dune: Part Two'}])
+    assert labels(suggest(app, 'dune')) == ['Dune', 'Dune: Part Two']
+
+    # A score-only row (the popularity job) reorders the franchise and its items
+    publish_rows('franchises', [{'id': zelda_id(standin), 'popularity_score': 10}])
+    assert suggest(app, 'zelda')[0]['weight'] == 10
+    assert suggest(app, 'wild')[0]['weight'] == 10 * ITEM_WEIGHT
+    assert suggest(app, 'zelda')[0]['category'] == 'games'
+
+    publish_rows('franchises', [{'id': 'dune', 'name': 'Dune Messiah', 'category': 'books', 'popularity_score': 70}])
+    assert labels(suggest(app, 'messiah')) == ['Dune Messiah']
+    assert labels(suggest(app, 'dune', type='franchise')) == ['Dune Messiah']
+
+    publish_rows('franchises', [{'id': zelda_id(standin)}], action='delete')
+    assert suggest(app, 'zelda') == []
+    # Deleting a franchise drops its items too
+    assert suggest(app, 'wild') == []
+
+
+def test_pending_keys_merge_into_the_built_list(monkeypatch):
+    monkeypatch.setattr(suggest_index, 'REBUILD_PENDING', 3)
+    index = PrefixIndex()
+    index.load([('franchise', 1, 'Halo', 'games', 50)])
+    index.put('franchise', 2, 'Halo Wars', 'games', 80)
+    assert index.stats()['pending'] == 2
+    assert labels(index.suggest('halo')) == ['Halo Wars', 'Halo']
+
+    index.put('franchise', 3, 'Half-Life', 'games', 60)
+    assert index.stats()['pending'] == 0
+    assert labels(index.suggest('hal')) == ['Halo Wars', 'Half-Life', 'Halo']
+    index.remove('franchise', 2)
+    index.set_weight('franchise', 1, 90)
+    assert labels(index.suggest('hal')) == ['Halo', 'Half-Life']
+
+
+def test_route_is_unavailable_without_an_index():
+    app = Flask(__name__)
+    app.register_blueprint(suggest_bp, url_prefix='/api')
+    response = app.test_client().get('/api/suggest?q=star')
+    assert response.status_code == 503
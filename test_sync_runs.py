@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+"""Checkpointed bulk syncs against the API stub server, on SQLite and the Supabase stand-in.
+
+A failure is injected partway through a run, then the run is resumed: the
+resume must make no provider call it already made and write no duplicates.
+"""
+
+import os
+import sys
+import tempfile
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+
+from flask import Flask
+from src.models.user import db
+from src.models.franchise import Franchise, Item, OrderItem
+from src.models.sync_run import SyncCheckpoint
+from src.config.database import configure_database
+from src.config.supabase import use_supabase_client
+from src.api_stub_server import StubServer
+from src.services.supabase_standin import AsyncSupabaseStandIn, SupabaseStandIn
+
+
+@pytest.fixture
+def stub(monkeypatch):
+    server = StubServer().start()
+    # Services read their base URLs when they are created
+    monkeypatch.setenv('TMDB_BASE_URL', server.tmdb_base_url)
+    monkeypatch.setenv('RAWG_BASE_URL', server.rawg_base_url)
+    yield server
+    server.stop()
+
+
+@pytest.fixture
+def client(stub):
+    from src.routes.sync import sync_bp
+
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    configure_database(app, db, os.path.join(tempfile.mkdtemp(), 'app.db'))
+    app.register_blueprint(sync_bp)
+    with app.app_context():
+        db.create_all()
+        yield app.test_client()
+
+
+def counts():
+    return Franchise.query.count(), Item.query.count(), OrderItem.query.count()
+
+
+def test_resume_after_failure(client, stub, monkeypatch):
+    from src.services.tmdb_service import TMDbService
+
+    def killed(self, *args):
+        raise RuntimeError('killed')
+
+    # Every movie franchise dies after its items are committed
+    with monkeypatch.context() as patch:
+        patch.setattr(TMDbService, '_create_movie_release_order', killed)
+        report = client.post('/admin/sync/popular').get_json()
+    assert (report['total'], report['synced']) == (30, 20)
+    assert {(failure['category'], failure['phase'], failure['error']) for failure in report['failed']} == \
+        {('movies', 'items', 'killed')}
+    calls = stub.stats()['by_provider']
+    franchises, items, entries = counts()
+    assert franchises == 30
+
+    status = client.get(f"/admin/sync/runs/{report['run_id']}").get_json()
+    assert status['phases'] == {'order': 20, 'items': 10}
+
+    resumed = client.post('/admin/sync/popular', json={'run_id': report['run_id'], 'failed_only': True}).get_json()
+    assert (resumed['synced'], resumed['skipped'], resumed['failed']) == (10, 20, [])
+    # The checkpoints held the search and collection results, so nothing was fetched again
+    assert stub.stats()['by_provider'] == calls
+    assert counts()[:2] == (franchises, items)
+    assert counts()[2] > entries
+
+    again = client.post('/admin/sync/popular', json={'run_id': report['run_id']}).get_json()
+    assert (again['synced'], again['skipped']) == (0, 30)
+    assert SyncCheckpoint.query.filter_by(run_id=report['run_id'], phase='order').count() == 30
+
+
+def test_fresh_run_is_idempotent(client):
+    client.post('/admin/sync/popular')
+    before = counts()
+    report = client.post('/admin/sync/popular').get_json()
+    assert report['synced'] == 30
+    assert counts() == before
+
+
+def test_supabase_resume(stub):
+    from src.services.supabase_sync_service import SupabaseSyncService
+
+    standin = SupabaseStandIn()
+    use_supabase_client(standin, AsyncSupabaseStandIn(standin))
+    service = SupabaseSyncService()
+
+    stub.state.error_rate = 1.0
+    report = service.sync_popular_franchises()
+    assert report['synced'] == 20
+    assert {(failure['phase'], failure['error']) for failure in report['failed']} == \
+        {('franchise', 'Failed to fetch from TMDb')}
+
+    stub.state.error_rate = 0.0
+    resumed = service.sync_popular_franchises(report['run_id'], failed_only=True)
+    assert (resumed['synced'], resumed['skipped'], resumed['failed']) == (10, 20, [])
+    tables = {name: len(standin.tables.get(name, [])) for name in ('franchises', 'items', 'order_items')}
+    assert tables['franchises'] == 30
+
+    # A new run re-syncs everything without duplicating items or order entries
+    assert service.sync_popular_franchises()['synced'] == 30
+    assert {name: len(standin.tables.get(name, [])) for name in tables} == tables
@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+"""Season and episode orders built by TMDbService._expand_tv_show on SQLite.
+
+Season-only tests use canned show details, so no provider is called; the
+episode tests fetch seasons from the API stub server. A re-sync that finds
+seasons or episodes missing from an order must slot them in broadcast order.
+"""
+
+import os
+import sys
+import threading
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+
+from src.models.user import db
+from src.models.franchise import Franchise, Item, Order, OrderItem
+from src.services.tmdb_service import TMDbService
+
+
+@pytest.fixture
+def franchise(sqlite_app):
+    with sqlite_app.app_context():
+        franchise = Franchise(name='Show', slug='show', category='series')
+        db.session.add(franchise)
+        db.session.commit()
+        yield franchise
+
+
+def show(*numbers):
+    return {'id': 7, 'name': 'Show', 'seasons': [
+        {'id': 700 + n, 'season_number': n, 'name': f'Season {n}', 'air_date': f'{2000 + n}-01-01'} for n in numbers
+    ]}
+
+
+def season_order(franchise):
+    order = Order.query.filter_by(franchise_id=franchise.id, order_type='chronological').one()
+    entries = OrderItem.query.filter_by(order_id=order.id).order_by(OrderItem.position)
+    return [db.session.get(Item, entry.item_id).api_metadata['season_number'] for entry in entries]
+
+
+def episode_order(franchise):
+    order = Order.query.filter_by(franchise_id=franchise.id, order_type='episodes').one()
+    entries = OrderItem.query.filter_by(order_id=order.id).order_by(OrderItem.position)
+    return [(metadata['season_number'], metadata['episode_number'])
+            for metadata in (db.session.get(Item, entry.item_id).api_metadata for entry in entries)]
+
+
+def test_resync_slots_missing_seasons_in_broadcast_order(franchise):
+    service = TMDbService()
+    service._expand_tv_show(show(1, 3), franchise.id)
+    db.session.commit()
+    ranks = [entry.position for entry in OrderItem.query.order_by(OrderItem.position)]
+
+    created = service._expand_tv_show(show(1, 2, 3, 4), franchise.id)
+    db.session.commit()
+    assert season_order(franchise) == [1, 2, 3, 4]
+    # Only the new seasons were written; the stored entries kept their ranks
+    assert len(created['order_items']) == 2
+    assert [entry.position for entry in OrderItem.query.order_by(OrderItem.position)][::2] == ranks
+
+
+def test_resync_respreads_a_dense_order(franchise):
+    service = TMDbService()
+    service._expand_tv_show(show(1, 3), franchise.id)
+    # Positions written densely (1, 2) by older syncs leave no gap for season 2
+    for position, entry in enumerate(OrderItem.query.order_by(OrderItem.position), 1):
+        entry.position = position
+    db.session.commit()
+
+    service._expand_tv_show(show(1, 2, 3), franchise.id)
+    db.session.commit()
+    assert season_order(franchise) == [1, 2, 3]
+
+
+# The stub gives show 4 five seasons of ten episodes
+TV_ID, SEASONS, EPISODES = 4, 5, 10
+BROADCAST_ORDER = [(season, episode) for season in range(1, SEASONS + 1) for episode in range(1, EPISODES + 1)]
+
+
+class SeasonFetches:
+    """Wraps get_tv_season to track requests in flight and fail chosen seasons."""
+
+    def __init__(self, service, failures=None):
+        self.fetch = service.get_tv_season
+        self.failures = failures or {}
+        self.lock = threading.Lock()
+        self.in_flight = self.peak = 0
+        service.get_tv_season = self
+
+    def __call__(self, tv_id, season_number):
+        with self.lock:
+            self.in_flight += 1
+            self.peak = max(self.peak, self.in_flight)
+        try:
+            failure = self.failures.get(season_number)
+            if isinstance(failure, Exception):
+                raise failure
+            return None if failure == 'missing' else self.fetch(tv_id, season_number)
+        finally:
+            with self.lock:
+                self.in_flight -= 1
+
+
+@pytest.fixture
+def tmdb(stub):
+    stub.state.latency = 50
+    return TMDbService()
+
+
+def test_seasons_are_fetched_concurrently(tmdb):
+    fetches = SeasonFetches(tmdb)
+    seasons = tmdb.get_tv_seasons(TV_ID, range(1, SEASONS + 1))
+
+    assert list(seasons) == list(range(1, SEASONS + 1))
+    assert [season['season_number'] for season in seasons.values()] == list(range(1, SEASONS + 1))
+    assert 1 < fetches.peak <= SEASONS
+
+    fetches = SeasonFetches(tmdb)
+    tmdb.get_tv_seasons(TV_ID, range(1, SEASONS + 1), concurrency=2)
+    assert fetches.peak <= 2
+
+
+def test_episodes_follow_broadcast_order(franchise, tmdb, stub):
+    created = tmdb._expand_tv_show(tmdb.get_tv_details(TV_ID), franchise.id, episodes=True)
+    db.session.commit()
+
+    assert season_order(franchise) == list(range(1, SEASONS + 1))
+    assert episode_order(franchise) == BROADCAST_ORDER
+    assert len(created['items']) == SEASONS + SEASONS * EPISODES
+    assert stub.stats()['by_endpoint']['tmdb:tv/{id}/season/{id}'] == SEASONS
+
+
+def test_missing_season_is_skipped_then_backfilled_in_place(franchise, tmdb):
+    show = tmdb.get_tv_details(TV_ID)
+    SeasonFetches(tmdb, failures={3: 'missing'})
+    tmdb._expand_tv_show(show, franchise.id, episodes=True)
+    db.session.commit()
+    # The other seasons' episodes are written; season 3 is still a season item
+    assert episode_order(franchise) == [key for key in BROADCAST_ORDER if key[0] != 3]
+    assert season_order(franchise) == list(range(1, SEASONS + 1))
+
+    tmdb = TMDbService()
+    created = tmdb._expand_tv_show(show, franchise.id, episodes=True)
+    db.session.commit()
+    assert episode_order(franchise) == BROADCAST_ORDER
+    assert len(created['items']) == EPISODES
+
+
+def test_failed_season_fetch_writes_nothing(franchise, tmdb):
+    show = tmdb.get_tv_details(TV_ID)
+    SeasonFetches(tmdb, failures={3: ValueError('not JSON')})
+
+    with pytest.raises(ValueError, match='not JSON'):
+        tmdb._expand_tv_show(show, franchise.id, episodes=True)
+    db.session.rollback()
+    assert Item.query.count() == 0
+    assert Order.query.count() == 0
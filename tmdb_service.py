@@ -1,13 +1,46 @@
 import requests
+import time
 import os
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from src.models.franchise import db, Franchise, Item, Order, OrderItem
+from src.services.catalog_events import publish_rows
+from src.services.entity_resolution import load_franchise_index, merge_into
+from src.services.metrics import record_outbound
+from src.services.order_ranks import RANK_GAP, plan_sequence
+from src.services.sync_runs import Checkpoint
+
+# Retries for 429 Too Many Requests, honouring Retry-After (capped)
+MAX_RATE_LIMIT_RETRIES = 3
+MAX_RETRY_AFTER = 10
+
+# Season requests in flight at once when expanding a show
+TV_FETCH_CONCURRENCY = 8
+# Rows per IN query / bulk insert when writing seasons and episodes
+TV_CHUNK_SIZE = 500
+
+def _parse_date(value):
+    try:
+        return datetime.strptime(value, '%Y-%m-%d').date() if value else None
+    except ValueError:
+        return None
+
+def season_external_id(tv_id, season_number):
+    """Stable Item.external_id of a season, namespaced away from TMDb movie and show ids"""
+    return f"tv/{tv_id}/season/{season_number}"
+
+def episode_external_id(tv_id, season_number, episode_number):
+    """Stable Item.external_id of an episode"""
+    return f"tv/{tv_id}/season/{season_number}/episode/{episode_number}"
 
 class TMDbService:
     def __init__(self):
-        self.api_key = "8b459b6f6aa0f76b7bf3fba33086cb81"
-        self.base_url = "https://api.themoviedb.org/3"
+        self.api_key = os.environ.get('TMDB_API_KEY', "8b459b6f6aa0f76b7bf3fba33086cb81")
+        # Overridable so syncs can run against the local API stub server
+        self.base_url = os.environ.get('TMDB_BASE_URL', "https://api.themoviedb.org/3")
         self.image_base_url = "https://image.tmdb.org/t/p/w500"
+        # franchise id -> EntityIndex, loaded on first use in a sync
+        self._entity_indexes = {}
     
     def _make_request(self, endpoint, params=None):
         """Make a request to TMDb API"""
@@ -15,13 +48,24 @@ class TMDbService:
             params = {}
         params['api_key'] = self.api_key
         
-        try:
-            response = requests.get(f"{self.base_url}/{endpoint}", params=params)
-            response.raise_for_status()
-            return response.json()
-        except requests.exceptions.RequestException as e:
-            print(f"TMDb API error: {e}")
-            return None
+        for attempt in range(MAX_RATE_LIMIT_RETRIES + 1):
+            started = time.perf_counter()
+            status = 'error'
+            try:
+                response = requests.get(f"{self.base_url}/{endpoint}", params=params)
+                status = response.status_code
+                if status == 429 and attempt < MAX_RATE_LIMIT_RETRIES:
+                    retry_after = response.headers.get('Retry-After', '1')
+                    delay = float(retry_after) if retry_after.replace('.', '', 1).isdigit() else 1.0
+                    time.sleep(min(delay, MAX_RETRY_AFTER))
+                    continue
+                response.raise_for_status()
+                return response.json()
+            except requests.exceptions.RequestException as e:
+                print(f"TMDb API error: {e}")
+                return None
+            finally:
+                record_outbound('tmdb', status, time.perf_counter() - started)
     
     def search_movies(self, query):
         """Search for movies by title"""
@@ -39,105 +83,118 @@ class TMDbService:
         """Get detailed information about a TV show"""
         return self._make_request(f"tv/{tv_id}")
     
+    def get_tv_season(self, tv_id, season_number):
+        """Get a TV season with its episodes"""
+        return self._make_request(f"tv/{tv_id}/season/{season_number}")
+    
+    def get_tv_seasons(self, tv_id, season_numbers, concurrency=TV_FETCH_CONCURRENCY):
+        """Fetch several seasons at once, at most concurrency requests in flight ({season number: season or None})"""
+        season_numbers = list(season_numbers)
+        if not season_numbers:
+            return {}
+        with ThreadPoolExecutor(max_workers=min(concurrency, len(season_numbers)),
+                                thread_name_prefix='tmdb-season') as pool:
+            seasons = pool.map(lambda number: self.get_tv_season(tv_id, number), season_numbers)
+            return dict(zip(season_numbers, seasons))
+    
     def get_movie_collection(self, collection_id):
         """Get movie collection details"""
         return self._make_request(f"collection/{collection_id}")
     
-    def sync_movie_franchise(self, franchise_name, franchise_id):
-        """Sync a movie franchise from TMDb"""
+    def sync_movie_franchise(self, franchise_name, franchise_id, checkpoint=None):
+        """Sync a movie franchise from TMDb, resuming after the last phase checkpoint reached"""
+        checkpoint = checkpoint or Checkpoint()
         try:
-            # Search for the franchise
-            search_results = self.search_movies(franchise_name)
-            if not search_results or not search_results.get('results'):
-                return False
-            
-            # Look for a movie with a collection
-            collection_id = None
-            for movie in search_results['results']:
-                movie_details = self.get_movie_details(movie['id'])
-                if movie_details and movie_details.get('belongs_to_collection'):
-                    collection_id = movie_details['belongs_to_collection']['id']
-                    break
-            
-            if not collection_id:
-                # If no collection found, just add individual movies
-                return self._sync_individual_movies(search_results['results'], franchise_id)
-            
-            # Get collection details
-            collection = self.get_movie_collection(collection_id)
-            if not collection:
-                return False
-            
-            # Create items for each movie in the collection
-            for movie in collection.get('parts', []):
-                self._create_movie_item(movie, franchise_id)
+            if not checkpoint.reached('search'):
+                # Search for the franchise
+                search_results = self.search_movies(franchise_name)
+                if not search_results or not search_results.get('results'):
+                    return False
+                checkpoint.reach('search', movies=search_results['results'])
+            movies = checkpoint.state['movies']
+            
+            if not checkpoint.reached('details'):
+                # Look for a movie with a collection
+                collection_id = None
+                for movie in movies:
+                    movie_details = self.get_movie_details(movie['id'])
+                    if movie_details and movie_details.get('belongs_to_collection'):
+                        collection_id = movie_details['belongs_to_collection']['id']
+                        break
+                
+                parts = None
+                if collection_id:
+                    # Get collection details
+                    collection = self.get_movie_collection(collection_id)
+                    if not collection:
+                        return False
+                    parts = collection.get('parts', [])
+                checkpoint.reach('details', parts=parts)
+            
+            # If no collection was found, just add individual movies
+            parts = checkpoint.state['parts']
+            if parts is None:
+                parts = movies[:5]  # Limit to first 5 results
+            
+            # Create items for each movie; on a resume they resolve to the stored ones
+            items = [self._create_movie_item(movie, franchise_id) for movie in parts]
+            db.session.commit()
+            checkpoint.reach('items')
             
             # Create release order
-            self._create_movie_release_order(collection.get('parts', []), franchise_id)
-            
+            self._create_movie_release_order(parts, items, franchise_id)
             db.session.commit()
+            checkpoint.reach('order')
             return True
             
         except Exception as e:
             print(f"Error syncing movie franchise: {e}")
             db.session.rollback()
+            checkpoint.error = str(e)
             return False
     
-    def sync_tv_franchise(self, franchise_name, franchise_id):
-        """Sync a TV franchise from TMDb"""
+    def sync_tv_franchise(self, franchise_name, franchise_id, episodes=False, checkpoint=None):
+        """Sync a TV franchise from TMDb: the show, its seasons and optionally every episode"""
+        checkpoint = checkpoint or Checkpoint()
         try:
-            # Search for the TV show
-            search_results = self.search_tv_shows(franchise_name)
-            if not search_results or not search_results.get('results'):
-                return False
-            
-            # Get details for the first result (main show)
-            main_show = search_results['results'][0]
-            tv_details = self.get_tv_details(main_show['id'])
-            
-            if not tv_details:
-                return False
+            if not checkpoint.reached('search'):
+                # Search for the TV show
+                search_results = self.search_tv_shows(franchise_name)
+                if not search_results or not search_results.get('results'):
+                    return False
+                checkpoint.reach('search', show_id=search_results['results'][0]['id'])
+            
+            if not checkpoint.reached('details'):
+                # Get details for the first result (main show)
+                tv_details = self.get_tv_details(checkpoint.state['show_id'])
+                if not tv_details:
+                    return False
+                checkpoint.reach('details', show=tv_details)
+            tv_details = checkpoint.state['show']
             
             # Create item for the main show
             self._create_tv_item(tv_details, franchise_id)
+            db.session.commit()
+            checkpoint.reach('items')
             
-            # Create season-based order if multiple seasons
-            if tv_details.get('number_of_seasons', 0) > 1:
-                self._create_tv_season_order(tv_details, franchise_id)
+            # Seasons (and episodes) as items with season and episode orders
+            created = self._expand_tv_show(tv_details, franchise_id, episodes)
             
             db.session.commit()
+            for table, rows in created.items():
+                publish_rows(table, rows)
+            checkpoint.reach('order')
             return True
             
         except Exception as e:
             print(f"Error syncing TV franchise: {e}")
             db.session.rollback()
-            return False
-    
-    def _sync_individual_movies(self, movies, franchise_id):
-        """Sync individual movies when no collection is found"""
-        try:
-            for movie in movies[:5]:  # Limit to first 5 results
-                self._create_movie_item(movie, franchise_id)
-            
-            # Create release order
-            self._create_movie_release_order(movies[:5], franchise_id)
-            return True
-        except Exception as e:
-            print(f"Error syncing individual movies: {e}")
+            checkpoint.error = str(e)
             return False
     
     def _create_movie_item(self, movie_data, franchise_id):
-        """Create an Item from movie data"""
+        """Create an Item from movie data, or merge it into the item it duplicates"""
         try:
-            # Check if item already exists
-            existing = Item.query.filter_by(
-                franchise_id=franchise_id,
-                external_id=str(movie_data['id'])
-            ).first()
-            
-            if existing:
-                return existing
-            
             release_date = None
             if movie_data.get('release_date'):
                 try:
@@ -149,43 +206,32 @@ class TMDbService:
             if movie_data.get('poster_path'):
                 image_url = f"{self.image_base_url}{movie_data['poster_path']}"
             
-            item = Item(
-                franchise_id=franchise_id,
-                title=movie_data.get('title', ''),
-                slug=movie_data.get('title', '').lower().replace(' ', '-'),
-                description=movie_data.get('overview', ''),
-                release_date=release_date,
-                image_url=image_url,
-                external_id=str(movie_data['id']),
-                api_metadata={
+            return self._resolve_item({
+                'franchise_id': franchise_id,
+                'title': movie_data.get('title', ''),
+                'slug': movie_data.get('title', '').lower().replace(' ', '-'),
+                'description': movie_data.get('overview', ''),
+                'release_date': release_date,
+                'image_url': image_url,
+                'external_id': str(movie_data['id']),
+                'api_metadata': {
                     'tmdb_id': movie_data['id'],
                     'vote_average': movie_data.get('vote_average'),
                     'vote_count': movie_data.get('vote_count'),
+                    'popularity': movie_data.get('popularity'),
                     'genre_ids': movie_data.get('genre_ids', []),
                     'original_language': movie_data.get('original_language'),
                     'adult': movie_data.get('adult', False)
                 }
-            )
-            
-            db.session.add(item)
-            return item
+            })
             
         except Exception as e:
             print(f"Error creating movie item: {e}")
             return None
     
     def _create_tv_item(self, tv_data, franchise_id):
-        """Create an Item from TV show data"""
+        """Create an Item from TV show data, or merge it into the item it duplicates"""
         try:
-            # Check if item already exists
-            existing = Item.query.filter_by(
-                franchise_id=franchise_id,
-                external_id=str(tv_data['id'])
-            ).first()
-            
-            if existing:
-                return existing
-            
             release_date = None
             if tv_data.get('first_air_date'):
                 try:
@@ -197,35 +243,54 @@ class TMDbService:
             if tv_data.get('poster_path'):
                 image_url = f"{self.image_base_url}{tv_data['poster_path']}"
             
-            item = Item(
-                franchise_id=franchise_id,
-                title=tv_data.get('name', ''),
-                slug=tv_data.get('name', '').lower().replace(' ', '-'),
-                description=tv_data.get('overview', ''),
-                release_date=release_date,
-                image_url=image_url,
-                external_id=str(tv_data['id']),
-                api_metadata={
+            return self._resolve_item({
+                'franchise_id': franchise_id,
+                'title': tv_data.get('name', ''),
+                'slug': tv_data.get('name', '').lower().replace(' ', '-'),
+                'description': tv_data.get('overview', ''),
+                'release_date': release_date,
+                'image_url': image_url,
+                'external_id': str(tv_data['id']),
+                'api_metadata': {
                     'tmdb_id': tv_data['id'],
                     'vote_average': tv_data.get('vote_average'),
                     'vote_count': tv_data.get('vote_count'),
+                    'popularity': tv_data.get('popularity'),
                     'genre_ids': tv_data.get('genre_ids', []),
                     'original_language': tv_data.get('original_language'),
                     'number_of_seasons': tv_data.get('number_of_seasons'),
                     'number_of_episodes': tv_data.get('number_of_episodes'),
                     'status': tv_data.get('status')
                 }
-            )
-            
-            db.session.add(item)
-            return item
+            })
             
         except Exception as e:
             print(f"Error creating TV item: {e}")
             return None
     
-    def _create_movie_release_order(self, movies, franchise_id):
-        """Create release order for movies"""
+    def _entity_index(self, franchise_id):
+        """EntityIndex of the franchise's items, loaded once per service"""
+        if franchise_id not in self._entity_indexes:
+            self._entity_indexes[franchise_id] = load_franchise_index(db.session, franchise_id)
+        return self._entity_indexes[franchise_id]
+    
+    def _resolve_item(self, row):
+        """The item row duplicates (same provider id, or same title and year), with row merged in; else a new Item"""
+        index = self._entity_index(row['franchise_id'])
+        existing_id = index.resolve(row)
+        existing = db.session.get(Item, existing_id) if existing_id is not None else None
+        if existing:
+            merge_into(existing, row)
+            return existing
+        
+        item = Item(**row)
+        db.session.add(item)
+        db.session.flush()  # Get the item ID
+        index.add(item.id, row)
+        return item
+    
+    def _create_movie_release_order(self, movies, items, franchise_id):
+        """Create release order for movies, items being the movies' Items (None where creation failed)"""
         try:
             # Check if order already exists
             existing_order = Order.query.filter_by(
@@ -248,19 +313,17 @@ class TMDbService:
             db.session.flush()  # Get the order ID
             
             # Sort movies by release date
-            sorted_movies = sorted(movies, key=lambda x: x.get('release_date', ''))
+            sorted_movies = sorted(zip(movies, items), key=lambda pair: pair[0].get('release_date') or '')
             
-            for position, movie in enumerate(sorted_movies, 1):
-                item = Item.query.filter_by(
-                    franchise_id=franchise_id,
-                    external_id=str(movie['id'])
-                ).first()
-                
-                if item:
+            # Two movies merged into one item only take one place
+            seen = set()
+            for position, (movie, item) in enumerate(sorted_movies, 1):
+                if item and item.id not in seen:
+                    seen.add(item.id)
                     order_item = OrderItem(
                         order_id=order.id,
                         item_id=item.id,
-                        position=position
+                        position=position * RANK_GAP
                     )
                     db.session.add(order_item)
             
@@ -270,23 +333,171 @@ class TMDbService:
             print(f"Error creating movie release order: {e}")
             return None
     
-    def _create_tv_season_order(self, tv_data, franchise_id):
-        """Create season order for TV shows"""
-        try:
-            # This is a simplified version - in a real implementation,
-            # you'd fetch season details and create items for each season
+    def _expand_tv_show(self, tv_data, franchise_id, episodes=False):
+        """Bulk-create season (and episode) items and their orders; returns the inserted rows by table
+        
+        Season summaries come with the show details, so seasons alone need no
+        further requests. Episodes are fetched season by season through
+        get_tv_seasons, TV_FETCH_CONCURRENCY at a time. Items are matched on
+        their stable external ids, so a re-sync only adds new seasons and
+        episodes and slots them into the existing orders.
+        """
+        tv_id = tv_data['id']
+        show_name = tv_data.get('name', '')
+        # Season 0 holds specials, which have no place in the viewing order
+        seasons = sorted((season for season in tv_data.get('seasons') or [] if season.get('season_number')),
+                         key=lambda season: season['season_number'])
+        
+        season_rows = [self._tv_season_row(tv_data, season, franchise_id) for season in seasons]
+        episode_rows = []
+        if episodes and seasons:
+            fetched = self.get_tv_seasons(tv_id, [season['season_number'] for season in seasons])
+            for season in seasons:
+                details = fetched.get(season['season_number'])
+                if not details:
+                    print(f"TMDb season {season['season_number']} of {show_name} not fetched, skipping its episodes")
+                    continue
+                for episode in sorted(details.get('episodes') or [], key=lambda episode: episode['episode_number']):
+                    episode_rows.append(self._tv_episode_row(tv_data, season['season_number'], episode, franchise_id))
+        
+        created = {'items': [], 'order_items': []}
+        season_ids = self._bulk_create_items(season_rows, franchise_id, created)
+        episode_ids = self._bulk_create_items(episode_rows, franchise_id, created)
+        
+        if len(season_ids) > 1:
+            self._fill_order(franchise_id, 'chronological', 'Season Order',
+                             f'Seasons of {show_name} in broadcast order', season_ids, created)
+        if episode_ids:
+            self._fill_order(franchise_id, 'episodes', 'Episode Order',
+                             f'Every episode of {show_name} in broadcast order', episode_ids, created)
+        return created
+    
+    def _tv_season_row(self, tv_data, season, franchise_id):
+        """Item row for a season summary from the show details"""
+        number = season['season_number']
+        return {
+            'franchise_id': franchise_id,
+            'title': f"{tv_data.get('name', '')}: {season.get('name') or f'Season {number}'}",
+            'slug': f"{tv_data.get('name', '').lower().replace(' ', '-')}-season-{number}",
+            'description': season.get('overview', ''),
+            'release_date': _parse_date(season.get('air_date')),
+            'image_url': f"{self.image_base_url}{season['poster_path']}" if season.get('poster_path') else None,
+            'external_id': season_external_id(tv_data['id'], number),
+            'api_metadata': {
+                'tmdb_id': season.get('id'),
+                'tmdb_show_id': tv_data['id'],
+                'season_number': number,
+                'episode_count': season.get('episode_count')
+            }
+        }
+    
+    def _tv_episode_row(self, tv_data, season_number, episode, franchise_id):
+        """Item row for an episode from a season's details"""
+        number = episode['episode_number']
+        code = f"S{season_number:02d}E{number:02d}"
+        return {
+            'franchise_id': franchise_id,
+            'title': f"{tv_data.get('name', '')} {code}: {episode.get('name', '')}",
+            'slug': f"{tv_data.get('name', '').lower().replace(' ', '-')}-{code.lower()}",
+            'description': episode.get('overview', ''),
+            'release_date': _parse_date(episode.get('air_date')),
+            'image_url': f"{self.image_base_url}{episode['still_path']}" if episode.get('still_path') else None,
+            'external_id': episode_external_id(tv_data['id'], season_number, number),
+            'api_metadata': {
+                'tmdb_id': episode.get('id'),
+                'tmdb_show_id': tv_data['id'],
+                'season_number': season_number,
+                'episode_number': number,
+                'runtime': episode.get('runtime'),
+                'vote_average': episode.get('vote_average'),
+                'vote_count': episode.get('vote_count')
+            }
+        }
+    
+    def _bulk_create_items(self, rows, franchise_id, created):
+        """Insert the rows whose external ids are new; returns every row's item id, in row order"""
+        ids = {}
+        external_ids = [row['external_id'] for row in rows]
+        for start in range(0, len(external_ids), TV_CHUNK_SIZE):
+            existing = db.session.query(Item.id, Item.external_id).filter(
+                Item.franchise_id == franchise_id,
+                Item.external_id.in_(external_ids[start:start + TV_CHUNK_SIZE])
+            )
+            ids.update({external_id: item_id for item_id, external_id in existing})
+        
+        new_rows = [row for row in rows if row['external_id'] not in ids]
+        for start in range(0, len(new_rows), TV_CHUNK_SIZE):
+            chunk = new_rows[start:start + TV_CHUNK_SIZE]
+            # return_defaults fills in the generated ids
+            db.session.bulk_insert_mappings(Item, chunk, return_defaults=True)
+            ids.update({row['external_id']: row['id'] for row in chunk})
+        created['items'].extend(new_rows)
+        return [ids[external_id] for external_id in external_ids]
+    
+    def _fill_order(self, franchise_id, order_type, name, description, item_ids, created):
+        """Create the order if needed and add the items it doesn't hold yet where item_ids puts them
+        
+        A missing item goes right after the closest item before it in item_ids
+        that the order already holds (or before the first one), so a backfilled
+        episode lands in broadcast order rather than at the end. Ranks come
+        from plan_sequence: existing entries keep theirs unless a gap is used
+        up and the order is respread.
+        """
+        order = Order.query.filter_by(franchise_id=franchise_id, order_type=order_type).first()
+        if not order:
             order = Order(
                 franchise_id=franchise_id,
-                order_type='chronological',
-                name='Season Order',
-                description='Episodes/seasons in chronological order',
+                order_type=order_type,
+                name=name,
+                description=description,
                 is_official=True
             )
-            
             db.session.add(order)
+            db.session.flush()  # Get the order ID
+        
+        entries = db.session.query(OrderItem.id, OrderItem.item_id, OrderItem.position) \
+            .filter(OrderItem.order_id == order.id).order_by(OrderItem.position)
+        current = [{'id': entry_id, 'item_id': item_id, 'rank': position} for entry_id, item_id, position in entries]
+        indexes = {}
+        for index, entry in enumerate(current):
+            indexes.setdefault(entry['item_id'], index)
+        
+        # Current entry index -> missing items placed before / after it
+        before, after, leading, previous, missing = {}, {}, [], None, set()
+        for item_id in item_ids:
+            if item_id in indexes:
+                if previous is None and leading:
+                    before[indexes[item_id]] = leading
+                previous = indexes[item_id]
+            elif item_id not in missing:
+                missing.add(item_id)
+                if previous is None:
+                    leading.append(item_id)
+                else:
+                    after.setdefault(previous, []).append(item_id)
+        if not missing:
             return order
-            
-        except Exception as e:
-            print(f"Error creating TV season order: {e}")
-            return None
+        
+        sequence = []
+        for index, entry in enumerate(current):
+            sequence.extend({'item_id': item_id} for item_id in before.get(index, ()))
+            sequence.append(entry)
+            sequence.extend({'item_id': item_id} for item_id in after.get(index, ()))
+        if leading and not before:
+            # None of item_ids is in the order yet
+            sequence.extend({'item_id': item_id} for item_id in leading)
+        plan = plan_sequence(current, sequence)
+        
+        if plan['updates']:
+            # A used-up gap respread the order; new ranks never collide with rows still in place
+            db.session.bulk_update_mappings(OrderItem, [{'id': entry['id'], 'position': entry['rank']}
+                                                        for entry in plan['updates']])
+        rows = [{'order_id': order.id, 'item_id': entry['item_id'], 'position': entry['rank']}
+                for entry in plan['inserts']]
+        for start in range(0, len(rows), TV_CHUNK_SIZE):
+            db.session.bulk_insert_mappings(OrderItem, rows[start:start + TV_CHUNK_SIZE], return_defaults=True)
+        created['order_items'].extend(rows)
+        created['order_items'].extend({'id': entry['id'], 'order_id': order.id, 'item_id': entry['item_id'],
+                                       'position': entry['rank']} for entry in plan['updates'])
+        return order
 
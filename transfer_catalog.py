@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""Snapshot and restore the catalog as NDJSON.
+
+Exports stream franchises, items, orders, order_items and affiliate_links
+keyed by natural keys (franchise slug, item external_id); imports upsert
+them chunk by chunk, so the same snapshot can be restored into another
+environment or backend, or re-applied, without duplicating rows. Files
+ending in .gz are compressed; '-' means stdout/stdin.
+
+    python transfer_catalog.py export --output catalog.ndjson.gz
+    python transfer_catalog.py import --input catalog.ndjson.gz --backend supabase
+    python transfer_catalog.py export --tables franchises,items --output - | head
+"""
+
+import argparse
+import gzip
+import io
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+
+from src.services.catalog_transfer import CHUNK_SIZE, TABLES, export_lines, import_lines, iter_lines
+
+
+def open_file(path, mode):
+    """Text file for path ('-' = stdio, .gz = gzip)."""
+    if path == '-':
+        return io.TextIOWrapper(sys.stdin.buffer if mode == 'r' else sys.stdout.buffer, encoding='utf-8')
+    if path.endswith('.gz'):
+        return gzip.open(path, mode + 't', encoding='utf-8')
+    return open(path, mode, encoding='utf-8')
+
+
+def sqlite_app(database):
+    from flask import Flask
+    from src.models.franchise import db
+    from src.config.database import configure_database
+    
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    configure_database(app, db, os.path.abspath(database))
+    with app.app_context():
+        db.create_all()
+    return app, db
+
+
+def run(args, action):
+    """Run action(catalog) against the selected backend."""
+    if args.backend == 'supabase':
+        from src.config.supabase import get_supabase_client
+        from src.services.catalog_transfer import SupabaseCatalog
+        return action(SupabaseCatalog(get_supabase_client()))
+    
+    from src.services.catalog_transfer import SqlAlchemyCatalog
+    app, db = sqlite_app(args.database)
+    with app.app_context():
+        return action(SqlAlchemyCatalog(db.session))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('command', choices=['export', 'import'])
+    parser.add_argument('--backend', choices=['sqlite', 'supabase'], default='sqlite')
+    parser.add_argument('--database', default=os.path.join(os.path.dirname(__file__), 'database', 'app.db'),
+                        help='SQLite database file (sqlite backend)')
+    parser.add_argument('--tables', default=','.join(TABLES), help='comma-separated tables to export')
+    parser.add_argument('--output', default='-', help='export destination')
+    parser.add_argument('--input', default='-', help='import source')
+    parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE)
+    args = parser.parse_args()
+    
+    started = time.perf_counter()
+    if args.command == 'export':
+        tables = [table.strip() for table in args.tables.split(',')]
+        
+        def export(catalog):
+            lines = 0
+            with open_file(args.output, 'w') as output:
+                for line in export_lines(catalog, tables, args.chunk_size):
+                    output.write(line)
+                    lines += 1
+            return lines
+        
+        lines = run(args, export)
+        print(f"Exported {lines - 1} rows in {time.perf_counter() - started:.1f}s", file=sys.stderr)
+        return
+    
+    def restore(catalog):
+        with open_file(args.input, 'r') as source:
+            return import_lines(catalog, iter_lines(source), args.chunk_size)
+    
+    report = run(args, restore)
+    print(json.dumps(report, indent=2))
+    if report['failed']:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()